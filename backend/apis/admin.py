@@ -711,8 +711,8 @@ class ConfiguracaoAdmin(ModelAdmin):
 
 @admin.register(AgendamentoBackup)
 class AgendamentoBackupAdmin(ModelAdmin):
-    list_display = ['id_agendamento', 'data_hora', 'descricao', 'notificado', 'criado_em']
-    list_filter = ['notificado']
+    list_display = ['id_agendamento', 'data_hora', 'descricao', 'executado', 'tentativas', 'executado_em', 'criado_em']
+    list_filter = ['executado', 'notificado']
     search_fields = ['descricao']
 
 @admin.register(Notificacao)
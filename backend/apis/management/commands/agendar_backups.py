@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from apis.services.agendamento_backup_service import AgendamentoBackupService
+
+
+class Command(BaseCommand):
+    help = 'Executa os backups agendados (AgendamentoBackup) na janela fora de horas de ponta'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--intervalo', type=float, default=None,
+            help=f'Segundos entre verificações dos agendamentos (padrão: {AgendamentoBackupService.INTERVALO})'
+        )
+        parser.add_argument(
+            '--uma-vez', action='store_true',
+            help='Executa os agendamentos vencidos e termina (ex: cron)'
+        )
+
+    def handle(self, *args, **options):
+        janela = AgendamentoBackupService.janela()
+        self.stdout.write(
+            f"Agendador de backups (janela: {'-'.join(h.strftime('%H:%M') for h in janela) if janela else 'sem restrição'})..."
+        )
+        try:
+            total = AgendamentoBackupService.processar(
+                intervalo=options['intervalo'],
+                uma_vez=options['uma_vez'],
+                log=self.stdout.write,
+            )
+        except KeyboardInterrupt:
+            self.stdout.write("Interrompido.")
+            return
+        self.stdout.write(self.style.SUCCESS(f"{total} backup(s) agendado(s) executado(s)."))
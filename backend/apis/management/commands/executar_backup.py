@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from apis.models import BackupJob
+from apis.services.backup_service import BackupService
+
+
+class Command(BaseCommand):
+    help = 'Executa um backup registado (lançado em segundo plano pelo BackupViewSet)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('job_id', type=int, help='ID do BackupJob a executar')
+
+    def handle(self, *args, **options):
+        job_id = options['job_id']
+        resultado = BackupService.executar(job_id)
+        if resultado is None:
+            raise CommandError(f"Backup #{job_id} não encontrado ou já executado.")
+        if resultado != BackupJob.STATUS_CONCLUIDO:
+            raise CommandError(f"Backup #{job_id}: {resultado}")
+        self.stdout.write(self.style.SUCCESS(f"Backup #{job_id} concluído."))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from apis.services.restauro_service import RestauroService
+
+
+class Command(BaseCommand):
+    help = 'Executa um restauro de backup (lançado em segundo plano pelo BackupViewSet)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('token', help='Token do restauro a executar')
+
+    def handle(self, *args, **options):
+        token = options['token']
+        resultado = RestauroService.executar(token)
+        if resultado is None:
+            raise CommandError(f"Restauro {token} não encontrado ou já executado.")
+        if resultado != RestauroService.STATUS_CONCLUIDO:
+            raise CommandError(f"Restauro {token}: {RestauroService.estado(token).get('erro')}")
+        self.stdout.write(self.style.SUCCESS(f"Restauro {token} concluído."))
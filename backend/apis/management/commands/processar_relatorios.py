@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+
+from apis.services.relatorio_job_service import RelatorioJobService
+
+
+class Command(BaseCommand):
+    help = 'Processa a fila de relatórios em PDF pedidos via API (pool de processos com concorrência limitada)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=None,
+            help=f'Relatórios renderizados em simultâneo (padrão: RELATORIOS_WORKERS={RelatorioJobService.MAX_WORKERS})'
+        )
+        parser.add_argument(
+            '--intervalo', type=float, default=None,
+            help=f'Segundos entre verificações da fila (padrão: {RelatorioJobService.INTERVALO})'
+        )
+        parser.add_argument(
+            '--uma-vez', action='store_true',
+            help='Processa os relatórios pendentes e termina (ex: cron)'
+        )
+
+    def handle(self, *args, **options):
+        workers = options['workers'] or RelatorioJobService.MAX_WORKERS
+        self.stdout.write(f"A processar relatórios com {workers} worker(s)...")
+        try:
+            total = RelatorioJobService.processar(
+                max_workers=workers,
+                intervalo=options['intervalo'],
+                uma_vez=options['uma_vez'],
+                log=self.stdout.write,
+            )
+        except KeyboardInterrupt:
+            self.stdout.write("Interrompido.")
+            return
+        self.stdout.write(self.style.SUCCESS(f"{total} relatório(s) processado(s)."))
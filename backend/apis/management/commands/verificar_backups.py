@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from apis.services.catalogo_backup_service import CatalogoBackupService
+
+
+class Command(BaseCommand):
+    help = 'Verifica a integridade dos arquivos de backup com os checksums SHA-256 do catálogo'
+
+    def add_arguments(self, parser):
+        parser.add_argument('nomes', nargs='*', help='Arquivos a verificar (padrão: todos os do catálogo)')
+        parser.add_argument(
+            '--membros', action='store_true',
+            help='Verifica também o CRC de cada membro do ZIP (mais lento)'
+        )
+        parser.add_argument(
+            '--reconstruir', action='store_true',
+            help='Reconstrói o catálogo a partir da pasta de backups antes de verificar '
+                 '(calcula o checksum dos arquivos que não o têm)'
+        )
+
+    def handle(self, *args, **options):
+        if options['reconstruir']:
+            CatalogoBackupService.reconstruir(calcular_checksum=True)
+
+        nomes = options['nomes'] or [entrada['nome'] for entrada in CatalogoBackupService.listar()]
+        falhas = 0
+        for nome in nomes:
+            ok, mensagem = CatalogoBackupService.verificar(nome, membros=options['membros'])
+            if ok:
+                self.stdout.write(f"{nome}: {self.style.SUCCESS(mensagem)}")
+            else:
+                falhas += 1
+                self.stdout.write(f"{nome}: {self.style.ERROR(mensagem)}")
+
+        if falhas:
+            raise CommandError(f"{falhas} de {len(nomes)} backup(s) com problemas.")
+        self.stdout.write(self.style.SUCCESS(f"{len(nomes)} backup(s) verificado(s)."))
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apis', '0069_alter_candidato_unique_together_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='matricula',
+            name='atualizado_em',
+            field=models.DateTimeField(auto_now=True, verbose_name='Atualizado em'),
+        ),
+        migrations.CreateModel(
+            name='RegistoRemocao',
+            fields=[
+                ('id_registo', models.AutoField(primary_key=True, serialize=False)),
+                ('modelo', models.CharField(max_length=50, verbose_name='Modelo')),
+                ('objeto_id', models.IntegerField(verbose_name='ID do Objecto')),
+                ('removido_em', models.DateTimeField(auto_now_add=True, verbose_name='Removido em')),
+            ],
+            options={
+                'verbose_name': 'Registo de Remoção',
+                'verbose_name_plural': 'Registos de Remoção',
+                'db_table': 'registo_remocao',
+                'ordering': ['-removido_em'],
+                'indexes': [models.Index(fields=['modelo', 'removido_em'], name='registo_rem_modelo_4e6b1e_idx')],
+            },
+        ),
+    ]
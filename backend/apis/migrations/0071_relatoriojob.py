@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apis', '0070_matricula_atualizado_em_registoremocao'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RelatorioJob',
+            fields=[
+                ('id_job', models.AutoField(primary_key=True, serialize=False)),
+                ('tipo', models.CharField(max_length=50, verbose_name='Tipo de Relatório')),
+                ('parametros', models.JSONField(blank=True, default=dict, verbose_name='Parâmetros')),
+                ('status', models.CharField(choices=[('Pendente', 'Pendente'), ('Em Processamento', 'Em Processamento'), ('Concluido', 'Concluído'), ('Erro', 'Erro')], default='Pendente', max_length=20, verbose_name='Estado')),
+                ('ficheiro', models.FileField(blank=True, null=True, upload_to='relatorios/%Y/%m/', verbose_name='Ficheiro')),
+                ('nome_ficheiro', models.CharField(blank=True, max_length=150, verbose_name='Nome do Ficheiro')),
+                ('erro', models.TextField(blank=True, null=True, verbose_name='Erro')),
+                ('solicitado_por_tipo', models.CharField(blank=True, max_length=20, verbose_name='Tipo do Solicitante')),
+                ('solicitado_por_id', models.IntegerField(blank=True, null=True, verbose_name='ID do Solicitante')),
+                ('criado_em', models.DateTimeField(auto_now_add=True, verbose_name='Criado em')),
+                ('iniciado_em', models.DateTimeField(blank=True, null=True, verbose_name='Iniciado em')),
+                ('concluido_em', models.DateTimeField(blank=True, null=True, verbose_name='Concluído em')),
+            ],
+            options={
+                'verbose_name': 'Pedido de Relatório',
+                'verbose_name_plural': 'Pedidos de Relatório',
+                'db_table': 'relatorio_job',
+                'ordering': ['-criado_em'],
+                'indexes': [models.Index(fields=['status', 'criado_em'], name='relatorio_j_status_b0d36e_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apis', '0071_relatoriojob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BackupJob',
+            fields=[
+                ('id_job', models.AutoField(primary_key=True, serialize=False)),
+                ('status', models.CharField(choices=[('Pendente', 'Pendente'), ('Em Processamento', 'Em Processamento'), ('Concluido', 'Concluído'), ('Erro', 'Erro')], default='Pendente', max_length=20, verbose_name='Estado')),
+                ('fase', models.CharField(blank=True, max_length=50, verbose_name='Fase Actual')),
+                ('progresso', models.PositiveSmallIntegerField(default=0, verbose_name='Progresso (%)')),
+                ('bytes_processados', models.BigIntegerField(default=0, verbose_name='Bytes Processados')),
+                ('bytes_estimados', models.BigIntegerField(blank=True, null=True, verbose_name='Bytes Estimados')),
+                ('nome_ficheiro', models.CharField(blank=True, max_length=150, verbose_name='Ficheiro')),
+                ('tamanho', models.BigIntegerField(blank=True, null=True, verbose_name='Tamanho do Ficheiro')),
+                ('erro', models.TextField(blank=True, null=True, verbose_name='Erro')),
+                ('solicitado_por_tipo', models.CharField(blank=True, max_length=20, verbose_name='Tipo do Solicitante')),
+                ('solicitado_por_id', models.IntegerField(blank=True, null=True, verbose_name='ID do Solicitante')),
+                ('criado_em', models.DateTimeField(auto_now_add=True, verbose_name='Criado em')),
+                ('iniciado_em', models.DateTimeField(blank=True, null=True, verbose_name='Iniciado em')),
+                ('actualizado_em', models.DateTimeField(auto_now=True, verbose_name='Última Actualização')),
+                ('concluido_em', models.DateTimeField(blank=True, null=True, verbose_name='Concluído em')),
+            ],
+            options={
+                'verbose_name': 'Execução de Backup',
+                'verbose_name_plural': 'Execuções de Backup',
+                'db_table': 'backup_job',
+                'ordering': ['-criado_em'],
+                'indexes': [models.Index(fields=['status', 'criado_em'], name='backup_job_status_7fba32_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apis', '0072_backupjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='backupjob',
+            name='completo',
+            field=models.BooleanField(default=False, help_text='Guardar toda a media, sem referências a backups anteriores', verbose_name='Media Completa'),
+        ),
+    ]
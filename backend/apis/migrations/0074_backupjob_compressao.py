@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apis', '0073_backupjob_completo'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='backupjob',
+            name='compressao',
+            field=models.CharField(choices=[('rapido', 'Rápido (gzip -1)'), ('equilibrado', 'Equilibrado (gzip -6)'), ('maximo', 'Máximo (xz -6)')], default='equilibrado', max_length=20, verbose_name='Perfil de Compressão'),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:11
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apis', '0074_backupjob_compressao'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='agendamentobackup',
+            name='backup_job',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='agendamentos', to='apis.backupjob', verbose_name='Último Backup'),
+        ),
+        migrations.AddField(
+            model_name='agendamentobackup',
+            name='erro',
+            field=models.TextField(blank=True, null=True, verbose_name='Último Erro'),
+        ),
+        migrations.AddField(
+            model_name='agendamentobackup',
+            name='executado_em',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Executado em'),
+        ),
+        migrations.AddField(
+            model_name='agendamentobackup',
+            name='proxima_tentativa',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Próxima Tentativa'),
+        ),
+        migrations.AddField(
+            model_name='agendamentobackup',
+            name='reservado_em',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Reservado em'),
+        ),
+        migrations.AddField(
+            model_name='agendamentobackup',
+            name='reservado_por',
+            field=models.CharField(blank=True, max_length=100, verbose_name='Reservado por'),
+        ),
+        migrations.AddField(
+            model_name='agendamentobackup',
+            name='tentativas',
+            field=models.PositiveSmallIntegerField(default=0, verbose_name='Tentativas Falhadas'),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apis', '0075_agendamentobackup_execucao'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='historico',
+            index=models.Index(fields=['data_hora', 'id_historico'], name='historico_data_ho_0b45e5_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='historicologin',
+            index=models.Index(fields=['hora_entrada', 'id_historico_login'], name='historico_l_hora_en_287b7c_idx'),
+        ),
+        # Depois de criado o novo índice: a tabela nunca fica sem índice em data_hora
+        migrations.RemoveIndex(
+            model_name='historico',
+            name='historico_data_ho_79493f_idx',
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:33
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def interromper_duplicados(apps, schema_editor):
+    """Backups activos em duplicado (antes da restrição): mantém o mais recente"""
+    BackupJob = apps.get_model('apis', 'BackupJob')
+    activos = BackupJob.objects.filter(status__in=['Pendente', 'Em Processamento']).order_by('-criado_em', '-id_job')
+    ids = list(activos.values_list('id_job', flat=True)[1:])
+    if ids:
+        BackupJob.objects.filter(id_job__in=ids).update(
+            status='Erro', erro='Backup interrompido', concluido_em=timezone.now()
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apis', '0076_auditoria_indices_keyset'),
+    ]
+
+    operations = [
+        migrations.RunPython(interromper_duplicados, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='backupjob',
+            constraint=models.UniqueConstraint(models.Value(True), condition=models.Q(('status__in', ['Pendente', 'Em Processamento'])), name='backup_job_um_em_curso'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:10
+
+from django.db import migrations, models
+from django.db.models import Count, Max
+
+
+def remover_duplicados(apps, schema_editor):
+    """Notas repetidas para a mesma avaliação (antes da restrição): mantém a mais recente"""
+    Nota = apps.get_model('apis', 'Nota')
+    chave = ['id_aluno', 'id_disciplina', 'id_turma', 'tipo_avaliacao']
+    grupos = Nota.objects.values(*chave).annotate(n=Count('id_nota'), manter=Max('id_nota')).filter(n__gt=1)
+    for grupo in grupos:
+        Nota.objects.filter(**{campo: grupo[campo] for campo in chave}).exclude(
+            id_nota=grupo['manter']
+        ).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apis', '0077_backup_job_um_em_curso'),
+    ]
+
+    operations = [
+        migrations.RunPython(remover_duplicados, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='nota',
+            constraint=models.UniqueConstraint(fields=('id_aluno', 'id_disciplina', 'id_turma', 'tipo_avaliacao'), name='unique_nota_por_avaliacao'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:40
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def remover_duplicados(apps, schema_editor):
+    """Faltas repetidas no mesmo dia (antes da restrição): mantém a justificada ou, senão, a primeira"""
+    FaltaAluno = apps.get_model('apis', 'FaltaAluno')
+    chave = ['id_aluno', 'id_disciplina', 'data_falta']
+    grupos = FaltaAluno.objects.filter(id_disciplina__isnull=False).values(*chave).annotate(
+        n=Count('id_falta')
+    ).filter(n__gt=1)
+    for grupo in grupos:
+        faltas = FaltaAluno.objects.filter(**{campo: grupo[campo] for campo in chave})
+        manter = faltas.order_by('-justificada', 'id_falta').values_list('id_falta', flat=True).first()
+        faltas.exclude(id_falta=manter).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apis', '0078_nota_unica_por_avaliacao'),
+    ]
+
+    operations = [
+        migrations.RunPython(remover_duplicados, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='faltaaluno',
+            constraint=models.UniqueConstraint(fields=('id_aluno', 'id_disciplina', 'data_falta'), name='unique_falta_por_dia'),
+        ),
+    ]
@@ -1,10 +1,15 @@
 """
 AuditMixin — mixin reutilizável para registar acções CRUD no modelo Historico.
+DeltaSyncMixin — sincronização incremental ("alterado desde") das listagens.
+ExportacaoCSVMixin — exportação da listagem em CSV (streaming).
 
 Uso: adicionar AuditMixin antes de viewsets.ModelViewSet na definição da classe.
     class TurmaViewSet(AuditMixin, viewsets.ModelViewSet):
         ...
 """
+import datetime
+from rest_framework.decorators import action
+from rest_framework.response import Response
 
 # Mapeamento de rótulos legíveis para cada acção
 ACTION_LABELS = {
@@ -64,7 +69,8 @@ def _safe_str(instance):
         return repr(instance)
 
 
-def _log_action(request, action_key, instance, dados_anteriores=None, dados_novos=None):
+def _log_action(request, action_key, instance, dados_anteriores=None, dados_novos=None,
+                model_name=None, str_repr=None):
     """Grava uma linha no Historico."""
     try:
         from apis.models import Historico
@@ -72,8 +78,8 @@ def _log_action(request, action_key, instance, dados_anteriores=None, dados_novo
         id_func, id_usuario, id_aluno = _get_actor(request)
 
         label = ACTION_LABELS.get(action_key, action_key)
-        model_name = _model_label(instance)
-        str_repr = _safe_str(instance)
+        model_name = model_name or _model_label(instance)
+        str_repr = str_repr if str_repr is not None else _safe_str(instance)
 
         tipo_accao = f"{label} {model_name}: {str_repr}"[:255]
 
@@ -126,6 +132,20 @@ class AuditMixin:
             dados_novos=dados_novos,
         )
 
+    def _log_audit_batch(self, action_key, model, descricao, dados_novos=None):
+        """
+        Regista uma única linha no Historico para uma operação em lote
+        (ex: pauta de notas, faltas de uma turma), sem precisar de uma instância.
+        """
+        _log_action(
+            self.request,
+            action_key,
+            None,
+            dados_novos=dados_novos,
+            model_name=model.__name__,
+            str_repr=descricao,
+        )
+
     def perform_create(self, serializer):
         instance = serializer.save()
         self._log_audit_action('create', instance, serializer)
@@ -139,3 +159,122 @@ class AuditMixin:
     def perform_destroy(self, instance):
         self._log_audit_action('destroy', instance)
         instance.delete()
+
+
+class DeltaSyncMixin:
+    """
+    Mixin para ViewSets com listagens consultadas periodicamente (polling).
+    Acrescenta a acção GET <recurso>/sincronizar/?desde=<cursor>, que devolve
+    apenas os objectos alterados e os IDs removidos desde o cursor:
+
+        {"cursor": "...", "completo": false, "alterados": [...], "removidos": [3, 7], "pagina_seguinte": null}
+
+    Sem `desde` devolve a listagem completa (completo=true). A resposta é
+    paginada por chave primária (?page_size=, até PAGE_SIZE_MAXIMO): enquanto
+    houver `pagina_seguinte`, o cliente repete o pedido (com o mesmo `desde`)
+    acrescentando ?pagina=<pagina_seguinte>. O `cursor` só vem na última página
+    e é o do início da sincronização, pelo que as alterações feitas entre
+    páginas são apanhadas na sincronização seguinte. Os removidos vêm na primeira.
+
+    `delta_campos` indica os caminhos de atualizado_em que marcam o objecto como
+    alterado (ex: a sala muda quando um aluno das suas turmas muda).
+    """
+    delta_campos = ['atualizado_em']
+    delta_page_size = 100
+
+    # Margem de segurança: transacções que fazem commit depois de o cursor ser
+    # emitido continuam a ser apanhadas (o cliente pode receber repetidos)
+    DELTA_MARGEM = datetime.timedelta(seconds=5)
+
+    @property
+    def is_listagem(self):
+        """A sincronização usa os mesmos serializers e pré-cálculos da listagem"""
+        return self.action in ('list', 'sincronizar')
+
+    def filtrar_alterados(self, queryset, desde):
+        from django.db.models import Q
+
+        filtro = Q()
+        for campo in self.delta_campos:
+            filtro |= Q(**{f'{campo}__gt': desde})
+
+        # Subconsulta por pk: os joins dos delta_campos não interferem com as
+        # anotações (contagens) do queryset da listagem
+        alterados = queryset.model.objects.filter(filtro).values('pk')
+        return queryset.filter(pk__in=alterados)
+
+    @action(detail=False, methods=['get'])
+    def sincronizar(self, request):
+        from django.utils import timezone
+        from django.utils.dateparse import parse_datetime
+        from apis.models import RegistoRemocao
+        from apis.utils import paginacao_utils
+
+        # Página seguinte: o cursor da sincronização e a última chave enviada
+        pagina = request.query_params.get('pagina')
+        if pagina:
+            try:
+                _direccao, cursor, ultimo_pk = paginacao_utils.descodificar_cursor(pagina)
+            except paginacao_utils.CursorInvalido:
+                return Response({'erro': 'Página inválida. Use o valor "pagina_seguinte" da resposta anterior.'}, status=400)
+        else:
+            cursor, ultimo_pk = timezone.now() - self.DELTA_MARGEM, None
+
+        queryset = self.filter_queryset(self.get_queryset())
+        removidos = []
+
+        desde_param = request.query_params.get('desde')
+        if desde_param:
+            desde = parse_datetime(desde_param.replace(' ', '+'))
+            if desde is None:
+                return Response({'erro': 'Cursor inválido. Use o valor "cursor" da última sincronização.'}, status=400)
+            if timezone.is_naive(desde):
+                desde = timezone.make_aware(desde)
+
+            queryset = self.filtrar_alterados(queryset, desde)
+            if not pagina:
+                removidos = list(
+                    RegistoRemocao.objects.filter(
+                        modelo=queryset.model.__name__, removido_em__gt=desde
+                    ).values_list('objeto_id', flat=True).distinct()
+                )
+
+        if ultimo_pk is not None:
+            queryset = queryset.filter(pk__gt=ultimo_pk)
+        tamanho = paginacao_utils.page_size(request.query_params.get('page_size', self.delta_page_size))
+        # Uma linha a mais indica se existe outra página
+        objectos = list(queryset.order_by('pk')[:tamanho + 1])
+        seguinte = None
+        if len(objectos) > tamanho:
+            objectos = objectos[:tamanho]
+            seguinte = paginacao_utils.codificar_cursor('n', cursor, objectos[-1].pk)
+
+        serializer = self.get_serializer(objectos, many=True)
+        return Response({
+            'cursor': None if seguinte else cursor.isoformat(),
+            'completo': not desde_param,
+            'alterados': serializer.data,
+            'removidos': removidos,
+            'pagina_seguinte': seguinte,
+        })
+
+
+class ExportacaoCSVMixin:
+    """
+    Mixin para ViewSets com listagens grandes (candidatos, matrículas, pagamentos).
+    Acrescenta GET <recurso>/exportar/, que devolve em CSV (streaming) todas as
+    linhas da listagem, com os mesmos filtros, pesquisa e ordenação, sem paginação.
+
+    `colunas_exportacao` = [(cabeçalho, caminho do campo), ...]
+    """
+    colunas_exportacao = []
+    nome_exportacao = 'exportacao'
+
+    @action(detail=False, methods=['get'])
+    def exportar(self, request):
+        from django.utils import timezone
+        from apis.utils.csv_utils import exportar_queryset
+
+        queryset = self.filter_queryset(self.get_queryset())
+        nome_ficheiro = f"{self.nome_exportacao}_{timezone.localdate().strftime('%Y%m%d')}.csv"
+        return exportar_queryset(queryset, self.colunas_exportacao, nome_ficheiro)
@@ -13,8 +13,10 @@ from .matriculas import Inscricao, Matricula
 from .historico import HistoricoEscolar
 from .auditoria import Historico, HistoricoLogin
 from .candidatura import Candidato, RupeCandidato, ExameAdmissao, ListaEspera
-from .configuracao import Configuracao, AgendamentoBackup
+from .configuracao import Configuracao, AgendamentoBackup, BackupJob
 from .notificacao import Notificacao
+from .sincronizacao import RegistoRemocao
+from .relatorio import RelatorioJob
 
 __all__ = [
     'BaseModel',
@@ -28,6 +30,8 @@ __all__ = [
     'Historico', 'HistoricoLogin',
     # Candidatura
     'Candidato', 'RupeCandidato', 'ExameAdmissao', 'ListaEspera',
-    'Configuracao', 'AgendamentoBackup',
+    'Configuracao', 'AgendamentoBackup', 'BackupJob',
     'Notificacao',
+    'RegistoRemocao',
+    'RelatorioJob',
 ]
@@ -1,6 +1,8 @@
 from django.db import models
 from django.core.exceptions import ValidationError
 from django.core.cache import cache
+from django.utils import timezone
+from apis.utils.cache_utils import invalidar_apos_commit
 from .base import BaseModel
 from .usuarios import Funcionario
 import datetime
@@ -133,12 +135,12 @@ class AnoLectivo(BaseModel):
             # Reverter os efeitos do encerramento para este ano
             if status_anterior == 'Encerrado':
                 # Reverter Turmas deste ano que foram concluídas pelo encerramento
-                count_turmas = Turma.objects.filter(ano_lectivo=self, status='Concluida').update(status='Ativa')
+                count_turmas = Turma.objects.filter(ano_lectivo=self, status='Concluida').update(status='Ativa', atualizado_em=timezone.now())
 
                 # Reverter Matrículas deste ano: 'Concluida' → 'Ativa'
                 count_matriculas = Matricula.objects.filter(
                     ano_lectivo=self, status='Concluida'
-                ).update(status='Ativa')
+                ).update(status='Ativa', atualizado_em=timezone.now())
 
                 # Reverter Alunos deste ano: 'Concluido' → 'Activo'
                 ids_alunos = Matricula.objects.filter(
@@ -148,7 +150,7 @@ class AnoLectivo(BaseModel):
                 count_alunos = Aluno.objects.filter(
                     id_aluno__in=ids_alunos,
                     status_aluno='Concluido'
-                ).update(status_aluno='Activo')
+                ).update(status_aluno='Activo', atualizado_em=timezone.now())
 
                 self._update_stats['reopened'] = {
                     'nome': self.nome,
@@ -162,12 +164,12 @@ class AnoLectivo(BaseModel):
             old_active = AnoLectivo.objects.filter(status='Activo').exclude(pk=self.pk).first()
             if old_active:
                 # Marcar Turmas do ano anterior como Concluídas
-                count_turmas = Turma.objects.filter(ano_lectivo=old_active, status='Ativa').update(status='Concluida')
+                count_turmas = Turma.objects.filter(ano_lectivo=old_active, status='Ativa').update(status='Concluida', atualizado_em=timezone.now())
 
                 # Marcar Matrículas do ano anterior como Concluídas
                 count_matriculas = Matricula.objects.filter(
                     ano_lectivo=old_active, status__in=['Ativa']
-                ).update(status='Concluida')
+                ).update(status='Concluida', atualizado_em=timezone.now())
 
                 # Actualizar Alunos do ano anterior: 'Activo' → 'Concluido'
                 # Incluir alunos via Matrícula e via Turma (segurança)
@@ -184,7 +186,7 @@ class AnoLectivo(BaseModel):
                 count_alunos = Aluno.objects.filter(
                     id_aluno__in=ids_alunos_geral,
                     status_aluno='Activo'
-                ).update(status_aluno='Concluido')
+                ).update(status_aluno='Concluido', atualizado_em=timezone.now())
 
                 # Fechar o ano anterior
                 AnoLectivo.objects.filter(pk=old_active.pk).update(status='Encerrado', activo=False)
@@ -204,12 +206,12 @@ class AnoLectivo(BaseModel):
             # === CASO C: ENCERRAMENTO EXPLÍCITO (Activo → Encerrado/Suspenso) ===
             if status_anterior == 'Activo' and self.status in ['Encerrado', 'Suspenso']:
                  # Concluir Turmas
-                 count_turmas = Turma.objects.filter(ano_lectivo=self, status='Ativa').update(status='Concluida')
+                 count_turmas = Turma.objects.filter(ano_lectivo=self, status='Ativa').update(status='Concluida', atualizado_em=timezone.now())
                  
                  # Concluir Matrículas
                  count_matriculas = Matricula.objects.filter(
                      ano_lectivo=self, status__in=['Ativa']
-                 ).update(status='Concluida')
+                 ).update(status='Concluida', atualizado_em=timezone.now())
                  
                  # Concluir Alunos
                  # Incluir alunos via Matrícula e via Turma (segurança)
@@ -226,7 +228,7 @@ class AnoLectivo(BaseModel):
                  count_alunos = Aluno.objects.filter(
                      id_aluno__in=ids_alunos_geral,
                      status_aluno='Activo'
-                 ).update(status_aluno='Concluido')
+                 ).update(status_aluno='Concluido', atualizado_em=timezone.now())
                  
                  self._update_stats['closed'] = {
                      'nome': self.nome,
@@ -236,8 +238,8 @@ class AnoLectivo(BaseModel):
                  }
 
         super().save(*args, **kwargs)
-        # Limpar cache ao salvar
-        cache.delete('active_academic_year')
+        # Limpar cache ao salvar (cache partilhada: vale para todos os workers)
+        invalidar_apos_commit('active_academic_year')
         
     def __str__(self):
         return f"{self.nome} ({self.status})"
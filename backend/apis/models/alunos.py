@@ -2,6 +2,7 @@ from django.db import models
 from django.contrib.auth.hashers import make_password
 from .base import BaseModel
 from .academico import Turma
+from .sincronizacao import RegistoRemocao
 
 
 class Aluno(BaseModel):
@@ -60,10 +61,11 @@ class Aluno(BaseModel):
         # Se o aluno já existir (pk definida) e o status anterior for um estado final,
         # impede qualquer alteração para preservar a integridade histórica.
         ESTADOS_FINAIS = {'Concluido', 'Transferido', 'Inativo'}
+        turma_anterior = None
         if self.pk:
             from django.core.exceptions import ValidationError
             try:
-                estado_anterior = Aluno.objects.values_list('status_aluno', flat=True).get(pk=self.pk)
+                estado_anterior, turma_anterior = Aluno.objects.values_list('status_aluno', 'id_turma_id').get(pk=self.pk)
                 # Permitimos salvar se o estado estiver a ser alterado (ex: desbloqueio de Inativo -> Activo)
                 # Caso contrário, se o estado atual for final e não estiver a mudar, bloqueia outras edições.
                 if estado_anterior in ESTADOS_FINAIS and self.status_aluno == estado_anterior:
@@ -105,6 +107,19 @@ class Aluno(BaseModel):
         if self.senha_hash and not self.senha_hash.startswith('pbkdf2_sha256$'):
             self.senha_hash = make_password(self.senha_hash)
         super(Aluno, self).save(*args, **kwargs)
+        # Mudança de turma: a turma anterior perdeu um aluno (sincronização incremental)
+        if turma_anterior and turma_anterior != self.id_turma_id:
+            RegistoRemocao.tocar(Turma, turma_anterior)
+        # Perfil alterado: o principal em cache deixa de ser válido
+        from apis.services.principal_service import PrincipalService
+        PrincipalService.invalidar('aluno', self.pk)
+
+    def delete(self, *args, **kwargs):
+        pk, turma_id = self.pk, self.id_turma_id
+        super(Aluno, self).delete(*args, **kwargs)
+        RegistoRemocao.tocar(Turma, turma_id)
+        from apis.services.principal_service import PrincipalService
+        PrincipalService.invalidar('aluno', pk)
 
 
 class AlunoEncarregado(models.Model):
@@ -39,7 +39,8 @@ class Historico(models.Model):
         verbose_name_plural = 'Históricos'
         ordering = ['-data_hora']
         indexes = [
-            models.Index(fields=['data_hora']),
+            # Paginação por cursor (data_hora, id_historico) na auditoria
+            models.Index(fields=['data_hora', 'id_historico']),
         ]
     
     def __str__(self):
@@ -89,6 +90,10 @@ class HistoricoLogin(models.Model):
         verbose_name = 'Histórico de Login'
         verbose_name_plural = 'Históricos de Login'
         ordering = ['-hora_entrada']
+        indexes = [
+            # Paginação por cursor (hora_entrada, id_historico_login) na auditoria
+            models.Index(fields=['hora_entrada', 'id_historico_login']),
+        ]
     
     def __str__(self):
         return f"Login {self.id_historico_login} - {self.hora_entrada}"
@@ -126,6 +126,13 @@ class Nota(models.Model):
         indexes = [
             models.Index(fields=['id_aluno', 'id_disciplina']),
         ]
+        constraints = [
+            # Uma nota por avaliação: o lançamento em lote grava com upsert nesta chave
+            models.UniqueConstraint(
+                fields=['id_aluno', 'id_disciplina', 'id_turma', 'tipo_avaliacao'],
+                name='unique_nota_por_avaliacao'
+            )
+        ]
     
     def __str__(self):
         return f"{self.id_aluno.nome_completo} - {self.id_disciplina.nome}: {self.valor}"
@@ -155,6 +162,13 @@ class FaltaAluno(models.Model):
         indexes = [
             models.Index(fields=['id_aluno', 'data_falta']),
         ]
+        constraints = [
+            # Uma falta por aluno, disciplina e dia: o registo em lote ignora as já existentes
+            models.UniqueConstraint(
+                fields=['id_aluno', 'id_disciplina', 'data_falta'],
+                name='unique_falta_por_dia'
+            )
+        ]
     
     def __str__(self):
         return f"{self.id_aluno.nome_completo} - {self.data_falta}"
@@ -2,6 +2,7 @@ from django.db import models
 from django.core.exceptions import ValidationError
 from .base import BaseModel
 from .academico import Curso, Sala, AnoLectivo
+from apis.utils.cache_utils import invalidar_apos_commit, chaves_status_candidato
 import uuid
 
 class Candidato(BaseModel):
@@ -121,6 +122,8 @@ class Candidato(BaseModel):
                 next_sequence += 1
                 
         super().save(*args, **kwargs)
+        # A consulta pública de status (consultar_status) fica em cache
+        self.invalidar_status()
 
     def clean(self):
         if self.ano_lectivo and not self.ano_lectivo.activo:
@@ -130,6 +133,20 @@ class Candidato(BaseModel):
         if self.ano_lectivo and not self.ano_lectivo.activo:
              raise ValidationError("O Ano Lectivo selecionado está encerrado. Não é possível excluir.")
         super().delete(*args, **kwargs)
+        self.invalidar_status()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instancia = super().from_db(db, field_names, values)
+        # BI lido da base de dados: se for alterado, a entrada em cache do BI antigo também é removida
+        instancia._bi_original = instancia.__dict__.get('numero_bi')
+        return instancia
+
+    def invalidar_status(self):
+        """Remove apenas as entradas de consultar_status deste candidato (por nº de inscrição e por BI)"""
+        invalidar_apos_commit(*chaves_status_candidato(
+            self.numero_inscricao, self.numero_bi, getattr(self, '_bi_original', None)
+        ))
 
     class Meta:
         db_table = 'candidato'
@@ -167,11 +184,13 @@ class ExameAdmissao(BaseModel):
     def save(self, *args, **kwargs):
         self.clean()
         super().save(*args, **kwargs)
+        self.candidato.invalidar_status()
 
     def delete(self, *args, **kwargs):
         if self.candidato.ano_lectivo and not self.candidato.ano_lectivo.activo:
              raise ValidationError("O Ano Lectivo deste candidato está encerrado. Não é possível excluir.")
         super().delete(*args, **kwargs)
+        self.candidato.invalidar_status()
         
 class RupeCandidato(BaseModel):
     """Pagamento do RUPE de inscrição"""
@@ -218,11 +237,13 @@ class RupeCandidato(BaseModel):
     def save(self, *args, **kwargs):
         self.clean()
         super().save(*args, **kwargs)
+        self.inscricao.invalidar_status()
 
     def delete(self, *args, **kwargs):
         if self.inscricao.ano_lectivo and not self.inscricao.ano_lectivo.activo:
              raise ValidationError("O Ano Lectivo deste candidato está encerrado. Não é possível excluir.")
         super().delete(*args, **kwargs)
+        self.inscricao.invalidar_status()
 
 class ListaEspera(BaseModel):
     """Candidatos em lista de espera"""
@@ -248,8 +269,10 @@ class ListaEspera(BaseModel):
     def save(self, *args, **kwargs):
         self.clean()
         super().save(*args, **kwargs)
+        self.candidato.invalidar_status()
 
     def delete(self, *args, **kwargs):
         if self.candidato.ano_lectivo and not self.candidato.ano_lectivo.activo:
              raise ValidationError("O Ano Lectivo deste candidato está encerrado. Não é possível excluir.")
         super().delete(*args, **kwargs)
+        self.candidato.invalidar_status()
@@ -1,5 +1,6 @@
 from django.db import models
 from django.core.cache import cache
+from apis.utils.cache_utils import invalidar_apos_commit
 
 class Configuracao(models.Model):
     """
@@ -35,8 +36,8 @@ class Configuracao(models.Model):
     def save(self, *args, **kwargs):
         self.pk = 1 # Garantir que sempre seja o ID 1 (Singleton)
         super(Configuracao, self).save(*args, **kwargs)
-        # Limpar cache ao salvar
-        cache.delete('global_config_solo')
+        # Limpar cache ao salvar (cache partilhada: vale para todos os workers)
+        invalidar_apos_commit('global_config_solo')
 
     def delete(self, *args, **kwargs):
         pass # Impedir exclusão
@@ -56,12 +57,27 @@ class Configuracao(models.Model):
 
 
 class AgendamentoBackup(models.Model):
-    """Agendamento de Backups Futuros"""
+    """
+    Agendamento de Backups Futuros.
+    Executado pelo agendador (comando `agendar_backups`) na primeira janela
+    fora de horas de ponta a partir de `data_hora`, com novas tentativas em caso de falha.
+    """
     id_agendamento = models.AutoField(primary_key=True)
     data_hora = models.DateTimeField(verbose_name="Data e Hora Programada")
     descricao = models.CharField(max_length=255, verbose_name="Descrição/Motivo", blank=True, null=True)
     notificado = models.BooleanField(default=False, verbose_name="Já Notificado?")
     executado = models.BooleanField(default=False, verbose_name="Executado?")
+    executado_em = models.DateTimeField(null=True, blank=True, verbose_name="Executado em")
+    tentativas = models.PositiveSmallIntegerField(default=0, verbose_name="Tentativas Falhadas")
+    proxima_tentativa = models.DateTimeField(null=True, blank=True, verbose_name="Próxima Tentativa")
+    erro = models.TextField(null=True, blank=True, verbose_name="Último Erro")
+    # Reserva do agendamento pelo nó que o está a executar (UPDATE condicional)
+    reservado_por = models.CharField(max_length=100, blank=True, verbose_name="Reservado por")
+    reservado_em = models.DateTimeField(null=True, blank=True, verbose_name="Reservado em")
+    backup_job = models.ForeignKey(
+        'BackupJob', on_delete=models.SET_NULL, null=True, blank=True,
+        related_name='agendamentos', verbose_name="Último Backup"
+    )
     criado_em = models.DateTimeField(auto_now_add=True)
 
     class Meta:
@@ -72,3 +88,69 @@ class AgendamentoBackup(models.Model):
 
     def __str__(self):
         return f"Backup agendado para {self.data_hora}"
+
+
+class BackupJob(models.Model):
+    """
+    Execução de um backup (base de dados + media) em segundo plano.
+    Criado pelo BackupViewSet e executado num processo separado, com prioridade
+    reduzida (comando `executar_backup`); o progresso é actualizado durante a execução.
+    """
+    STATUS_PENDENTE = 'Pendente'
+    STATUS_PROCESSANDO = 'Em Processamento'
+    STATUS_CONCLUIDO = 'Concluido'
+    STATUS_ERRO = 'Erro'
+
+    STATUS_CHOICES = [
+        (STATUS_PENDENTE, 'Pendente'),
+        (STATUS_PROCESSANDO, 'Em Processamento'),
+        (STATUS_CONCLUIDO, 'Concluído'),
+        (STATUS_ERRO, 'Erro'),
+    ]
+
+    COMPRESSAO_CHOICES = [
+        ('rapido', 'Rápido (gzip -1)'),
+        ('equilibrado', 'Equilibrado (gzip -6)'),
+        ('maximo', 'Máximo (xz -6)'),
+    ]
+
+    id_job = models.AutoField(primary_key=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDENTE, verbose_name='Estado')
+    completo = models.BooleanField(default=False, verbose_name='Media Completa',
+                                   help_text='Guardar toda a media, sem referências a backups anteriores')
+    compressao = models.CharField(max_length=20, choices=COMPRESSAO_CHOICES, default='equilibrado',
+                                  verbose_name='Perfil de Compressão')
+    fase = models.CharField(max_length=50, blank=True, verbose_name='Fase Actual')
+    progresso = models.PositiveSmallIntegerField(default=0, verbose_name='Progresso (%)')
+    bytes_processados = models.BigIntegerField(default=0, verbose_name='Bytes Processados')
+    bytes_estimados = models.BigIntegerField(null=True, blank=True, verbose_name='Bytes Estimados')
+    nome_ficheiro = models.CharField(max_length=150, blank=True, verbose_name='Ficheiro')
+    tamanho = models.BigIntegerField(null=True, blank=True, verbose_name='Tamanho do Ficheiro')
+    erro = models.TextField(null=True, blank=True, verbose_name='Erro')
+    solicitado_por_tipo = models.CharField(max_length=20, blank=True, verbose_name='Tipo do Solicitante')
+    solicitado_por_id = models.IntegerField(null=True, blank=True, verbose_name='ID do Solicitante')
+    criado_em = models.DateTimeField(auto_now_add=True, verbose_name='Criado em')
+    iniciado_em = models.DateTimeField(null=True, blank=True, verbose_name='Iniciado em')
+    actualizado_em = models.DateTimeField(auto_now=True, verbose_name='Última Actualização')
+    concluido_em = models.DateTimeField(null=True, blank=True, verbose_name='Concluído em')
+
+    class Meta:
+        db_table = 'backup_job'
+        verbose_name = 'Execução de Backup'
+        verbose_name_plural = 'Execuções de Backup'
+        ordering = ['-criado_em']
+        indexes = [
+            models.Index(fields=['status', 'criado_em']),
+        ]
+        constraints = [
+            # No máximo um backup pendente ou em execução: a base de dados rejeita
+            # o segundo, mesmo com pedidos simultâneos (API e agendador)
+            models.UniqueConstraint(
+                models.Value(True),
+                condition=models.Q(status__in=['Pendente', 'Em Processamento']),
+                name='backup_job_um_em_curso',
+            ),
+        ]
+
+    def __str__(self):
+        return f"Backup #{self.id_job} ({self.status})"
@@ -1,5 +1,6 @@
 from django.db import models
 from django.core.exceptions import ValidationError
+from django.utils import timezone
 from .alunos import Aluno
 
 from .academico import Turma, AnoLectivo
@@ -80,6 +81,7 @@ class Matricula(models.Model):
         verbose_name='Cópia do BI (PDF)',
         help_text="Se deixado em branco, o sistema tentará buscar o documento da última matrícula do aluno."
     )
+    atualizado_em = models.DateTimeField(auto_now=True, verbose_name='Atualizado em')
     
     class Meta:
         db_table = 'matricula'
@@ -168,6 +170,10 @@ class Matricula(models.Model):
                     link=f"/turmas"
                 )
         
+        # Turma anterior (mudança de turma) para o feed de ocupação em tempo real
+        from apis.services.eventos_service import EventosService
+        turma_anterior = EventosService.turma_anterior(self)
+
         super().save(*args, **kwargs)
         
         # Inheritance of documentation from previous enrollment if not provided
@@ -190,7 +196,8 @@ class Matricula(models.Model):
                     # Save again but only the file fields to avoid recursion/re-validation
                     Matricula.objects.filter(pk=self.pk).update(
                         doc_certificado=self.doc_certificado,
-                        doc_bi=self.doc_bi
+                        doc_bi=self.doc_bi,
+                        atualizado_em=timezone.now()
                     )
         
         # Sync Aluno's Turma
@@ -202,10 +209,17 @@ class Matricula(models.Model):
         if self.id_aluno and self.id_aluno.numero_bi:
             try:
                 from apis.models.candidatura import Candidato
-                Candidato.objects.filter(numero_bi=self.id_aluno.numero_bi, status='Aprovado').update(status='Matriculado')
+                from apis.utils.cache_utils import invalidar_apos_commit, chaves_status_candidato
+                aprovados = Candidato.objects.filter(numero_bi=self.id_aluno.numero_bi, status='Aprovado')
+                inscricoes = list(aprovados.values_list('numero_inscricao', flat=True))
+                if inscricoes and aprovados.update(status='Matriculado'):
+                    invalidar_apos_commit(*chaves_status_candidato(self.id_aluno.numero_bi, *inscricoes))
             except ImportError:
                 pass # Avoid issues if candidacy app isn't ready
 
+        # Publicar ocupação/vagas actualizadas (após o commit) aos clientes SSE
+        EventosService.matricula_alterada(self.id_turma_id, turma_anterior)
+
 
     def delete(self, *args, **kwargs):
         if self.ano_lectivo and not self.ano_lectivo.activo:
@@ -0,0 +1,45 @@
+from django.db import models
+
+
+class RelatorioJob(models.Model):
+    """
+    Pedido de geração de um relatório em PDF em segundo plano.
+    Criado pelo RelatorioViewSet e processado pelos workers do comando
+    `processar_relatorios`; o ficheiro final fica no armazenamento de media.
+    """
+    STATUS_PENDENTE = 'Pendente'
+    STATUS_PROCESSANDO = 'Em Processamento'
+    STATUS_CONCLUIDO = 'Concluido'
+    STATUS_ERRO = 'Erro'
+
+    STATUS_CHOICES = [
+        (STATUS_PENDENTE, 'Pendente'),
+        (STATUS_PROCESSANDO, 'Em Processamento'),
+        (STATUS_CONCLUIDO, 'Concluído'),
+        (STATUS_ERRO, 'Erro'),
+    ]
+
+    id_job = models.AutoField(primary_key=True)
+    tipo = models.CharField(max_length=50, verbose_name='Tipo de Relatório')
+    parametros = models.JSONField(default=dict, blank=True, verbose_name='Parâmetros')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDENTE, verbose_name='Estado')
+    ficheiro = models.FileField(upload_to='relatorios/%Y/%m/', null=True, blank=True, verbose_name='Ficheiro')
+    nome_ficheiro = models.CharField(max_length=150, blank=True, verbose_name='Nome do Ficheiro')
+    erro = models.TextField(null=True, blank=True, verbose_name='Erro')
+    solicitado_por_tipo = models.CharField(max_length=20, blank=True, verbose_name='Tipo do Solicitante')
+    solicitado_por_id = models.IntegerField(null=True, blank=True, verbose_name='ID do Solicitante')
+    criado_em = models.DateTimeField(auto_now_add=True, verbose_name='Criado em')
+    iniciado_em = models.DateTimeField(null=True, blank=True, verbose_name='Iniciado em')
+    concluido_em = models.DateTimeField(null=True, blank=True, verbose_name='Concluído em')
+
+    class Meta:
+        db_table = 'relatorio_job'
+        verbose_name = 'Pedido de Relatório'
+        verbose_name_plural = 'Pedidos de Relatório'
+        ordering = ['-criado_em']
+        indexes = [
+            models.Index(fields=['status', 'criado_em']),
+        ]
+
+    def __str__(self):
+        return f"{self.tipo} #{self.id_job} ({self.status})"
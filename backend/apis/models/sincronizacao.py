@@ -0,0 +1,41 @@
+from django.db import models
+
+
+class RegistoRemocao(models.Model):
+    """
+    Registo de eliminações (tombstones) usado pela sincronização incremental:
+    permite aos clientes saberem que objectos foram removidos desde o último cursor.
+    """
+    id_registo = models.AutoField(primary_key=True)
+    modelo = models.CharField(max_length=50, verbose_name='Modelo')
+    objeto_id = models.IntegerField(verbose_name='ID do Objecto')
+    removido_em = models.DateTimeField(auto_now_add=True, verbose_name='Removido em')
+
+    class Meta:
+        db_table = 'registo_remocao'
+        verbose_name = 'Registo de Remoção'
+        verbose_name_plural = 'Registos de Remoção'
+        ordering = ['-removido_em']
+        indexes = [
+            models.Index(fields=['modelo', 'removido_em']),
+        ]
+
+    def __str__(self):
+        return f"{self.modelo} #{self.objeto_id} removido em {self.removido_em}"
+
+    @classmethod
+    def registar(cls, modelo, objeto_id):
+        """Regista a eliminação de um objecto (chamar depois do delete)"""
+        if objeto_id is not None:
+            cls.objects.create(modelo=modelo.__name__, objeto_id=objeto_id)
+
+    @classmethod
+    def tocar(cls, modelo, *ids):
+        """
+        Actualiza o atualizado_em dos objectos indicados sem passar pelo save(),
+        para que contagens derivadas (ex: alunos de uma turma) entrem no delta.
+        """
+        from django.utils import timezone
+        ids = [pk for pk in ids if pk]
+        if ids:
+            modelo.objects.filter(pk__in=ids).update(atualizado_em=timezone.now())
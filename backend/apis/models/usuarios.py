@@ -18,6 +18,17 @@ class Cargo(BaseModel):
     def __str__(self):
         return self.nome_cargo
 
+    def save(self, *args, **kwargs):
+        super(Cargo, self).save(*args, **kwargs)
+        # O nome do cargo faz parte do resumo de todos os principais em cache
+        from apis.services.principal_service import PrincipalService
+        PrincipalService.invalidar_todos()
+
+    def delete(self, *args, **kwargs):
+        super(Cargo, self).delete(*args, **kwargs)
+        from apis.services.principal_service import PrincipalService
+        PrincipalService.invalidar_todos()
+
 
 class Usuario(BaseModel):
     """
@@ -62,6 +73,15 @@ class Usuario(BaseModel):
         if self.senha_hash and not self.senha_hash.startswith('pbkdf2_sha256$'):
             self.senha_hash = make_password(self.senha_hash)
         super(Usuario, self).save(*args, **kwargs)
+        # Perfil/permissões alterados: o principal em cache deixa de ser válido
+        from apis.services.principal_service import PrincipalService
+        PrincipalService.invalidar('usuario', self.pk)
+
+    def delete(self, *args, **kwargs):
+        pk = self.pk
+        super(Usuario, self).delete(*args, **kwargs)
+        from apis.services.principal_service import PrincipalService
+        PrincipalService.invalidar('usuario', pk)
 
 
 class Funcionario(BaseModel):
@@ -140,6 +160,15 @@ class Funcionario(BaseModel):
         if self.senha_hash and not self.senha_hash.startswith('pbkdf2_sha256$'):
             self.senha_hash = make_password(self.senha_hash)
         super(Funcionario, self).save(*args, **kwargs)
+        # Perfil/permissões alterados: o principal em cache deixa de ser válido
+        from apis.services.principal_service import PrincipalService
+        PrincipalService.invalidar('funcionario', self.pk)
+
+    def delete(self, *args, **kwargs):
+        pk = self.pk
+        super(Funcionario, self).delete(*args, **kwargs)
+        from apis.services.principal_service import PrincipalService
+        PrincipalService.invalidar('funcionario', pk)
 
 
 class Encarregado(BaseModel):
@@ -176,6 +205,15 @@ class Encarregado(BaseModel):
         if self.senha_hash and not self.senha_hash.startswith('pbkdf2_sha256$'):
             self.senha_hash = make_password(self.senha_hash)
         super(Encarregado, self).save(*args, **kwargs)
+        # Perfil/permissões alterados: o principal em cache deixa de ser válido
+        from apis.services.principal_service import PrincipalService
+        PrincipalService.invalidar('encarregado', self.pk)
+
+    def delete(self, *args, **kwargs):
+        pk = self.pk
+        super(Encarregado, self).delete(*args, **kwargs)
+        from apis.services.principal_service import PrincipalService
+        PrincipalService.invalidar('encarregado', pk)
 
 
 class CargoFuncionario(models.Model):
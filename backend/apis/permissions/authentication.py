@@ -1,6 +1,7 @@
 from rest_framework_simplejwt.authentication import JWTAuthentication
 from rest_framework import exceptions
 from apis.models import Funcionario, Aluno, Encarregado, Usuario
+from apis.services.principal_service import PrincipalService
 
 class SchoolJWTAuthentication(JWTAuthentication):
     """
@@ -16,7 +17,10 @@ class SchoolJWTAuthentication(JWTAuthentication):
             return None
 
         validated_token = self.get_validated_token(raw_token)
-        
+        return self._autenticar(request, validated_token)
+
+    def _autenticar(self, request, validated_token):
+        """Associa o perfil do token (ou do bilhete) ao request"""
         # Injetar o payload no request para as permissões
         request.auth_payload = validated_token
         
@@ -26,11 +30,14 @@ class SchoolJWTAuthentication(JWTAuthentication):
         user_id = validated_token.get('user_id')
         user_type = validated_token.get('user_type')
         
+        self.principal = None
         user = self.get_user(validated_token)
         
         # Adicionar informações extras ao request
         request.user_type = user_type
         request.profile_id = user_id
+        # Resumo do principal (cargo, permissões) para as classes de permissão
+        request.principal = self.principal
         
         return user, validated_token
 
@@ -46,26 +53,18 @@ class SchoolJWTAuthentication(JWTAuthentication):
                # Se não tiver tipo/id customizado, tenta o padrão Django User (caso use admin etc)
                return super().get_user(validated_token)
 
-            user = None
-            if user_type == 'funcionario':
-                user = Funcionario.objects.get(id_funcionario=user_id)
-            elif user_type == 'usuario':
-                # Para o tipo 'usuario', retornamos o perfil 'Usuario'
-                # mas garantimos que as propriedades is_staff e is_superuser sejam acessíveis
-                user = Usuario.objects.select_related('user').get(id_usuario=user_id)
-            elif user_type == 'aluno':
-                user = Aluno.objects.get(id_aluno=user_id)
-            elif user_type == 'encarregado':
-                user = Encarregado.objects.get(id_encarregado=user_id)
+            # Perfil + resumo de permissões a partir da cache partilhada (PrincipalService)
+            user, principal = PrincipalService.carregar(user_type, user_id)
             
             if not user:
                  raise exceptions.AuthenticationFailed('Usuário não encontrado', code='user_not_found')
             
             # Adicionar is_authenticated ao objeto para o DRF (Permission classes usam isso)
             user.is_authenticated = True
+            self.principal = principal
             return user
             
-        except (Funcionario.DoesNotExist, Aluno.DoesNotExist, Encarregado.DoesNotExist):
+        except (Funcionario.DoesNotExist, Usuario.DoesNotExist, Aluno.DoesNotExist, Encarregado.DoesNotExist):
             raise exceptions.AuthenticationFailed('Usuário não encontrado', code='user_not_found')
         except Exception as e:
             # Fallback for standard Django users
@@ -73,3 +72,22 @@ class SchoolJWTAuthentication(JWTAuthentication):
                 return super().get_user(validated_token)
             except:
                 raise exceptions.AuthenticationFailed('Token inválido', code='invalid_token')
+
+
+class SSEBilheteAuthentication(SchoolJWTAuthentication):
+    """
+    Autenticação do EventSource (SSE): o browser não permite enviar o header
+    Authorization, pelo que o URL leva um bilhete de uso único e curta duração
+    (POST /eventos/bilhete/) em vez do access token, que ficaria nos logs e no
+    histórico do browser.
+    """
+    def authenticate(self, request):
+        bilhete = request.query_params.get('bilhete')
+        if not bilhete:
+            return None
+
+        from apis.services.eventos_service import EventosService
+        payload = EventosService.consumir_bilhete(bilhete)
+        if payload is None:
+            raise exceptions.AuthenticationFailed('Bilhete inválido ou expirado', code='invalid_ticket')
+        return self._autenticar(request, payload)
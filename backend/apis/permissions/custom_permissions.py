@@ -1,9 +1,133 @@
 from rest_framework import permissions
 
+
+def _cargo(request):
+    """Cargo do utilizador: resumo do principal (cache) ou, em alternativa, o payload do token"""
+    principal = getattr(request, 'principal', None)
+    if principal:
+        return principal['cargo']
+    auth_data = getattr(request, 'auth_payload', None) or {}
+    return (auth_data.get('cargo') or '').lower()
+
+
+def _is_superuser(request):
+    """Superusuário segundo o principal em cache, sem carregar o cargo da base de dados"""
+    principal = getattr(request, 'principal', None)
+    if principal:
+        return principal['is_superuser']
+    return bool(getattr(request.user, 'is_superuser', False))
+
+
+# Mapeamento de Papéis (Backend Mirror): usado quando o perfil não tem permissões explícitas
+PAPEIS_ADMIN = ('administrador', 'admin', 'diretor', 'coord')
+PERMISSOES_POR_PAPEL = (
+    (('secretário', 'secretaria', 'secretario'), frozenset([
+        'view_dashboard',
+        'view_alunos', 'create_aluno', 'edit_aluno',
+        'view_inscritos', 'manage_inscritos',
+        'view_matriculas', 'create_matricula', 'edit_matricula',
+        'view_turmas', 'view_salas', 'view_cursos',
+        'view_relatorios', 'view_configuracoes'
+    ])),
+    (('professor', 'docente'), frozenset(['view_dashboard', 'view_turmas', 'view_alunos', 'view_notas', 'view_faltas'])),
+    (('comum',), frozenset(['view_dashboard'])),
+)
+
+
+def normalizar_permissoes(permissoes):
+    """Lista de permissões (JSON ou string JSON) -> frozenset"""
+    if isinstance(permissoes, str):
+        import json
+        try:
+            permissoes = json.loads(permissoes)
+        except ValueError:
+            permissoes = []
+    if not isinstance(permissoes, (list, tuple, set, frozenset)):
+        return frozenset()
+    return frozenset(p for p in permissoes if isinstance(p, str))
+
+
+def resolver_cargo(cargo_token=None, perfil=None):
+    """
+    Cargo/papel usado nas permissões por defeito, pela precedência original:
+    cargo do token (nome do cargo), papel do perfil e, por fim, o cargo do perfil.
+    """
+    role = cargo_token or ''
+    if not role and perfil is not None:
+        role = getattr(perfil, 'papel', '') or ''
+        if not role and getattr(perfil, 'cargo', None):
+            role = perfil.cargo.nome_cargo
+    return role.lower()
+
+
+def compilar_permissoes(permissoes, cargo, is_superuser=False):
+    """
+    Compila as permissões efectivas de um utilizador uma única vez.
+    Retorna (acesso_total, frozenset_de_permissoes):
+      1. Superusuário: acesso total.
+      2. Lista explícita com itens: controlo exclusivo ('NO_ACCESS' bloqueia tudo),
+         sem fallback para as permissões genéricas do cargo.
+      3. Lista vazia: permissões por defeito do cargo/papel.
+    """
+    if is_superuser:
+        return True, frozenset()
+
+    explicitas = normalizar_permissoes(permissoes)
+    if explicitas:
+        if 'NO_ACCESS' in explicitas:
+            return False, frozenset()
+        return False, explicitas
+
+    cargo = (cargo or '').lower()
+    if not cargo:
+        return False, frozenset()
+    if any(r in cargo for r in PAPEIS_ADMIN):
+        return True, frozenset()
+    for papeis, permissoes_papel in PERMISSOES_POR_PAPEL:
+        if any(r in cargo for r in papeis):
+            return False, permissoes_papel
+    return False, frozenset()
+
+
+def _principal_do_request(request):
+    """
+    Compila o principal quando a autenticação não o resolveu
+    (ex: User nativo do Django com perfil associado). Guardado no request.
+    """
+    principal = getattr(request, '_principal_compilado', None)
+    if principal:
+        return principal
+
+    user = request.user
+    user_perms = []
+    profile = None
+    # Se o user já for uma instância de Usuario (do apis.models)
+    if hasattr(user, 'permissoes'):
+        user_perms = user.permissoes
+    # Se for uma instância de Funcionario
+    elif hasattr(user, 'permissoes_adicionais'):
+        user_perms = user.permissoes_adicionais
+    # Se for um User nativo do Django com perfil associado
+    elif hasattr(user, 'profile'):
+        profile = user.profile
+        user_perms = profile.permissoes if hasattr(profile, 'permissoes') else []
+        if not user_perms and hasattr(profile, 'funcionario_perfil'):
+            user_perms = profile.funcionario_perfil.permissoes_adicionais or []
+
+    role = resolver_cargo(_cargo(request), profile)
+
+    acesso_total, permissoes_efectivas = compilar_permissoes(
+        user_perms, role, getattr(user, 'is_superuser', False)
+    )
+    principal = {'acesso_total': acesso_total, 'permissoes': permissoes_efectivas}
+    request._principal_compilado = principal
+    return principal
+
+
 class IsSuperAdmin(permissions.BasePermission):
     """Permissão para desenvolvedores/superadministradores"""
     def has_permission(self, request, view):
-        return bool(request.user and request.user.is_superuser)
+        return bool(request.user and _is_superuser(request))
 
 class IsFuncionario(permissions.BasePermission):
     """Permissão para qualquer funcionário ativo"""
@@ -20,7 +144,7 @@ class IsDirecao(permissions.BasePermission):
         if not auth_data or auth_data.get('user_type') not in ['funcionario', 'usuario']:
             return False
         
-        cargo = auth_data.get('cargo', '').lower()
+        cargo = _cargo(request)
         return cargo in ['diretor', 'administrador', 'diretor geral', 'diretor adjunto']
 
 class IsSecretario(permissions.BasePermission):
@@ -30,7 +154,7 @@ class IsSecretario(permissions.BasePermission):
         if not auth_data or auth_data.get('user_type') not in ['funcionario', 'usuario']:
             return False
         
-        cargo = auth_data.get('cargo', '').lower()
+        cargo = _cargo(request)
         return cargo in ['secretário', 'secretaria', 'secretario']
 
 class IsProfessor(permissions.BasePermission):
@@ -40,7 +164,7 @@ class IsProfessor(permissions.BasePermission):
         if not auth_data or auth_data.get('user_type') not in ['funcionario', 'usuario']:
             return False
         
-        cargo = auth_data.get('cargo', '').lower()
+        cargo = _cargo(request)
         return cargo in ['professor', 'docente']
 
 class IsAluno(permissions.BasePermission):
@@ -58,111 +182,29 @@ class IsEncarregado(permissions.BasePermission):
 class HasAdditionalPermission(permissions.BasePermission):
     """
     Verifica se o usuário tem uma permissão específica listada em 'permissoes_adicionais'.
-    A view deve definir um mapeamento `permission_required` = {'action': 'permission_string'}.
+    A view deve definir um mapeamento `permission_map` = {'action': 'permission_string'}.
+
+    As permissões efectivas vêm pré-compiladas no principal (ver compilar_permissoes),
+    pelo que a verificação é apenas um teste de pertença num frozenset.
     """
     def has_permission(self, request, view):
         if not request.user or not request.user.is_authenticated:
             return False
-        
-        if request.user.is_superuser:
+
+        principal = getattr(request, 'principal', None) or _principal_do_request(request)
+        if principal['acesso_total']:
             return True
 
-        # Verificar se a view define permissões por ação
-        permission_map = getattr(view, 'permission_map', {})
-        
         # Se for um ViewSet, view.action está definido (list, create, update, etc)
         action = getattr(view, 'action', None)
-        
-        if not action or action not in permission_map:
+        required_permission = getattr(view, 'permission_map', {}).get(action) if action else None
+
+        if required_permission is None:
             # Se não houver permissão específica mapeada, esta classe não bloqueia
             # (Deixa para as outras classes de permissão)
             return True
-        
-        required_permission = permission_map[action]
-        
-        # 1. Obter as permissões (vêm do perfil Usuario ou Funcionario)
-        user_perms = []
-        
-        # Se o user já for uma instância de Usuario (do apis.models)
-        if hasattr(request.user, 'permissoes'):
-            user_perms = request.user.permissoes
-        # Se for uma instância de Funcionario
-        elif hasattr(request.user, 'permissoes_adicionais'):
-            user_perms = request.user.permissoes_adicionais
-        # Se for um User nativo do Django com perfil associado
-        elif hasattr(request.user, 'profile'):
-            profile = request.user.profile
-            user_perms = profile.permissoes if hasattr(profile, 'permissoes') else []
-            if not user_perms and hasattr(profile, 'funcionario_perfil'):
-                user_perms = profile.funcionario_perfil.permissoes_adicionais or []
-        
-        # Compatibilidade: Se o campo for string (JSON mal formatado), tentar parsear
-        if isinstance(user_perms, str):
-            import json
-            try:
-                user_perms = json.loads(user_perms)
-            except:
-                user_perms = []
-                
-        # 2. Prioridade: Verificar permissões explícitas (Granular)
-        # Se o campo existir E TIVER ITENS, ele é o controle exclusivo de acessos.
-        if isinstance(user_perms, list) and len(user_perms) > 0:
-            # Se 'NO_ACCESS' estiver na lista, bloqueio total manual
-            if 'NO_ACCESS' in user_perms:
-                return False
-                
-            if required_permission in user_perms:
-                return True
-            
-            # Se a lista tem itens mas não contém a permissão, negamos o acesso.
-            # Isso impede o fallback automático para permissões genéricas de cargo.
-            return False
-            
-        # 3. Fallback: Verificar permissões do CARGO/ROLE (Se a lista for vazia [] ou None)
-            
-        # 2. Fallback: Verificar permissões do CARGO/ROLE
-        # Tentar obter do perfil Usuario ou Payload
-        auth_data = getattr(request, 'auth_payload', {})
-        role = auth_data.get('cargo', '')
-        
-        if not role and profile:
-             role = profile.papel or ''
-             if not role and profile.cargo:
-                 role = profile.cargo.nome_cargo
-
-        if not role:
-             return False
 
-        role = role.lower()
-        
-        # Mapeamento de Papéis (Backend Mirror)
-        # ADMIN
-        if any(r in role for r in ['administrador', 'admin', 'diretor', 'coord']):
-            return True 
-            
-        # SECRETARIA
-        if any(r in role for r in ['secretário', 'secretaria', 'secretario']):
-            SECRETARIA_PERMISSIONS = [
-                'view_dashboard', 
-                'view_alunos', 'create_aluno', 'edit_aluno',
-                'view_inscritos', 'manage_inscritos',
-                'view_matriculas', 'create_matricula', 'edit_matricula',
-                'view_turmas', 'view_salas', 'view_cursos',
-                'view_relatorios', 'view_configuracoes'
-            ]
-            return required_permission in SECRETARIA_PERMISSIONS
-
-        # PROFESSOR
-        if any(r in role for r in ['professor', 'docente']):
-             PROFESSOR_PERMISSIONS = ['view_dashboard', 'view_turmas', 'view_alunos', 'view_notas', 'view_faltas']
-             return required_permission in PROFESSOR_PERMISSIONS
-
-        # COMUM
-        if 'comum' in role:
-             COMUM_PERMISSIONS = ['view_dashboard']
-             return required_permission in COMUM_PERMISSIONS
-
-        return False
+        return required_permission in principal['permissoes']
 
 class IsActiveYearOrReadOnly(permissions.BasePermission):
     """
@@ -30,6 +30,10 @@ class SalaSerializer(serializers.ModelSerializer):
     def get_total_alunos(self, obj):
         # Counts students linked to turmas in this room (Total Headcount) for the active/specific year
         from apis.models import Aluno, AnoLectivo
+
+        # Valor pré-calculado pelo OcupacaoService (listagens)
+        if hasattr(obj, 'num_alunos_activos'):
+            return obj.num_alunos_activos
         
         # 1. Tentar obter ano do contexto (query params)
         request = self.context.get('request')
@@ -49,6 +53,9 @@ class SalaSerializer(serializers.ModelSerializer):
         from apis.models import Aluno, AnoLectivo
         from django.db.models import Count
 
+        if hasattr(obj, 'ocupacao_por_periodo'):
+            return obj.ocupacao_por_periodo
+
         # 1. Tentar obter ano do contexto
         request = self.context.get('request')
         ano_id = request.query_params.get('ano_lectivo') if request else None
@@ -149,13 +156,28 @@ class CursoListSerializer(serializers.ModelSerializer):
     def get_responsavel_nome(self, obj):
         return obj.id_responsavel.nome_completo if obj.id_responsavel else "Sem Coordenador"
 
+    def _ano_activo(self):
+        # O ViewSet partilha o ano activo no contexto (evita leituras repetidas da cache)
+        if 'ano_activo' in self.context:
+            return self.context['ano_activo']
+        from apis.models import AnoLectivo
+        return AnoLectivo.get_active_year()
+
     def get_total_turmas(self, obj):
         from apis.models import Turma
+        from apis.services.vagas_service import VagasService
+        indice = self.context.get('indice_vagas')
+        if indice is not None:
+            return VagasService.total_turmas(indice, obj.pk)
         return Turma.objects.filter(id_curso=obj).count()
 
     def get_vagas_totais(self, obj):
-        from apis.models import VagaCurso, AnoLectivo
-        active_year = AnoLectivo.get_active_year()
+        from apis.models import VagaCurso
+        from apis.services.vagas_service import VagasService
+        active_year = self._ano_activo()
+        indice = self.context.get('indice_vagas')
+        if indice is not None:
+            return VagasService.obter(indice, obj.pk, active_year.pk)[0] if active_year else 0
         if active_year:
             vaga_reg = VagaCurso.objects.filter(id_curso=obj, ano_lectivo=active_year).first()
             if vaga_reg:
@@ -163,11 +185,17 @@ class CursoListSerializer(serializers.ModelSerializer):
         return 0
 
     def get_vagas_disponiveis(self, obj):
-        from apis.models import AnoLectivo, VagaCurso
+        from apis.models import VagaCurso
         from apis.models.matriculas import Matricula
-        active_year = AnoLectivo.get_active_year()
+        from apis.services.vagas_service import VagasService
+        active_year = self._ano_activo()
         if not active_year:
             return 0
+
+        indice = self.context.get('indice_vagas')
+        if indice is not None:
+            vagas_totais, matriculados, _turmas = VagasService.obter(indice, obj.pk, active_year.pk)
+            return max(0, vagas_totais - matriculados)
         
         # Obter vagas totais para este ano
         vaga_reg = VagaCurso.objects.filter(id_curso=obj, ano_lectivo=active_year).first()
@@ -224,6 +252,9 @@ class TurmaSerializer(serializers.ModelSerializer):
         
     def get_total_alunos(self, obj):
         from apis.models import Aluno
+        # Anotação do OcupacaoService.anotar_turmas (evita uma contagem por linha)
+        if hasattr(obj, 'num_alunos_activos'):
+            return obj.num_alunos_activos
         return Aluno.objects.filter(id_turma=obj, status_aluno__in=['Ativo', 'Activo']).count()
 
     def validate(self, data):
@@ -272,6 +303,9 @@ class TurmaListSerializer(serializers.ModelSerializer):
         
     def get_total_alunos(self, obj):
         from apis.models import Aluno
+        # Anotação do OcupacaoService.anotar_turmas (evita uma contagem por linha)
+        if hasattr(obj, 'num_alunos_activos'):
+            return obj.num_alunos_activos
         return Aluno.objects.filter(id_turma=obj, status_aluno__in=['Ativo', 'Activo']).count()
 
 
@@ -293,6 +327,10 @@ class VagaCursoSerializer(serializers.ModelSerializer):
 
     def get_vagas_preenchidas(self, obj):
         from apis.models.matriculas import Matricula
+        from apis.services.vagas_service import VagasService
+        indice = self.context.get('indice_vagas')
+        if indice is not None:
+            return VagasService.obter(indice, obj.id_curso_id, obj.ano_lectivo_id)[1]
         # Contamos as matrículas ativas para este curso e ano lectivo
         # Matriculas que NÃO contam como ocupadas: Desistente, Transferido
         status_ativos = ['Ativa', 'Concluida']
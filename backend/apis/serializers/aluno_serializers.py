@@ -2,6 +2,36 @@ from rest_framework import serializers
 from apis.models import Aluno, AlunoEncarregado, Matricula
 
 
+def _resolver_img_path(serializer, obj):
+    """Foto do aluno ou, em alternativa, a foto do candidato com o mesmo BI"""
+    request = serializer.context.get('request')
+    if obj.img_path:
+        if request:
+            return request.build_absolute_uri(obj.img_path.url)
+        return obj.img_path.url
+
+    # Fallback para foto do candidato (pré-resolvida em lote nas listagens)
+    fotos = serializer.context.get('fotos_candidatos')
+    if fotos is not None:
+        foto = fotos.get(obj.numero_bi)
+    else:
+        from apis.models import Candidato
+        candidato = Candidato.objects.filter(numero_bi=obj.numero_bi).first()
+        foto = candidato.foto_passe if candidato else None
+
+    if foto:
+        if request:
+            return request.build_absolute_uri(foto.url)
+        return foto.url
+    return None
+
+
+def _matriculas_ordenadas(obj):
+    if hasattr(obj, 'matriculas_ordenadas'):
+        return obj.matriculas_ordenadas
+    return Matricula.objects.filter(id_aluno=obj).order_by('-ano_lectivo__nome', '-data_matricula')
+
+
 class AlunoSerializer(serializers.ModelSerializer):
     """Serializer para Aluno"""
     turma_codigo = serializers.CharField(source='id_turma.codigo_turma', read_only=True)
@@ -51,8 +81,7 @@ class AlunoListSerializer(serializers.ModelSerializer):
         ]
 
     def get_matriculas_detalhes(self, obj):
-        matriculas = Matricula.objects.filter(id_aluno=obj).order_by('-ano_lectivo__nome', '-data_matricula')
-        return MatriculaHistorySerializer(matriculas, many=True).data
+        return MatriculaHistorySerializer(_matriculas_ordenadas(obj), many=True).data
 
     def get_ano_lectivo(self, obj):
         return obj.id_turma.ano_lectivo.nome if obj.id_turma and obj.id_turma.ano_lectivo else (obj.id_turma.ano if obj.id_turma else "N/A")
@@ -61,30 +90,22 @@ class AlunoListSerializer(serializers.ModelSerializer):
         return obj.id_turma.ano_lectivo.activo if obj.id_turma and obj.id_turma.ano_lectivo else False
 
     def get_img_path(self, obj):
-        if obj.img_path:
-            request = self.context.get('request')
-            if request:
-                return request.build_absolute_uri(obj.img_path.url)
-            return obj.img_path.url
-        
-        # Fallback para foto do candidato
-        from apis.models import Candidato
-        candidato = Candidato.objects.filter(numero_bi=obj.numero_bi).first()
-        if candidato and candidato.foto_passe:
-            request = self.context.get('request')
-            if request:
-                return request.build_absolute_uri(candidato.foto_passe.url)
-            return candidato.foto_passe.url
-        return None
+        return _resolver_img_path(self, obj)
 
     def get_encarregado_principal(self, obj):
         # Return first guardian name found
-        first = obj.alunoencarregado_set.first()
+        if hasattr(obj, 'vinculos_encarregados'):
+            first = obj.vinculos_encarregados[0] if obj.vinculos_encarregados else None
+        else:
+            first = obj.alunoencarregado_set.first()
         if first:            
             return first.id_encarregado.nome_completo
         return 'N/A'
 
     def get_sugerido_tipo_matricula(self, obj):
+        tipos = self.context.get('tipos_matricula')
+        if tipos is not None and obj.id_aluno in tipos:
+            return tipos[obj.id_aluno]
         from apis.services.academic_service import AcademicService
         return AcademicService.determinar_tipo_matricula(obj.id_aluno)
 
@@ -136,26 +157,13 @@ class AlunoDetailSerializer(serializers.ModelSerializer):
         ]
 
     def get_matriculas_detalhes(self, obj):
-        matriculas = Matricula.objects.filter(id_aluno=obj).order_by('-ano_lectivo__nome', '-data_matricula')
-        return MatriculaHistorySerializer(matriculas, many=True).data
+        return MatriculaHistorySerializer(_matriculas_ordenadas(obj), many=True).data
 
     def get_ano_lectivo_ativo(self, obj):
         return obj.id_turma.ano_lectivo.activo if obj.id_turma and obj.id_turma.ano_lectivo else False
     
     def get_img_path(self, obj):
-        if obj.img_path:
-            request = self.context.get('request')
-            if request:
-                return request.build_absolute_uri(obj.img_path.url)
-            return obj.img_path.url
-        from apis.models import Candidato
-        candidato = Candidato.objects.filter(numero_bi=obj.numero_bi).first()
-        if candidato and candidato.foto_passe:
-            request = self.context.get('request')
-            if request:
-                return request.build_absolute_uri(candidato.foto_passe.url)
-            return candidato.foto_passe.url
-        return None
+        return _resolver_img_path(self, obj)
 
     def get_encarregados(self, obj):
         aluno_encarregados = AlunoEncarregado.objects.filter(id_aluno=obj).select_related('id_encarregado')
@@ -94,15 +94,19 @@ class NotaListSerializer(serializers.ModelSerializer):
         fields = ['id_nota', 'aluno_nome', 'disciplina_nome', 'tipo_avaliacao', 'valor', 'data_lancamento']
 
 
+class NotaLinhaSerializer(serializers.Serializer):
+    """Linha da pauta: um aluno e a respectiva nota"""
+    id_aluno = serializers.IntegerField()
+    valor = serializers.DecimalField(max_digits=5, decimal_places=2)
+
+
 class NotaLancamentoLoteSerializer(serializers.Serializer):
     """Serializer para lançamento de notas em lote"""
     id_turma = serializers.IntegerField()
     id_disciplina = serializers.IntegerField()
     id_professor = serializers.IntegerField()
     tipo_avaliacao = serializers.ChoiceField(choices=Nota.TIPO_AVALIACAO_CHOICES)
-    notas = serializers.ListField(
-        child=serializers.DictField(child=serializers.DecimalField(max_digits=5, decimal_places=2))
-    )
+    notas = NotaLinhaSerializer(many=True)
 
 
 class FaltaAlunoSerializer(serializers.ModelSerializer):
@@ -0,0 +1,12 @@
+from rest_framework import serializers
+from apis.models import BackupJob
+
+
+class BackupJobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = BackupJob
+        fields = [
+            'id_job', 'completo', 'compressao', 'status', 'fase', 'progresso', 'bytes_processados', 'bytes_estimados',
+            'nome_ficheiro', 'tamanho', 'erro', 'criado_em', 'iniciado_em', 'concluido_em'
+        ]
+        read_only_fields = fields
@@ -30,3 +30,8 @@ class AgendamentoBackupSerializer(serializers.ModelSerializer):
     class Meta:
         model = AgendamentoBackup
         fields = '__all__'
+        # Preenchidos pelo agendador
+        read_only_fields = [
+            'notificado', 'executado', 'executado_em', 'tentativas', 'proxima_tentativa', 'erro',
+            'reservado_por', 'reservado_em', 'backup_job',
+        ]
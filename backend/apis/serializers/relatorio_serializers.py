@@ -0,0 +1,22 @@
+from django.urls import reverse
+from rest_framework import serializers
+from apis.models import RelatorioJob
+
+
+class RelatorioJobSerializer(serializers.ModelSerializer):
+    download_url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = RelatorioJob
+        fields = [
+            'id_job', 'tipo', 'parametros', 'status', 'nome_ficheiro', 'erro',
+            'criado_em', 'iniciado_em', 'concluido_em', 'download_url'
+        ]
+        read_only_fields = fields
+
+    def get_download_url(self, obj):
+        if obj.status != RelatorioJob.STATUS_CONCLUIDO:
+            return None
+        url = reverse('relatorio-download', args=[obj.id_job])
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
@@ -1,4 +1,6 @@
-from django.db.models import Avg
+from decimal import Decimal, InvalidOperation
+from django.db import transaction
+from django.db.models import Avg, Q
 from apis.models import Nota, FaltaAluno, Aluno
 
 class AcademicService:
@@ -59,61 +61,229 @@ class AcademicService:
         """
         Determina o tipo de matrícula sugerido com base nas notas do aluno no ano anterior.
         """
+        aluno_id = int(aluno_id) # Pode chegar como string (query params)
+        return AcademicService.determinar_tipo_matricula_lote([aluno_id]).get(aluno_id, 'Novo')
+
+    @staticmethod
+    def determinar_tipo_matricula_lote(aluno_ids):
+        """
+        Versão em lote de determinar_tipo_matricula: resolve a sugestão para
+        vários alunos com duas consultas (matrículas e médias por disciplina).
+        Retorna {aluno_id: tipo}.
+        """
         from apis.models import Matricula, Nota
-        
-        # 1. Obter a última matrícula ativa concluída ou do ano anterior
-        ultima_matricula = Matricula.objects.filter(id_aluno_id=aluno_id).order_by('-ano_lectivo__data_fim').first()
-        
-        if not ultima_matricula:
-            return 'Novo'
-        
-        # 2. Verificar desempenho no ano dessa última matrícula
-        ano_anterior = ultima_matricula.ano_lectivo
-        turma_anterior = ultima_matricula.id_turma
-        
-        if not ano_anterior or not turma_anterior:
-            return 'Confirmacao'
 
-        # Obter disciplinas daquele curso/classe (ou simplesmente as que ele tem nota)
-        notas = Nota.objects.filter(id_aluno_id=aluno_id, id_turma=turma_anterior)
-        
-        if not notas.exists():
-            return 'Confirmacao' # Sem notas registradas, assume progressão normal
-
-        # Lógica de aprovação: Agrupar por disciplina e calcular média
-        desempenho = {}
-        for n in notas:
-            if n.id_disciplina_id not in desempenho:
-                desempenho[n.id_disciplina_id] = []
-            desempenho[n.id_disciplina_id].append(float(n.valor))
-            
-        disciplinas_reprovadas = 0
-        for disc_id, vals in desempenho.items():
-            media = sum(vals) / len(vals)
-            if media < 10:
-                disciplinas_reprovadas += 1
-        
+        aluno_ids = list(aluno_ids)
+        if not aluno_ids:
+            return {}
+
+        # 1. Obter a última matrícula de cada aluno (mesma ordenação da versão individual)
+        ultimas_matriculas = {}
+        matriculas = Matricula.objects.filter(id_aluno_id__in=aluno_ids).order_by(
+            'id_aluno_id', '-ano_lectivo__data_fim'
+        ).values_list('id_aluno_id', 'ano_lectivo_id', 'id_turma_id')
+        for a_id, ano_id, turma_id in matriculas:
+            ultimas_matriculas.setdefault(a_id, (ano_id, turma_id))
+
+        sugestoes = {}
+        turmas_por_aluno = {}
+        for a_id in aluno_ids:
+            if a_id not in ultimas_matriculas:
+                sugestoes[a_id] = 'Novo'
+                continue
+            ano_id, turma_id = ultimas_matriculas[a_id]
+            if not ano_id or not turma_id:
+                sugestoes[a_id] = 'Confirmacao'
+                continue
+            turmas_por_aluno[a_id] = turma_id
+
+        if not turmas_por_aluno:
+            return sugestoes
+
+        # 2. Médias por disciplina na turma dessa última matrícula
+        medias = Nota.objects.filter(
+            id_aluno_id__in=list(turmas_por_aluno.keys()),
+            id_turma_id__in=set(turmas_por_aluno.values())
+        ).values('id_aluno_id', 'id_turma_id', 'id_disciplina_id').annotate(media=Avg('valor'))
+
+        disciplinas_avaliadas = {}
+        disciplinas_reprovadas = {}
+        for item in medias:
+            a_id = item['id_aluno_id']
+            if turmas_por_aluno.get(a_id) != item['id_turma_id']:
+                continue
+            disciplinas_avaliadas[a_id] = disciplinas_avaliadas.get(a_id, 0) + 1
+            if item['media'] < 10:
+                disciplinas_reprovadas[a_id] = disciplinas_reprovadas.get(a_id, 0) + 1
+
         # 3. Decidir tipo
-        if disciplinas_reprovadas == 0:
-            return 'Confirmacao'
-        elif disciplinas_reprovadas <= 2:
-            return 'Reenquadramento'
-        else:
-            return 'Repetente'
+        for a_id in turmas_por_aluno:
+            reprovadas = disciplinas_reprovadas.get(a_id, 0)
+            if a_id not in disciplinas_avaliadas:
+                sugestoes[a_id] = 'Confirmacao' # Sem notas registradas, assume progressão normal
+            elif reprovadas == 0:
+                sugestoes[a_id] = 'Confirmacao'
+            elif reprovadas <= 2:
+                sugestoes[a_id] = 'Reenquadramento'
+            else:
+                sugestoes[a_id] = 'Repetente'
+
+        return sugestoes
+
+    @staticmethod
+    def alunos_da_turma(turma_id):
+        """
+        Retorna o conjunto de IDs dos alunos da turma (pela turma actual do aluno
+        ou por uma matrícula nessa turma), numa única consulta.
+        """
+        return set(
+            Aluno.objects.filter(
+                Q(id_turma_id=turma_id) | Q(matricula__id_turma_id=turma_id)
+            ).values_list('id_aluno', flat=True).distinct()
+        )
+
+    @staticmethod
+    def lancar_notas_lote(turma, disciplina, professor, tipo_avaliacao, notas_data):
+        """
+        Lança uma pauta completa de notas numa única transacção.
+
+        A pauta é validada em memória contra a lista de alunos da turma; se alguma
+        linha for inválida nada é gravado. As notas são gravadas numa única
+        instrução (bulk_create com upsert): as já existentes para
+        (aluno, disciplina, turma, tipo_avaliacao) são actualizadas em vez de duplicadas.
+
+        Retorna {'valido', 'criadas', 'actualizadas', 'resultados'} com o
+        resultado de cada linha pela ordem recebida.
+        """
+        roster = AcademicService.alunos_da_turma(turma.pk)
+
+        # 1. Validação em memória de toda a pauta
+        resultados = []
+        valores = {}
+        for linha in notas_data:
+            resultado = {'id_aluno': linha.get('id_aluno'), 'estado': None, 'erro': None}
+            resultados.append(resultado)
+            try:
+                aluno_id = int(linha.get('id_aluno'))
+                resultado['id_aluno'] = aluno_id
+            except (TypeError, ValueError):
+                resultado['erro'] = 'id_aluno inválido.'
+                continue
+            try:
+                valor = Decimal(str(linha.get('valor')))
+            except (InvalidOperation, ValueError):
+                resultado['erro'] = 'Nota inválida.'
+                continue
+
+            if aluno_id not in roster:
+                resultado['erro'] = 'O aluno não pertence a esta turma.'
+            elif valor < 0 or valor > 20:
+                resultado['erro'] = 'A nota deve estar entre 0 e 20.'
+            elif aluno_id in valores:
+                resultado['erro'] = 'Aluno repetido na pauta.'
+            else:
+                valores[aluno_id] = valor
+
+        if any(r['erro'] for r in resultados):
+            for r in resultados:
+                r['estado'] = 'rejeitada' if r['erro'] else 'nao_gravada'
+            return {'valido': False, 'criadas': 0, 'actualizadas': 0, 'resultados': resultados}
+
+        # 2. Gravação: upsert em (aluno, disciplina, turma, tipo_avaliacao).
+        # A leitura só serve para o estado de cada linha; a unicidade é garantida
+        # pela restrição da tabela, pelo que dois envios simultâneos da mesma
+        # pauta actualizam as mesmas notas em vez de as duplicar.
+        estados = {}
+        with transaction.atomic():
+            existentes = Nota.objects.filter(
+                id_turma=turma,
+                id_disciplina=disciplina,
+                tipo_avaliacao=tipo_avaliacao,
+                id_aluno_id__in=list(valores.keys())
+            ).values_list('id_aluno_id', 'valor', 'id_professor_id')
+
+            for aluno_id, valor, professor_id in existentes:
+                if valor != valores[aluno_id] or professor_id != professor.pk:
+                    estados[aluno_id] = 'actualizada'
+                else:
+                    estados[aluno_id] = 'inalterada'
+            for aluno_id in valores:
+                estados.setdefault(aluno_id, 'criada')
+
+            gravar = [
+                Nota(
+                    id_aluno_id=aluno_id,
+                    id_disciplina=disciplina,
+                    id_professor=professor,
+                    id_turma=turma,
+                    tipo_avaliacao=tipo_avaliacao,
+                    valor=valor
+                )
+                for aluno_id, valor in valores.items() if estados[aluno_id] != 'inalterada'
+            ]
+            if gravar:
+                Nota.objects.bulk_create(
+                    gravar,
+                    update_conflicts=True,
+                    unique_fields=['id_aluno', 'id_disciplina', 'id_turma', 'tipo_avaliacao'],
+                    update_fields=['valor', 'id_professor'],
+                )
+
+        for r in resultados:
+            r['estado'] = estados[r['id_aluno']]
+
+        return {
+            'valido': True,
+            'criadas': sum(1 for e in estados.values() if e == 'criada'),
+            'actualizadas': sum(1 for e in estados.values() if e == 'actualizada'),
+            'resultados': resultados
+        }
 
     @staticmethod
     def registrar_falta_lote(aluno_ids, disciplina_id, turma_id, data_falta, justificativa=None):
         """
-        Registra faltas para vários alunos ao mesmo tempo
+        Registra faltas para vários alunos ao mesmo tempo.
+
+        Valida a lista contra os alunos da turma, ignora faltas já registadas para
+        o mesmo (aluno, disciplina, data) e insere as restantes numa única instrução
+        (sem falhar se outro pedido as tiver inserido entretanto).
+        Retorna {'criadas': n, 'ignoradas': [ids já com falta]}.
         """
-        faltas_criadas = []
-        for a_id in aluno_ids:
-            falta = FaltaAluno.objects.create(
-                id_aluno_id=a_id,
-                id_disciplina_id=disciplina_id,
-                id_turma_id=turma_id,
-                data_falta=data_falta,
-                observacao=justificativa
+        from django.core.exceptions import ValidationError
+
+        try:
+            aluno_ids = list(dict.fromkeys(int(a_id) for a_id in aluno_ids))
+        except (TypeError, ValueError):
+            raise ValidationError("A lista de alunos contém identificadores inválidos.")
+
+        roster = AcademicService.alunos_da_turma(turma_id)
+        fora_da_turma = [a_id for a_id in aluno_ids if a_id not in roster]
+        if fora_da_turma:
+            raise ValidationError(f"Alunos que não pertencem a esta turma: {fora_da_turma}")
+
+        with transaction.atomic():
+            ja_registadas = set(
+                FaltaAluno.objects.filter(
+                    id_aluno_id__in=aluno_ids,
+                    id_disciplina_id=disciplina_id,
+                    data_falta=data_falta
+                ).values_list('id_aluno_id', flat=True)
             )
-            faltas_criadas.append(falta)
-        return len(faltas_criadas)
+
+            faltas = [
+                FaltaAluno(
+                    id_aluno_id=a_id,
+                    id_disciplina_id=disciplina_id,
+                    id_turma_id=turma_id,
+                    data_falta=data_falta,
+                    observacao=justificativa
+                )
+                for a_id in aluno_ids if a_id not in ja_registadas
+            ]
+            # A restrição única garante que uma chamada simultânea não duplica faltas
+            FaltaAluno.objects.bulk_create(faltas, ignore_conflicts=True)
+
+        return {
+            'criadas': len(faltas),
+            'ignoradas': [a_id for a_id in aluno_ids if a_id in ja_registadas]
+        }
@@ -0,0 +1,260 @@
+import os
+import sys
+import glob
+import time
+import signal
+import socket
+import logging
+import datetime
+import subprocess
+from datetime import timedelta
+from django.conf import settings
+from django.db import connections
+from django.db.models import Q
+from django.utils import timezone
+
+from apis.models import AgendamentoBackup, BackupJob
+from apis.services.backup_service import BackupService
+from apis.services.notification_service import NotificationService
+
+logger = logging.getLogger(__name__)
+
+
+class AgendamentoBackupService:
+    """
+    Agendador dos backups programados (AgendamentoBackup), executado pelo
+    comando `agendar_backups` num ou mais nós.
+
+    - Só inicia backups dentro da janela fora de horas de ponta (BACKUP_JANELA).
+    - Cada agendamento é reservado com um UPDATE condicional: com vários nós
+      a correr o agendador, apenas um executa cada backup.
+    - Orçamento de recursos: não inicia com a máquina sobrecarregada, limita as
+      threads de compressão e termina backups que excedam a duração máxima.
+    - Falhas são repetidas com intervalos crescentes, até BACKUP_AGENDADO_TENTATIVAS.
+    """
+
+    # Janela fora de horas de ponta ('HH:MM-HH:MM', hora local; vazio = sem restrição)
+    JANELA = getattr(settings, 'BACKUP_JANELA', '01:00-06:00')
+    TENTATIVAS = getattr(settings, 'BACKUP_AGENDADO_TENTATIVAS', 3)
+    # Intervalo antes da primeira repetição (duplica a cada falha)
+    INTERVALO_REPETICAO = timedelta(minutes=15)
+    DURACAO_MAXIMA = timedelta(minutes=getattr(settings, 'BACKUP_AGENDADO_DURACAO_MAXIMA', 240))
+    # Carga média (1 min) por CPU acima da qual o backup é adiado
+    CARGA_MAXIMA = getattr(settings, 'BACKUP_AGENDADO_CARGA_MAXIMA', 0.75)
+    THREADS = getattr(settings, 'BACKUP_AGENDADO_THREADS', 2)
+    # Intervalo de verificação dos agendamentos (segundos)
+    INTERVALO = 60
+    # Reservas mais antigas do que isto pertencem a um nó que terminou
+    RESERVA_EXPIRADA = DURACAO_MAXIMA + timedelta(minutes=10)
+
+    @staticmethod
+    def identificador():
+        """Identificação do nó/processo que reserva os agendamentos"""
+        return f"{socket.gethostname()}:{os.getpid()}"
+
+    @staticmethod
+    def janela():
+        """(início, fim) da janela de execução ou None se não houver restrição"""
+        valor = (AgendamentoBackupService.JANELA or '').strip()
+        if not valor:
+            return None
+        try:
+            inicio, fim = (datetime.datetime.strptime(h.strip(), '%H:%M').time() for h in valor.split('-'))
+        except ValueError:
+            raise ValueError(f"BACKUP_JANELA inválida: '{valor}' (formato HH:MM-HH:MM)")
+        return inicio, fim
+
+    @staticmethod
+    def na_janela(momento=None):
+        janela = AgendamentoBackupService.janela()
+        if janela is None:
+            return True
+        inicio, fim = janela
+        hora = timezone.localtime(momento or timezone.now()).time()
+        if inicio <= fim:
+            return inicio <= hora < fim
+        # Janela que atravessa a meia-noite (ex: 22:00-06:00)
+        return hora >= inicio or hora < fim
+
+    @staticmethod
+    def carga_excessiva():
+        """Carga média da máquina acima do orçamento (None onde não é possível medir, ex: Windows)"""
+        if not hasattr(os, 'getloadavg'):
+            return None
+        carga = os.getloadavg()[0] / (os.cpu_count() or 1)
+        return carga > AgendamentoBackupService.CARGA_MAXIMA
+
+    @staticmethod
+    def pendentes(agora=None):
+        """Agendamentos vencidos, por executar, com tentativas disponíveis (mais antigos primeiro)"""
+        agora = agora or timezone.now()
+        return AgendamentoBackup.objects.filter(
+            executado=False, data_hora__lte=agora, tentativas__lt=AgendamentoBackupService.TENTATIVAS
+        ).filter(
+            Q(proxima_tentativa__isnull=True) | Q(proxima_tentativa__lte=agora)
+        ).order_by('data_hora')
+
+    @staticmethod
+    def reservar(agendamento_id, identificador):
+        """UPDATE condicional: True se este nó ficou com o agendamento"""
+        agora = timezone.now()
+        return bool(AgendamentoBackup.objects.filter(
+            id_agendamento=agendamento_id, executado=False
+        ).filter(
+            Q(reservado_em__isnull=True) | Q(reservado_em__lt=agora - AgendamentoBackupService.RESERVA_EXPIRADA)
+        ).update(reservado_por=identificador, reservado_em=agora))
+
+    @staticmethod
+    def _executar_backup(job):
+        """
+        Executa `manage.py executar_backup <job>` como processo filho, com
+        prioridade reduzida e threads de compressão limitadas; termina-o se
+        exceder a duração máxima.
+        """
+        comando = BackupService.prefixo_prioridade() + [
+            sys.executable, os.path.join(settings.BASE_DIR, 'manage.py'), 'executar_backup', str(job.id_job)
+        ]
+        ambiente = os.environ.copy()
+        ambiente['BACKUP_COMPRESSAO_THREADS'] = str(AgendamentoBackupService.THREADS)
+        kwargs = {'stdin': subprocess.DEVNULL, 'stdout': subprocess.DEVNULL, 'stderr': subprocess.DEVNULL,
+                  'cwd': str(settings.BASE_DIR), 'env': ambiente}
+        if os.name == 'nt':
+            kwargs['creationflags'] = subprocess.CREATE_NEW_PROCESS_GROUP | subprocess.BELOW_NORMAL_PRIORITY_CLASS
+        else:
+            # Grupo próprio: o pg_dump também é terminado se o tempo for excedido
+            kwargs['start_new_session'] = True
+
+        processo = subprocess.Popen(comando, **kwargs)
+        try:
+            processo.wait(timeout=AgendamentoBackupService.DURACAO_MAXIMA.total_seconds())
+        except subprocess.TimeoutExpired:
+            if os.name == 'nt':
+                processo.kill()
+            else:
+                os.killpg(processo.pid, signal.SIGKILL)
+            processo.wait()
+            for parcial in glob.glob(os.path.join(BackupService.DIRECTORIO, 'backup_*.zip.part')):
+                os.remove(parcial)
+            BackupJob.objects.filter(
+                id_job=job.id_job, status__in=[BackupJob.STATUS_PENDENTE, BackupJob.STATUS_PROCESSANDO]
+            ).update(status=BackupJob.STATUS_ERRO, erro='Duração máxima do backup excedida',
+                     concluido_em=timezone.now())
+
+        job.refresh_from_db()
+        if job.status == BackupJob.STATUS_PENDENTE:
+            # O processo terminou sem reservar o job (ex: erro ao arrancar o Django)
+            BackupJob.objects.filter(id_job=job.id_job).update(
+                status=BackupJob.STATUS_ERRO, erro=f'Processo do backup terminou com código {processo.returncode}',
+                concluido_em=timezone.now()
+            )
+            job.refresh_from_db()
+        return job
+
+    @staticmethod
+    def executar(agendamento):
+        """
+        Executa um agendamento já reservado. Retorna o BackupJob, ou None se o
+        backup foi adiado (outro backup ou restauro em curso).
+        """
+        try:
+            job = BackupService.criar_job('sistema', None)
+        except ValueError as e:
+            logger.info("Backup agendado #%s adiado: %s", agendamento.id_agendamento, e)
+            AgendamentoBackup.objects.filter(id_agendamento=agendamento.id_agendamento).update(
+                reservado_por='', reservado_em=None
+            )
+            return None
+
+        AgendamentoBackup.objects.filter(id_agendamento=agendamento.id_agendamento).update(backup_job=job)
+        try:
+            job = AgendamentoBackupService._executar_backup(job)
+        except Exception as e:
+            # Ex: OSError ao lançar o processo; conta como tentativa falhada e liberta a reserva
+            logger.exception("Backup agendado #%s: falha ao executar o backup #%s", agendamento.id_agendamento, job.id_job)
+            BackupJob.objects.filter(
+                id_job=job.id_job, status__in=[BackupJob.STATUS_PENDENTE, BackupJob.STATUS_PROCESSANDO]
+            ).update(status=BackupJob.STATUS_ERRO, erro=f'Falha ao executar o backup: {e}', concluido_em=timezone.now())
+            job.refresh_from_db()
+        agora = timezone.now()
+        descricao = agendamento.descricao or 'Backup do Sistema'
+
+        if job.status == BackupJob.STATUS_CONCLUIDO:
+            # O mesmo backup satisfaz os outros agendamentos já vencidos quando começou
+            AgendamentoBackup.objects.filter(
+                Q(id_agendamento=agendamento.id_agendamento)
+                | Q(executado=False, data_hora__lte=job.iniciado_em, reservado_em__isnull=True)
+            ).update(
+                executado=True, executado_em=agora, notificado=True, erro=None, proxima_tentativa=None,
+                backup_job=job, reservado_por='', reservado_em=None
+            )
+            NotificationService._create_unique_notification(
+                titulo="Backup Agendado Concluído",
+                mensagem=f"O backup agendado foi concluído: {descricao} ({job.nome_ficheiro})",
+                tipo="success",
+                link="/configuracoes"
+            )
+            return job
+
+        tentativas = agendamento.tentativas + 1
+        AgendamentoBackup.objects.filter(id_agendamento=agendamento.id_agendamento).update(
+            tentativas=tentativas, erro=job.erro,
+            proxima_tentativa=agora + AgendamentoBackupService.INTERVALO_REPETICAO * 2 ** (tentativas - 1),
+            reservado_por='', reservado_em=None
+        )
+        if tentativas >= AgendamentoBackupService.TENTATIVAS:
+            AgendamentoBackup.objects.filter(id_agendamento=agendamento.id_agendamento).update(notificado=True)
+            NotificationService._create_unique_notification(
+                titulo="Falha no Backup Agendado",
+                mensagem=f"O backup agendado falhou após {tentativas} tentativas: {descricao}. Erro: {job.erro}",
+                tipo="error",
+                link="/configuracoes"
+            )
+        return job
+
+    @staticmethod
+    def executar_pendentes(log=None):
+        """Executa o agendamento vencido mais antigo, se as condições o permitirem. Retorna o BackupJob ou None."""
+        log = log or logger.info
+        if not AgendamentoBackupService.na_janela():
+            return None
+        if not AgendamentoBackupService.pendentes().exists():
+            return None
+        if AgendamentoBackupService.carga_excessiva():
+            log("Backup agendado adiado: carga da máquina acima do orçamento")
+            return None
+
+        identificador = AgendamentoBackupService.identificador()
+        for agendamento in AgendamentoBackupService.pendentes()[:5]:
+            if not AgendamentoBackupService.reservar(agendamento.id_agendamento, identificador):
+                continue
+            log(f"Backup agendado #{agendamento.id_agendamento}: a executar")
+            job = AgendamentoBackupService.executar(agendamento)
+            if job is not None:
+                log(f"Backup agendado #{agendamento.id_agendamento}: {job.status} {job.erro or job.nome_ficheiro}")
+            return job
+        return None
+
+    @staticmethod
+    def processar(intervalo=None, uma_vez=False, log=None):
+        """
+        Ciclo do agendador: verifica os agendamentos a cada `intervalo` segundos.
+        Com `uma_vez`, executa os agendamentos vencidos e termina (ex: cron).
+        Retorna o número de backups executados.
+        """
+        intervalo = intervalo or AgendamentoBackupService.INTERVALO
+        log = log or logger.info
+        AgendamentoBackupService.janela()  # Valida a configuração antes de começar
+
+        executados = 0
+        while True:
+            job = AgendamentoBackupService.executar_pendentes(log)
+            if job is not None:
+                executados += 1
+                # Podem existir mais agendamentos vencidos
+                continue
+            if uma_vez:
+                break
+            # Ligações inactivas durante a espera podem ser fechadas pelo servidor
+            connections.close_all()
+            time.sleep(intervalo)
+        return executados
@@ -0,0 +1,61 @@
+from django.db.models import Prefetch
+from apis.models import AlunoEncarregado, Candidato, Matricula
+from apis.services.academic_service import AcademicService
+
+
+class AlunoService:
+    """
+    Serviço de resolução em lote para as listagens de Alunos.
+    Agrupa numa só consulta o que os serializers faziam por aluno
+    (foto do candidato, encarregados, matrículas e tipo de matrícula sugerido).
+    """
+
+    @staticmethod
+    def preparar_listagem(queryset):
+        """Adiciona os Prefetch usados pelo AlunoListSerializer"""
+        return queryset.prefetch_related(
+            Prefetch(
+                'alunoencarregado_set',
+                queryset=AlunoEncarregado.objects.select_related('id_encarregado').order_by('pk'),
+                to_attr='vinculos_encarregados'
+            ),
+            Prefetch(
+                'matricula_set',
+                queryset=Matricula.objects.select_related(
+                    'ano_lectivo', 'id_turma', 'id_turma__id_classe',
+                    'id_turma__id_curso', 'id_turma__id_periodo', 'id_turma__id_sala'
+                ).order_by('-ano_lectivo__nome', '-data_matricula'),
+                to_attr='matriculas_ordenadas'
+            ),
+            'historico_escolar',
+        )
+
+    @staticmethod
+    def fotos_candidatos(alunos):
+        """
+        Retorna {numero_bi: foto_passe} com a foto da candidatura mais recente
+        de cada aluno sem fotografia própria (uma única consulta).
+        """
+        bis = {a.numero_bi for a in alunos if not a.img_path and a.numero_bi}
+        if not bis:
+            return {}
+
+        fotos = {}
+        candidatos = Candidato.objects.filter(numero_bi__in=bis).only(
+            'id_candidato', 'numero_bi', 'foto_passe'
+        ).order_by('-criado_em')
+        for candidato in candidatos:
+            # Mesma regra do fallback individual: conta apenas o candidato mais recente
+            if candidato.numero_bi not in fotos:
+                fotos[candidato.numero_bi] = candidato.foto_passe
+        return fotos
+
+    @staticmethod
+    def contexto_lote(alunos):
+        """Dados pré-calculados partilhados pelo serializer através do contexto"""
+        return {
+            'fotos_candidatos': AlunoService.fotos_candidatos(alunos),
+            'tipos_matricula': AcademicService.determinar_tipo_matricula_lote(
+                [a.id_aluno for a in alunos]
+            ),
+        }
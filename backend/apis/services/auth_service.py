@@ -1,6 +1,7 @@
 from django.contrib.auth import authenticate
 from django.contrib.auth.models import User
 from django.contrib.auth.hashers import check_password
+from django.db.models import CharField, Q, Value
 from rest_framework_simplejwt.tokens import RefreshToken
 from apis.models import Usuario, Funcionario, Aluno, Encarregado, HistoricoLogin
 
@@ -31,11 +32,21 @@ class AuthService:
                 if t not in types_to_try:
                     types_to_try.append(t)
 
+        # 'funcionario' e 'usuario' autenticam pela mesma conta (perfil Usuario): tentar apenas uma vez
+        if 'funcionario' in types_to_try and 'usuario' in types_to_try:
+            types_to_try.remove('usuario' if types_to_try.index('funcionario') < types_to_try.index('usuario') else 'funcionario')
+
+        # Índice de identidades: uma única consulta localiza as contas candidatas em todas as tabelas
+        contas = AuthService.localizar_contas(email)
+        senhas_verificadas = {}
+
         errors = []
         
         for current_type in types_to_try:
             try:
-                user, user_data = AuthService._perform_auth(email, password, current_type)
+                user, user_data = AuthService._perform_auth(
+                    email, password, current_type, contas=contas, senhas_verificadas=senhas_verificadas
+                )
                 # Se chegou aqui, a autenticação foi um sucesso para este tipo!
                 return user, user_data
             except ValueError as e:
@@ -63,44 +74,95 @@ class AuthService:
         raise ValueError('Credenciais inválidas.')
 
     @staticmethod
-    def _perform_auth(email, password, user_type):
-        """Lógica interna de autenticação para um tipo específico"""
+    def localizar_contas(identificador):
+        """
+        Índice unificado de identidades de login: uma única consulta (UNION ALL)
+        sobre usuario, auth_user, aluno e encarregado que devolve as contas
+        candidatas para o identificador (email, username, nº de matrícula ou BI).
+
+        Retorna {origem: [pk, ...]} com as origens:
+        'usuario', 'auth_email', 'auth_username', 'aluno', 'encarregado'.
+        """
+        identificador = (identificador or '').strip()
+        if not identificador:
+            return {}
+
+        def origem(queryset, nome, pk_field):
+            # order_by() limpa o Meta.ordering (não permitido dentro de um UNION)
+            return queryset.order_by().annotate(
+                origem=Value(nome, output_field=CharField())
+            ).values_list(pk_field, 'origem')
+
+        filtro_aluno = Q(email__iexact=identificador)
+        if identificador.isdigit():
+            filtro_aluno |= Q(numero_matricula=int(identificador))
+
+        consultas = [
+            origem(Usuario.objects.filter(email__iexact=identificador), 'usuario', 'id_usuario'),
+            origem(User.objects.filter(email__iexact=identificador), 'auth_email', 'id'),
+            origem(User.objects.filter(username=identificador), 'auth_username', 'id'),
+            origem(Aluno.objects.filter(filtro_aluno), 'aluno', 'id_aluno'),
+            origem(
+                Encarregado.objects.filter(Q(email__iexact=identificador) | Q(numero_bi=identificador)),
+                'encarregado', 'id_encarregado'
+            ),
+        ]
+
+        contas = {}
+        for pk, nome in consultas[0].union(*consultas[1:], all=True):
+            contas.setdefault(nome, []).append(pk)
+        return contas
+
+    @staticmethod
+    def _verificar_senha(password, encoded, senhas_verificadas, verificar=None):
+        """
+        Verifica a senha uma única vez por hash: contas em tabelas diferentes com o
+        mesmo hash não repetem o PBKDF2 dentro da mesma tentativa de login.
+        """
+        if senhas_verificadas is not None and encoded in senhas_verificadas:
+            return senhas_verificadas[encoded]
+
+        valida = verificar(password) if verificar else check_password(password, encoded)
+        if senhas_verificadas is not None:
+            senhas_verificadas[encoded] = valida
+        return valida
+
+    @staticmethod
+    def _perfil_de_django_user(django_user):
+        """Migration on-the-fly: cria o perfil Usuario para um Auth User nativo"""
+        user_profile, _ = Usuario.objects.get_or_create(
+            user=django_user,
+            defaults={
+                'email': django_user.email,
+                'nome_completo': django_user.get_full_name() or django_user.username,
+                'papel': 'Admin' if django_user.is_superuser else 'Comum',
+                'is_superuser': django_user.is_superuser
+            }
+        )
+        return user_profile
+
+    @staticmethod
+    def _perform_auth(email, password, user_type, contas=None, senhas_verificadas=None):
+        """
+        Lógica interna de autenticação para um tipo específico.
+        `contas` é o resultado de localizar_contas (calculado se não for fornecido).
+        """
         user = None
         user_data = {}
+        if contas is None:
+            contas = AuthService.localizar_contas(email)
         
         # 1. Autenticação para Funcionários e Usuários Administrativos
         if user_type in ['funcionario', 'usuario']:
-            # Tenta encontrar o perfil de Usuário (busca case-insensitive)
-            try:
-                user_profile = Usuario.objects.get(email__iexact=email)
-            except Usuario.DoesNotExist:
-                # Fallback: Tenta encontrar Auth User nativo e criar perfil (Migration on-the-fly)
-                try:
-                    django_user = User.objects.get(email__iexact=email)
-                    user_profile, _ = Usuario.objects.get_or_create(
-                        user=django_user,
-                        defaults={
-                            'email': django_user.email,
-                            'nome_completo': django_user.get_full_name() or django_user.username,
-                            'papel': 'Admin' if django_user.is_superuser else 'Comum',
-                            'is_superuser': django_user.is_superuser
-                        }
-                    )
-                except User.DoesNotExist:
-                    # Tenta fallback via username
-                    try:
-                        django_user = User.objects.get(username=email)
-                        user_profile, _ = Usuario.objects.get_or_create(
-                            user=django_user,
-                            defaults={
-                                'email': django_user.email,
-                                'nome_completo': django_user.get_full_name() or django_user.username,
-                                'papel': 'Admin' if django_user.is_superuser else 'Comum',
-                                'is_superuser': django_user.is_superuser
-                            }
-                        )
-                    except User.DoesNotExist:
-                        raise ValueError('Usuário não encontrado.')
+            # Perfil de Usuário (email case-insensitive) ou, em alternativa, Auth User
+            # nativo por email/username com criação do perfil (Migration on-the-fly)
+            if contas.get('usuario'):
+                user_profile = Usuario.objects.select_related('user', 'cargo').get(id_usuario=contas['usuario'][0])
+            elif contas.get('auth_email') or contas.get('auth_username'):
+                django_user_id = (contas.get('auth_email') or contas['auth_username'])[0]
+                user_profile = AuthService._perfil_de_django_user(User.objects.get(id=django_user_id))
+            else:
+                raise ValueError('Usuário não encontrado.')
 
             user = user_profile
             
@@ -115,9 +177,11 @@ class AuthService:
             # Validação da Senha
             password_valid = False
             if user.user:
-                password_valid = user.user.check_password(password)
+                password_valid = AuthService._verificar_senha(
+                    password, user.user.password, senhas_verificadas, verificar=user.user.check_password
+                )
             else:
-                password_valid = check_password(password, user.senha_hash)
+                password_valid = AuthService._verificar_senha(password, user.senha_hash, senhas_verificadas)
 
             if not password_valid:
                 raise ValueError('Senha incorreta.')
@@ -152,17 +216,12 @@ class AuthService:
 
         # 2. Autenticação para Alunos
         elif user_type == 'aluno':
-            try:
-                # Tenta por email
-                user = Aluno.objects.get(email__iexact=email)
-            except Aluno.DoesNotExist:
-                # Tenta por número de matrícula
-                try:
-                    user = Aluno.objects.get(numero_matricula=email)
-                except (Aluno.DoesNotExist, ValueError, TypeError):
-                    raise ValueError('Aluno não encontrado.')
+            # Por email ou por número de matrícula (resolvido no índice de identidades)
+            if not contas.get('aluno'):
+                raise ValueError('Aluno não encontrado.')
+            user = Aluno.objects.select_related('id_turma').get(id_aluno=contas['aluno'][0])
                 
-            if not check_password(password, user.senha_hash):
+            if not AuthService._verificar_senha(password, user.senha_hash, senhas_verificadas):
                 raise ValueError('Senha incorreta.')
                 
             user_data = {
@@ -180,17 +239,12 @@ class AuthService:
 
         # 3. Autenticação para Encarregados
         elif user_type == 'encarregado':
-            try:
-                # Tenta por email
-                user = Encarregado.objects.get(email__iexact=email)
-            except Encarregado.DoesNotExist:
-                # Tenta por número de BI
-                try:
-                    user = Encarregado.objects.get(numero_bi=email)
-                except Encarregado.DoesNotExist:
-                    raise ValueError('Encarregado não encontrado.')
+            # Por email ou por número de BI (resolvido no índice de identidades)
+            if not contas.get('encarregado'):
+                raise ValueError('Encarregado não encontrado.')
+            user = Encarregado.objects.get(id_encarregado=contas['encarregado'][0])
                 
-            if not check_password(password, user.senha_hash):
+            if not AuthService._verificar_senha(password, user.senha_hash, senhas_verificadas):
                 raise ValueError('Senha incorreta.')
                 
             user_data = {
@@ -0,0 +1,516 @@
+import os
+import sys
+import json
+import time
+import hashlib
+import shutil
+import logging
+import zipfile
+import tempfile
+import datetime
+import subprocess
+from datetime import timedelta
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.utils import timezone
+
+from apis.models import BackupJob
+from apis.utils import compressao_utils
+
+logger = logging.getLogger(__name__)
+
+
+class _Progresso:
+    """Acumula o progresso do job e grava-o na base de dados no máximo a cada INTERVALO segundos"""
+
+    INTERVALO = 2
+
+    def __init__(self, job):
+        self.job = job
+        self._gravado_em = 0
+
+    def fase(self, fase):
+        self.job.fase = fase
+        self.gravar(forcar=True)
+
+    def avancar(self, n_bytes):
+        self.job.bytes_processados += n_bytes
+        self.gravar()
+
+    def gravar(self, forcar=False):
+        agora = time.monotonic()
+        if not forcar and agora - self._gravado_em < self.INTERVALO:
+            return
+        self._gravado_em = agora
+        if self.job.bytes_estimados:
+            # Estimativa: nunca chega aos 100% antes do fim
+            self.job.progresso = min(99, int(self.job.bytes_processados * 100 / self.job.bytes_estimados))
+        self.job.save(update_fields=['fase', 'progresso', 'bytes_processados', 'actualizado_em'])
+
+
+class BackupService:
+    """
+    Backups completos do sistema (base de dados PostgreSQL + ficheiros de media)
+    executados em segundo plano.
+
+    O `pg_dump` (formato custom) é lido através de um pipe, comprimido em blocos
+    paralelos (gzip/xz, conforme o perfil de compressão) e escrito directamente
+    no arquivo ZIP, sem ficheiro SQL temporário no disco. A media é incremental:
+    o manifesto de cada arquivo lista todos os ficheiros e o arquivo onde cada
+    conteúdo está guardado, pelo que só os ficheiros novos ou alterados são copiados. A execução decorre num
+    processo separado com prioridade de CPU/IO reduzida (nice/ionice), para não
+    competir com a API, e o progresso fica registado no BackupJob.
+    """
+
+    DIRECTORIO = str(getattr(settings, 'BACKUP_DIR', os.path.join(settings.BASE_DIR, 'backups')))
+    # Nome do dump da base de dados dentro do arquivo (+ extensão do codec: database.dump.gz)
+    NOME_DUMP = 'database.dump'
+    # Manifesto da media (hash, tamanho, data e arquivo onde está cada ficheiro)
+    NOME_MANIFESTO = 'manifest.json'
+    # Número máximo de backups incrementais seguidos antes de um backup completo da media
+    MEDIA_COMPLETO_A_CADA = getattr(settings, 'BACKUP_MEDIA_COMPLETO_A_CADA', 7)
+    CHUNK_SIZE = 1024 * 1024
+    # Jobs em processamento sem actualizações há mais tempo do que isto são considerados interrompidos
+    TEMPO_SEM_PROGRESSO = timedelta(minutes=10)
+
+    @staticmethod
+    def executavel(nome):
+        """Caminho de um executável do PostgreSQL (pg_dump, pg_restore, psql)"""
+        path = shutil.which(nome)
+        if path:
+            return path
+
+        # Caminhos comuns no Windows
+        if os.name == 'nt':
+            common_bases = [
+                r"C:\Program Files\PostgreSQL",
+                r"C:\Program Files (x86)\PostgreSQL",
+            ]
+            for base in common_bases:
+                if os.path.exists(base):
+                    versions = sorted(os.listdir(base), reverse=True)  # Versões mais recentes primeiro
+                    for v in versions:
+                        full_path = os.path.join(base, v, "bin", f"{nome}.exe")
+                        if os.path.exists(full_path):
+                            return full_path
+
+        return nome  # Fallback ao comando simples
+
+    @staticmethod
+    def argumentos_conexao():
+        db_config = settings.DATABASES['default']
+        argumentos = []
+        for opcao, chave in (('-h', 'HOST'), ('-p', 'PORT'), ('-U', 'USER')):
+            if db_config.get(chave):
+                argumentos += [opcao, str(db_config[chave])]
+        return argumentos
+
+    @staticmethod
+    def ambiente():
+        """Variáveis de ambiente dos comandos do PostgreSQL (a password não passa pela linha de comandos)"""
+        env = os.environ.copy()
+        env['PGPASSWORD'] = settings.DATABASES['default'].get('PASSWORD') or ''
+        return env
+
+    @staticmethod
+    def prefixo_prioridade():
+        """nice/ionice para o processo do backup (os subprocessos, como o pg_dump, herdam a prioridade)"""
+        if os.name == 'nt':
+            return []
+        prefixo = []
+        nice = shutil.which('nice')
+        if nice:
+            prefixo += [nice, '-n', str(getattr(settings, 'BACKUP_NICE', 10))]
+        ionice = shutil.which('ionice')
+        if ionice:
+            # Best-effort com a prioridade mais baixa: não bloqueia o disco da base de dados
+            prefixo += [ionice, '-c', '2', '-n', '7']
+        return prefixo
+
+    @staticmethod
+    def em_curso():
+        """Backup pendente ou em execução (os interrompidos são marcados como erro)"""
+        limite = timezone.now() - BackupService.TEMPO_SEM_PROGRESSO
+        BackupJob.objects.filter(
+            status__in=[BackupJob.STATUS_PENDENTE, BackupJob.STATUS_PROCESSANDO], actualizado_em__lt=limite
+        ).update(status=BackupJob.STATUS_ERRO, erro='Backup interrompido', concluido_em=timezone.now())
+
+        return BackupJob.objects.filter(
+            status__in=[BackupJob.STATUS_PENDENTE, BackupJob.STATUS_PROCESSANDO]
+        ).first()
+
+    @staticmethod
+    def criar_job(user_type='', user_id=None, completo=False, compressao=None):
+        """
+        Regista o backup (sem o executar).
+        Com `completo`, toda a media é guardada no arquivo (sem referências a backups anteriores).
+        `compressao` é o perfil (rapido, equilibrado, maximo); por omissão, settings.BACKUP_COMPRESSAO.
+        Lança ValueError se já existir um backup ou restauro em curso ou o perfil for inválido.
+
+        A verificação de `em_curso` não basta com pedidos simultâneos (ou um pedido
+        e o agendador): a restrição backup_job_um_em_curso garante na base de dados
+        que apenas um dos INSERT concorrentes é aceite.
+        """
+        from apis.services.restauro_service import RestauroService
+
+        compressao, _codec, _nivel = compressao_utils.perfil(compressao)
+        if BackupService.em_curso():
+            raise ValueError('Já existe um backup em curso.')
+        if RestauroService.em_curso():
+            raise ValueError('Existe um restauro em curso.')
+
+        try:
+            with transaction.atomic():
+                return BackupJob.objects.create(
+                    completo=completo, compressao=compressao,
+                    solicitado_por_tipo=user_type or '', solicitado_por_id=user_id,
+                )
+        except IntegrityError:
+            raise ValueError('Já existe um backup em curso.')
+
+    @staticmethod
+    def iniciar(user_type='', user_id=None, completo=False, compressao=None):
+        """Regista o backup (ver `criar_job`) e lança o processo que o executa"""
+        job = BackupService.criar_job(user_type, user_id, completo=completo, compressao=compressao)
+        transaction.on_commit(lambda: BackupService.lancar(job.id_job))
+        return job
+
+    @staticmethod
+    def executar_comando_destacado(argumentos, prioridade_reduzida=True):
+        """Executa `manage.py <argumentos>` num processo destacado (sobrevive ao fim do pedido)"""
+        comando = [sys.executable, os.path.join(settings.BASE_DIR, 'manage.py')] + list(argumentos)
+        if prioridade_reduzida:
+            comando = BackupService.prefixo_prioridade() + comando
+        kwargs = {
+            'stdin': subprocess.DEVNULL,
+            'stdout': subprocess.DEVNULL,
+            'stderr': subprocess.DEVNULL,
+            'cwd': str(settings.BASE_DIR),
+        }
+        if os.name == 'nt':
+            kwargs['creationflags'] = subprocess.CREATE_NEW_PROCESS_GROUP
+            if prioridade_reduzida:
+                kwargs['creationflags'] |= subprocess.BELOW_NORMAL_PRIORITY_CLASS
+        else:
+            kwargs['start_new_session'] = True
+        subprocess.Popen(comando, **kwargs)
+
+    @staticmethod
+    def lancar(job_id):
+        """Executa `manage.py executar_backup <job>` num processo destacado de prioridade reduzida"""
+        try:
+            BackupService.executar_comando_destacado(['executar_backup', str(job_id)])
+        except OSError as e:
+            logger.exception("Não foi possível iniciar o backup #%s", job_id)
+            BackupJob.objects.filter(id_job=job_id).update(
+                status=BackupJob.STATUS_ERRO, erro=str(e), concluido_em=timezone.now()
+            )
+
+    @staticmethod
+    def _tamanho_base_dados():
+        """Tamanho da base de dados (estimativa do volume do dump); None fora do PostgreSQL"""
+        if connection.vendor != 'postgresql':
+            return None
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_database_size(current_database())")
+            return cursor.fetchone()[0]
+
+    @staticmethod
+    def ficheiros_media():
+        """[(caminho, caminho relativo a MEDIA_ROOT, tamanho, mtime)] de todos os ficheiros de media"""
+        media_root = str(settings.MEDIA_ROOT)
+        ficheiros = []
+        if os.path.exists(media_root):
+            for root, dirs, files in os.walk(media_root):
+                for file in files:
+                    file_path = os.path.join(root, file)
+                    relativo = os.path.relpath(file_path, media_root).replace(os.sep, '/')
+                    try:
+                        info = os.stat(file_path)
+                    except OSError:
+                        continue
+                    ficheiros.append((file_path, relativo, info.st_size, info.st_mtime))
+        return ficheiros
+
+    @staticmethod
+    def _escrever_dump(arquivo, progresso, codec, nivel):
+        """
+        pg_dump -Fc -> pipe -> compressão paralela (codec/nível) -> membro do ZIP.
+        O membro é guardado sem DEFLATE (já vai comprimido). Retorna o nome do membro.
+        """
+        db_config = settings.DATABASES['default']
+        comando = [BackupService.executavel('pg_dump')] + BackupService.argumentos_conexao() + [
+            '-F', 'c',
+            # Sem compressão no pg_dump: o fluxo é comprimido aqui, em paralelo (evita comprimir duas vezes)
+            '-Z', '0',
+            db_config['NAME'],
+        ]
+
+        with tempfile.TemporaryFile() as erros:
+            # stderr num ficheiro: um pipe cheio bloquearia o pg_dump
+            processo = subprocess.Popen(
+                comando, stdout=subprocess.PIPE, stderr=erros, env=BackupService.ambiente()
+            )
+            membro = BackupService.NOME_DUMP + compressao_utils.EXTENSOES[codec]
+            info = zipfile.ZipInfo(membro, date_time=time.localtime()[:6])
+            info.compress_type = zipfile.ZIP_STORED
+            try:
+                with arquivo.open(info, 'w', force_zip64=True) as destino, \
+                        compressao_utils.CompressorParalelo(destino, codec, nivel) as compressor:
+                    while True:
+                        bloco = processo.stdout.read(BackupService.CHUNK_SIZE)
+                        if not bloco:
+                            break
+                        compressor.write(bloco)
+                        progresso.avancar(len(bloco))
+            finally:
+                processo.stdout.close()
+                codigo = processo.wait()
+
+            if codigo != 0:
+                erros.seek(0)
+                mensagem = erros.read().decode(errors='replace').strip()
+                raise RuntimeError(f"pg_dump terminou com código {codigo}: {mensagem}")
+        return membro
+
+    @staticmethod
+    def _hash(caminho):
+        sha = hashlib.sha256()
+        with open(caminho, 'rb') as f:
+            for bloco in iter(lambda: f.read(BackupService.CHUNK_SIZE), b''):
+                sha.update(bloco)
+        return sha.hexdigest()
+
+    @staticmethod
+    def ler_manifesto(arquivo):
+        """Manifesto de um backup (ZipFile aberto ou caminho); None para backups sem manifesto (antigos)"""
+        if not isinstance(arquivo, zipfile.ZipFile):
+            try:
+                with zipfile.ZipFile(arquivo) as z:
+                    return BackupService.ler_manifesto(z)
+            except (OSError, zipfile.BadZipFile):
+                return None
+        try:
+            return json.loads(arquivo.read(BackupService.NOME_MANIFESTO))
+        except (KeyError, ValueError):
+            return None
+
+    @staticmethod
+    def arquivos_referenciados(manifesto):
+        """Nomes dos arquivos de backup com conteúdos usados pelo manifesto"""
+        return {entrada['arquivo'] for entrada in (manifesto or {}).get('media', {}).values()}
+
+    @staticmethod
+    def _manifesto_anterior():
+        """
+        (nome, manifesto) do backup mais recente com manifesto cujos arquivos
+        referenciados ainda existem; (None, None) se não houver (backup completo).
+        """
+        if not os.path.isdir(BackupService.DIRECTORIO):
+            return None, None
+        existentes = {f for f in os.listdir(BackupService.DIRECTORIO) if f.endswith('.zip')}
+        for nome in sorted((f for f in existentes if f.startswith('backup_')), reverse=True):
+            manifesto = BackupService.ler_manifesto(os.path.join(BackupService.DIRECTORIO, nome))
+            if manifesto is None:
+                continue
+            if BackupService.arquivos_referenciados(manifesto) <= existentes:
+                return nome, manifesto
+            return None, None
+        return None, None
+
+    @staticmethod
+    def _escrever_media(arquivo, nome_arquivo, ficheiros, completo, progresso, nivel):
+        """
+        Media incremental: cada ficheiro novo ou alterado é guardado neste arquivo
+        (sem recompressão se o formato já for comprimido, ex: JPEG, PDF);
+        os restantes são apenas referenciados no manifesto (arquivo + membro onde
+        o conteúdo já existe). Ficheiros com o mesmo tamanho e data de modificação
+        do backup anterior não são lidos; os restantes são comparados pelo SHA-256,
+        o que também evita guardar duas vezes o mesmo conteúdo.
+        Retorna o manifesto do backup.
+        """
+        nome_anterior, anterior = (None, None) if completo else BackupService._manifesto_anterior()
+        if anterior and anterior.get('profundidade', 0) + 1 > BackupService.MEDIA_COMPLETO_A_CADA:
+            # Cadeia longa: novo backup completo (limita os arquivos necessários ao restauro)
+            nome_anterior, anterior = None, None
+
+        entradas_anteriores = (anterior or {}).get('media', {})
+        por_hash = {entrada['sha256']: entrada for entrada in entradas_anteriores.values()}
+        media = {}
+        guardados = 0
+
+        for file_path, relativo, tamanho, mtime in ficheiros:
+            entrada = entradas_anteriores.get(relativo)
+            if entrada is None or entrada['tamanho'] != tamanho or entrada['mtime'] != mtime:
+                try:
+                    sha = BackupService._hash(file_path)
+                    existente = por_hash.get(sha)
+                    if existente:
+                        entrada = {'arquivo': existente['arquivo'], 'membro': existente['membro']}
+                    else:
+                        membro = f"media/{relativo}"
+                        compress_type, compresslevel = compressao_utils.tipo_zip(relativo, nivel)
+                        arquivo.write(
+                            file_path, arcname=membro, compress_type=compress_type, compresslevel=compresslevel
+                        )
+                        entrada = {'arquivo': nome_arquivo, 'membro': membro}
+                        guardados += 1
+                except FileNotFoundError:
+                    # Removido durante o backup
+                    continue
+                entrada.update({'sha256': sha, 'tamanho': tamanho, 'mtime': mtime})
+                por_hash.setdefault(sha, entrada)
+            media[relativo] = entrada
+            progresso.avancar(tamanho)
+
+        return {
+            'versao': 1,
+            'arquivo': nome_arquivo,
+            'tipo': 'incremental' if anterior else 'completo',
+            'anterior': nome_anterior,
+            'profundidade': anterior.get('profundidade', 0) + 1 if anterior else 0,
+            'criado_em': timezone.now().isoformat(),
+            'ficheiros_guardados': guardados,
+            'media': media,
+        }
+
+    @staticmethod
+    def arquivos_em_falta(caminho):
+        """Arquivos referenciados pelo backup em `caminho` que não existem na pasta de backups"""
+        manifesto = BackupService.ler_manifesto(caminho)
+        # O nome original do arquivo (pode ter sido renomeado, ex: upload para restauro)
+        nome = (manifesto or {}).get('arquivo', os.path.basename(caminho))
+        referenciados = BackupService.arquivos_referenciados(manifesto) - {nome}
+        return sorted(
+            r for r in referenciados if not os.path.exists(os.path.join(BackupService.DIRECTORIO, r))
+        )
+
+    @staticmethod
+    def restaurar_media(caminho, destino, progresso=None):
+        """
+        Reconstrói a árvore de media completa do backup em `destino`, lendo cada
+        ficheiro do arquivo onde está guardado (o próprio ou backups anteriores).
+        As datas de modificação são repostas, para que o backup seguinte continue
+        incremental. Backups sem manifesto: extrai a pasta media/ do arquivo.
+        `progresso(n_bytes)` é chamado após cada ficheiro.
+        Retorna o número de ficheiros restaurados.
+        """
+        destino_abs = os.path.abspath(destino)
+
+        def caminho_seguro(relativo):
+            alvo = os.path.abspath(os.path.join(destino_abs, relativo))
+            if os.path.commonpath([destino_abs, alvo]) != destino_abs:
+                raise ValueError("Tentativa de Zip Slip detectada!")
+            return alvo
+
+        def copiar(origem, membro, alvo, mtime=None):
+            os.makedirs(os.path.dirname(alvo), exist_ok=True)
+            with origem.open(membro) as entrada, open(alvo, 'wb') as saida:
+                shutil.copyfileobj(entrada, saida, BackupService.CHUNK_SIZE)
+            if mtime is not None:
+                os.utime(alvo, (mtime, mtime))
+            if progresso:
+                progresso(origem.getinfo(membro).file_size)
+
+        with zipfile.ZipFile(caminho) as arquivo:
+            manifesto = BackupService.ler_manifesto(arquivo)
+            if manifesto is None:
+                membros = [m for m in arquivo.namelist() if m.startswith('media/') and not m.endswith('/')]
+                for membro in membros:
+                    copiar(arquivo, membro, caminho_seguro(membro[len('media/'):]))
+                return len(membros)
+
+            em_falta = BackupService.arquivos_em_falta(caminho)
+            if em_falta:
+                raise ValueError(f"Backups de referência em falta: {', '.join(em_falta)}")
+
+            # Agrupado por arquivo de origem: cada ZIP é aberto uma única vez
+            por_arquivo = {}
+            for relativo, entrada in manifesto.get('media', {}).items():
+                por_arquivo.setdefault(entrada['arquivo'], []).append((relativo, entrada))
+
+            nome = manifesto.get('arquivo', os.path.basename(caminho))
+            for nome_origem, entradas in por_arquivo.items():
+                if nome_origem == nome:
+                    origem = arquivo
+                else:
+                    origem = zipfile.ZipFile(os.path.join(BackupService.DIRECTORIO, nome_origem))
+                try:
+                    for relativo, entrada in entradas:
+                        copiar(origem, entrada['membro'], caminho_seguro(relativo), entrada['mtime'])
+                finally:
+                    if origem is not arquivo:
+                        origem.close()
+            return len(manifesto.get('media', {}))
+
+    @staticmethod
+    def executar(job_id):
+        """
+        Executa o backup do job (no processo lançado por `lancar`) e regista-o
+        no catálogo de backups. A reserva é um UPDATE condicional ao estado:
+        retorna None se o job não existir ou já tiver sido executado.
+        """
+        from apis.services.catalogo_backup_service import CatalogoBackupService
+
+        agora = timezone.now()
+        reservado = BackupJob.objects.filter(id_job=job_id, status=BackupJob.STATUS_PENDENTE).update(
+            status=BackupJob.STATUS_PROCESSANDO, iniciado_em=agora, actualizado_em=agora
+        )
+        if not reservado:
+            return None
+        job = BackupJob.objects.get(id_job=job_id)
+
+        os.makedirs(BackupService.DIRECTORIO, exist_ok=True)
+        timestamp = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
+        nome_ficheiro = f"backup_{timestamp}.zip"
+        caminho = os.path.join(BackupService.DIRECTORIO, nome_ficheiro)
+        # Escrito com outra extensão e renomeado no fim: a listagem nunca mostra backups incompletos
+        temporario = f"{caminho}.part"
+
+        progresso = _Progresso(job)
+        try:
+            nome_perfil, codec, nivel = compressao_utils.perfil(job.compressao)
+            tabelas, registos_estimados = CatalogoBackupService.contagem_registos()
+            ficheiros = BackupService.ficheiros_media()
+            tamanho_bd = BackupService._tamanho_base_dados()
+            if tamanho_bd is not None:
+                job.bytes_estimados = tamanho_bd + sum(ficheiro[2] for ficheiro in ficheiros)
+                job.save(update_fields=['bytes_estimados'])
+
+            with zipfile.ZipFile(temporario, 'w', zipfile.ZIP_DEFLATED, allowZip64=True) as arquivo:
+                progresso.fase('Base de dados')
+                membro_dump = BackupService._escrever_dump(arquivo, progresso, codec, nivel)
+
+                progresso.fase('Ficheiros de media')
+                manifesto = BackupService._escrever_media(
+                    arquivo, nome_ficheiro, ficheiros, job.completo, progresso, nivel
+                )
+                manifesto['dump'] = membro_dump
+                manifesto['compressao'] = {'perfil': nome_perfil, 'codec': codec, 'nivel': nivel}
+                arquivo.writestr(BackupService.NOME_MANIFESTO, json.dumps(manifesto))
+
+            progresso.fase('Checksum')
+            sha256 = BackupService._hash(temporario)
+            os.replace(temporario, caminho)
+            CatalogoBackupService.registar(CatalogoBackupService.entrada(
+                caminho, manifesto, sha256=sha256, tabelas=tabelas, registos_estimados=registos_estimados,
+                job_id=job.id_job,
+                duracao=round((timezone.now() - job.iniciado_em).total_seconds(), 1),
+            ))
+
+            job.status = BackupJob.STATUS_CONCLUIDO
+            job.fase = ''
+            job.progresso = 100
+            job.nome_ficheiro = nome_ficheiro
+            job.tamanho = os.path.getsize(caminho)
+            job.erro = None
+        except Exception as e:
+            logger.exception("Erro no backup #%s", job_id)
+            if os.path.exists(temporario):
+                os.remove(temporario)
+            job.status = BackupJob.STATUS_ERRO
+            job.erro = str(e) or e.__class__.__name__
+
+        job.concluido_em = timezone.now()
+        job.save()
+        return job.status
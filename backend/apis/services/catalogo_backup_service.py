@@ -0,0 +1,240 @@
+import os
+import json
+import logging
+import zipfile
+import tempfile
+import datetime
+from contextlib import contextmanager
+from django.db import connection
+
+from apis.services.backup_service import BackupService
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+class CatalogoBackupService:
+    """
+    Catálogo dos arquivos de backup: um ficheiro JSON na pasta de backups com os
+    metadados de cada arquivo (tamanho, duração, SHA-256, registos estimados da
+    base de dados, ficheiros de media, compressão e backups referenciados),
+    gravado quando o backup termina.
+
+    A listagem lê apenas o catálogo, sem abrir nem consultar os arquivos.
+    Fica junto dos arquivos e não na base de dados, que é substituída pelos
+    restauros (perderia os backups posteriores ao restaurado).
+    """
+
+    FICHEIRO = os.path.join(BackupService.DIRECTORIO, 'catalogo.json')
+    FICHEIRO_BLOQUEIO = os.path.join(BackupService.DIRECTORIO, '.catalogo.lock')
+    VERSAO = 1
+
+    @staticmethod
+    @contextmanager
+    def _bloqueio():
+        """Exclusão mútua entre processos (processo do backup e workers da API)"""
+        os.makedirs(BackupService.DIRECTORIO, exist_ok=True)
+        with open(CatalogoBackupService.FICHEIRO_BLOQUEIO, 'w') as f:
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    @staticmethod
+    def _ler_ficheiro():
+        try:
+            with open(CatalogoBackupService.FICHEIRO) as f:
+                return json.load(f).get('backups', {})
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError):
+            logger.warning("Catálogo de backups ilegível: %s", CatalogoBackupService.FICHEIRO)
+            return None
+
+    @staticmethod
+    def _gravar(backups):
+        """Gravação atómica do catálogo (ficheiro temporário + rename)"""
+        fd, temporario = tempfile.mkstemp(dir=BackupService.DIRECTORIO, suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump({'versao': CatalogoBackupService.VERSAO, 'backups': backups}, f, indent=1)
+        os.replace(temporario, CatalogoBackupService.FICHEIRO)
+
+    @staticmethod
+    def ler():
+        """{nome: entrada} de todos os backups; na primeira utilização o catálogo é construído"""
+        backups = CatalogoBackupService._ler_ficheiro()
+        if backups is None:
+            backups = CatalogoBackupService.reconstruir()
+        return backups
+
+    @staticmethod
+    def obter(nome):
+        return CatalogoBackupService.ler().get(nome)
+
+    @staticmethod
+    def listar():
+        """Entradas do catálogo, das mais recentes para as mais antigas"""
+        return sorted(CatalogoBackupService.ler().values(), key=lambda e: e['criado_em'], reverse=True)
+
+    @staticmethod
+    def registar(entrada):
+        with CatalogoBackupService._bloqueio():
+            backups = CatalogoBackupService._ler_ficheiro() or {}
+            backups[entrada['nome']] = entrada
+            CatalogoBackupService._gravar(backups)
+
+    @staticmethod
+    def actualizar(nome, **campos):
+        with CatalogoBackupService._bloqueio():
+            backups = CatalogoBackupService._ler_ficheiro() or {}
+            if nome in backups:
+                backups[nome].update(campos)
+                CatalogoBackupService._gravar(backups)
+
+    @staticmethod
+    def remover(nome):
+        with CatalogoBackupService._bloqueio():
+            backups = CatalogoBackupService._ler_ficheiro()
+            if backups and backups.pop(nome, None) is not None:
+                CatalogoBackupService._gravar(backups)
+
+    @staticmethod
+    def referenciado_por(nome):
+        """Backups (mais recentes) que usam ficheiros de media guardados em `nome`"""
+        return sorted(
+            outro for outro, entrada in CatalogoBackupService.ler().items()
+            if outro != nome and nome in entrada.get('referencias', [])
+        )
+
+    @staticmethod
+    def contagem_registos():
+        """
+        ({tabela: nº de registos}, estimado) de todas as tabelas da base de dados.
+
+        Em PostgreSQL usa a estimativa do planeador (pg_class.reltuples, mantida
+        pelo ANALYZE/autovacuum): um COUNT(*) por tabela percorreria a base de
+        dados inteira antes do pg_dump e, fora do snapshot do dump, também não
+        seria exacto. Tabelas nunca analisadas ficam com None. Noutras bases de
+        dados (desenvolvimento) a contagem é exacta.
+        """
+        contagens = {}
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute(
+                    "SELECT c.relname, c.reltuples::bigint FROM pg_class c "
+                    "JOIN pg_namespace n ON n.oid = c.relnamespace "
+                    "WHERE c.relkind IN ('r', 'p') AND n.nspname = current_schema()"
+                )
+                for tabela, estimativa in cursor.fetchall():
+                    # -1: tabela ainda não analisada (PostgreSQL 14+)
+                    contagens[tabela] = estimativa if estimativa >= 0 else None
+                return dict(sorted(contagens.items())), True
+
+            for tabela in sorted(connection.introspection.table_names(cursor)):
+                cursor.execute(f"SELECT COUNT(*) FROM {connection.ops.quote_name(tabela)}")
+                contagens[tabela] = cursor.fetchone()[0]
+        return contagens, False
+
+    @staticmethod
+    def entrada(caminho, manifesto=None, sha256=None, duracao=None, tabelas=None, job_id=None,
+                registos_estimados=False):
+        """
+        Entrada do catálogo de um arquivo de backup.
+        `tabelas`/`registos_bd` são estimativas quando `registos_estimados` (ver contagem_registos).
+        """
+        info = os.stat(caminho)
+        manifesto = manifesto or {}
+        compressao = manifesto.get('compressao') or {}
+        return {
+            'nome': os.path.basename(caminho),
+            'tamanho': info.st_size,
+            'criado_em': (
+                manifesto.get('criado_em')
+                or datetime.datetime.fromtimestamp(info.st_mtime).astimezone().isoformat()
+            ),
+            'duracao': duracao,
+            'sha256': sha256,
+            'job': job_id,
+            'tipo': manifesto.get('tipo'),
+            'anterior': manifesto.get('anterior'),
+            'compressao': compressao.get('perfil'),
+            'codec': compressao.get('codec'),
+            'registos_bd': sum(n for n in tabelas.values() if n) if tabelas is not None else None,
+            'registos_estimados': registos_estimados,
+            'tabelas': tabelas,
+            'ficheiros_media': len(manifesto['media']) if 'media' in manifesto else None,
+            'ficheiros_guardados': manifesto.get('ficheiros_guardados'),
+            'referencias': sorted(BackupService.arquivos_referenciados(manifesto) - {os.path.basename(caminho)}),
+            'verificado_em': None,
+        }
+
+    @staticmethod
+    def reconstruir(calcular_checksum=False):
+        """
+        Reconstrói o catálogo a partir dos arquivos da pasta de backups (lê o
+        manifesto de cada um). As entradas existentes mantêm checksum, duração
+        e contagens; `calcular_checksum` calcula o SHA-256 dos que não o têm.
+        Retorna {nome: entrada}.
+        """
+        from apis.services.restauro_service import RestauroService
+
+        with CatalogoBackupService._bloqueio():
+            anteriores = CatalogoBackupService._ler_ficheiro() or {}
+            backups = {}
+            if os.path.isdir(BackupService.DIRECTORIO):
+                for nome in os.listdir(BackupService.DIRECTORIO):
+                    if not nome.endswith('.zip') or nome.startswith(RestauroService.PREFIXO_UPLOAD):
+                        continue
+                    caminho = os.path.join(BackupService.DIRECTORIO, nome)
+                    anterior = anteriores.get(nome)
+                    if anterior and anterior['tamanho'] == os.path.getsize(caminho):
+                        backups[nome] = anterior
+                    else:
+                        backups[nome] = CatalogoBackupService.entrada(caminho, BackupService.ler_manifesto(caminho))
+                    if calcular_checksum and not backups[nome]['sha256']:
+                        backups[nome]['sha256'] = BackupService._hash(caminho)
+            CatalogoBackupService._gravar(backups)
+        return backups
+
+    @staticmethod
+    def verificar(nome, membros=False):
+        """
+        Recalcula o SHA-256 do arquivo (leitura em blocos) e compara-o com o do
+        catálogo; com `membros`, verifica também o CRC de cada membro do ZIP
+        (descompressão em streaming). Retorna (ok, mensagem).
+        """
+        entrada = CatalogoBackupService.obter(nome)
+        caminho = os.path.join(BackupService.DIRECTORIO, os.path.basename(nome))
+        if entrada is None:
+            return False, 'não está no catálogo'
+        if not os.path.exists(caminho):
+            return False, 'ficheiro em falta'
+        if not entrada.get('sha256'):
+            return False, 'sem checksum no catálogo'
+
+        tamanho = os.path.getsize(caminho)
+        if tamanho != entrada['tamanho']:
+            return False, f"tamanho diferente ({tamanho} != {entrada['tamanho']} bytes)"
+        if BackupService._hash(caminho) != entrada['sha256']:
+            return False, 'checksum SHA-256 diferente'
+        if membros:
+            try:
+                with zipfile.ZipFile(caminho) as arquivo:
+                    corrompido = arquivo.testzip()
+            except zipfile.BadZipFile as e:
+                return False, f"ZIP inválido: {e}"
+            if corrompido:
+                return False, f"CRC inválido no membro {corrompido}"
+        em_falta = BackupService.arquivos_em_falta(caminho)
+        if em_falta:
+            return False, f"backups de referência em falta: {', '.join(em_falta)}"
+
+        CatalogoBackupService.actualizar(nome, verificado_em=datetime.datetime.now().astimezone().isoformat())
+        return True, 'ok'
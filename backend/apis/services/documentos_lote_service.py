@@ -0,0 +1,229 @@
+import logging
+import multiprocessing
+import threading
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
+from django.conf import settings
+from django.utils import timezone
+
+from apis.models import Aluno, Candidato, Matricula
+
+logger = logging.getLogger(__name__)
+
+
+def _inicializar_worker():
+    """Initializer dos processos do pool (spawn): configura o Django e o registo de recursos dos PDFs"""
+    import django
+    django.setup()
+
+    from apis.services.pdf_service import RecursosPDF
+    RecursosPDF.carregar()
+
+
+def gerar_documento(tipo, pk, site_url):
+    """
+    Ponto de entrada executado nos processos do pool.
+    Retorna (nome do ficheiro, PDF em bytes ou None, mensagem de erro).
+    """
+    try:
+        return DocumentosLoteService.gerar(tipo, pk, site_url)
+    except Exception as e:
+        logger.exception("Erro ao gerar %s #%s", tipo, pk)
+        return f'{tipo}_{pk}.pdf', None, str(e) or e.__class__.__name__
+
+
+class _SaidaZip:
+    """
+    Destino do ZipFile em streaming: acumula os bytes escritos até serem
+    enviados ao cliente. Sem seek/tell, o zipfile escreve os tamanhos em
+    data descriptors e não precisa de voltar atrás no ficheiro.
+    """
+
+    def __init__(self):
+        self._partes = []
+
+    def write(self, dados):
+        self._partes.append(bytes(dados))
+        return len(dados)
+
+    def flush(self):
+        pass
+
+    def esvaziar(self):
+        dados = b''.join(self._partes)
+        self._partes = []
+        return dados
+
+
+class DocumentosLoteService:
+    """
+    Geração em lote de documentos PDF (fichas de matrícula, declarações,
+    comprovativos de inscrição) por turma, sala de exame ou ano lectivo.
+
+    Os PDFs são renderizados em paralelo num pool de processos partilhado
+    (DOCUMENTOS_LOTE_WORKERS) e escritos num ZIP enviado em streaming à medida
+    que cada um termina; o número de documentos em curso é limitado, pelo que
+    a memória não cresce com o tamanho do lote.
+    """
+
+    # Documentos em renderização (ou à espera de serem escritos) por worker do pool
+    DOCUMENTOS_POR_WORKER = 2
+
+    _pool = None
+    _pool_lock = threading.Lock()
+
+    @staticmethod
+    def _contexto_ficha(pk, site_url):
+        matricula = Matricula.objects.select_related(
+            'id_aluno', 'ano_lectivo', 'id_turma__id_curso', 'id_turma__id_classe',
+            'id_turma__id_periodo', 'id_turma__id_sala'
+        ).get(pk=pk)
+        aluno = matricula.id_aluno
+        contexto = {
+            'matricula': matricula,
+            'aluno': aluno,
+            'turma': matricula.id_turma,
+            'encarregados': aluno.alunoencarregado_set.select_related('id_encarregado').all(),
+            'hoje': timezone.now(),
+            'site_url': site_url,
+        }
+        return contexto, f"Ficha_Matricula_{aluno.numero_matricula or aluno.pk}.pdf"
+
+    @staticmethod
+    def _contexto_declaracao(pk, site_url):
+        aluno = Aluno.objects.select_related('id_turma__id_curso').get(pk=pk)
+        contexto = {
+            'aluno': aluno,
+            'solicitacao': None,
+            'hoje': timezone.now(),
+            'site_url': site_url,
+        }
+        return contexto, f"Declaracao_Matricula_{aluno.numero_matricula or aluno.pk}.pdf"
+
+    @staticmethod
+    def _contexto_comprovativo(pk, site_url):
+        from apis.models import ExameAdmissao, RupeCandidato
+
+        candidato = Candidato.objects.select_related('curso_primeira_opcao', 'curso_segunda_opcao').get(pk=pk)
+        contexto = {
+            'candidato': candidato,
+            'exame': ExameAdmissao.objects.select_related('sala').filter(candidato=candidato).first(),
+            'rupe': RupeCandidato.objects.filter(inscricao=candidato).first(),
+            'hoje': timezone.now(),
+            'site_url': site_url,
+        }
+        return contexto, f"Comprovativo_{candidato.numero_inscricao}.pdf"
+
+    # tipo -> (template, método que constrói o contexto)
+    DOCUMENTOS = {
+        'ficha_matricula': ('pdf/ficha_matricula.html', '_contexto_ficha'),
+        'declaracao_matricula': ('pdf/declaracao_matricula.html', '_contexto_declaracao'),
+        'comprovativo_inscricao': ('pdf/comprovativo_inscricao.html', '_contexto_comprovativo'),
+    }
+
+    @staticmethod
+    def gerar(tipo, pk, site_url):
+        """Renderiza um documento: (nome do ficheiro, PDF ou None, erro)"""
+        from apis.services.pdf_service import PDFService
+
+        template, metodo = DocumentosLoteService.DOCUMENTOS[tipo]
+        contexto, nome_ficheiro = getattr(DocumentosLoteService, metodo)(pk, site_url)
+        pdf = PDFService.render_to_pdf(template, contexto)
+        return nome_ficheiro, pdf, None if pdf else 'Erro ao gerar PDF'
+
+    @staticmethod
+    def max_workers():
+        return int(getattr(settings, 'DOCUMENTOS_LOTE_WORKERS', 2))
+
+    @staticmethod
+    def pool():
+        """
+        Pool de processos partilhado pelo worker web (criado no primeiro lote).
+        Usa 'spawn': os processos filhos não herdam as ligações à base de dados
+        nem as threads do servidor.
+        """
+        with DocumentosLoteService._pool_lock:
+            if DocumentosLoteService._pool is None:
+                DocumentosLoteService._pool = ProcessPoolExecutor(
+                    max_workers=DocumentosLoteService.max_workers(),
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=_inicializar_worker,
+                )
+            return DocumentosLoteService._pool
+
+    @staticmethod
+    def _reiniciar_pool():
+        """Descarta um pool avariado (ex: processo filho terminado pelo sistema)"""
+        with DocumentosLoteService._pool_lock:
+            if DocumentosLoteService._pool is not None:
+                DocumentosLoteService._pool.shutdown(wait=False, cancel_futures=True)
+                DocumentosLoteService._pool = None
+
+    @staticmethod
+    def stream_zip(tipo, ids, site_url):
+        """
+        Gerador do ZIP com um PDF por ID, escrito à medida que cada documento termina.
+        Documentos que falhem são listados em ERROS.txt no fim do arquivo.
+        """
+        saida = _SaidaZip()
+        erros = []
+        nomes = set()
+        limite = DocumentosLoteService.max_workers() * DocumentosLoteService.DOCUMENTOS_POR_WORKER
+
+        pool = DocumentosLoteService.pool()
+        pendentes = iter(ids)
+        em_curso = set()
+
+        try:
+            with zipfile.ZipFile(saida, 'w', compression=zipfile.ZIP_DEFLATED) as arquivo:
+                while True:
+                    # Manter no máximo `limite` documentos em curso
+                    while len(em_curso) < limite:
+                        pk = next(pendentes, None)
+                        if pk is None:
+                            break
+                        em_curso.add(pool.submit(gerar_documento, tipo, pk, site_url))
+
+                    if not em_curso:
+                        break
+
+                    concluidos, em_curso = wait(em_curso, return_when=FIRST_COMPLETED)
+                    for futuro in concluidos:
+                        nome_ficheiro, pdf, erro = futuro.result()
+                        if pdf is None:
+                            erros.append(f"{nome_ficheiro}: {erro}")
+                            continue
+
+                        # Nomes repetidos (ex: alunos sem número de matrícula)
+                        base, contador = nome_ficheiro, 1
+                        while nome_ficheiro in nomes:
+                            contador += 1
+                            nome_ficheiro = base.replace('.pdf', f'_{contador}.pdf')
+                        nomes.add(nome_ficheiro)
+
+                        arquivo.writestr(nome_ficheiro, pdf)
+                    yield saida.esvaziar()
+
+                if erros:
+                    arquivo.writestr('ERROS.txt', '\n'.join(erros))
+            yield saida.esvaziar()
+        except BrokenProcessPool:
+            DocumentosLoteService._reiniciar_pool()
+            raise
+        finally:
+            # Erro ou cliente desligado (GeneratorExit): não renderizar o resto do lote
+            for futuro in em_curso:
+                futuro.cancel()
+
+    @staticmethod
+    def resposta(tipo, ids, site_url, nome_ficheiro):
+        """StreamingHttpResponse com o ZIP dos documentos"""
+        from django.http import StreamingHttpResponse
+
+        response = StreamingHttpResponse(
+            DocumentosLoteService.stream_zip(tipo, ids, site_url), content_type='application/zip'
+        )
+        response['Content-Disposition'] = f'attachment; filename="{nome_ficheiro}"'
+        response['X-Accel-Buffering'] = 'no'
+        return response
@@ -0,0 +1,200 @@
+import asyncio
+import json
+import queue
+import re
+import secrets
+import threading
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+
+class BrokerLocal:
+    """
+    Broker em memória (um por processo) para os eventos em tempo real.
+    Cada cliente SSE subscreve uma fila; os eventos são descartados para
+    clientes lentos cuja fila esteja cheia, sem bloquear quem publica.
+    """
+
+    TAMANHO_FILA = 100
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._filas = set()
+
+    def subscrever(self):
+        fila = queue.Queue(maxsize=self.TAMANHO_FILA)
+        with self._lock:
+            self._filas.add(fila)
+        return fila
+
+    def cancelar(self, fila):
+        with self._lock:
+            self._filas.discard(fila)
+
+    @property
+    def tem_subscritores(self):
+        return bool(self._filas)
+
+    def publicar(self, evento, dados):
+        with self._lock:
+            filas = list(self._filas)
+        for fila in filas:
+            try:
+                fila.put_nowait((evento, dados))
+            except queue.Full:
+                pass
+
+
+broker = BrokerLocal()
+
+
+class EventosService:
+    """
+    Feed de alterações (Server-Sent Events) da ocupação das salas e das vagas
+    dos cursos. As matrículas publicam, após o commit, os contadores actualizados
+    das salas e cursos afectados; os clientes recebem-nos sem refazer as listagens.
+    """
+
+    # Intervalo do comentário keep-alive (segundos) e da verificação da fila em ASGI
+    KEEPALIVE = 15
+    INTERVALO_ASSINCRONO = 0.25
+    # Validade (segundos) do bilhete de acesso ao feed
+    BILHETE_VALIDADE = 60
+    BILHETE_RE = re.compile(r'^[A-Za-z0-9_-]{43}$')
+
+    @staticmethod
+    def _chave_bilhete(bilhete):
+        return f'sse_bilhete:{bilhete}'
+
+    @staticmethod
+    def emitir_bilhete(user_type, user_id):
+        """Bilhete de uso único para abrir o feed, guardado na cache partilhada"""
+        bilhete = secrets.token_urlsafe(32)
+        cache.set(
+            EventosService._chave_bilhete(bilhete), {'user_type': user_type, 'user_id': user_id},
+            EventosService.BILHETE_VALIDADE
+        )
+        return bilhete
+
+    @staticmethod
+    def consumir_bilhete(bilhete):
+        """Payload do bilhete (user_type, user_id), ou None; o bilhete deixa de ser válido"""
+        if not bilhete or not EventosService.BILHETE_RE.match(bilhete):
+            return None
+        chave = EventosService._chave_bilhete(bilhete)
+        payload = cache.get(chave)
+        # Só quem remove a chave usa o bilhete (dois pedidos simultâneos não o usam ambos)
+        if payload is None or not cache.delete(chave):
+            return None
+        return payload
+
+    @staticmethod
+    def motivo_indisponivel(assincrono):
+        """
+        Motivo pelo qual o feed não pode ser servido, ou None. O broker é local
+        ao processo: com vários workers, cada cliente só veria as matrículas
+        gravadas no seu worker. Em WSGI cada ligação ocupa um worker enquanto
+        está aberta, pelo que só é aceite em desenvolvimento (DEBUG).
+        """
+        if not getattr(settings, 'EVENTOS_SSE', True):
+            return 'Eventos em tempo real desactivados (EVENTOS_SSE).'
+        if getattr(settings, 'WEB_CONCURRENCY', 1) > 1:
+            return 'Eventos em tempo real indisponíveis com vários workers (broker local ao processo).'
+        if not assincrono and not settings.DEBUG:
+            return 'Eventos em tempo real requerem um servidor ASGI.'
+        return None
+
+    @staticmethod
+    def turma_anterior(matricula):
+        """Turma gravada antes de um save (só consultada quando há subscritores)"""
+        if not matricula.pk or not broker.tem_subscritores:
+            return None
+        from apis.models import Matricula
+        return Matricula.objects.filter(pk=matricula.pk).values_list('id_turma_id', flat=True).first()
+
+    @staticmethod
+    def matricula_alterada(*turma_ids):
+        """Agenda a publicação dos contadores das turmas afectadas para depois do commit"""
+        turma_ids = {pk for pk in turma_ids if pk}
+        if not turma_ids or not broker.tem_subscritores:
+            return
+        transaction.on_commit(lambda: EventosService.publicar_contadores(turma_ids))
+
+    @staticmethod
+    def publicar_contadores(turma_ids):
+        """Recalcula (consultas agrupadas) e publica a ocupação das salas e as vagas dos cursos"""
+        from apis.models import AnoLectivo, Sala, Turma
+        from apis.services.ocupacao_service import OcupacaoService
+        from apis.services.vagas_service import VagasService
+
+        if not broker.tem_subscritores:
+            return
+
+        turmas = list(Turma.objects.filter(pk__in=turma_ids).values('id_sala', 'id_curso'))
+        sala_ids = {t['id_sala'] for t in turmas if t['id_sala']}
+        curso_ids = {t['id_curso'] for t in turmas if t['id_curso']}
+
+        ano_activo = AnoLectivo.get_active_year()
+        ano_id = ano_activo.pk if ano_activo else None
+
+        salas = OcupacaoService.carregar_ocupacao_salas(Sala.objects.filter(pk__in=sala_ids), ano_id)
+        for sala in salas:
+            broker.publicar('ocupacao_sala', {
+                'id_sala': sala.pk,
+                'numero_sala': sala.numero_sala,
+                'total_alunos': sala.num_alunos_activos,
+                'ocupacao_por_periodo': sala.ocupacao_por_periodo,
+            })
+
+        if curso_ids and ano_id:
+            indice = VagasService.construir_indice(curso_ids)
+            for curso_id in curso_ids:
+                vagas, preenchidas, _turmas = VagasService.obter(indice, curso_id, ano_id)
+                broker.publicar('vagas_curso', {
+                    'id_curso': curso_id,
+                    'ano_lectivo': ano_id,
+                    'vagas_totais': vagas,
+                    'vagas_preenchidas': preenchidas,
+                    'vagas_disponiveis': max(0, vagas - preenchidas),
+                })
+
+    @staticmethod
+    def _formatar(evento, dados):
+        return f"event: {evento}\ndata: {json.dumps(dados, ensure_ascii=False)}\n\n"
+
+    @staticmethod
+    def stream(fila):
+        """Gerador síncrono (WSGI): bloqueia na fila até haver eventos"""
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                try:
+                    evento, dados = fila.get(timeout=EventosService.KEEPALIVE)
+                except queue.Empty:
+                    yield ": keepalive\n\n"
+                    continue
+                yield EventosService._formatar(evento, dados)
+        finally:
+            broker.cancelar(fila)
+
+    @staticmethod
+    async def stream_assincrono(fila):
+        """Gerador assíncrono (ASGI): não ocupa uma thread por cliente ligado"""
+        try:
+            yield "retry: 3000\n\n"
+            espera = 0.0
+            while True:
+                try:
+                    evento, dados = fila.get_nowait()
+                except queue.Empty:
+                    await asyncio.sleep(EventosService.INTERVALO_ASSINCRONO)
+                    espera += EventosService.INTERVALO_ASSINCRONO
+                    if espera >= EventosService.KEEPALIVE:
+                        espera = 0.0
+                        yield ": keepalive\n\n"
+                    continue
+                espera = 0.0
+                yield EventosService._formatar(evento, dados)
+        finally:
+            broker.cancelar(fila)
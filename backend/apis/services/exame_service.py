@@ -0,0 +1,142 @@
+import datetime
+from django.db import transaction
+from django.utils import timezone
+from apis.models import Candidato, ExameAdmissao
+from apis.utils.cache_utils import invalidar_apos_commit, NS_CANDIDATOS_STATUS
+
+
+class ExameService:
+    """
+    Serviço de agendamento dos exames de admissão.
+    O plano de distribuição é calculado inteiramente em memória e só depois
+    gravado em lote, numa única transacção.
+    """
+
+    # Janelas de exame: 08h-12h e 13h-16h, sessões de 2 horas
+    HORA_ALMOCO = 12
+    HORA_REINICIO_TARDE = 13
+    HORA_FIM_DIA = 16
+    HORA_INICIO_DIA = 8
+    DURACAO_SESSAO = datetime.timedelta(hours=2)
+
+    BATCH_SIZE = 1000
+
+    @staticmethod
+    def planear_distribuicao(candidatos, salas, data_inicio, capacidade_por_sala=None):
+        """
+        Distribui os candidatos pelas salas, sessão a sessão, respeitando as
+        janelas de horário. Não acede à base de dados.
+
+        Retorna uma lista de (candidato, sala, data_exame) pela ordem dos candidatos.
+        """
+        salas = list(salas)
+        capacidades = [
+            int(capacidade_por_sala) if capacidade_por_sala else sala.capacidade_alunos
+            for sala in salas
+        ]
+        if not salas or sum(capacidades) <= 0:
+            raise ValueError('As salas disponíveis não têm capacidade para candidatos.')
+
+        plano = []
+        data_atual = data_inicio
+        idx = 0
+        total = len(candidatos)
+
+        while idx < total:
+            current_hour = data_atual.hour
+
+            # Se cair no intervalo de almoço (12:xx), salta para as 13h
+            if ExameService.HORA_ALMOCO <= current_hour < ExameService.HORA_REINICIO_TARDE:
+                data_atual = data_atual.replace(hour=ExameService.HORA_REINICIO_TARDE, minute=0)
+
+            # Se passar das 16:xx, salta para as 08h do dia seguinte
+            if current_hour >= ExameService.HORA_FIM_DIA:
+                data_atual = data_atual.replace(hour=ExameService.HORA_INICIO_DIA, minute=0) + datetime.timedelta(days=1)
+
+            # Preencher cada sala no horário actual
+            for sala, capacidade in zip(salas, capacidades):
+                if idx >= total:
+                    break
+                for cand in candidatos[idx:idx + capacidade]:
+                    plano.append((cand, sala, data_atual))
+                idx += capacidade
+
+            data_atual += ExameService.DURACAO_SESSAO
+
+        return plano
+
+    @staticmethod
+    def resumir_plano(plano):
+        """Resumo por sessão (data/sala) para a pré-visualização do plano"""
+        sessoes = {}
+        for _cand, sala, data_exame in plano:
+            chave = (data_exame, sala.numero_sala)
+            sessoes[chave] = sessoes.get(chave, 0) + 1
+
+        return [
+            {
+                'data_exame': data_exame.strftime('%Y-%m-%d %H:%M'),
+                'sala': numero_sala,
+                'candidatos': total
+            }
+            for (data_exame, numero_sala), total in sorted(sessoes.items())
+        ]
+
+    @staticmethod
+    def aplicar_distribuicao(plano):
+        """
+        Grava o plano numa única transacção: cria os exames em falta e actualiza
+        os já existentes com bulk_create/bulk_update.
+        """
+        if not plano:
+            return 0
+
+        candidato_ids = [cand.pk for cand, _sala, _data in plano]
+        lotes_ids = [
+            candidato_ids[i:i + ExameService.BATCH_SIZE]
+            for i in range(0, len(candidato_ids), ExameService.BATCH_SIZE)
+        ]
+        agora = timezone.now()
+
+        with transaction.atomic():
+            existentes = {}
+            for lote in lotes_ids:
+                for exame in ExameAdmissao.objects.select_for_update().filter(candidato_id__in=lote):
+                    existentes[exame.candidato_id] = exame
+
+            novos = []
+            a_actualizar = []
+            for cand, sala, data_exame in plano:
+                if timezone.is_naive(data_exame):
+                    data_exame = timezone.make_aware(data_exame)
+
+                exame = existentes.get(cand.pk)
+                if exame:
+                    exame.data_exame = data_exame
+                    exame.sala = sala
+                    exame.realizado = False
+                    exame.atualizado_em = agora
+                    a_actualizar.append(exame)
+                else:
+                    novos.append(ExameAdmissao(
+                        candidato_id=cand.pk,
+                        data_exame=data_exame,
+                        sala=sala,
+                        realizado=False
+                    ))
+
+            ExameAdmissao.objects.bulk_create(novos, batch_size=ExameService.BATCH_SIZE)
+            if a_actualizar:
+                ExameAdmissao.objects.bulk_update(
+                    a_actualizar, ['data_exame', 'sala', 'realizado', 'atualizado_em'],
+                    batch_size=ExameService.BATCH_SIZE
+                )
+
+            # Os candidatos agendados permanecem INSCRITO; apenas marcamos a alteração
+            for lote in lotes_ids:
+                Candidato.objects.filter(pk__in=lote).update(status='INSCRITO', atualizado_em=agora)
+
+            # bulk_create/update não chamam save(): invalidar a consulta de status aqui
+            invalidar_apos_commit(namespaces=[NS_CANDIDATOS_STATUS])
+
+        return len(plano)
@@ -1,5 +1,5 @@
 from django.utils import timezone
-from apis.models import Notificacao, AnoLectivo, AgendamentoBackup
+from apis.models import Notificacao, AnoLectivo
 import datetime
 
 class NotificationService:
@@ -8,8 +8,9 @@ class NotificationService:
     @staticmethod
     def check_and_create_notifications():
         """
-        Verifica datas importantes e agendamentos para criar notificações.
+        Verifica datas importantes para criar notificações.
         Este método deve ser chamado periodicamente ou em pontos de entrada frequentes.
+        Os backups agendados são executados (e notificados) pelo AgendamentoBackupService.
         """
         now = timezone.now()
         today = now.date()
@@ -44,23 +45,6 @@ class NotificationService:
                     link="/inscritos"
                 )
 
-        # 2. Verificar Agendamentos de Backup
-        # Procurar agendamentos para agora ou passados que ainda não foram notificados
-        agendamentos = AgendamentoBackup.objects.filter(
-            data_hora__lte=now,
-            notificado=False
-        )
-
-        for agendamento in agendamentos:
-            NotificationService._create_unique_notification(
-                titulo="Backup Agendado",
-                mensagem=f"É hora de realizar o backup agendado: {agendamento.descricao or 'Backup do Sistema'}",
-                tipo="info",
-                link="/configuracoes"
-            )
-            agendamento.notificado = True
-            agendamento.save()
-
     @staticmethod
     def _create_unique_notification(titulo, mensagem, tipo="info", link=None):
         """Evita criar notificações duplicadas para o mesmo evento no mesmo dia."""
@@ -0,0 +1,90 @@
+from django.db.models import Count, Q
+from apis.models import Aluno, AnoLectivo
+
+
+class OcupacaoService:
+    """
+    Serviço para cálculo agregado da ocupação de Salas e Turmas.
+    Substitui as contagens por linha (N+1) dos serializers por anotações
+    e consultas agrupadas executadas uma única vez por página.
+    """
+
+    STATUS_ALUNO_ACTIVO = ['Ativo', 'Activo']
+
+    @staticmethod
+    def resolver_ano_id(request=None):
+        """
+        Retorna o ID do ano lectivo a considerar:
+        query param 'ano_lectivo' ou, em alternativa, o ano activo (cache).
+        """
+        ano_id = request.query_params.get('ano_lectivo') if request else None
+        if ano_id:
+            return ano_id
+
+        active_year = AnoLectivo.get_active_year()
+        return active_year.pk if active_year else None
+
+    @staticmethod
+    def anotar_turmas(queryset):
+        """
+        Anota cada Turma com o número de alunos activos (num_alunos_activos)
+        na mesma consulta da listagem.
+        """
+        return queryset.annotate(
+            num_alunos_activos=Count(
+                'aluno',
+                filter=Q(aluno__status_aluno__in=OcupacaoService.STATUS_ALUNO_ACTIVO)
+            )
+        )
+
+    @staticmethod
+    def carregar_ocupacao_salas(salas, ano_id):
+        """
+        Calcula, numa única consulta agrupada, a ocupação por período de todas
+        as salas recebidas e guarda o resultado em cada instância:
+            sala.ocupacao_por_periodo = {'Manhã': 30, 'Tarde': 20}
+            sala.num_alunos_activos = 50
+        """
+        salas = list(salas)
+        if not salas:
+            return salas
+
+        ocupacao = {sala.pk: {} for sala in salas}
+
+        if ano_id:
+            stats = Aluno.objects.filter(
+                id_turma__id_sala__in=list(ocupacao.keys()),
+                id_turma__ano_lectivo_id=ano_id,
+                status_aluno__in=OcupacaoService.STATUS_ALUNO_ACTIVO
+            ).values(
+                'id_turma__id_sala', 'id_turma__id_periodo__periodo'
+            ).annotate(total=Count('id_aluno'))
+
+            for item in stats:
+                periodo = item['id_turma__id_periodo__periodo'] or 'Sem Turno'
+                ocupacao[item['id_turma__id_sala']][periodo] = item['total']
+
+        for sala in salas:
+            sala.ocupacao_por_periodo = ocupacao[sala.pk]
+            sala.num_alunos_activos = sum(ocupacao[sala.pk].values())
+
+        return salas
+
+    @staticmethod
+    def alunos_activos_por_sala(sala_ids=None):
+        """
+        Retorna {id_sala: alunos activos} (todas as turmas da sala) numa única
+        consulta agrupada, independentemente do número de salas.
+        """
+        alunos = Aluno.objects.filter(
+            status_aluno__in=OcupacaoService.STATUS_ALUNO_ACTIVO,
+            id_turma__id_sala__isnull=False
+        )
+        if sala_ids is not None:
+            alunos = alunos.filter(id_turma__id_sala__in=sala_ids)
+
+        return dict(
+            alunos.order_by().values('id_turma__id_sala')
+            .annotate(total=Count('id_aluno'))
+            .values_list('id_turma__id_sala', 'total')
+        )
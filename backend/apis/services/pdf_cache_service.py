@@ -0,0 +1,176 @@
+import os
+import json
+import hashlib
+import logging
+import tempfile
+import threading
+from io import BytesIO
+from django.conf import settings
+from django.template.loader import get_template
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+
+class PDFCacheService:
+    """
+    Cache em disco dos PDFs gerados, endereçada pelo conteúdo do pedido:
+    a chave é o hash do template (incluindo a data de modificação do ficheiro),
+    dos parâmetros e da versão dos dados usados no documento. Quando os dados
+    não mudam (ex: anos lectivos encerrados) o PDF é servido do disco sem
+    voltar a consultar a base de dados nem a executar o xhtml2pdf.
+
+    Os documentos imprimem a data de emissão ('hoje'), pelo que a chave inclui
+    também o dia local: um PDF em cache nunca é servido com a data de outro dia.
+    A hora não entra na chave, pelo que os documentos em cache são gerados com
+    `contexto()` e imprimem só a data (ver pdf/base_documento.html).
+
+    O espaço ocupado é limitado (PDF_CACHE_MAX_MB): ao exceder, removem-se os
+    ficheiros usados há mais tempo (a data de modificação marca o último acesso).
+    """
+
+    # Incrementar quando o formato da chave mudar
+    FORMATO = 3
+
+    _lock = threading.Lock()
+
+    @staticmethod
+    def directorio():
+        return str(getattr(settings, 'PDF_CACHE_DIR', os.path.join(settings.BASE_DIR, 'pdf_cache')))
+
+    @staticmethod
+    def tamanho_maximo():
+        return int(getattr(settings, 'PDF_CACHE_MAX_MB', 200)) * 1024 * 1024
+
+    @staticmethod
+    def _versao_template(template_src):
+        """Data de modificação do template: alterar o layout invalida os PDFs antigos"""
+        origem = getattr(get_template(template_src), 'origin', None)
+        try:
+            return os.path.getmtime(origem.name)
+        except (AttributeError, TypeError, OSError):
+            return None
+
+    @staticmethod
+    def contexto(contexto):
+        """Contexto de um documento em cache: sem a hora de emissão, que ficaria desactualizada"""
+        return {**contexto, 'pdf_em_cache': True}
+
+    @staticmethod
+    def chave(template_src, parametros, versao):
+        conteudo = json.dumps(
+            [PDFCacheService.FORMATO, template_src, PDFCacheService._versao_template(template_src),
+             timezone.localdate().isoformat(), parametros, versao],
+            sort_keys=True, default=str
+        )
+        return hashlib.sha256(conteudo.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def _caminho(chave):
+        return os.path.join(PDFCacheService.directorio(), chave[:2], f'{chave}.pdf')
+
+    @staticmethod
+    def obter(chave):
+        """Caminho do PDF em cache (ou None), marcando-o como usado recentemente"""
+        caminho = PDFCacheService._caminho(chave)
+        try:
+            os.utime(caminho)
+        except OSError:
+            return None
+        return caminho
+
+    @staticmethod
+    def guardar(chave, conteudo):
+        """Grava o PDF de forma atómica (ficheiro temporário + rename) e aplica o limite de espaço"""
+        caminho = PDFCacheService._caminho(chave)
+        os.makedirs(os.path.dirname(caminho), exist_ok=True)
+
+        fd, temporario = tempfile.mkstemp(dir=os.path.dirname(caminho), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(conteudo)
+            os.replace(temporario, caminho)
+        except OSError:
+            if os.path.exists(temporario):
+                os.remove(temporario)
+            raise
+
+        PDFCacheService.limitar()
+        return caminho
+
+    @staticmethod
+    def obter_ou_gerar(template_src, parametros, versao, gerar):
+        """
+        Retorna o PDF (ficheiro aberto para leitura, pronto para FileResponse)
+        a partir da cache ou gerado com `gerar()` (bytes ou None).
+        Retorna None se a geração falhar. Erros de escrita na cache não impedem
+        a resposta: nesse caso o PDF é servido a partir da memória.
+        """
+        chave = PDFCacheService.chave(template_src, parametros, versao)
+        caminho = PDFCacheService.obter(chave)
+        if caminho:
+            try:
+                return open(caminho, 'rb')
+            except OSError:
+                # Removido entretanto (ex: limite de espaço atingido noutro worker)
+                pass
+
+        conteudo = gerar()
+        if conteudo is None:
+            return None
+
+        try:
+            return open(PDFCacheService.guardar(chave, conteudo), 'rb')
+        except OSError as e:
+            logger.warning("Não foi possível gravar o PDF na cache: %s", e)
+            return BytesIO(conteudo)
+
+    @staticmethod
+    def _ficheiros():
+        """[(mtime, tamanho, caminho)] dos PDFs em cache"""
+        ficheiros = []
+        for raiz, _dirs, nomes in os.walk(PDFCacheService.directorio()):
+            for nome in nomes:
+                if not nome.endswith('.pdf'):
+                    continue
+                caminho = os.path.join(raiz, nome)
+                try:
+                    info = os.stat(caminho)
+                except OSError:
+                    continue
+                ficheiros.append((info.st_mtime, info.st_size, caminho))
+        return ficheiros
+
+    @staticmethod
+    def limitar():
+        """Remove os PDFs usados há mais tempo até o total caber no limite (LRU)"""
+        maximo = PDFCacheService.tamanho_maximo()
+        with PDFCacheService._lock:
+            ficheiros = PDFCacheService._ficheiros()
+            total = sum(tamanho for _mtime, tamanho, _caminho in ficheiros)
+            if total <= maximo:
+                return 0
+
+            removidos = 0
+            for _mtime, tamanho, caminho in sorted(ficheiros):
+                try:
+                    os.remove(caminho)
+                except OSError:
+                    continue
+                total -= tamanho
+                removidos += 1
+                if total <= maximo:
+                    break
+            return removidos
+
+    @staticmethod
+    def limpar():
+        """Remove todos os PDFs em cache"""
+        removidos = 0
+        for _mtime, _tamanho, caminho in PDFCacheService._ficheiros():
+            try:
+                os.remove(caminho)
+                removidos += 1
+            except OSError:
+                pass
+        return removidos
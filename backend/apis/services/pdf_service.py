@@ -1,11 +1,138 @@
 import os
+import base64
+import logging
+import mimetypes
+import threading
 from io import BytesIO
+from urllib.parse import urlparse
 from django.conf import settings
 from django.template.loader import get_template
 from xhtml2pdf import pisa
 from django.utils import timezone
 from pathlib import Path
 
+logger = logging.getLogger(__name__)
+
+
+class RecursosPDF:
+    """
+    Registo dos recursos estáticos usados nos PDFs (logótipos, CSS, fontes).
+
+    É construído uma única vez por processo: percorre STATIC_ROOT e
+    STATICFILES_DIRS e mapeia cada URI estático para o caminho absoluto;
+    as imagens e fontes pequenas ficam em memória (como data URI) a partir
+    da primeira utilização.
+    A resolução durante a renderização é apenas uma consulta ao dicionário:
+    sem verificações no sistema de ficheiros nem pedidos HTTP ao próprio
+    servidor (que podiam bloquear o runserver). Recursos em falta são
+    registados no log uma única vez.
+    """
+
+    # Imagens/fontes até este tamanho são mantidas em memória
+    TAMANHO_MAXIMO_MEMORIA = 1024 * 1024
+    EXTENSOES_MEMORIA = {'.png', '.jpg', '.jpeg', '.gif', '.bmp', '.ttf', '.otf'}
+
+    _caminhos = None
+    _conteudos = {}
+    _avisados = set()
+    _lock = threading.Lock()
+
+    @staticmethod
+    def _prefixo(url):
+        url = urlparse(str(url)).path
+        return '/' + url.strip('/') + '/'
+
+    @staticmethod
+    def carregar():
+        """Constrói o registo (se ainda não existir) e retorna {caminho relativo: caminho absoluto}"""
+        if RecursosPDF._caminhos is not None:
+            return RecursosPDF._caminhos
+
+        with RecursosPDF._lock:
+            if RecursosPDF._caminhos is not None:
+                return RecursosPDF._caminhos
+
+            # STATIC_ROOT (collectstatic) tem prioridade sobre as pastas de desenvolvimento
+            directorios = [settings.STATIC_ROOT] if settings.STATIC_ROOT else []
+            directorios += list(settings.STATICFILES_DIRS)
+
+            caminhos = {}
+            for directorio in directorios:
+                directorio = str(directorio[1] if isinstance(directorio, (list, tuple)) else directorio)
+                for raiz, _dirs, nomes in os.walk(directorio):
+                    for nome in nomes:
+                        absoluto = os.path.normpath(os.path.join(raiz, nome))
+                        relativo = os.path.relpath(absoluto, directorio).replace(os.sep, '/')
+                        caminhos.setdefault(relativo, absoluto)
+
+            RecursosPDF._conteudos = {}
+            RecursosPDF._caminhos = caminhos
+            logger.debug("Recursos PDF: %d ficheiros estáticos registados", len(caminhos))
+            return caminhos
+
+    @staticmethod
+    def _conteudo(relativo, caminho):
+        """
+        Imagens e fontes pequenas como data URI, lidas do disco uma única vez
+        (apenas as usadas nos documentos ficam em memória). None para os restantes.
+        """
+        if relativo in RecursosPDF._conteudos:
+            return RecursosPDF._conteudos[relativo]
+
+        conteudo = None
+        if os.path.splitext(relativo)[1].lower() in RecursosPDF.EXTENSOES_MEMORIA:
+            try:
+                with open(caminho, 'rb') as f:
+                    dados = f.read(RecursosPDF.TAMANHO_MAXIMO_MEMORIA + 1)
+                if len(dados) <= RecursosPDF.TAMANHO_MAXIMO_MEMORIA:
+                    tipo = mimetypes.guess_type(caminho)[0] or 'application/octet-stream'
+                    conteudo = f"data:{tipo};base64,{base64.b64encode(dados).decode('ascii')}"
+            except OSError:
+                pass
+        RecursosPDF._conteudos[relativo] = conteudo
+        return conteudo
+
+    @staticmethod
+    def _em_falta(uri, caminho):
+        """Aviso único por recurso em falta; o caminho local (inexistente) evita o download via HTTP"""
+        if uri not in RecursosPDF._avisados:
+            RecursosPDF._avisados.add(uri)
+            logger.warning("[PDFService] Recurso não encontrado localmente: %s", uri)
+        return caminho
+
+    @staticmethod
+    def resolver(uri, rel=None):
+        """
+        link_callback do xhtml2pdf: converte URIs de ficheiros estáticos/media
+        em data URIs (recursos mantidos em memória) ou caminhos absolutos do sistema
+        """
+        if uri.startswith('data:'):
+            return uri
+
+        caminhos = RecursosPDF.carregar()
+        url = urlparse(uri)
+        caminho_uri = '/' + url.path.lstrip('/')
+
+        # Ficheiros estáticos: apenas o registo (inclui URLs absolutos do próprio site)
+        static_url = RecursosPDF._prefixo(settings.STATIC_URL)
+        if caminho_uri.startswith(static_url):
+            relativo = caminho_uri[len(static_url):]
+            if relativo in caminhos:
+                return RecursosPDF._conteudo(relativo, caminhos[relativo]) or caminhos[relativo]
+            return RecursosPDF._em_falta(uri, os.path.normpath(os.path.join(str(settings.STATIC_ROOT), relativo)))
+
+        # Ficheiros de media (carregados pelos utilizadores): caminho directo em MEDIA_ROOT
+        media_url = RecursosPDF._prefixo(settings.MEDIA_URL)
+        if caminho_uri.startswith(media_url):
+            return os.path.normpath(os.path.join(str(settings.MEDIA_ROOT), caminho_uri[len(media_url):]))
+
+        # Caminhos absolutos do sistema (ex: FileField.path)
+        if os.path.isabs(uri) and url.scheme not in ('http', 'https', 'file'):
+            return os.path.normpath(uri)
+
+        return RecursosPDF._em_falta(uri, os.path.normpath(uri if not url.scheme else url.path.lstrip('/')))
+
+
 class PDFService:
     """
     Serviço para geração de documentos PDF a partir de templates HTML
@@ -20,59 +147,28 @@ class PDFService:
         html = template.render(context_dict)
         result = BytesIO()
         
-        # Função para resolver caminhos de recursos (imagens, css) no PDF
-        def link_callback(uri, rel):
-            """
-            Converte URIs de arquivos estáticos/mídia em caminhos absolutos do sistema
-            """
-            sUrl = settings.STATIC_URL
-            sRoot = settings.STATIC_ROOT
-            mUrl = settings.MEDIA_URL
-            mRoot = settings.MEDIA_ROOT
-
-            # Normalização de URIs e URLs de configuração
-            sUrl_norm = sUrl if sUrl.startswith('/') else '/' + sUrl
-            mUrl_norm = mUrl if mUrl.startswith('/') else '/' + mUrl
-            uri_norm = uri if uri.startswith('/') else '/' + uri
-            
-            # Caminho final padrão
-            path = uri
-
-            # Prioridade 1: Media Files
-            if uri_norm.startswith(mUrl_norm):
-                relative = uri_norm[len(mUrl_norm):].lstrip('/')
-                path = os.path.join(mRoot, relative)
-            
-            # Prioridade 2: Static Files
-            elif uri_norm.startswith(sUrl_norm):
-                relative = uri_norm[len(sUrl_norm):].lstrip('/')
-                path = os.path.join(sRoot, relative)
-                
-                # Fallback para desenvolvimento (look in STATICFILES_DIRS)
-                if not os.path.isfile(path) and settings.DEBUG:
-                    for static_dir in settings.STATICFILES_DIRS:
-                        possible_path = os.path.join(str(static_dir), relative)
-                        if os.path.isfile(possible_path):
-                            path = possible_path
-                            break
-
-            # Normalização de barras (essencial para Windows)
-            path = os.path.normpath(path)
-            
-            # Se o arquivo não existir localmente, retorna o URI original 
-            # (o xhtml2pdf tentará buscar via HTTP, o que pode causar deadlock no runserver)
-            if not os.path.isfile(path):
-                print(f"⚠️ [PDFService] Recurso não encontrado localmente: {path}")
-                return uri 
-                
-            return path
-
-        pdf = pisa.pisaDocument(BytesIO(html.encode("UTF-8")), result, link_callback=link_callback)
+        pdf = pisa.pisaDocument(BytesIO(html.encode("UTF-8")), result, link_callback=RecursosPDF.resolver)
         
         if not pdf.err:
             return result.getvalue()
         return None
 
+    @staticmethod
+    def render_to_pdf_cached(template_src, context_dict, parametros, versao):
+        """
+        Versão com cache em disco de render_to_pdf (ver PDFCacheService).
+        `versao` identifica o estado dos dados usados no documento; `context_dict`
+        pode ser uma função, chamada apenas quando o PDF não está em cache.
+        Retorna um ficheiro aberto (para FileResponse) ou None em caso de erro.
+        """
+        from apis.services.pdf_cache_service import PDFCacheService
+
+        def gerar():
+            contexto = context_dict() if callable(context_dict) else context_dict
+            return PDFService.render_to_pdf(template_src, PDFCacheService.contexto(contexto))
+
+        return PDFCacheService.obter_ou_gerar(template_src, parametros, versao, gerar)
+
     @staticmethod
     def save_pdf(pdf_content, filename, sub_dir='documentos'):
         """
@@ -0,0 +1,118 @@
+from django.core.cache import cache
+from django.db import router
+from apis.models import Funcionario, Usuario, Aluno, Encarregado
+from apis.permissions.custom_permissions import compilar_permissoes, resolver_cargo
+from apis.utils.cache_utils import chave, invalidar_apos_commit, invalidar_namespace
+
+NS_PRINCIPAIS = 'principais'
+
+
+class PrincipalService:
+    """
+    Resolução em cache do utilizador autenticado (principal).
+    Guarda, por (user_type, user_id, versão), apenas um resumo compacto
+    (cargo, superusuário, permissões) usado pelas classes de permissão,
+    evitando consultas à base de dados em cada request. O perfil não é
+    guardado (nem a senha_hash): em cache, o request recebe uma referência
+    com os restantes campos diferidos, lidos da base de dados só se usados.
+
+    A versão é a geração do namespace 'principais' na cache partilhada:
+    alterações de perfil removem a chave do utilizador e alterações de cargo
+    invalidam todos os principais de uma vez.
+    """
+
+    TIMEOUT = 300
+    # Incrementar quando o formato do resumo mudar (chaves antigas deixam de ser lidas)
+    FORMATO = 4
+
+    # Consultas por tipo de utilizador (com as relações usadas pelas permissões)
+    CONSULTAS = {
+        'funcionario': lambda user_id: Funcionario.objects.select_related('id_cargo').get(id_funcionario=user_id),
+        'usuario': lambda user_id: Usuario.objects.select_related('user', 'cargo').get(id_usuario=user_id),
+        'aluno': lambda user_id: Aluno.objects.get(id_aluno=user_id),
+        'encarregado': lambda user_id: Encarregado.objects.get(id_encarregado=user_id),
+    }
+
+    MODELOS = {
+        'funcionario': Funcionario,
+        'usuario': Usuario,
+        'aluno': Aluno,
+        'encarregado': Encarregado,
+    }
+
+    @staticmethod
+    def chave_cache(user_type, user_id):
+        return chave(NS_PRINCIPAIS, PrincipalService.FORMATO, user_type, user_id)
+
+    @staticmethod
+    def resumir(user, user_type):
+        """Resumo compacto do principal: identidade, cargo e permissões"""
+        cargo = ''
+        permissoes = []
+        is_superuser = False
+
+        if user_type == 'funcionario':
+            cargo = resolver_cargo(user.id_cargo.nome_cargo if user.id_cargo else None)
+            permissoes = user.permissoes_adicionais
+            is_superuser = user.is_superuser
+        elif user_type == 'usuario':
+            # O cargo (o mesmo que vai no token) tem precedência; 'papel' tem
+            # sempre valor ('Comum' por defeito) e só conta sem cargo atribuído
+            cargo = resolver_cargo(user.cargo.nome_cargo if user.cargo else None, user)
+            permissoes = user.permissoes
+            is_superuser = user.is_superuser
+
+        acesso_total, permissoes_efectivas = compilar_permissoes(permissoes, cargo, is_superuser)
+        return {
+            'user_type': user_type,
+            'user_id': user.pk,
+            'cargo': cargo,
+            'is_superuser': bool(is_superuser),
+            # Permissões efectivas (explícitas ou do cargo), verificadas em O(1)
+            'acesso_total': acesso_total,
+            'permissoes': permissoes_efectivas,
+        }
+
+    @staticmethod
+    def referencia(user_type, principal):
+        """
+        Instância do perfil com apenas a chave primária e is_superuser carregados;
+        os outros campos são diferidos (uma consulta no primeiro acesso) e um
+        save() grava só os campos carregados.
+        """
+        modelo = PrincipalService.MODELOS[user_type]
+        conhecidos = {modelo._meta.pk.attname: principal['user_id'], 'is_superuser': principal['is_superuser']}
+        campos = [f.attname for f in modelo._meta.concrete_fields if f.attname in conhecidos]
+        return modelo.from_db(router.db_for_read(modelo), campos, [conhecidos[c] for c in campos])
+
+    @staticmethod
+    def carregar(user_type, user_id):
+        """
+        Retorna (user, principal) a partir da cache ou, em falta, da base de dados.
+        Lança DoesNotExist do modelo correspondente se o utilizador não existir.
+        """
+        consulta = PrincipalService.CONSULTAS.get(user_type)
+        if consulta is None:
+            return None, None
+
+        cache_key = PrincipalService.chave_cache(user_type, user_id)
+        principal = cache.get(cache_key)
+        if principal:
+            return PrincipalService.referencia(user_type, principal), principal
+
+        user = consulta(user_id)
+        principal = PrincipalService.resumir(user, user_type)
+        cache.set(cache_key, principal, PrincipalService.TIMEOUT)
+        return user, principal
+
+    @staticmethod
+    def invalidar(user_type, *user_ids):
+        """Remove os principais da cache (alteração de perfil ou permissões)"""
+        chaves = [PrincipalService.chave_cache(user_type, user_id) for user_id in user_ids if user_id]
+        if chaves:
+            invalidar_apos_commit(*chaves)
+
+    @staticmethod
+    def invalidar_todos():
+        """Invalida todos os principais (ex: cargo renomeado)"""
+        invalidar_namespace(NS_PRINCIPAIS)
@@ -0,0 +1,199 @@
+import time
+import logging
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
+from datetime import timedelta
+from django.conf import settings
+from django.core.exceptions import ObjectDoesNotExist
+from django.core.files.base import ContentFile
+from django.db import connections
+from django.utils import timezone
+
+from apis.models import RelatorioJob
+from apis.services.relatorio_service import RelatorioService
+
+logger = logging.getLogger(__name__)
+
+
+def _inicializar_worker():
+    """Initializer dos processos do pool: Django configurado, sem ligações herdadas do pai e com o registo de recursos dos PDFs"""
+    import django
+    django.setup()
+
+    from apis.services.pdf_service import RecursosPDF
+    RecursosPDF.carregar()
+    connections.close_all()
+
+
+def executar_job(job_id):
+    """Ponto de entrada (serializável) executado nos processos do pool"""
+    return RelatorioJobService.executar(job_id)
+
+
+class RelatorioJobService:
+    """
+    Fila de relatórios em PDF processados em segundo plano.
+    Os pedidos são registados em RelatorioJob pela API e executados por um
+    pool de processos com concorrência limitada (comando `processar_relatorios`),
+    para que os workers web nunca fiquem bloqueados na renderização do xhtml2pdf.
+    """
+
+    # Número máximo de relatórios renderizados em simultâneo
+    MAX_WORKERS = getattr(settings, 'RELATORIOS_WORKERS', 2)
+    # Intervalo de verificação da fila (segundos)
+    INTERVALO = 2
+    # Jobs 'Em Processamento' há mais tempo do que isto são considerados interrompidos
+    TEMPO_MAXIMO = timedelta(minutes=30)
+
+    @staticmethod
+    def submeter(tipo, parametros, user_type='', user_id=None):
+        """Regista o pedido (lança ValueError para relatórios desconhecidos)"""
+        if not RelatorioService.existe(tipo):
+            raise ValueError(f'Relatório desconhecido: {tipo}')
+        return RelatorioJob.objects.create(
+            tipo=tipo,
+            parametros=parametros,
+            solicitado_por_tipo=user_type or '',
+            solicitado_por_id=user_id,
+        )
+
+    @staticmethod
+    def reservar(limite):
+        """
+        Reserva até `limite` jobs pendentes (mais antigos primeiro).
+        A reserva é um UPDATE condicional ao estado, pelo que vários
+        processadores podem partilhar a mesma fila sem executar o mesmo job.
+        """
+        reservados = []
+        candidatos = RelatorioJob.objects.filter(
+            status=RelatorioJob.STATUS_PENDENTE
+        ).order_by('criado_em').values_list('id_job', flat=True)[:limite * 2]
+
+        for job_id in candidatos:
+            actualizados = RelatorioJob.objects.filter(
+                id_job=job_id, status=RelatorioJob.STATUS_PENDENTE
+            ).update(status=RelatorioJob.STATUS_PROCESSANDO, iniciado_em=timezone.now())
+            if actualizados:
+                reservados.append(job_id)
+                if len(reservados) >= limite:
+                    break
+        return reservados
+
+    @staticmethod
+    def recuperar_interrompidos():
+        """Devolve à fila os jobs deixados 'Em Processamento' por um processador que terminou"""
+        limite = timezone.now() - RelatorioJobService.TEMPO_MAXIMO
+        return RelatorioJob.objects.filter(
+            status=RelatorioJob.STATUS_PROCESSANDO, iniciado_em__lt=limite
+        ).update(status=RelatorioJob.STATUS_PENDENTE, iniciado_em=None)
+
+    @staticmethod
+    def executar(job_id):
+        """Renderiza o relatório do job e guarda o PDF no armazenamento de media"""
+        job = RelatorioJob.objects.get(id_job=job_id)
+        try:
+            pdf, nome_ficheiro = RelatorioService.renderizar(job.tipo, job.parametros or {})
+            if pdf is None:
+                raise ValueError('Erro ao gerar PDF')
+
+            job.ficheiro.save(nome_ficheiro, ContentFile(pdf), save=False)
+            job.nome_ficheiro = nome_ficheiro
+            job.status = RelatorioJob.STATUS_CONCLUIDO
+            job.erro = None
+        except (ValueError, ObjectDoesNotExist) as e:
+            # Parâmetros inválidos ou objecto inexistente: erro do pedido, não do processador
+            job.status = RelatorioJob.STATUS_ERRO
+            job.erro = str(e) if isinstance(e, ValueError) else 'Objecto do relatório não encontrado'
+        except Exception as e:
+            logger.exception("Erro ao processar o relatório #%s", job_id)
+            job.status = RelatorioJob.STATUS_ERRO
+            job.erro = str(e) or e.__class__.__name__
+
+        job.concluido_em = timezone.now()
+        job.save(update_fields=['ficheiro', 'nome_ficheiro', 'status', 'erro', 'concluido_em'])
+        return job.status
+
+    @staticmethod
+    def falhar(job_id, erro):
+        """Marca como erro um job reservado cujo resultado se perdeu (ex: worker terminado pelo sistema)"""
+        return RelatorioJob.objects.filter(
+            id_job=job_id, status=RelatorioJob.STATUS_PROCESSANDO
+        ).update(status=RelatorioJob.STATUS_ERRO, erro=erro, concluido_em=timezone.now())
+
+    @staticmethod
+    def _novo_pool(max_workers):
+        # As ligações à base de dados não podem ser partilhadas com os processos filhos
+        connections.close_all()
+        return ProcessPoolExecutor(max_workers=max_workers, initializer=_inicializar_worker)
+
+    @staticmethod
+    def processar(max_workers=None, intervalo=None, uma_vez=False, log=None):
+        """
+        Ciclo do processador: mantém no máximo `max_workers` relatórios em
+        renderização e vai buscando novos jobs à medida que os anteriores terminam.
+        Com `uma_vez`, termina quando a fila estiver vazia.
+
+        Um job que falhe fora de `executar` fica em erro sem parar o ciclo. Se um
+        processo do pool terminar abruptamente (ex: morto por falta de memória),
+        o pool deixa de ser utilizável: os jobs em curso ficam em erro e é criado
+        um pool novo.
+        """
+        max_workers = max_workers or RelatorioJobService.MAX_WORKERS
+        intervalo = intervalo or RelatorioJobService.INTERVALO
+        log = log or logger.info
+
+        recuperados = RelatorioJobService.recuperar_interrompidos()
+        if recuperados:
+            log(f"{recuperados} relatório(s) interrompido(s) devolvido(s) à fila")
+
+        processados = 0
+        em_curso = {}
+        pool = RelatorioJobService._novo_pool(max_workers)
+        try:
+            while True:
+                quebrado = False
+                livres = max_workers - len(em_curso)
+                if livres > 0:
+                    for job_id in RelatorioJobService.reservar(livres):
+                        try:
+                            em_curso[pool.submit(executar_job, job_id)] = job_id
+                        except BrokenProcessPool:
+                            # Não chegou a ser executado: volta à fila
+                            RelatorioJob.objects.filter(id_job=job_id).update(
+                                status=RelatorioJob.STATUS_PENDENTE, iniciado_em=None
+                            )
+                            quebrado = True
+
+                if not em_curso and not quebrado:
+                    if uma_vez:
+                        break
+                    time.sleep(intervalo)
+                    continue
+
+                concluidos, _pendentes = wait(list(em_curso), timeout=intervalo, return_when=FIRST_COMPLETED)
+                for futuro in concluidos:
+                    job_id = em_curso.pop(futuro)
+                    try:
+                        log(f"Relatório #{job_id}: {futuro.result()}")
+                    except BrokenProcessPool:
+                        quebrado = True
+                        RelatorioJobService.falhar(job_id, 'O processo de renderização terminou inesperadamente')
+                        log(f"Relatório #{job_id}: processo terminado inesperadamente")
+                    except Exception as e:
+                        logger.exception("Erro ao processar o relatório #%s", job_id)
+                        RelatorioJobService.falhar(job_id, str(e) or e.__class__.__name__)
+                        log(f"Relatório #{job_id}: {RelatorioJob.STATUS_ERRO}")
+                    processados += 1
+
+                if quebrado:
+                    # Os restantes jobs do pool perderam-se com ele
+                    for job_id in em_curso.values():
+                        RelatorioJobService.falhar(job_id, 'O processo de renderização terminou inesperadamente')
+                    processados += len(em_curso)
+                    em_curso.clear()
+                    pool.shutdown(wait=False, cancel_futures=True)
+                    log("Pool de processos reiniciado")
+                    pool = RelatorioJobService._novo_pool(max_workers)
+        finally:
+            pool.shutdown()
+        return processados
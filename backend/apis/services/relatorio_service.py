@@ -0,0 +1,407 @@
+import hashlib
+from io import BytesIO
+from django.db.models import Count, Max, Sum
+from django.template.loader import render_to_string
+from django.utils import timezone
+from xhtml2pdf import pisa
+
+from apis.models import Aluno, AnoLectivo, Candidato, Classe, Matricula, Pagamento, Periodo, Sala, Turma, VagaCurso
+from apis.services.ocupacao_service import OcupacaoService
+from apis.services.vagas_service import VagasService
+from apis.utils.csv_utils import linhas_queryset
+
+
+class RelatorioService:
+    """
+    Construção dos relatórios em PDF (dados + template), partilhada pelas
+    acções síncronas do RelatorioViewSet e pelos workers em segundo plano
+    (comando `processar_relatorios`).
+    """
+
+    ESCOLA_NOME = 'Complexo Escolar Politécnico'
+
+    # tipo -> (template, nome do ficheiro, método que constrói o contexto)
+    RELATORIOS = {
+        'relatorio_turmas': ('pdf/turmas_resumo.html', 'relatorio_turmas.pdf', '_contexto_turmas'),
+        'alunos_por_turma': ('pdf/lista_alunos_turma.html', 'lista_alunos_{turma.codigo_turma}.pdf', '_contexto_alunos_turma'),
+        'financeiro_resumo': ('pdf/financeiro_resumo.html', 'resumo_financeiro.pdf', '_contexto_financeiro'),
+        'inscritos_por_ano': ('pdf/inscritos_resumo.html', 'relatorio_inscritos.pdf', '_contexto_inscritos'),
+        'relatorio_ano_lectivo': ('pdf/anos_lectivos_resumo.html', 'relatorio_anos_lectivos.pdf', '_contexto_anos_lectivos'),
+        'relatorio_vagas': ('pdf/vagas_resumo.html', 'relatorio_vagas.pdf', '_contexto_vagas'),
+        'stats_ocupacao': ('pdf/ocupacao_salas.html', 'ocupacao_salas.pdf', '_contexto_ocupacao'),
+    }
+
+    @staticmethod
+    def _ano_filtrado(params, chave='ano_id'):
+        """ID do ano lectivo pedido ('all' ou vazio = todos)"""
+        ano_id = params.get(chave)
+        if ano_id and ano_id != 'all':
+            return ano_id
+        return None
+
+    @staticmethod
+    def _contexto_base():
+        return {
+            # Só a data: os relatórios ficam em cache durante o dia (ver PDFCacheService)
+            'data_impressao': timezone.localdate().strftime('%d/%m/%Y'),
+            'hoje': timezone.now(),
+            'escola_nome': RelatorioService.ESCOLA_NOME,
+        }
+
+    @staticmethod
+    def _contagens(queryset, campo):
+        """{valor de `campo`: número de linhas} numa única consulta agrupada"""
+        return dict(
+            queryset.order_by().values(campo).annotate(total=Count('pk')).values_list(campo, 'total')
+        )
+
+    @staticmethod
+    def _contexto_turmas(params):
+        ano_id = RelatorioService._ano_filtrado(params)
+        turmas = Turma.objects.select_related('id_curso', 'id_classe', 'id_periodo', 'id_sala', 'ano_lectivo').all().order_by('ano_lectivo', 'codigo_turma')
+        alunos = Aluno.objects.filter(id_turma__isnull=False)
+
+        if ano_id:
+            turmas = turmas.filter(ano_lectivo_id=ano_id)
+            alunos = alunos.filter(id_turma__ano_lectivo_id=ano_id)
+
+        # Contagem de alunos de todas as turmas numa só consulta agrupada
+        alunos_por_turma = RelatorioService._contagens(alunos, 'id_turma')
+        turmas = list(turmas)
+        for turma in turmas:
+            turma.total_alunos = alunos_por_turma.get(turma.pk, 0)
+
+        return {
+            'turmas': turmas,
+            'total': len(turmas),
+            'ano_filtrado': AnoLectivo.objects.filter(id_ano=ano_id).first() if ano_id else None,
+        }
+
+    @staticmethod
+    def _contexto_alunos_turma(params):
+        turma_id = params.get('turma_id')
+        if not turma_id:
+            raise ValueError('turma_id é obrigatório')
+
+        # Lança Turma.DoesNotExist (404 na view)
+        turma = Turma.objects.select_related('id_curso', 'id_classe', 'id_periodo', 'id_sala', 'ano_lectivo').get(id_turma=turma_id)
+        return {
+            'turma': turma,
+            'alunos': Aluno.objects.filter(id_turma=turma).order_by('nome_completo'),
+        }
+
+    @staticmethod
+    def _contexto_financeiro(params):
+        # Acesso correto: Pagamento -> Fatura -> Aluno
+        pagamentos = Pagamento.objects.select_related('id_fatura__id_aluno').order_by('-criado_em')[:50]
+        total = Pagamento.objects.aggregate(total=Sum('valor_pago'))['total'] or 0
+        return {
+            'pagamentos': pagamentos,
+            'total_geral': total,
+        }
+
+    @staticmethod
+    def _contexto_inscritos(params):
+        ano_id = RelatorioService._ano_filtrado(params)
+        candidatos = Candidato.objects.select_related('curso_primeira_opcao', 'ano_lectivo').all().order_by('nome_completo')
+
+        if ano_id:
+            candidatos = candidatos.filter(ano_lectivo_id=ano_id)
+
+        return {
+            'candidatos': candidatos,
+            'total': candidatos.count(),
+            'ano_filtrado': AnoLectivo.objects.filter(id_ano=ano_id).first() if ano_id else None,
+        }
+
+    @staticmethod
+    def _contexto_anos_lectivos(params):
+        anos = AnoLectivo.objects.all().order_by('-data_inicio')
+        return {
+            'anos': anos,
+            'total': anos.count(),
+        }
+
+    @staticmethod
+    def _contexto_vagas(params):
+        ano_id = RelatorioService._ano_filtrado(params)
+        vagas_qs = VagaCurso.objects.select_related('id_curso', 'ano_lectivo').all().order_by('ano_lectivo', 'id_curso__nome_curso')
+
+        if ano_id:
+            vagas_qs = vagas_qs.filter(ano_lectivo_id=ano_id)
+
+        vagas_qs = list(vagas_qs)
+        # Matrículas que ocupam vaga por (curso, ano): consultas agrupadas do VagasService
+        indice = VagasService.construir_indice({v.id_curso_id for v in vagas_qs})
+
+        report_data = []
+        total_vagas = 0
+        total_preenchidas = 0
+
+        for v in vagas_qs:
+            _vagas, preenchidas, _turmas = VagasService.obter(indice, v.id_curso_id, v.ano_lectivo_id)
+
+            report_data.append({
+                'curso_nome': v.id_curso.nome_curso,
+                'ano_lectivo_nome': v.ano_lectivo.nome,
+                'vagas': v.vagas,
+                'vagas_preenchidas': preenchidas,
+                'vagas_disponiveis': max(0, v.vagas - preenchidas)
+            })
+
+            total_vagas += v.vagas
+            total_preenchidas += preenchidas
+
+        return {
+            'vagas': report_data,
+            'totais': {
+                'vagas': total_vagas,
+                'preenchidas': total_preenchidas,
+                'disponiveis': max(0, total_vagas - total_preenchidas)
+            },
+            'ano_filtrado': AnoLectivo.objects.filter(id_ano=ano_id).first() if ano_id else None,
+        }
+
+    @staticmethod
+    def _contexto_ocupacao(params):
+        # Aluno -> Turma -> Sala: alunos activos de todas as salas numa consulta agrupada
+        salas_data = list(Sala.objects.all().order_by('bloco', 'numero_sala'))
+        alunos_por_sala = OcupacaoService.alunos_activos_por_sala()
+
+        for sala in salas_data:
+            sala.total_alunos_count = alunos_por_sala.get(sala.pk, 0)
+            if sala.capacidade_alunos > 0:
+                sala.percentagem = round((sala.total_alunos_count / sala.capacidade_alunos) * 100, 1)
+            else:
+                sala.percentagem = 0
+
+        return {'salas': salas_data}
+
+    # Versão dos dados de cada relatório (cache de PDFs): tipo -> (método, parâmetros usados)
+    # Relatórios sem versão (ex: alunos_por_turma) são sempre gerados de novo.
+    VERSOES = {
+        'relatorio_turmas': ('_versao_turmas', ('ano_id',)),
+        'financeiro_resumo': ('_versao_financeiro', ()),
+        'inscritos_por_ano': ('_versao_inscritos', ('ano_id',)),
+        'relatorio_ano_lectivo': ('_versao_anos_lectivos', ()),
+        'relatorio_vagas': ('_versao_vagas', ('ano_id',)),
+        'stats_ocupacao': ('_versao_ocupacao', ()),
+    }
+
+    @staticmethod
+    def _versao(queryset, *campos):
+        """Número de linhas e maior atualizado_em (próprio e das relações indicadas)"""
+        agregados = {'total': Count('pk')}
+        for i, campo in enumerate(('atualizado_em',) + campos):
+            agregados[f'max_{i}'] = Max(campo)
+        return sorted(queryset.order_by().aggregate(**agregados).items())
+
+    @staticmethod
+    def _versao_valores(queryset, *campos):
+        """Tabelas sem atualizado_em (ex: Periodo, Classe): número de linhas e hash dos campos impressos"""
+        linhas = list(queryset.order_by('pk').values_list('pk', *campos))
+        return [len(linhas), hashlib.sha256(repr(linhas).encode('utf-8')).hexdigest()]
+
+    @staticmethod
+    def _versao_turmas(params):
+        ano_id = RelatorioService._ano_filtrado(params)
+        turmas = Turma.objects.all()
+        if ano_id:
+            turmas = turmas.filter(ano_lectivo_id=ano_id)
+        # Alunos que saem ou são eliminados actualizam a turma (ver Aluno.save/delete)
+        return [
+            RelatorioService._versao(turmas, 'id_curso__atualizado_em', 'ano_lectivo__atualizado_em'),
+            RelatorioService._versao(Aluno.objects.filter(id_turma__in=turmas)),
+            # Período e classe não têm atualizado_em (o período é impresso, a classe entra no código)
+            RelatorioService._versao_valores(Periodo.objects.all(), 'periodo'),
+            RelatorioService._versao_valores(Classe.objects.all(), 'nivel', 'descricao'),
+        ]
+
+    @staticmethod
+    def _versao_financeiro(params):
+        return RelatorioService._versao(
+            Pagamento.objects.all(),
+            'id_fatura__atualizado_em', 'id_fatura__id_aluno__atualizado_em', 'id_recebedor__atualizado_em'
+        )
+
+    @staticmethod
+    def _versao_inscritos(params):
+        ano_id = RelatorioService._ano_filtrado(params)
+        candidatos = Candidato.objects.all()
+        if ano_id:
+            candidatos = candidatos.filter(ano_lectivo_id=ano_id)
+        return [
+            RelatorioService._versao(candidatos, 'curso_primeira_opcao__atualizado_em'),
+            RelatorioService._versao(AnoLectivo.objects.filter(id_ano=ano_id)) if ano_id else None,
+        ]
+
+    @staticmethod
+    def _versao_anos_lectivos(params):
+        return RelatorioService._versao(AnoLectivo.objects.all())
+
+    @staticmethod
+    def _versao_vagas(params):
+        ano_id = RelatorioService._ano_filtrado(params)
+        vagas = VagaCurso.objects.all()
+        matriculas = Matricula.objects.all()
+        if ano_id:
+            vagas = vagas.filter(ano_lectivo_id=ano_id)
+            matriculas = matriculas.filter(ano_lectivo_id=ano_id)
+        return [
+            RelatorioService._versao(vagas, 'id_curso__atualizado_em', 'ano_lectivo__atualizado_em'),
+            RelatorioService._versao(matriculas),
+        ]
+
+    @staticmethod
+    def _versao_ocupacao(params):
+        return [
+            RelatorioService._versao(Sala.objects.all()),
+            RelatorioService._versao(Turma.objects.all()),
+            RelatorioService._versao(Aluno.objects.all()),
+        ]
+
+    @staticmethod
+    def versao_dados(tipo, params):
+        """
+        Retorna (parâmetros relevantes, versão dos dados) para a cache de PDFs,
+        ou None se o relatório não for guardado em cache.
+        """
+        if tipo not in RelatorioService.VERSOES:
+            return None
+        metodo, nomes = RelatorioService.VERSOES[tipo]
+        parametros = {nome: RelatorioService._ano_filtrado(params, nome) for nome in nomes}
+        return parametros, getattr(RelatorioService, metodo)(params)
+
+    @staticmethod
+    def template(tipo):
+        return RelatorioService.RELATORIOS[tipo][0]
+
+    @staticmethod
+    def nome_ficheiro(tipo, contexto=None):
+        return RelatorioService.RELATORIOS[tipo][1].format(**(contexto or {}))
+
+    @staticmethod
+    def _exportar_turmas(params):
+        ano_id = RelatorioService._ano_filtrado(params)
+        turmas = Turma.objects.order_by('ano_lectivo', 'codigo_turma')
+        if ano_id:
+            turmas = turmas.filter(ano_lectivo_id=ano_id)
+        turmas = turmas.annotate(total_alunos=Count('aluno'))
+        return (
+            ['Ano Lectivo', 'Turma', 'Curso', 'Classe', 'Período', 'Sala', 'Alunos'],
+            linhas_queryset(turmas, ['ano_lectivo__nome', 'codigo_turma', 'id_curso__nome_curso', 'id_classe__nivel',
+                                     'id_periodo__periodo', 'id_sala__numero_sala', 'total_alunos'])
+        )
+
+    @staticmethod
+    def _exportar_alunos_turma(params):
+        turma_id = params.get('turma_id')
+        if not turma_id:
+            raise ValueError('turma_id é obrigatório')
+        turma = Turma.objects.get(id_turma=turma_id)
+        alunos = Aluno.objects.filter(id_turma=turma).order_by('nome_completo')
+        return (
+            ['Nº Matrícula', 'Nome Completo', 'Género', 'Nº BI', 'Telefone', 'Estado'],
+            linhas_queryset(alunos, ['numero_matricula', 'nome_completo', 'genero', 'numero_bi', 'telefone', 'status_aluno'])
+        )
+
+    @staticmethod
+    def _exportar_financeiro(params):
+        # Todos os pagamentos (o PDF mostra apenas os 50 mais recentes)
+        pagamentos = Pagamento.objects.order_by('-criado_em')
+        return (
+            ['Data', 'Aluno', 'Descrição', 'Método de Pagamento', 'Valor Pago', 'Recebedor'],
+            linhas_queryset(pagamentos, ['criado_em', 'id_fatura__id_aluno__nome_completo', 'id_fatura__descricao',
+                                         'metodo_pagamento', 'valor_pago', 'id_recebedor__nome_completo'])
+        )
+
+    @staticmethod
+    def _exportar_inscritos(params):
+        ano_id = RelatorioService._ano_filtrado(params)
+        candidatos = Candidato.objects.order_by('nome_completo')
+        if ano_id:
+            candidatos = candidatos.filter(ano_lectivo_id=ano_id)
+        return (
+            ['Nº Inscrição', 'Nome Completo', 'Nº BI', 'Curso (1ª Opção)', 'Média Final', 'Estado', 'Ano Lectivo'],
+            linhas_queryset(candidatos, ['numero_inscricao', 'nome_completo', 'numero_bi', 'curso_primeira_opcao__nome_curso',
+                                         'media_final', 'status', 'ano_lectivo__nome'])
+        )
+
+    @staticmethod
+    def _exportar_anos_lectivos(params):
+        anos = AnoLectivo.objects.order_by('-data_inicio')
+        return (
+            ['Ano Lectivo', 'Início', 'Fim', 'Estado'],
+            linhas_queryset(anos, ['nome', 'data_inicio', 'data_fim', 'status'])
+        )
+
+    @staticmethod
+    def _exportar_vagas(params):
+        # Uma linha por VagaCurso: reutiliza o conjunto de dados agregado do PDF
+        vagas = RelatorioService._contexto_vagas(params)['vagas']
+        return (
+            ['Curso', 'Ano Lectivo', 'Vagas', 'Preenchidas', 'Disponíveis'],
+            ((v['curso_nome'], v['ano_lectivo_nome'], v['vagas'], v['vagas_preenchidas'], v['vagas_disponiveis']) for v in vagas)
+        )
+
+    @staticmethod
+    def _exportar_ocupacao(params):
+        salas = RelatorioService._contexto_ocupacao(params)['salas']
+        return (
+            ['Bloco', 'Sala', 'Capacidade', 'Alunos Activos', 'Ocupação (%)'],
+            ((s.bloco, s.numero_sala, s.capacidade_alunos, s.total_alunos_count, s.percentagem) for s in salas)
+        )
+
+    # Exportação tabular (CSV em streaming) de cada relatório: tipo -> método
+    EXPORTACOES = {
+        'relatorio_turmas': '_exportar_turmas',
+        'alunos_por_turma': '_exportar_alunos_turma',
+        'financeiro_resumo': '_exportar_financeiro',
+        'inscritos_por_ano': '_exportar_inscritos',
+        'relatorio_ano_lectivo': '_exportar_anos_lectivos',
+        'relatorio_vagas': '_exportar_vagas',
+        'stats_ocupacao': '_exportar_ocupacao',
+    }
+
+    @staticmethod
+    def exportar(tipo, params):
+        """
+        Retorna (cabeçalho, linhas, nome do ficheiro) para a exportação em CSV.
+        As linhas são um iterador lido em blocos da base de dados.
+        """
+        cabecalho, linhas = getattr(RelatorioService, RelatorioService.EXPORTACOES[tipo])(params)
+        return cabecalho, linhas, f"{tipo}_{timezone.localdate().strftime('%Y%m%d')}.csv"
+
+    @staticmethod
+    def existe(tipo):
+        return tipo in RelatorioService.RELATORIOS
+
+    @staticmethod
+    def preparar(tipo, params):
+        """
+        Retorna (template, contexto, nome do ficheiro) do relatório.
+        Lança ValueError para parâmetros inválidos e DoesNotExist se o objecto pedido não existir.
+        """
+        if not RelatorioService.existe(tipo):
+            raise ValueError(f'Relatório desconhecido: {tipo}')
+
+        template, _nome, metodo = RelatorioService.RELATORIOS[tipo]
+        contexto = RelatorioService._contexto_base()
+        contexto.update(getattr(RelatorioService, metodo)(params))
+        return template, contexto, RelatorioService.nome_ficheiro(tipo, contexto)
+
+    @staticmethod
+    def gerar_pdf(template_path, context):
+        """Renderiza o template para PDF (bytes) ou None em caso de erro do xhtml2pdf"""
+        html = render_to_string(template_path, context)
+        result = BytesIO()
+        pdf = pisa.pisaDocument(BytesIO(html.encode("UTF-8")), result)
+        if not pdf.err:
+            return result.getvalue()
+        return None
+
+    @staticmethod
+    def renderizar(tipo, params):
+        """Retorna (pdf, nome do ficheiro); pdf é None se a renderização falhar"""
+        template, contexto, nome_ficheiro = RelatorioService.preparar(tipo, params)
+        return RelatorioService.gerar_pdf(template, contexto), nome_ficheiro
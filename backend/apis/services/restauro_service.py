@@ -0,0 +1,457 @@
+import os
+import re
+import sys
+import json
+import time
+import uuid
+import shutil
+import logging
+import zipfile
+import tempfile
+import datetime
+import threading
+import subprocess
+from contextlib import contextmanager
+from django.conf import settings
+
+from apis.services.backup_service import BackupService
+from apis.utils import compressao_utils
+
+logger = logging.getLogger(__name__)
+
+
+class _EstadoRestauro:
+    """
+    Estado de um restauro, gravado num ficheiro JSON (a base de dados é
+    substituída durante o restauro, pelo que não pode guardar o próprio progresso).
+    Partilhado entre a thread da media e a da base de dados.
+    """
+
+    INTERVALO = 1
+
+    def __init__(self, dados):
+        self.dados = dados
+        self._lock = threading.Lock()
+        self._gravado_em = 0
+
+    def fase(self, fase):
+        with self._lock:
+            self.dados['fase'] = fase
+        self.gravar(forcar=True)
+
+    def avancar(self, parte, n_bytes=0, itens=0):
+        with self._lock:
+            self.dados[parte]['bytes'] += n_bytes
+            self.dados[parte]['itens'] += itens
+        self.gravar()
+
+    @contextmanager
+    def medir(self, nome):
+        """Regista a duração de uma fase em `fases` (segundos)"""
+        inicio = time.monotonic()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.dados['fases'][nome] = round(time.monotonic() - inicio, 2)
+            self.gravar(forcar=True)
+
+    def _progresso(self):
+        """Média das partes ponderada pelo volume de cada uma (nunca 100% antes do fim)"""
+        total = feito = 0
+        for parte in ('base_dados', 'media'):
+            info = self.dados[parte]
+            if info.get('total_itens'):
+                # pg_restore paralelo: progresso por itens do dump
+                peso = info['total'] or 1
+                feito += peso * min(1, info['itens'] / info['total_itens'])
+            else:
+                feito += min(info['bytes'], info['total'])
+                peso = info['total']
+            total += peso
+        return min(99, int(feito * 100 / total)) if total else 0
+
+    def gravar(self, forcar=False):
+        agora = time.monotonic()
+        with self._lock:
+            if not forcar and agora - self._gravado_em < self.INTERVALO:
+                return
+            self._gravado_em = agora
+            if self.dados['status'] == RestauroService.STATUS_PROCESSANDO:
+                self.dados['progresso'] = self._progresso()
+            self.dados['actualizado_em'] = datetime.datetime.now().isoformat()
+            RestauroService._gravar(self.dados)
+
+
+class RestauroService:
+    """
+    Restauro de backups (base de dados + media) em segundo plano.
+
+    O dump é lido do arquivo em streaming e enviado directamente ao `pg_restore`
+    (ou ao `psql`, para backups antigos em SQL), sem descompactar o arquivo.
+    Com BACKUP_RESTAURO_JOBS > 1, o dump custom é extraído para um ficheiro
+    temporário e restaurado com `pg_restore -j` (o modo paralelo precisa de um
+    ficheiro). A media é reconstruída numa pasta temporária em paralelo com a
+    base de dados e trocada no fim. O progresso e a duração de cada fase ficam
+    num ficheiro JSON consultado pelo token devolvido ao iniciar.
+    """
+
+    STATUS_PENDENTE = 'Pendente'
+    STATUS_PROCESSANDO = 'Em Processamento'
+    STATUS_CONCLUIDO = 'Concluido'
+    STATUS_ERRO = 'Erro'
+
+    DIRECTORIO_ESTADO = os.path.join(BackupService.DIRECTORIO, 'restauros')
+    FICHEIRO_BLOQUEIO = os.path.join(BackupService.DIRECTORIO, '.restauro.lock')
+    # Ficheiros enviados para restauro (removidos no fim)
+    PREFIXO_UPLOAD = 'upload_'
+    PROCESSOS = getattr(settings, 'BACKUP_RESTAURO_JOBS', 1)
+    TOKEN_RE = re.compile(r'^[0-9a-f]{32}$')
+
+    @staticmethod
+    def _caminho_estado(token):
+        return os.path.join(RestauroService.DIRECTORIO_ESTADO, f'{token}.json')
+
+    @staticmethod
+    def _gravar(dados):
+        """Gravação atómica do estado (ficheiro temporário + rename)"""
+        os.makedirs(RestauroService.DIRECTORIO_ESTADO, exist_ok=True)
+        fd, temporario = tempfile.mkstemp(dir=RestauroService.DIRECTORIO_ESTADO, suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(dados, f)
+        os.replace(temporario, RestauroService._caminho_estado(dados['token']))
+
+    @staticmethod
+    def estado(token):
+        """Estado de um restauro (None se o token for inválido ou desconhecido)"""
+        if not token or not RestauroService.TOKEN_RE.match(token):
+            return None
+        try:
+            with open(RestauroService._caminho_estado(token)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    @staticmethod
+    def em_curso():
+        """Token do restauro em curso; bloqueios de restauros interrompidos são ignorados"""
+        try:
+            with open(RestauroService.FICHEIRO_BLOQUEIO) as f:
+                token = f.read().strip()
+        except OSError:
+            return None
+
+        estado = RestauroService.estado(token)
+        if estado and estado['status'] in (RestauroService.STATUS_PENDENTE, RestauroService.STATUS_PROCESSANDO):
+            actualizado = datetime.datetime.fromisoformat(estado['actualizado_em'])
+            if datetime.datetime.now() - actualizado < BackupService.TEMPO_SEM_PROGRESSO:
+                return token
+        return None
+
+    @staticmethod
+    def _bloquear(token):
+        """Cria o ficheiro de bloqueio (O_EXCL: dois pedidos simultâneos não iniciam dois restauros)"""
+        os.makedirs(BackupService.DIRECTORIO, exist_ok=True)
+        for _tentativa in range(2):
+            try:
+                fd = os.open(RestauroService.FICHEIRO_BLOQUEIO, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                if RestauroService.em_curso():
+                    raise ValueError('Já existe um restauro em curso.')
+                # Bloqueio de um restauro interrompido
+                try:
+                    os.remove(RestauroService.FICHEIRO_BLOQUEIO)
+                except OSError:
+                    pass
+                continue
+            with os.fdopen(fd, 'w') as f:
+                f.write(token)
+            return
+        raise ValueError('Já existe um restauro em curso.')
+
+    @staticmethod
+    def localizar_dump(arquivo):
+        """
+        (membro, formato, codec) do dump da base de dados no arquivo: formato
+        'custom' ou 'sql' (backups antigos); codec 'gzip', 'xz' ou None (sem compressão própria)
+        """
+        nomes = arquivo.namelist()
+        for codec, extensao in compressao_utils.EXTENSOES.items():
+            if BackupService.NOME_DUMP + extensao in nomes:
+                return BackupService.NOME_DUMP + extensao, 'custom', codec
+        if BackupService.NOME_DUMP in nomes:
+            return BackupService.NOME_DUMP, 'custom', None
+        sql = [n for n in nomes if n.endswith('.sql') and '/' not in n]
+        if sql:
+            return sql[0], 'sql', None
+        return None, None, None
+
+    @staticmethod
+    def guardar_upload(ficheiro):
+        """Grava um backup enviado pelo utilizador na pasta de backups (em blocos) e retorna o nome"""
+        os.makedirs(BackupService.DIRECTORIO, exist_ok=True)
+        timestamp = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
+        nome = f"{RestauroService.PREFIXO_UPLOAD}{timestamp}.zip"
+        with open(os.path.join(BackupService.DIRECTORIO, nome), 'wb') as destino:
+            for chunk in ficheiro.chunks():
+                destino.write(chunk)
+        return nome
+
+    @staticmethod
+    def iniciar(nome_ficheiro):
+        """
+        Valida o arquivo e lança o restauro num processo destacado.
+        Retorna o estado inicial (com o token). Lança ValueError se não for possível restaurar.
+        """
+        caminho = os.path.join(BackupService.DIRECTORIO, os.path.basename(nome_ficheiro))
+        if not os.path.exists(caminho):
+            raise ValueError('Ficheiro não encontrado')
+        if BackupService.em_curso():
+            raise ValueError('Existe um backup em curso.')
+
+        try:
+            with zipfile.ZipFile(caminho) as arquivo:
+                membro, formato, _codec = RestauroService.localizar_dump(arquivo)
+                if not membro:
+                    raise ValueError('Dump da base de dados não encontrado no backup')
+                tamanho_dump = arquivo.getinfo(membro).file_size
+        except zipfile.BadZipFile:
+            raise ValueError('Ficheiro de backup inválido')
+
+        em_falta = BackupService.arquivos_em_falta(caminho)
+        if em_falta:
+            raise ValueError(f"Backups de referência em falta: {', '.join(em_falta)}")
+
+        token = uuid.uuid4().hex
+        RestauroService._bloquear(token)
+        dados = {
+            'token': token,
+            'ficheiro': os.path.basename(caminho),
+            'formato': formato,
+            'processos': RestauroService.PROCESSOS if formato == 'custom' else 1,
+            'status': RestauroService.STATUS_PENDENTE,
+            'fase': '',
+            'progresso': 0,
+            'base_dados': {'bytes': 0, 'total': tamanho_dump, 'itens': 0, 'total_itens': None},
+            'media': {'bytes': 0, 'total': 0, 'itens': 0, 'total_itens': None},
+            'fases': {},
+            'erro': None,
+            'criado_em': datetime.datetime.now().isoformat(),
+            'actualizado_em': datetime.datetime.now().isoformat(),
+            'concluido_em': None,
+        }
+        RestauroService._gravar(dados)
+
+        try:
+            # Sem prioridade reduzida: durante o restauro o sistema está indisponível
+            BackupService.executar_comando_destacado(['executar_restauro', token], prioridade_reduzida=False)
+        except OSError as e:
+            dados.update(status=RestauroService.STATUS_ERRO, erro=str(e))
+            RestauroService._gravar(dados)
+            os.remove(RestauroService.FICHEIRO_BLOQUEIO)
+        return dados
+
+    @staticmethod
+    def _comando_psql(*argumentos):
+        db_config = settings.DATABASES['default']
+        return [BackupService.executavel('psql')] + BackupService.argumentos_conexao() + [
+            '-d', db_config['NAME']
+        ] + list(argumentos)
+
+    @staticmethod
+    def _enviar_para_processo(comando, arquivo, membro, codec, estado):
+        """
+        Envia um membro do arquivo (em streaming, descomprimido conforme o codec)
+        para o stdin do comando. O progresso conta os bytes lidos do arquivo.
+        """
+        with tempfile.TemporaryFile() as erros:
+            processo = subprocess.Popen(
+                comando, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=erros,
+                env=BackupService.ambiente()
+            )
+            try:
+                with arquivo.open(membro) as bruto, compressao_utils.descomprimir(bruto, codec) as origem:
+                    lidos = 0
+                    for bloco in iter(lambda: origem.read(BackupService.CHUNK_SIZE), b''):
+                        processo.stdin.write(bloco)
+                        estado.avancar('base_dados', bruto.tell() - lidos)
+                        lidos = bruto.tell()
+            except BrokenPipeError:
+                # O processo terminou antes do fim do dump: o erro está no stderr
+                pass
+            finally:
+                try:
+                    processo.stdin.close()
+                except BrokenPipeError:
+                    pass
+                codigo = processo.wait()
+
+            if codigo != 0:
+                erros.seek(0)
+                mensagem = erros.read().decode(errors='replace').strip()
+                raise RuntimeError(f"{os.path.basename(comando[0])} terminou com código {codigo}: {mensagem}")
+
+    @staticmethod
+    def _pg_restore_paralelo(caminho_dump, processos, estado):
+        """pg_restore -j a partir de um ficheiro; o progresso conta os itens terminados (-v)"""
+        pg_restore = BackupService.executavel('pg_restore')
+        ambiente = BackupService.ambiente()
+
+        indice = subprocess.run(
+            [pg_restore, '-l', caminho_dump], capture_output=True, text=True, env=ambiente
+        )
+        if indice.returncode == 0:
+            estado.dados['base_dados']['total_itens'] = sum(
+                1 for linha in indice.stdout.splitlines() if linha.strip() and not linha.startswith(';')
+            )
+
+        db_config = settings.DATABASES['default']
+        comando = [pg_restore] + BackupService.argumentos_conexao() + [
+            '-d', db_config['NAME'], '--no-owner', '-j', str(processos), '-v', caminho_dump
+        ]
+        processo = subprocess.Popen(
+            comando, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, env=ambiente,
+            text=True, errors='replace'
+        )
+        mensagens = []
+        for linha in processo.stderr:
+            if 'finished item' in linha:
+                estado.avancar('base_dados', itens=1)
+            elif 'error' in linha.lower() or 'erro' in linha.lower():
+                mensagens.append(linha.strip())
+        codigo = processo.wait()
+        if codigo != 0:
+            raise RuntimeError(f"pg_restore terminou com código {codigo}: {' '.join(mensagens[-20:])}")
+
+    @staticmethod
+    def _restaurar_base_dados(caminho, estado):
+        dados = estado.dados
+        with zipfile.ZipFile(caminho) as arquivo:
+            membro, formato, codec = RestauroService.localizar_dump(arquivo)
+
+            with estado.medir('Limpeza da base de dados'):
+                estado.fase('Limpeza da base de dados')
+                subprocess.run(
+                    RestauroService._comando_psql('-c', 'DROP SCHEMA public CASCADE; CREATE SCHEMA public;'),
+                    check=True, capture_output=True, env=BackupService.ambiente()
+                )
+
+            if formato == 'custom' and dados['processos'] > 1:
+                # O pg_restore paralelo precisa de acesso aleatório ao dump
+                fd, caminho_dump = tempfile.mkstemp(dir=BackupService.DIRECTORIO, suffix='.dump')
+                try:
+                    with estado.medir('Extracção do dump'):
+                        estado.fase('Extracção do dump')
+                        with os.fdopen(fd, 'wb') as destino, arquivo.open(membro) as bruto, \
+                                compressao_utils.descomprimir(bruto, codec) as origem:
+                            shutil.copyfileobj(origem, destino, BackupService.CHUNK_SIZE)
+
+                    with estado.medir('Base de dados'):
+                        estado.fase(f"Base de dados ({dados['processos']} processos)")
+                        RestauroService._pg_restore_paralelo(caminho_dump, dados['processos'], estado)
+                finally:
+                    os.remove(caminho_dump)
+            else:
+                with estado.medir('Base de dados'):
+                    estado.fase('Base de dados')
+                    if formato == 'custom':
+                        db_config = settings.DATABASES['default']
+                        comando = [BackupService.executavel('pg_restore')] + BackupService.argumentos_conexao() + [
+                            '-d', db_config['NAME'], '--no-owner'
+                        ]
+                    else:
+                        comando = RestauroService._comando_psql()
+                    RestauroService._enviar_para_processo(comando, arquivo, membro, codec, estado)
+
+    @staticmethod
+    def _tamanho_media(caminho):
+        with zipfile.ZipFile(caminho) as arquivo:
+            manifesto = BackupService.ler_manifesto(arquivo)
+            if manifesto is not None:
+                return sum(entrada['tamanho'] for entrada in manifesto.get('media', {}).values())
+            return sum(i.file_size for i in arquivo.infolist() if i.filename.startswith('media/'))
+
+    @staticmethod
+    def executar(token):
+        """Executa o restauro (no processo lançado por `iniciar`)"""
+        dados = RestauroService.estado(token)
+        if not dados or dados['status'] != RestauroService.STATUS_PENDENTE:
+            return None
+
+        caminho = os.path.join(BackupService.DIRECTORIO, dados['ficheiro'])
+        media_root = str(settings.MEDIA_ROOT).rstrip(os.sep)
+        media_nova = f"{media_root}.restauro"
+        media_antiga = f"{media_root}.anterior"
+
+        dados['status'] = RestauroService.STATUS_PROCESSANDO
+        dados['media']['total'] = RestauroService._tamanho_media(caminho)
+        estado = _EstadoRestauro(dados)
+        estado.gravar(forcar=True)
+
+        erro_media = []
+        restaurados = []
+
+        def restaurar_media():
+            try:
+                with estado.medir('Media'):
+                    restaurados.append(BackupService.restaurar_media(
+                        caminho, media_nova, progresso=lambda n: estado.avancar('media', n, 1)
+                    ))
+            except Exception as e:
+                logger.exception("Erro ao restaurar a media (%s)", dados['ficheiro'])
+                erro_media.append(e)
+
+        inicio = time.monotonic()
+        try:
+            shutil.rmtree(media_nova, ignore_errors=True)
+            # A media é reconstruída em paralelo com a base de dados
+            thread_media = threading.Thread(target=restaurar_media, daemon=True)
+            thread_media.start()
+            try:
+                RestauroService._restaurar_base_dados(caminho, estado)
+            finally:
+                thread_media.join()
+            if erro_media:
+                raise erro_media[0]
+
+            with estado.medir('Migrações'):
+                # Garante que a base de dados restaurada é compatível com o código actual
+                estado.fase('Migrações')
+                subprocess.run(
+                    [sys.executable, os.path.join(settings.BASE_DIR, 'manage.py'), 'migrate', '--noinput'],
+                    check=True, capture_output=True, cwd=str(settings.BASE_DIR)
+                )
+
+            if restaurados and restaurados[0]:
+                # Troca por rename (mesmo sistema de ficheiros): sem cópia da media
+                estado.fase('Media')
+                shutil.rmtree(media_antiga, ignore_errors=True)
+                if os.path.exists(media_root):
+                    os.rename(media_root, media_antiga)
+                os.rename(media_nova, media_root)
+                shutil.rmtree(media_antiga, ignore_errors=True)
+
+            dados['status'] = RestauroService.STATUS_CONCLUIDO
+            dados['fase'] = ''
+            dados['progresso'] = 100
+        except subprocess.CalledProcessError as e:
+            logger.exception("Erro no restauro %s", token)
+            saida = e.stderr.decode(errors='replace') if isinstance(e.stderr, bytes) else (e.stderr or '')
+            dados['status'] = RestauroService.STATUS_ERRO
+            dados['erro'] = saida.strip() or str(e)
+        except Exception as e:
+            logger.exception("Erro no restauro %s", token)
+            dados['status'] = RestauroService.STATUS_ERRO
+            dados['erro'] = str(e) or e.__class__.__name__
+        finally:
+            shutil.rmtree(media_nova, ignore_errors=True)
+            if dados['ficheiro'].startswith(RestauroService.PREFIXO_UPLOAD) and os.path.exists(caminho):
+                os.remove(caminho)
+            dados['fases']['Total'] = round(time.monotonic() - inicio, 2)
+            dados['concluido_em'] = datetime.datetime.now().isoformat()
+            estado.gravar(forcar=True)
+            try:
+                os.remove(RestauroService.FICHEIRO_BLOQUEIO)
+            except OSError:
+                pass
+        return dados['status']
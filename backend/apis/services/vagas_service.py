@@ -0,0 +1,77 @@
+from django.db.models import Count
+from apis.models import AnoLectivo, Turma, VagaCurso, Matricula
+
+
+class VagasService:
+    """
+    Serviço para cálculo de vagas por curso e ano lectivo.
+    Constrói um índice único por request, partilhado pelos serializers
+    através do contexto, em vez de consultar Turma/VagaCurso/Matricula por linha.
+    """
+
+    # Matrículas que ocupam vaga (Desistente e Transferido libertam a vaga)
+    STATUS_OCUPADAS = ['Ativa', 'Concluida']
+
+    @staticmethod
+    def construir_indice(curso_ids=None, ano_ids=None):
+        """
+        Retorna {(id_curso, id_ano): (vagas, preenchidas, turmas)} com base em
+        três consultas agrupadas, independentemente do número de cursos.
+        `curso_ids` restringe o índice a alguns cursos (ex: cursos da página).
+        `ano_ids` restringe as vagas e as matrículas a esses anos lectivos, para
+        que o custo não cresça com o histórico; as turmas são contadas em todos
+        os anos (total_turmas do curso).
+        """
+        indice = {}
+        vagas = VagaCurso.objects.all()
+        matriculas = Matricula.objects.filter(status__in=VagasService.STATUS_OCUPADAS)
+        turmas = Turma.objects.all()
+        if curso_ids is not None:
+            vagas = vagas.filter(id_curso__in=curso_ids)
+            matriculas = matriculas.filter(id_turma__id_curso__in=curso_ids)
+            turmas = turmas.filter(id_curso__in=curso_ids)
+        if ano_ids is not None:
+            vagas = vagas.filter(ano_lectivo__in=ano_ids)
+            matriculas = matriculas.filter(ano_lectivo__in=ano_ids)
+
+        def acumular(chave, posicao, valor):
+            actual = list(indice.get(chave, (0, 0, 0)))
+            actual[posicao] += valor
+            indice[chave] = tuple(actual)
+
+        for item in vagas.values('id_curso', 'ano_lectivo', 'vagas'):
+            acumular((item['id_curso'], item['ano_lectivo']), 0, item['vagas'])
+
+        preenchidas = matriculas.values('id_turma__id_curso', 'ano_lectivo').annotate(total=Count('id_matricula'))
+        for item in preenchidas:
+            acumular((item['id_turma__id_curso'], item['ano_lectivo']), 1, item['total'])
+
+        for item in turmas.values('id_curso', 'ano_lectivo').annotate(total=Count('id_turma')):
+            acumular((item['id_curso'], item['ano_lectivo']), 2, item['total'])
+
+        return indice
+
+    @staticmethod
+    def contexto_serializer(curso_ids=None, ano_ids=None):
+        """
+        Dados partilhados pelos serializers de Curso/VagaCurso durante um request.
+        `curso_ids`/`ano_ids`: cursos e anos lectivos da página; sem `ano_ids`,
+        só o ano activo (o único lido pelo CursoListSerializer).
+        """
+        ano_activo = AnoLectivo.get_active_year()
+        if ano_ids is None:
+            ano_ids = [ano_activo.pk] if ano_activo else []
+        return {
+            'indice_vagas': VagasService.construir_indice(curso_ids, ano_ids),
+            'ano_activo': ano_activo,
+        }
+
+    @staticmethod
+    def obter(indice, curso_id, ano_id):
+        """Retorna (vagas, preenchidas, turmas) para o par curso/ano"""
+        return indice.get((curso_id, ano_id), (0, 0, 0))
+
+    @staticmethod
+    def total_turmas(indice, curso_id):
+        """Total de turmas do curso em todos os anos lectivos"""
+        return sum(valor[2] for (curso, _ano), valor in indice.items() if curso == curso_id)
@@ -0,0 +1,32 @@
+"""
+Receivers de sinais dos modelos.
+
+Os tombstones da sincronização incremental (RegistoRemocao) são escritos no
+post_delete e não no delete() dos modelos: o Django não chama delete() nas
+eliminações em cascata (ex: matrículas de um aluno eliminado) nem em
+queryset.delete(), mas envia o sinal para cada objecto removido.
+"""
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from apis.models import Curso, Matricula, RegistoRemocao, Sala, Turma
+
+# Modelos servidos pelo endpoint `sincronizar` (DeltaSyncMixin)
+MODELOS_SINCRONIZADOS = (Sala, Curso, Turma, Matricula)
+
+
+def registar_remocao(sender, instance, **kwargs):
+    """Tombstone para a sincronização incremental"""
+    RegistoRemocao.registar(sender, instance.pk)
+
+
+for _modelo in MODELOS_SINCRONIZADOS:
+    post_delete.connect(registar_remocao, sender=_modelo, dispatch_uid=f'registar_remocao_{_modelo.__name__}')
+
+
+@receiver(post_delete, sender=Matricula, dispatch_uid='matricula_removida')
+def matricula_removida(sender, instance, **kwargs):
+    """Turma "tocada" (as vagas preenchidas do curso mudaram) e ocupação publicada aos clientes SSE"""
+    from apis.services.eventos_service import EventosService
+    RegistoRemocao.tocar(Turma, instance.id_turma_id)
+    EventosService.matricula_alterada(instance.id_turma_id)
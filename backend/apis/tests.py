@@ -1,3 +1,1411 @@
-from django.test import TestCase
+import os
+import json
+import datetime
+import io
+import shutil
+import tempfile
+import itertools
+import zipfile
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+from decimal import Decimal
+from types import SimpleNamespace
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db import connection
+from django.template.loader import render_to_string
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import dateformat, timezone
+from rest_framework.test import APIClient
+
+from apis.models import (
+    AgendamentoBackup, Aluno, AlunoEncarregado, AnoLectivo, BackupJob, Candidato, Cargo, Classe, Curso, Disciplina,
+    Encarregado, FaltaAluno, Funcionario, Historico, Matricula, Nota, Periodo, RegistoRemocao, RelatorioJob, Sala, Turma, Usuario,
+    VagaCurso
+)
+from apis.permissions.custom_permissions import (
+    HasAdditionalPermission, IsDirecao, IsSecretario, compilar_permissoes, resolver_cargo
+)
+from apis.services.academic_service import AcademicService
+from apis.services.agendamento_backup_service import AgendamentoBackupService
+from apis.services.auth_service import AuthService
+from apis.services.backup_service import BackupService
+from apis.services.catalogo_backup_service import CatalogoBackupService
+from apis.services.documentos_lote_service import DocumentosLoteService
+from apis.services.eventos_service import EventosService, broker
+from apis.services.pdf_cache_service import PDFCacheService
+from apis.services.principal_service import PrincipalService
+from apis.services.relatorio_job_service import RelatorioJobService
+from apis.services.relatorio_service import RelatorioService
+from apis.services.restauro_service import RestauroService
+from apis.services.vagas_service import VagasService
+from apis.utils import cache_utils, compressao_utils, csv_utils, paginacao_utils
+from apis.views.backup_views import BackupViewSet
+
+
+def criar_estrutura(n_salas=1, alunos_por_turma=2, periodos=('Manhã',)):
+    """Ano lectivo activo com salas, turmas (uma por período) e alunos matriculados"""
+    ano = AnoLectivo.objects.create(
+        nome='2026/2027', data_inicio=datetime.date(2026, 1, 1), data_fim=datetime.date(2026, 12, 1),
+        status='Activo', activo=True
+    )
+    periodos = [Periodo.objects.create(periodo=nome) for nome in periodos]
+    classe = Classe.objects.create(nivel=10)
+    curso = Curso.objects.create(nome_curso='Informática')
+    turmas = []
+    for numero in range(1, n_salas + 1):
+        sala = Sala.objects.create(numero_sala=numero, capacidade_alunos=60)
+        for periodo in periodos:
+            turma = Turma.objects.create(
+                id_sala=sala, id_curso=curso, id_classe=classe, id_periodo=periodo, ano_lectivo=ano, capacidade=40
+            )
+            turmas.append(turma)
+            for indice in range(alunos_por_turma):
+                aluno = Aluno.objects.create(
+                    nome_completo=f'Aluno {turma.pk}.{indice}', telefone='923000000', id_turma=turma,
+                    numero_bi=f'BI{turma.pk:04d}{indice:03d}'
+                )
+                Matricula.objects.create(id_aluno=aluno, id_turma=turma, ano_lectivo=ano)
+    return ano, curso, turmas
+
+
+def _request(principal, user_type='usuario'):
+    """Request mínimo para as classes de permissão (principal já resolvido)"""
+    return SimpleNamespace(
+        user=SimpleNamespace(is_authenticated=True, is_superuser=principal['is_superuser']),
+        auth_payload={'user_type': user_type, 'cargo': principal['cargo']},
+        principal=principal,
+    )
+
+
+def cliente_api(user_id, user_type='usuario'):
+    """APIClient autenticado com um access token JWT"""
+    tokens = AuthService.generate_tokens({'id': user_id, 'tipo': user_type})
+    cliente = APIClient()
+    cliente.credentials(HTTP_AUTHORIZATION=f"Bearer {tokens['access']}")
+    return cliente
+
+
+CACHE_LOCAL = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'testes'}}
+
+
+@override_settings(CACHES=CACHE_LOCAL)
+class PrincipalServiceTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def criar_usuario(self, email, cargo=None, **campos):
+        return Usuario.objects.create(
+            nome_completo=email, email=email, senha_hash='senha', cargo=cargo, **campos
+        )
+
+    def test_cargo_tem_precedencia_sobre_papel_por_defeito(self):
+        """Usuario com papel 'Comum' (defeito) e cargo atribuído usa as permissões do cargo"""
+        diretor = self.criar_usuario('diretor@escola.ao', Cargo.objects.create(nome_cargo='Diretor'))
+        secretario = self.criar_usuario('secretaria@escola.ao', Cargo.objects.create(nome_cargo='Secretário'))
+
+        principal = PrincipalService.resumir(diretor, 'usuario')
+        self.assertEqual(principal['cargo'], 'diretor')
+        self.assertTrue(principal['acesso_total'])
+        self.assertTrue(IsDirecao().has_permission(_request(principal), None))
+
+        principal = PrincipalService.resumir(secretario, 'usuario')
+        self.assertEqual(principal['cargo'], 'secretário')
+        self.assertIn('create_matricula', principal['permissoes'])
+        self.assertTrue(IsSecretario().has_permission(_request(principal), None))
+        view = SimpleNamespace(action='create', permission_map={'create': 'create_matricula'})
+        self.assertTrue(HasAdditionalPermission().has_permission(_request(principal), view))
+
+    def test_papel_sem_cargo(self):
+        usuario = self.criar_usuario('comum@escola.ao')
+        principal = PrincipalService.resumir(usuario, 'usuario')
+        self.assertEqual(principal['cargo'], 'comum')
+        self.assertEqual(principal['permissoes'], frozenset(['view_dashboard']))
+        self.assertFalse(IsDirecao().has_permission(_request(principal), None))
+
+
+    def test_cache_guarda_apenas_o_resumo(self):
+        usuario = self.criar_usuario('cache@escola.ao', Cargo.objects.create(nome_cargo='Professor'))
+        user, principal = PrincipalService.carregar('usuario', usuario.pk)
+        self.assertEqual(user.pk, usuario.pk)
+
+        em_cache = cache.get(PrincipalService.chave_cache('usuario', usuario.pk))
+        self.assertEqual(em_cache, principal)
+        self.assertNotIn('senha_hash', repr(em_cache))
+
+        with self.assertNumQueries(0):
+            referencia, principal_cache = PrincipalService.carregar('usuario', usuario.pk)
+        self.assertEqual(principal_cache, principal)
+        self.assertIsInstance(referencia, Usuario)
+        self.assertFalse(referencia.is_superuser)
+        # Campos diferidos: lidos da base de dados no primeiro acesso
+        with self.assertNumQueries(1):
+            self.assertEqual(referencia.email, 'cache@escola.ao')
+
+    def test_referencia_grava_so_campos_carregados(self):
+        usuario = self.criar_usuario('ref@escola.ao')
+        senha = Usuario.objects.get(pk=usuario.pk).senha_hash
+        PrincipalService.carregar('usuario', usuario.pk)
+        referencia, _principal = PrincipalService.carregar('usuario', usuario.pk)
+        referencia.is_superuser = True
+        referencia.save()
+        self.assertEqual(Usuario.objects.get(pk=usuario.pk).senha_hash, senha)
+
+    def test_invalidacao(self):
+        ano, _curso, turmas = criar_estrutura(alunos_por_turma=1)
+        aluno = Aluno.objects.get()
+        chave_aluno = PrincipalService.chave_cache('aluno', aluno.pk)
+        PrincipalService.carregar('aluno', aluno.pk)
+        self.assertIsNotNone(cache.get(chave_aluno))
+
+        cliente = APIClient()
+        cliente.force_authenticate(User.objects.create(username='admin', is_superuser=True))
+        resposta = cliente.patch(f'/api/v1/alunos/{aluno.pk}/update_status/', {'status_aluno': 'Inativo'}, secure=True)
+        self.assertEqual(resposta.status_code, 200, resposta.content)
+        self.assertIsNone(cache.get(chave_aluno))
+
+        PrincipalService.carregar('aluno', aluno.pk)
+        Cargo.objects.create(nome_cargo='Temporário').delete()
+        self.assertIsNone(cache.get(PrincipalService.chave_cache('aluno', aluno.pk)))
+
+
+def _permissao_original(user, auth_payload, required_permission):
+    """
+    HasAdditionalPermission.has_permission antes da compilação das permissões
+    (mesmas regras, avaliadas em cada request), para comparação.
+    """
+    if user.is_superuser:
+        return True
+    profile = None
+    user_perms = []
+    if hasattr(user, 'permissoes'):
+        user_perms = user.permissoes
+    elif hasattr(user, 'permissoes_adicionais'):
+        user_perms = user.permissoes_adicionais
+    elif hasattr(user, 'profile'):
+        profile = user.profile
+        user_perms = profile.permissoes if hasattr(profile, 'permissoes') else []
+    if isinstance(user_perms, str):
+        try:
+            user_perms = json.loads(user_perms)
+        except ValueError:
+            user_perms = []
+
+    if isinstance(user_perms, list) and len(user_perms) > 0:
+        if 'NO_ACCESS' in user_perms:
+            return False
+        return required_permission in user_perms
+
+    role = auth_payload.get('cargo', '')
+    if not role and profile:
+        role = profile.papel or ''
+        if not role and profile.cargo:
+            role = profile.cargo.nome_cargo
+    if not role:
+        return False
+    role = role.lower()
+
+    if any(r in role for r in ['administrador', 'admin', 'diretor', 'coord']):
+        return True
+    if any(r in role for r in ['secretário', 'secretaria', 'secretario']):
+        return required_permission in [
+            'view_dashboard', 'view_alunos', 'create_aluno', 'edit_aluno',
+            'view_inscritos', 'manage_inscritos',
+            'view_matriculas', 'create_matricula', 'edit_matricula',
+            'view_turmas', 'view_salas', 'view_cursos',
+            'view_relatorios', 'view_configuracoes'
+        ]
+    if any(r in role for r in ['professor', 'docente']):
+        return required_permission in ['view_dashboard', 'view_turmas', 'view_alunos', 'view_notas', 'view_faltas']
+    if 'comum' in role:
+        return required_permission in ['view_dashboard']
+    return False
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class CompilarPermissoesTests(TestCase):
+    """As permissões compiladas dão o mesmo resultado que a verificação original"""
+
+    CARGOS = [None, 'Diretor Geral', 'Secretário', 'Professor', 'Coordenador', 'Contabilista']
+    PAPEIS = ['', 'Comum', 'Admin', 'Professor']
+    PERMISSOES = [[], ['view_alunos', 'view_turmas'], ['NO_ACCESS'], '["create_matricula"]']
+    REQUERIDAS = ['view_dashboard', 'view_alunos', 'create_matricula', 'view_notas', 'manage_backups']
+
+    def setUp(self):
+        self.cargos = {nome: Cargo.objects.create(nome_cargo=nome) for nome in self.CARGOS if nome}
+
+    def combinacoes(self):
+        for indice, (cargo, papel, permissoes) in enumerate(
+            itertools.product(self.CARGOS, self.PAPEIS, self.PERMISSOES)
+        ):
+            perfil = Usuario.objects.create(
+                nome_completo=f'Utilizador {indice}', email=f'u{indice}@escola.ao', senha_hash='senha',
+                cargo=self.cargos.get(cargo), papel=papel, permissoes=permissoes,
+            )
+            yield cargo, papel, permissoes, perfil
+
+    def verificar(self, user, auth_payload, principal, contexto):
+        for requerida in self.REQUERIDAS:
+            view = SimpleNamespace(action='acao', permission_map={'acao': requerida})
+            request = SimpleNamespace(user=user, auth_payload=auth_payload, principal=principal)
+            self.assertEqual(
+                HasAdditionalPermission().has_permission(request, view),
+                _permissao_original(user, auth_payload, requerida),
+                f'{contexto}, {requerida}'
+            )
+
+    def test_token_do_usuario(self):
+        """Autenticação por token: principal compilado a partir do perfil (cargo no token)"""
+        for cargo, papel, permissoes, perfil in self.combinacoes():
+            if cargo is None:
+                # A verificação original falhava (perfil não definido) sem cargo no token
+                continue
+            perfil.is_authenticated = True
+            principal = PrincipalService.resumir(perfil, 'usuario')
+            auth_payload = {'user_type': 'usuario', 'cargo': cargo}
+            self.verificar(perfil, auth_payload, principal, (cargo, papel, permissoes))
+
+    def test_user_django_com_perfil(self):
+        """User nativo com perfil Usuario, com e sem cargo no payload"""
+        for cargo, papel, permissoes, perfil in self.combinacoes():
+            user = User.objects.create(username=perfil.email)
+            perfil.user = user
+            perfil.save()
+            for auth_payload in ({}, {'cargo': 'Professor'}):
+                user = User.objects.select_related('profile__cargo').get(pk=user.pk)
+                self.verificar(user, auth_payload, None, (cargo, papel, permissoes, auth_payload))
+
+    def test_precedencia_do_cargo(self):
+        perfil = SimpleNamespace(papel='Comum', cargo=SimpleNamespace(nome_cargo='Diretor'))
+        self.assertEqual(resolver_cargo('Secretário', perfil), 'secretário')
+        self.assertEqual(resolver_cargo(None, perfil), 'comum')
+        self.assertEqual(resolver_cargo(None, SimpleNamespace(papel='', cargo=perfil.cargo)), 'diretor')
+        self.assertEqual(resolver_cargo(None, None), '')
+
+    def test_superusuario_e_no_access(self):
+        self.assertEqual(compilar_permissoes(['NO_ACCESS'], 'diretor', is_superuser=True), (True, frozenset()))
+        self.assertEqual(compilar_permissoes(['NO_ACCESS'], 'diretor'), (False, frozenset()))
+        self.assertEqual(compilar_permissoes([], 'diretor'), (True, frozenset()))
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'], CACHES=CACHE_LOCAL)
+class RelatorioCSVPermissoesTests(TestCase):
+    """A exportação CSV dos relatórios exige a permissão do módulo"""
+
+    def cliente(self, user_id, user_type):
+        tokens = AuthService.generate_tokens({'id': user_id, 'tipo': user_type})
+        cliente = APIClient()
+        cliente.credentials(HTTP_AUTHORIZATION=f"Bearer {tokens['access']}")
+        return cliente
+
+    def get(self, cliente, relatorio, **params):
+        return cliente.get(f'/api/v1/relatorios/{relatorio}/', params, secure=True)
+
+    def test_aluno_nao_exporta(self):
+        aluno = Aluno.objects.create(nome_completo='Aluno', telefone='923000000')
+        cliente = self.cliente(aluno.pk, 'aluno')
+        for relatorio in ('financeiro_resumo', 'inscritos_por_ano', 'relatorio_turmas'):
+            self.assertEqual(self.get(cliente, relatorio, formato='csv').status_code, 403, relatorio)
+
+    def test_permissoes_do_cargo(self):
+        usuario = Usuario.objects.create(
+            nome_completo='Secretaria', email='secretaria@escola.ao', senha_hash='senha',
+            cargo=Cargo.objects.create(nome_cargo='Secretário')
+        )
+        cliente = self.cliente(usuario.pk, 'usuario')
+        self.assertEqual(self.get(cliente, 'financeiro_resumo', formato='csv').status_code, 403)
+        resposta = self.get(cliente, 'inscritos_por_ano', formato='csv')
+        self.assertEqual(resposta.status_code, 200)
+        self.assertTrue(b''.join(resposta.streaming_content).startswith('\ufeff'.encode()))
+
+
+class CSVUtilsTests(TestCase):
+    def test_formulas_sao_neutralizadas(self):
+        for valor in ('=HYPERLINK("http://x")', '+1', '-2+3', '@SUM(A1)', '\tx', '\rx'):
+            self.assertEqual(csv_utils.formatar(valor), "'" + valor)
+
+    def test_valores_normais(self):
+        self.assertEqual(csv_utils.formatar('Ana'), 'Ana')
+        self.assertEqual(csv_utils.formatar(-5), -5)
+        self.assertEqual(csv_utils.formatar(Decimal('-12.50')), '-12,50')
+        self.assertEqual(csv_utils.formatar(datetime.date(2026, 3, 1)), '01/03/2026')
+        self.assertEqual(csv_utils.formatar(None), '')
+
+    def test_linhas_csv(self):
+        conteudo = ''.join(csv_utils.linhas_csv(['Nome', 'Valor'], [('=1+1', Decimal('3.5'))]))
+        self.assertEqual(conteudo, "\ufeffNome;Valor\r\n'=1+1;3,5\r\n")
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class RegistoRemocaoTests(TestCase):
+    """Tombstones da sincronização incremental em todas as formas de eliminação"""
+
+    def removidas(self):
+        return set(RegistoRemocao.objects.filter(modelo='Matricula').values_list('objeto_id', flat=True))
+
+    def test_eliminacao_em_cascata(self):
+        _ano, _curso, turmas = criar_estrutura(alunos_por_turma=2)
+        matricula = Matricula.objects.filter(id_turma=turmas[0]).first()
+        Aluno.objects.get(pk=matricula.id_aluno_id).delete()
+        self.assertEqual(self.removidas(), {matricula.pk})
+
+    def test_queryset_delete(self):
+        _ano, _curso, turmas = criar_estrutura(alunos_por_turma=3)
+        ids = set(Matricula.objects.values_list('pk', flat=True))
+        Matricula.objects.all().delete()
+        self.assertEqual(self.removidas(), ids)
+        # Turma "tocada": as vagas preenchidas mudaram
+        turmas[0].refresh_from_db()
+        self.assertGreaterEqual(turmas[0].atualizado_em, RegistoRemocao.objects.order_by('removido_em')[0].removido_em)
+
+    def test_delete_da_instancia(self):
+        _ano, _curso, turmas = criar_estrutura(alunos_por_turma=1)
+        matricula = Matricula.objects.get()
+        pk = matricula.pk
+        matricula.delete()
+        self.assertEqual(self.removidas(), {pk})
+        self.assertEqual(RegistoRemocao.objects.count(), 1)
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class RelatorioConsultasTests(TestCase):
+    """Consultas dos contextos dos relatórios: constantes, qualquer que seja o volume de dados"""
+
+    N_SALAS = 2
+
+    def setUp(self):
+        self.ano, self.curso, self.turmas = criar_estrutura(n_salas=self.N_SALAS, periodos=('Manhã', 'Tarde'))
+        VagaCurso.objects.create(id_curso=self.curso, ano_lectivo=self.ano, vagas=500)
+
+    def test_contexto_turmas(self):
+        with self.assertNumQueries(2):
+            contexto = RelatorioService._contexto_turmas({})
+        self.assertEqual([t.total_alunos for t in contexto['turmas']], [2] * len(self.turmas))
+        with self.assertNumQueries(3):
+            RelatorioService._contexto_turmas({'ano_id': self.ano.pk})
+
+    def test_contexto_vagas(self):
+        # Vagas + consultas agrupadas do VagasService (matrículas por curso e ano)
+        with self.assertNumQueries(4):
+            contexto = RelatorioService._contexto_vagas({})
+        self.assertEqual(contexto['totais']['preenchidas'], 2 * len(self.turmas))
+        with self.assertNumQueries(5):
+            RelatorioService._contexto_vagas({'ano_id': self.ano.pk})
+
+    def test_contexto_ocupacao(self):
+        with self.assertNumQueries(2):
+            contexto = RelatorioService._contexto_ocupacao({})
+        self.assertEqual([s.total_alunos_count for s in contexto['salas']], [4] * self.N_SALAS)
+
+
+class RelatorioConsultasVolumeTests(RelatorioConsultasTests):
+    N_SALAS = 15
+
+
+@override_settings(CACHES=CACHE_LOCAL, PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class ListagemSalasTurmasConsultasTests(TestCase):
+    """Listagens de salas e turmas: número fixo de consultas, qualquer que seja o número de linhas"""
+
+    N_SALAS = 2
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.ano, _curso, cls.turmas = criar_estrutura(n_salas=cls.N_SALAS, periodos=('Manhã', 'Tarde'))
+        cls.usuario = Usuario.objects.create(
+            nome_completo='Administrador', email='admin@escola.ao', senha_hash='senha', is_superuser=True
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.cliente = cliente_api(self.usuario.pk)
+        # Principal em cache: conta só as consultas da listagem
+        self.cliente.get('/api/v1/classes/', secure=True)
+
+    def test_salas(self):
+        # Contagem, página, ano lectivo activo e ocupação agrupada de todas as salas da página
+        with self.assertNumQueries(4):
+            resposta = self.cliente.get('/api/v1/salas/', secure=True)
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(resposta.json()['count'], self.N_SALAS)
+        # Duas turmas (Manhã e Tarde) com dois alunos em cada sala
+        self.assertEqual({sala['total_alunos'] for sala in resposta.json()['results']}, {4})
+
+    def test_turmas(self):
+        # Contagem e página (alunos contados na própria consulta)
+        with self.assertNumQueries(2):
+            resposta = self.cliente.get('/api/v1/turmas/', secure=True)
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(resposta.json()['count'], len(self.turmas))
+        self.assertEqual({turma['total_alunos'] for turma in resposta.json()['results']}, {2})
+
+
+class ListagemSalasTurmasConsultasVolumeTests(ListagemSalasTurmasConsultasTests):
+    N_SALAS = 15
+
+
+@override_settings(CACHES=CACHE_LOCAL, PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class ListagemAlunosConsultasTests(TestCase):
+    """Listagem de alunos: fotos, encarregados e matrículas resolvidos em lote"""
+
+    ALUNOS_POR_TURMA = 3
+
+    @classmethod
+    def setUpTestData(cls):
+        criar_estrutura(n_salas=2, alunos_por_turma=cls.ALUNOS_POR_TURMA)
+        for aluno in Aluno.objects.all():
+            encarregado = Encarregado.objects.create(nome_completo=f'Encarregado {aluno.pk}', senha_hash='senha')
+            AlunoEncarregado.objects.create(id_aluno=aluno, id_encarregado=encarregado, grau_parentesco='Pai')
+        cls.total = Aluno.objects.count()
+        cls.usuario = Usuario.objects.create(
+            nome_completo='Administrador', email='admin@escola.ao', senha_hash='senha', is_superuser=True
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.cliente = cliente_api(self.usuario.pk)
+        self.cliente.get('/api/v1/classes/', secure=True)
+
+    def test_listagem(self):
+        # Contagem, página com relações, encarregados, matrículas, histórico escolar, fotos das candidaturas
+        # e o tipo de matrícula sugerido (últimas matrículas e médias)
+        with self.assertNumQueries(8):
+            resposta = self.cliente.get('/api/v1/alunos/', secure=True)
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(resposta.json()['count'], self.total)
+
+    def test_ativos(self):
+        # As mesmas consultas da página, sem a contagem (o orçamento é de menos de 10 por lote)
+        with self.assertNumQueries(7):
+            resposta = self.cliente.get('/api/v1/alunos/ativos/', secure=True)
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(len(resposta.json()), self.total)
+
+
+class ListagemAlunosConsultasVolumeTests(ListagemAlunosConsultasTests):
+    # 100 alunos: mais de uma página na listagem e uma lista de 100 nos activos
+    ALUNOS_POR_TURMA = 50
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class IdentidadesLoginConsultasTests(TestCase):
+    """O login localiza as contas candidatas de todas as tabelas numa única consulta"""
+
+    N_CONTAS = 2
+
+    @classmethod
+    def setUpTestData(cls):
+        for i in range(cls.N_CONTAS):
+            Usuario.objects.create(nome_completo=f'Usuário {i}', email=f'usuario{i}@escola.ao', senha_hash='senha')
+            User.objects.create(username=f'conta{i}', email=f'auth{i}@escola.ao')
+            Aluno.objects.create(
+                nome_completo=f'Aluno {i}', telefone='923000000', email=f'aluno{i}@escola.ao', numero_bi=f'BIA{i:05d}'
+            )
+            Encarregado.objects.create(
+                nome_completo=f'Encarregado {i}', email=f'encarregado{i}@escola.ao', numero_bi=f'BIE{i:05d}',
+                senha_hash='senha'
+            )
+        cls.aluno = Aluno.objects.get(email='aluno1@escola.ao')
+
+    def localizar(self, identificador):
+        with self.assertNumQueries(1):
+            return AuthService.localizar_contas(identificador)
+
+    def test_uma_consulta_por_identificador(self):
+        self.assertEqual(list(self.localizar('USUARIO1@escola.ao')), ['usuario'])
+        self.assertEqual(list(self.localizar('auth1@escola.ao')), ['auth_email'])
+        self.assertEqual(list(self.localizar('conta1')), ['auth_username'])
+        self.assertEqual(self.localizar('aluno1@escola.ao'), {'aluno': [self.aluno.pk]})
+        self.assertEqual(self.localizar(str(self.aluno.numero_matricula)), {'aluno': [self.aluno.pk]})
+        self.assertEqual(list(self.localizar('BIE00001')), ['encarregado'])
+        self.assertEqual(self.localizar('desconhecido@escola.ao'), {})
+
+    def test_login_de_identidade_desconhecida(self):
+        # Sem contas candidatas, nenhum tipo de utilizador volta a consultar a base de dados
+        with self.assertNumQueries(1), self.assertRaises(ValueError):
+            AuthService.authenticate_user('desconhecido@escola.ao', 'senha', 'funcionario')
+
+
+class IdentidadesLoginConsultasVolumeTests(IdentidadesLoginConsultasTests):
+    N_CONTAS = 40
+
+
+class ListagemCursosConsultasTests(TestCase):
+    """Índice de vagas da listagem de cursos: só os cursos da página e o ano activo"""
+
+    N_ANOS_HISTORICO = 1
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.ano, cls.curso, cls.turmas = criar_estrutura(n_salas=2)
+        VagaCurso.objects.create(id_curso=cls.curso, ano_lectivo=cls.ano, vagas=50)
+        classe = Classe.objects.get()
+        periodo = Periodo.objects.get()
+        for indice in range(cls.N_ANOS_HISTORICO):
+            anterior = AnoLectivo.objects.create(
+                nome=f'{2000 + indice}/{2001 + indice}', data_inicio=datetime.date(2000 + indice, 1, 1),
+                data_fim=datetime.date(2000 + indice, 12, 1), activo=False
+            )
+            VagaCurso.objects.create(id_curso=cls.curso, ano_lectivo=anterior, vagas=30)
+            # Histórico criado como se o ano ainda estivesse aberto (o save da turma recusa anos encerrados)
+            anterior.activo = True
+            turma = Turma.objects.create(
+                id_sala=cls.turmas[0].id_sala, id_curso=cls.curso, id_classe=classe, id_periodo=periodo,
+                ano_lectivo=anterior, capacidade=40
+            )
+            aluno = Aluno.objects.create(
+                nome_completo=f'Antigo {indice}', telefone='923000000', id_turma=turma, numero_bi=f'BIH{indice:05d}'
+            )
+            Matricula.objects.create(id_aluno=aluno, id_turma=turma, ano_lectivo=anterior)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_listagem_publica(self):
+        AnoLectivo.get_active_year()
+        # Contagem, página, vagas, matrículas e turmas agrupadas (restritas aos cursos da página)
+        with self.assertNumQueries(5):
+            resposta = APIClient().get('/api/v1/cursos/', secure=True)
+        self.assertEqual(resposta.status_code, 200)
+        curso = resposta.json()['results'][0]
+        self.assertEqual(curso['total_turmas'], len(self.turmas) + self.N_ANOS_HISTORICO)
+        self.assertEqual(curso['vagas_totais'], 50)
+        self.assertEqual(curso['vagas_disponiveis'], 50 - len(self.turmas) * 2)
+
+    def test_indice_restrito_ao_ano_activo(self):
+        indice = VagasService.contexto_serializer([self.curso.pk])['indice_vagas']
+        anos_com_vagas = {ano for (curso, ano), (vagas, preenchidas, turmas) in indice.items() if vagas or preenchidas}
+        self.assertEqual(anos_com_vagas, {self.ano.pk})
+        self.assertEqual(VagasService.total_turmas(indice, self.curso.pk), len(self.turmas) + self.N_ANOS_HISTORICO)
+
+
+class ListagemCursosConsultasVolumeTests(ListagemCursosConsultasTests):
+    N_ANOS_HISTORICO = 12
+
+
+class PDFCacheServiceTests(TestCase):
+    def setUp(self):
+        self.directorio = tempfile.mkdtemp(prefix='pdf_cache_')
+        self.addCleanup(shutil.rmtree, self.directorio, ignore_errors=True)
+        configuracao = override_settings(PDF_CACHE_DIR=self.directorio)
+        configuracao.enable()
+        self.addCleanup(configuracao.disable)
+        self.geracoes = 0
+
+    def gerar(self):
+        self.geracoes += 1
+        return f'%PDF-{self.geracoes}'.encode()
+
+    def obter(self, versao=1):
+        with PDFCacheService.obter_ou_gerar('pdf/vagas_resumo.html', {'ano_id': 1}, versao, self.gerar) as f:
+            return f.read()
+
+    def test_reutiliza_enquanto_os_dados_nao_mudam(self):
+        self.assertEqual(self.obter(), b'%PDF-1')
+        self.assertEqual(self.obter(), b'%PDF-1')
+        self.assertEqual(self.obter(versao=2), b'%PDF-2')
+        self.assertEqual(self.geracoes, 2)
+
+    def test_data_de_emissao_nao_fica_desactualizada(self):
+        """A data impressa no documento ('hoje') muda: o PDF de ontem não é servido"""
+        self.assertEqual(self.obter(), b'%PDF-1')
+        amanha = timezone.localdate() + datetime.timedelta(days=1)
+        with mock.patch('apis.services.pdf_cache_service.timezone.localdate', return_value=amanha):
+            self.assertEqual(self.obter(), b'%PDF-2')
+            self.assertEqual(self.obter(), b'%PDF-2')
+
+    def test_documentos_em_cache_nao_imprimem_a_hora(self):
+        """A chave só distingue o dia: a hora da primeira geração ficaria impressa o dia todo"""
+        template, contexto, _nome = RelatorioService.preparar('relatorio_turmas', {})
+        emissao = dateformat.format(timezone.localtime(contexto['hoje']), 'd/m/Y H:i')
+
+        self.assertIn(emissao, render_to_string(template, contexto))
+        self.assertNotIn(emissao, render_to_string(template, PDFCacheService.contexto(contexto)))
+
+    def test_versao_das_turmas_inclui_periodo_e_classe(self):
+        _ano, _curso, (turma,) = criar_estrutura()
+        antes = RelatorioService.versao_dados('relatorio_turmas', {})
+
+        Periodo.objects.filter(pk=turma.id_periodo_id).update(periodo='Tarde')
+        depois_periodo = RelatorioService.versao_dados('relatorio_turmas', {})
+        Classe.objects.filter(pk=turma.id_classe_id).update(nivel=11)
+        depois_classe = RelatorioService.versao_dados('relatorio_turmas', {})
+
+        self.assertNotEqual(antes, depois_periodo)
+        self.assertNotEqual(depois_periodo, depois_classe)
+
+
+class EventosSSETests(TestCase):
+    """O feed SSE só é servido num único worker (broker local ao processo)"""
+
+    def setUp(self):
+        self.cliente = APIClient()
+        self.cliente.force_authenticate(User.objects.create(username='admin', is_superuser=True))
+
+    def get(self):
+        return self.cliente.get('/api/v1/eventos/ocupacao/', secure=True)
+
+    @override_settings(WEB_CONCURRENCY=4, DEBUG=True)
+    def test_varios_workers(self):
+        resposta = self.get()
+        self.assertEqual(resposta.status_code, 503)
+        self.assertFalse(broker.tem_subscritores)
+
+    @override_settings(WEB_CONCURRENCY=1, DEBUG=False)
+    def test_wsgi_fora_do_debug(self):
+        self.assertEqual(self.get().status_code, 503)
+
+    @override_settings(EVENTOS_SSE=False, DEBUG=True)
+    def test_desactivado(self):
+        self.assertEqual(self.get().status_code, 503)
+
+    @override_settings(WEB_CONCURRENCY=1, DEBUG=True)
+    def test_um_worker(self):
+        resposta = self.get()
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(next(iter(resposta.streaming_content)), b'retry: 3000\n\n')
+        self.assertTrue(broker.tem_subscritores)
+        resposta.close()
+        self.assertFalse(broker.tem_subscritores)
+
+
+@override_settings(CACHES=CACHE_LOCAL, EVENTOS_SSE=False)
+class EventosBilheteTests(TestCase):
+    """O EventSource autentica-se com um bilhete de uso único, nunca com o access token no URL"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = Usuario.objects.create(
+            nome_completo='Administrador', email='admin@escola.ao', senha_hash='senha', is_superuser=True
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.cliente = cliente_api(self.usuario.pk)
+
+    def abrir_feed(self, **parametros):
+        # EVENTOS_SSE=False: um pedido autenticado chega à view e recebe 503
+        return APIClient().get('/api/v1/eventos/ocupacao/', parametros, secure=True)
+
+    def test_bilhete_de_uso_unico(self):
+        resposta = self.cliente.post('/api/v1/eventos/bilhete/', secure=True)
+        self.assertEqual(resposta.status_code, 201)
+        bilhete = resposta.json()['bilhete']
+        self.assertEqual(self.abrir_feed(bilhete=bilhete).status_code, 503)
+        self.assertEqual(self.abrir_feed(bilhete=bilhete).status_code, 401)
+
+    def test_access_token_no_url_recusado(self):
+        token = AuthService.generate_tokens({'id': self.usuario.pk, 'tipo': 'usuario'})['access']
+        self.assertEqual(self.abrir_feed(token=token).status_code, 401)
+        self.assertEqual(self.abrir_feed(bilhete=token).status_code, 401)
+
+    def test_bilhete_exige_autenticacao(self):
+        self.assertEqual(APIClient().post('/api/v1/eventos/bilhete/', secure=True).status_code, 401)
+
+    def test_bilhete_expirado(self):
+        bilhete = EventosService.emitir_bilhete('usuario', self.usuario.pk)
+        cache.delete(EventosService._chave_bilhete(bilhete))
+        self.assertEqual(self.abrir_feed(bilhete=bilhete).status_code, 401)
+
+
+class BackupJobConcorrenciaTests(TestCase):
+    def test_um_backup_em_curso(self):
+        job = BackupService.criar_job('usuario', 1)
+        with self.assertRaisesMessage(ValueError, 'Já existe um backup em curso.'):
+            BackupService.criar_job('usuario', 2)
+
+        BackupJob.objects.filter(pk=job.pk).update(status=BackupJob.STATUS_CONCLUIDO)
+        self.assertEqual(BackupService.criar_job('sistema', None).status, BackupJob.STATUS_PENDENTE)
+
+    def test_pedidos_simultaneos(self):
+        """Dois pedidos que passam ambos a verificação em_curso: a base de dados rejeita o segundo"""
+        with mock.patch.object(BackupService, 'em_curso', return_value=None):
+            BackupService.criar_job('usuario', 1)
+            with self.assertRaisesMessage(ValueError, 'Já existe um backup em curso.'):
+                BackupService.criar_job('sistema', None)
+        self.assertEqual(BackupJob.objects.count(), 1)
+
+
+class CompressaoTests(TestCase):
+    """CompressorParalelo: os blocos concatenados descomprimem para os dados originais"""
+
+    BLOCO = 1024
+
+    def comprimir_e_descomprimir(self, codec, dados, escritas=1):
+        destino = io.BytesIO()
+        with mock.patch.dict(compressao_utils.TAMANHO_BLOCO, {codec: self.BLOCO}):
+            with compressao_utils.CompressorParalelo(destino, codec, 1, n_threads=2) as compressor:
+                passo = max(1, len(dados) // escritas)
+                for inicio in range(0, len(dados), passo):
+                    compressor.write(dados[inicio:inicio + passo])
+        destino.seek(0)
+        return compressao_utils.descomprimir(destino, codec).read()
+
+    def test_round_trip(self):
+        dados = os.urandom(self.BLOCO // 2) * 7
+        casos = {
+            'vazio': (b'', 1),
+            'um bloco exacto': (dados[:self.BLOCO], 1),
+            'vários blocos em escritas parciais': (dados, 5),
+        }
+        for codec in ('gzip', 'xz'):
+            for nome, (entrada, escritas) in casos.items():
+                with self.subTest(codec=codec, caso=nome):
+                    self.assertEqual(self.comprimir_e_descomprimir(codec, entrada, escritas), entrada)
+
+    def test_threads_por_omissao(self):
+        with override_settings(BACKUP_COMPRESSAO_THREADS=0), mock.patch('os.cpu_count', return_value=16):
+            self.assertEqual(compressao_utils.threads(), compressao_utils.THREADS_PADRAO)
+        with override_settings(BACKUP_COMPRESSAO_THREADS=0), mock.patch('os.cpu_count', return_value=1):
+            self.assertEqual(compressao_utils.threads(), 1)
+        with override_settings(BACKUP_COMPRESSAO_THREADS=6):
+            self.assertEqual(compressao_utils.threads(), 6)
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class BackupFicheirosTests(TestCase):
+    """Só os arquivos do catálogo podem ser descarregados, eliminados ou restaurados"""
+
+    def setUp(self):
+        self.directorio = tempfile.mkdtemp(prefix='backups_')
+        self.addCleanup(shutil.rmtree, self.directorio, ignore_errors=True)
+        for alvo, atributo, valor in (
+            (BackupService, 'DIRECTORIO', self.directorio),
+            (BackupViewSet, 'BACKUP_DIR', self.directorio),
+            (CatalogoBackupService, 'FICHEIRO', os.path.join(self.directorio, 'catalogo.json')),
+            (CatalogoBackupService, 'FICHEIRO_BLOQUEIO', os.path.join(self.directorio, '.catalogo.lock')),
+        ):
+            patcher = mock.patch.object(alvo, atributo, valor)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        with zipfile.ZipFile(os.path.join(self.directorio, 'backup_20260101_000000.zip'), 'w') as arquivo:
+            arquivo.writestr('database.dump', b'dump')
+        with open(os.path.join(self.directorio, 'backup_20260102_000000.zip.part'), 'wb') as f:
+            f.write(b'em curso')
+        CatalogoBackupService.reconstruir()
+
+        usuario = Usuario.objects.create(
+            nome_completo='Administrador', email='admin@escola.ao', senha_hash='senha', is_superuser=True
+        )
+        tokens = AuthService.generate_tokens({'id': usuario.pk, 'tipo': 'usuario'})
+        self.cliente = APIClient()
+        self.cliente.credentials(HTTP_AUTHORIZATION=f"Bearer {tokens['access']}")
+
+    def test_ficheiros_internos_da_pasta(self):
+        for nome in ('catalogo.json', '.catalogo.lock', 'backup_20260102_000000.zip.part', '../settings.py'):
+            self.assertEqual(
+                self.cliente.get('/api/v1/backups/download_backup/', {'filename': nome}, secure=True).status_code, 404, nome
+            )
+            self.assertEqual(
+                self.cliente.delete(f'/api/v1/backups/delete_backup/?filename={nome}', secure=True).status_code, 404, nome
+            )
+            self.assertEqual(
+                self.cliente.post('/api/v1/backups/restore_backup/', {'filename': nome}, secure=True).status_code, 404, nome
+            )
+        self.assertEqual(
+            sorted(os.listdir(self.directorio)),
+            ['.catalogo.lock', 'backup_20260101_000000.zip', 'backup_20260102_000000.zip.part', 'catalogo.json']
+        )
+
+    def test_backup_do_catalogo(self):
+        resposta = self.cliente.get(
+            '/api/v1/backups/download_backup/', {'filename': 'backup_20260101_000000.zip'}, secure=True
+        )
+        self.assertEqual(resposta.status_code, 200)
+        resposta.close()
+
+        resposta = self.cliente.delete('/api/v1/backups/delete_backup/?filename=backup_20260101_000000.zip', secure=True)
+        self.assertEqual(resposta.status_code, 200)
+        self.assertIsNone(CatalogoBackupService.obter('backup_20260101_000000.zip'))
+
+class CatalogoContagemTests(TestCase):
+    def test_contagem_exacta_fora_do_postgresql(self):
+        criar_estrutura(alunos_por_turma=3)
+        tabelas, estimado = CatalogoBackupService.contagem_registos()
+        self.assertFalse(estimado)
+        self.assertEqual(tabelas['aluno'], 3)
+        self.assertEqual(tabelas['matricula'], 3)
+
+    def test_entrada_com_estimativas(self):
+        with tempfile.NamedTemporaryFile(suffix='.zip') as arquivo:
+            entrada = CatalogoBackupService.entrada(
+                arquivo.name, {}, tabelas={'aluno': 1200, 'matricula': None}, registos_estimados=True
+            )
+        # Tabelas ainda não analisadas (sem estimativa) não entram no total
+        self.assertEqual(entrada['registos_bd'], 1200)
+        self.assertTrue(entrada['registos_estimados'])
+
+
+class AgendamentoBackupTests(TestCase):
+    def setUp(self):
+        self.agendamento = AgendamentoBackup.objects.create(
+            data_hora=timezone.now() - datetime.timedelta(minutes=1), descricao='Backup semanal'
+        )
+
+    def recarregar(self):
+        return AgendamentoBackup.objects.get(pk=self.agendamento.pk)
+
+    @mock.patch('apis.services.agendamento_backup_service.subprocess.Popen', side_effect=OSError('sem memória'))
+    def test_falha_ao_lancar_o_processo(self, _popen):
+        identificador = AgendamentoBackupService.identificador()
+        self.assertTrue(AgendamentoBackupService.reservar(self.agendamento.pk, identificador))
+
+        with self.assertLogs('apis.services.agendamento_backup_service', 'ERROR'):
+            job = AgendamentoBackupService.executar(self.recarregar())
+
+        self.assertEqual(job.status, BackupJob.STATUS_ERRO)
+        self.assertIn('sem memória', job.erro)
+        agendamento = self.recarregar()
+        self.assertEqual(agendamento.tentativas, 1)
+        self.assertEqual(agendamento.reservado_por, '')
+        self.assertIsNone(agendamento.reservado_em)
+        self.assertIsNotNone(agendamento.proxima_tentativa)
+        self.assertFalse(agendamento.executado)
+        # O backup falhado não fica em curso: a próxima tentativa pode criar outro
+        self.assertIsNone(BackupService.em_curso())
+        self.assertTrue(AgendamentoBackupService.reservar(self.agendamento.pk, identificador))
+
+
+class RelatorioJobServiceTests(TestCase):
+    def setUp(self):
+        self.media = tempfile.mkdtemp(prefix='relatorios_')
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        configuracao = override_settings(MEDIA_ROOT=self.media)
+        configuracao.enable()
+        self.addCleanup(configuracao.disable)
+
+    def test_relatorio_desconhecido(self):
+        with self.assertRaises(ValueError):
+            RelatorioJobService.submeter('inexistente', {})
+        self.assertFalse(RelatorioJob.objects.exists())
+
+    def test_reserva_os_mais_antigos_sem_repetir(self):
+        jobs = [RelatorioJobService.submeter('relatorio_vagas', {}, 'usuario', 1) for _ in range(3)]
+        # criado_em distintos: a ordem da fila não depende da resolução do relógio
+        for i, job in enumerate(jobs):
+            RelatorioJob.objects.filter(pk=job.pk).update(criado_em=timezone.now() - datetime.timedelta(minutes=10 - i))
+
+        self.assertEqual(RelatorioJobService.reservar(2), [jobs[0].pk, jobs[1].pk])
+        self.assertEqual(RelatorioJobService.reservar(2), [jobs[2].pk])
+        self.assertEqual(RelatorioJobService.reservar(2), [])
+        self.assertEqual(RelatorioJob.objects.filter(status=RelatorioJob.STATUS_PROCESSANDO).count(), 3)
+
+    def test_recupera_jobs_interrompidos(self):
+        parado = RelatorioJobService.submeter('relatorio_vagas', {})
+        activo = RelatorioJobService.submeter('relatorio_vagas', {})
+        RelatorioJobService.reservar(2)
+        RelatorioJob.objects.filter(pk=parado.pk).update(
+            iniciado_em=timezone.now() - RelatorioJobService.TEMPO_MAXIMO - datetime.timedelta(minutes=1)
+        )
+
+        self.assertEqual(RelatorioJobService.recuperar_interrompidos(), 1)
+        self.assertEqual(RelatorioJob.objects.get(pk=parado.pk).status, RelatorioJob.STATUS_PENDENTE)
+        self.assertEqual(RelatorioJob.objects.get(pk=activo.pk).status, RelatorioJob.STATUS_PROCESSANDO)
+        self.assertEqual(RelatorioJobService.reservar(1), [parado.pk])
+
+    @mock.patch.object(RelatorioService, 'gerar_pdf', return_value=b'%PDF-1.4')
+    def test_executar_guarda_o_pdf(self, _gerar_pdf):
+        job = RelatorioJobService.submeter('relatorio_vagas', {})
+        RelatorioJobService.reservar(1)
+
+        self.assertEqual(RelatorioJobService.executar(job.pk), RelatorioJob.STATUS_CONCLUIDO)
+        job.refresh_from_db()
+        self.assertEqual(job.nome_ficheiro, 'relatorio_vagas.pdf')
+        self.assertIsNotNone(job.concluido_em)
+        with job.ficheiro.open('rb') as f:
+            self.assertEqual(f.read(), b'%PDF-1.4')
+
+    def test_executar_com_parametros_invalidos(self):
+        job = RelatorioJobService.submeter('alunos_por_turma', {})
+
+        self.assertEqual(RelatorioJobService.executar(job.pk), RelatorioJob.STATUS_ERRO)
+        job.refresh_from_db()
+        self.assertEqual(job.erro, 'turma_id é obrigatório')
+        self.assertFalse(job.ficheiro)
+
+
+class _PoolSincrono:
+    """ProcessPoolExecutor de teste: executa cada job no próprio processo (a base de dados de teste não é partilhável)"""
+    criados = 0
+
+    def __init__(self, max_workers, initializer=None):
+        type(self).criados += 1
+
+    def submit(self, funcao, *args):
+        futuro = Future()
+        try:
+            futuro.set_result(funcao(*args))
+        except Exception as e:
+            futuro.set_exception(e)
+        return futuro
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        pass
+
+
+def _documento_falso(tipo, pk, site_url):
+    """gerar_documento de teste: o ID 0 falha, os restantes repetem o nome do ficheiro"""
+    if pk == 0:
+        return f'{tipo}_{pk}.pdf', None, 'Aluno sem turma'
+    return 'Ficha_Matricula_sem_numero.pdf', f'PDF {pk}'.encode(), None
+
+
+@mock.patch('apis.services.documentos_lote_service.gerar_documento', _documento_falso)
+@mock.patch.object(DocumentosLoteService, 'pool', lambda: _PoolSincrono(max_workers=1))
+class DocumentosLoteZipTests(TestCase):
+    """ZIP em streaming dos documentos em lote"""
+
+    def arquivo(self, ids):
+        dados = b''.join(DocumentosLoteService.stream_zip('ficha_matricula', ids, 'http://escola.ao'))
+        return zipfile.ZipFile(io.BytesIO(dados))
+
+    def test_nomes_repetidos(self):
+        with self.arquivo([1, 2, 3]) as arquivo:
+            self.assertEqual(arquivo.namelist(), [
+                'Ficha_Matricula_sem_numero.pdf', 'Ficha_Matricula_sem_numero_2.pdf', 'Ficha_Matricula_sem_numero_3.pdf'
+            ])
+            # Os documentos são escritos pela ordem em que terminam
+            self.assertEqual(sorted(arquivo.read(nome) for nome in arquivo.namelist()), [b'PDF 1', b'PDF 2', b'PDF 3'])
+
+    def test_erros_listados_no_fim(self):
+        with self.arquivo([1, 0, 2]) as arquivo:
+            self.assertEqual(arquivo.namelist()[-1], 'ERROS.txt')
+            self.assertEqual(arquivo.read('ERROS.txt').decode(), 'ficha_matricula_0.pdf: Aluno sem turma')
+            self.assertEqual(len(arquivo.namelist()), 3)
+
+    def test_sem_erros_nem_documentos(self):
+        with self.arquivo([]) as arquivo:
+            self.assertEqual(arquivo.namelist(), [])
+
+
+class RestauroLocalizarDumpTests(TestCase):
+    """Dump da base de dados nos vários formatos de arquivo de backup"""
+
+    def localizar(self, *nomes):
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, 'w') as arquivo:
+            for nome in nomes:
+                arquivo.writestr(nome, b'dados')
+        with zipfile.ZipFile(buffer) as arquivo:
+            return RestauroService.localizar_dump(arquivo)
+
+    def test_formatos(self):
+        casos = [
+            (('escola.sql', 'media/fotos/a.jpg'), ('escola.sql', 'sql', None)),
+            (('database.dump', 'manifesto.json'), ('database.dump', 'custom', None)),
+            (('database.dump.gz', 'manifesto.json'), ('database.dump.gz', 'custom', 'gzip')),
+            (('database.dump.xz', 'manifesto.json'), ('database.dump.xz', 'custom', 'xz')),
+            # O dump custom tem prioridade sobre SQL avulso; SQL dentro de pastas não é um dump
+            (('database.dump.gz', 'escola.sql'), ('database.dump.gz', 'custom', 'gzip')),
+            (('media/migracao.sql', 'media/fotos/a.jpg'), (None, None, None)),
+        ]
+        for nomes, esperado in casos:
+            with self.subTest(nomes=nomes):
+                self.assertEqual(self.localizar(*nomes), esperado)
+
+
+class RestauroBloqueioTests(TestCase):
+    """Ficheiro de bloqueio do restauro: exclusivo, mas sem ficar preso após um restauro interrompido"""
+
+    def setUp(self):
+        directorio = tempfile.mkdtemp(prefix='restauro_')
+        self.addCleanup(shutil.rmtree, directorio, ignore_errors=True)
+        for alvo, atributo, valor in (
+            (BackupService, 'DIRECTORIO', directorio),
+            (RestauroService, 'DIRECTORIO_ESTADO', os.path.join(directorio, 'restauros')),
+            (RestauroService, 'FICHEIRO_BLOQUEIO', os.path.join(directorio, '.restauro.lock')),
+        ):
+            patcher = mock.patch.object(alvo, atributo, valor)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def gravar_estado(self, token, status, ha=datetime.timedelta()):
+        actualizado = (datetime.datetime.now() - ha).isoformat()
+        RestauroService._gravar({'token': token, 'status': status, 'actualizado_em': actualizado})
+
+    def test_sem_bloqueio(self):
+        self.assertIsNone(RestauroService.em_curso())
+
+    def test_restauro_activo_bloqueia(self):
+        self.gravar_estado('a' * 32, RestauroService.STATUS_PROCESSANDO)
+        RestauroService._bloquear('a' * 32)
+        self.assertEqual(RestauroService.em_curso(), 'a' * 32)
+        with self.assertRaisesMessage(ValueError, 'Já existe um restauro em curso.'):
+            RestauroService._bloquear('b' * 32)
+        with open(RestauroService.FICHEIRO_BLOQUEIO) as f:
+            self.assertEqual(f.read(), 'a' * 32)
+
+    def test_bloqueios_abandonados_sao_substituidos(self):
+        casos = {
+            'sem progresso': (RestauroService.STATUS_PROCESSANDO, BackupService.TEMPO_SEM_PROGRESSO * 2),
+            'concluído': (RestauroService.STATUS_CONCLUIDO, datetime.timedelta()),
+            'sem estado': (None, None),
+        }
+        for caso, (status, ha) in casos.items():
+            with self.subTest(caso=caso):
+                if status:
+                    self.gravar_estado('a' * 32, status, ha)
+                with open(RestauroService.FICHEIRO_BLOQUEIO, 'w') as f:
+                    f.write('a' * 32 if status else 'token-invalido')
+                self.assertIsNone(RestauroService.em_curso())
+                RestauroService._bloquear('b' * 32)
+                with open(RestauroService.FICHEIRO_BLOQUEIO) as f:
+                    self.assertEqual(f.read(), 'b' * 32)
+                os.remove(RestauroService.FICHEIRO_BLOQUEIO)
+
+
+@mock.patch('apis.services.relatorio_job_service.connections.close_all')
+@mock.patch('apis.services.relatorio_job_service.ProcessPoolExecutor', _PoolSincrono)
+class ProcessadorRelatoriosTests(TestCase):
+    def setUp(self):
+        _PoolSincrono.criados = 0
+        self.media = tempfile.mkdtemp(prefix='relatorios_')
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        configuracao = override_settings(MEDIA_ROOT=self.media)
+        configuracao.enable()
+        self.addCleanup(configuracao.disable)
+
+    @mock.patch.object(RelatorioService, 'gerar_pdf', return_value=b'%PDF-1.4')
+    def test_falhas_fora_do_job_nao_param_o_processador(self, _gerar_pdf, _close_all):
+        morto, excepcao, normal = [RelatorioJobService.submeter('relatorio_vagas', {}) for _ in range(3)]
+        for i, job in enumerate((morto, excepcao, normal)):
+            RelatorioJob.objects.filter(pk=job.pk).update(criado_em=timezone.now() - datetime.timedelta(minutes=10 - i))
+        efeitos = {morto.pk: BrokenProcessPool(), excepcao.pk: RuntimeError('falha no worker')}
+
+        def executar_job(job_id):
+            if job_id in efeitos:
+                raise efeitos[job_id]
+            return RelatorioJobService.executar(job_id)
+
+        with mock.patch('apis.services.relatorio_job_service.executar_job', side_effect=executar_job), \
+                self.assertLogs('apis.services.relatorio_job_service', 'ERROR'):
+            processados = RelatorioJobService.processar(max_workers=1, intervalo=0.01, uma_vez=True, log=lambda m: None)
+
+        self.assertEqual(processados, 3)
+        estados = dict(RelatorioJob.objects.values_list('pk', 'status'))
+        self.assertEqual(estados, {
+            morto.pk: RelatorioJob.STATUS_ERRO, excepcao.pk: RelatorioJob.STATUS_ERRO, normal.pk: RelatorioJob.STATUS_CONCLUIDO,
+        })
+        self.assertEqual(RelatorioJob.objects.get(pk=excepcao.pk).erro, 'falha no worker')
+        # O pool quebrado foi substituído
+        self.assertEqual(_PoolSincrono.criados, 2)
+
+class ManifestoMediaTests(TestCase):
+    """Media incremental: conteúdos repetidos guardados uma vez e restauro a partir da cadeia de arquivos"""
+
+    def setUp(self):
+        self.media = tempfile.mkdtemp(prefix='media_')
+        self.backups = tempfile.mkdtemp(prefix='backups_')
+        for directorio in (self.media, self.backups):
+            self.addCleanup(shutil.rmtree, directorio, ignore_errors=True)
+        configuracao = override_settings(MEDIA_ROOT=self.media)
+        configuracao.enable()
+        self.addCleanup(configuracao.disable)
+        patcher = mock.patch.object(BackupService, 'DIRECTORIO', self.backups)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def escrever(self, relativo, conteudo):
+        caminho = os.path.join(self.media, relativo)
+        os.makedirs(os.path.dirname(caminho), exist_ok=True)
+        with open(caminho, 'wb') as f:
+            f.write(conteudo)
+
+    def backup(self, nome, completo=False):
+        progresso = SimpleNamespace(avancar=lambda n_bytes: None)
+        with zipfile.ZipFile(os.path.join(self.backups, nome), 'w') as arquivo:
+            manifesto = BackupService._escrever_media(
+                arquivo, nome, BackupService.ficheiros_media(), completo, progresso, 6
+            )
+            arquivo.writestr(BackupService.NOME_MANIFESTO, json.dumps(manifesto))
+        return manifesto
+
+    def membros(self, nome):
+        with zipfile.ZipFile(os.path.join(self.backups, nome)) as arquivo:
+            return sorted(m for m in arquivo.namelist() if m.startswith('media/'))
+
+    def test_conteudo_repetido_guardado_uma_vez(self):
+        self.escrever('fotos/a.jpg', b'foto')
+        self.escrever('fotos/copia.jpg', b'foto')
+        self.escrever('docs/b.pdf', b'documento')
+
+        manifesto = self.backup('backup_20260101_000000.zip')
+        self.assertEqual(manifesto['tipo'], 'completo')
+        self.assertEqual(manifesto['ficheiros_guardados'], 2)
+        self.assertEqual(len(manifesto['media']), 3)
+        self.assertEqual(manifesto['media']['fotos/a.jpg']['membro'], manifesto['media']['fotos/copia.jpg']['membro'])
+
+    def test_incremental_e_restauro(self):
+        self.escrever('fotos/a.jpg', b'foto')
+        self.escrever('docs/b.pdf', b'documento')
+        self.backup('backup_20260101_000000.zip')
+
+        self.escrever('docs/b.pdf', b'documento revisto')
+        self.escrever('docs/c.pdf', b'novo')
+        manifesto = self.backup('backup_20260102_000000.zip')
+
+        self.assertEqual(manifesto['tipo'], 'incremental')
+        self.assertEqual(manifesto['anterior'], 'backup_20260101_000000.zip')
+        self.assertEqual(manifesto['media']['fotos/a.jpg']['arquivo'], 'backup_20260101_000000.zip')
+        self.assertEqual(self.membros('backup_20260102_000000.zip'), ['media/docs/b.pdf', 'media/docs/c.pdf'])
+
+        destino = tempfile.mkdtemp(prefix='restauro_')
+        self.addCleanup(shutil.rmtree, destino, ignore_errors=True)
+        restaurados = BackupService.restaurar_media(os.path.join(self.backups, 'backup_20260102_000000.zip'), destino)
+
+        self.assertEqual(restaurados, 3)
+        for relativo, conteudo in (('fotos/a.jpg', b'foto'), ('docs/b.pdf', b'documento revisto'), ('docs/c.pdf', b'novo')):
+            with open(os.path.join(destino, relativo), 'rb') as f:
+                self.assertEqual(f.read(), conteudo)
+        # Datas repostas: o backup seguinte continua incremental sem reler os ficheiros
+        self.assertEqual(
+            os.stat(os.path.join(destino, 'fotos/a.jpg')).st_mtime, manifesto['media']['fotos/a.jpg']['mtime']
+        )
+
+    def test_restauro_com_arquivo_de_referencia_em_falta(self):
+        self.escrever('fotos/a.jpg', b'foto')
+        self.backup('backup_20260101_000000.zip')
+        self.escrever('docs/b.pdf', b'documento')
+        self.backup('backup_20260102_000000.zip')
+        os.remove(os.path.join(self.backups, 'backup_20260101_000000.zip'))
+
+        destino = tempfile.mkdtemp(prefix='restauro_')
+        self.addCleanup(shutil.rmtree, destino, ignore_errors=True)
+        with self.assertRaisesMessage(ValueError, 'backup_20260101_000000.zip'):
+            BackupService.restaurar_media(os.path.join(self.backups, 'backup_20260102_000000.zip'), destino)
+
+class PaginacaoKeysetTests(TestCase):
+    """Cursores (data_hora, id_historico) com datas repetidas"""
+
+    @classmethod
+    def setUpTestData(cls):
+        base = timezone.now()
+        for i in range(23):
+            registo = Historico.objects.create(tipo_accao=f'Acção {i}')
+            # Grupos de 4 registos com a mesma data: o desempate é feito pela chave primária
+            Historico.objects.filter(pk=registo.pk).update(data_hora=base - datetime.timedelta(seconds=i // 4))
+
+    def percorrer(self, chave, cursor, tamanho=5):
+        paginas = []
+        while cursor:
+            linhas, metadados = paginacao_utils.paginar(Historico.objects.all(), 'data_hora', cursor, tamanho)
+            paginas.append([h.pk for h in linhas])
+            cursor = metadados[chave]
+        return paginas
+
+    def test_ida_e_volta(self):
+        esperado = list(Historico.objects.order_by('-data_hora', '-id_historico').values_list('pk', flat=True))
+
+        linhas, metadados = paginacao_utils.paginar(Historico.objects.all(), 'data_hora', tamanho=5)
+        self.assertFalse(metadados['has_previous'])
+        paginas = [[h.pk for h in linhas]] + self.percorrer('next_cursor', metadados['next_cursor'])
+        self.assertEqual([len(p) for p in paginas], [5, 5, 5, 5, 3])
+        self.assertEqual(list(itertools.chain.from_iterable(paginas)), esperado)
+
+        # Da última página para trás: as mesmas páginas, pela ordem inversa
+        _linhas, metadados = paginacao_utils.paginar(
+            Historico.objects.all(), 'data_hora', paginacao_utils.codificar_cursor(
+                'n', Historico.objects.get(pk=paginas[-2][-1]).data_hora, paginas[-2][-1]
+            ), 5
+        )
+        self.assertFalse(metadados['has_next'])
+        self.assertEqual(self.percorrer('previous_cursor', metadados['previous_cursor']), paginas[-2::-1])
+
+    def test_cursor_invalido(self):
+        for cursor in ('nao-e-um-cursor', paginacao_utils.codificar_cursor('x', timezone.now(), 1)):
+            with self.assertRaises(paginacao_utils.CursorInvalido):
+                paginacao_utils.paginar(Historico.objects.all(), 'data_hora', cursor)
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class LancamentoNotasTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        _ano, _curso, (cls.turma, cls.outra) = criar_estrutura(n_salas=2, alunos_por_turma=3)
+        cls.alunos = list(Aluno.objects.filter(id_turma=cls.turma).values_list('pk', flat=True))
+        cls.disciplina = Disciplina.objects.create(nome='Matemática')
+        cls.professor = Funcionario.objects.create(
+            codigo_identificacao='PROF001', nome_completo='Professor', senha_hash='senha'
+        )
+
+    def lancar(self, valores, tipo='Prova do Professor'):
+        return AcademicService.lancar_notas_lote(
+            self.turma, self.disciplina, self.professor, tipo,
+            [{'id_aluno': aluno_id, 'valor': valor} for aluno_id, valor in valores]
+        )
+
+    def test_rejeita_a_pauta_com_alunos_de_outra_turma(self):
+        de_fora = Aluno.objects.filter(id_turma=self.outra).values_list('pk', flat=True).first()
+        resultado = self.lancar([(self.alunos[0], 12), (de_fora, 14), (self.alunos[1], 25)])
+
+        self.assertFalse(resultado['valido'])
+        self.assertEqual(
+            [(r['estado'], r['erro']) for r in resultado['resultados']],
+            [
+                ('nao_gravada', None),
+                ('rejeitada', 'O aluno não pertence a esta turma.'),
+                ('rejeitada', 'A nota deve estar entre 0 e 20.'),
+            ]
+        )
+        self.assertFalse(Nota.objects.exists())
+
+    def test_estado_de_cada_linha(self):
+        self.lancar([(self.alunos[0], 10), (self.alunos[1], 11)])
+        resultado = self.lancar([(self.alunos[0], 10), (self.alunos[1], 15), (self.alunos[2], 9)])
+
+        self.assertTrue(resultado['valido'])
+        self.assertEqual(
+            [r['estado'] for r in resultado['resultados']], ['inalterada', 'actualizada', 'criada']
+        )
+        self.assertEqual((resultado['criadas'], resultado['actualizadas']), (1, 1))
+        self.assertEqual(Nota.objects.get(id_aluno_id=self.alunos[1]).valor, Decimal('15'))
+
+    def test_reenvio_nao_duplica(self):
+        pauta = [(aluno_id, 12) for aluno_id in self.alunos]
+        self.lancar(pauta)
+        self.lancar(pauta)
+        # Outro tipo de avaliação é outra nota
+        self.lancar(pauta, tipo='Prova Trimestral')
+
+        self.assertEqual(Nota.objects.count(), 2 * len(self.alunos))
+
+    def test_envio_concorrente_actualiza_a_mesma_nota(self):
+        """Dois envios que não vêem as notas um do outro: a restrição transforma o segundo em actualização"""
+        with mock.patch.object(Nota.objects, 'filter', wraps=Nota.objects.filter) as filtro:
+            filtro.return_value = Nota.objects.none().values_list('id_aluno_id', 'valor', 'id_professor_id')
+            self.lancar([(self.alunos[0], 8)])
+            self.lancar([(self.alunos[0], 13)])
+
+        self.assertEqual(list(Nota.objects.values_list('id_aluno_id', 'valor')), [(self.alunos[0], Decimal('13'))])
+
+
+class RegistoFaltasTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        _ano, _curso, (cls.turma, cls.outra) = criar_estrutura(n_salas=2, alunos_por_turma=3)
+        cls.alunos = list(Aluno.objects.filter(id_turma=cls.turma).values_list('pk', flat=True))
+        cls.disciplina = Disciplina.objects.create(nome='Física')
+        cls.dia = datetime.date(2026, 3, 2)
+
+    def registar(self, aluno_ids):
+        return AcademicService.registrar_falta_lote(aluno_ids, self.disciplina.pk, self.turma.pk, self.dia)
+
+    def test_rejeita_alunos_de_outra_turma(self):
+        de_fora = Aluno.objects.filter(id_turma=self.outra).values_list('pk', flat=True).first()
+        with self.assertRaises(ValidationError):
+            self.registar([self.alunos[0], de_fora])
+        self.assertFalse(FaltaAluno.objects.exists())
+
+    def test_ignora_faltas_ja_registadas(self):
+        self.assertEqual(self.registar(self.alunos[:2]), {'criadas': 2, 'ignoradas': []})
+        self.assertEqual(self.registar(self.alunos), {'criadas': 1, 'ignoradas': self.alunos[:2]})
+        self.assertEqual(FaltaAluno.objects.count(), 3)
+
+    def test_chamada_concorrente_nao_duplica(self):
+        """Duas chamadas que não vêem as faltas uma da outra: a restrição ignora a repetida"""
+        with mock.patch.object(FaltaAluno.objects, 'filter', return_value=FaltaAluno.objects.none()):
+            self.registar(self.alunos)
+            self.registar(self.alunos)
+
+        self.assertEqual(FaltaAluno.objects.count(), len(self.alunos))
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+@override_settings(CACHES=CACHE_LOCAL)
+class CacheStatusCandidatoTests(TestCase):
+    """A alteração de um candidato remove apenas as suas entradas de consultar_status"""
+
+    def setUp(self):
+        cache.clear()
+        self.ano, self.curso, _ = criar_estrutura(n_salas=1, alunos_por_turma=0)
+        self.candidatos = [
+            Candidato.objects.create(
+                nome_completo=f'Candidato {i}', genero='M', data_nascimento=datetime.date(2010, 1, 1),
+                numero_bi=f'BIC{i:05d}', residencia='Luanda', telefone='923000000', escola_proveniencia='Escola',
+                municipio_escola='Luanda', ano_conclusao=2025, media_final=Decimal('14.00'),
+                curso_primeira_opcao=self.curso, nome_encarregado='Encarregado', parentesco_encarregado='Pai',
+                telefone_encarregado='923000001'
+            )
+            for i in range(2)
+        ]
+        self.cliente = APIClient()
+        for candidato in self.candidatos:
+            for termo in (candidato.numero_inscricao, candidato.numero_bi):
+                self.consultar(termo)
+
+    def consultar(self, termo):
+        resposta = self.cliente.get('/api/v1/candidaturas/consultar_status/', {'q': termo}, secure=True)
+        self.assertEqual(resposta.status_code, 200)
+        return resposta.json()
+
+    def em_cache(self, termo):
+        return cache.get(cache_utils.chave(cache_utils.NS_CANDIDATOS_STATUS, termo)) is not None
+
+    def test_alteracao_remove_so_as_chaves_do_candidato(self):
+        alterado, outro = Candidato.objects.get(pk=self.candidatos[0].pk), self.candidatos[1]
+        alterado.status = 'AUSENTE'
+        alterado.save()
+        self.assertFalse(self.em_cache(alterado.numero_inscricao))
+        self.assertFalse(self.em_cache(alterado.numero_bi))
+        self.assertTrue(self.em_cache(outro.numero_inscricao))
+        self.assertTrue(self.em_cache(outro.numero_bi))
+        self.assertEqual(self.consultar(alterado.numero_bi)['status'], 'AUSENTE')
+
+    def test_bi_alterado_remove_a_chave_antiga(self):
+        alterado = Candidato.objects.get(pk=self.candidatos[0].pk)
+        bi_antigo = alterado.numero_bi
+        alterado.numero_bi = 'BIC99999'
+        alterado.save()
+        self.assertFalse(self.em_cache(bi_antigo))
+
+
+class SincronizacaoTests(TestCase):
+    """Sincronização paginada por chave primária (DeltaSyncMixin)"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.salas = [Sala.objects.create(numero_sala=numero, capacidade_alunos=40).pk for numero in range(1, 6)]
+        cls.usuario = Usuario.objects.create(
+            nome_completo='Administrador', email='admin@escola.ao', senha_hash='senha', is_superuser=True
+        )
+
+    def sincronizar(self, **params):
+        resposta = cliente_api(self.usuario.pk).get('/api/v1/salas/sincronizar/', params, secure=True)
+        self.assertEqual(resposta.status_code, 200)
+        return resposta.json()
+
+    def percorrer(self, **params):
+        paginas = [self.sincronizar(page_size=2, **params)]
+        while paginas[-1]['pagina_seguinte']:
+            paginas.append(self.sincronizar(page_size=2, pagina=paginas[-1]['pagina_seguinte'], **params))
+        return paginas
+
+    def test_carga_inicial_paginada(self):
+        paginas = self.percorrer()
+
+        self.assertEqual([len(p['alterados']) for p in paginas], [2, 2, 1])
+        self.assertEqual([sala['id_sala'] for p in paginas for sala in p['alterados']], self.salas)
+        # O cursor só vem na última página (e é o do início da sincronização)
+        self.assertEqual([p['cursor'] is None for p in paginas], [True, True, False])
+        self.assertTrue(all(p['completo'] for p in paginas))
+
+    def test_delta_paginado(self):
+        agora = timezone.now()
+        Sala.objects.update(atualizado_em=agora - datetime.timedelta(hours=1))
+        cursor = (agora - datetime.timedelta(minutes=30)).isoformat()
+        Sala.objects.filter(pk__in=self.salas[1:4]).update(atualizado_em=agora)
+        Sala.objects.get(pk=self.salas[4]).delete()
+
+        paginas = self.percorrer(desde=cursor)
+        self.assertEqual([sala['id_sala'] for p in paginas for sala in p['alterados']], self.salas[1:4])
+        self.assertEqual(paginas[0]['removidos'], [self.salas[4]])
+        self.assertFalse(any(p['removidos'] for p in paginas[1:]))
+
+    def test_pagina_invalida(self):
+        resposta = cliente_api(self.usuario.pk).get('/api/v1/salas/sincronizar/', {'pagina': 'x'}, secure=True)
+        self.assertEqual(resposta.status_code, 400)
 
-# Create your tests here.
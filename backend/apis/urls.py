@@ -24,6 +24,7 @@ from apis.views import (
     RelatorioViewSet,
     AuditoriaViewSet,
     ConfiguracaoViewSet,
+    EventosViewSet,
 )
 
 # Criar router e registrar ViewSets
@@ -87,6 +88,9 @@ router.register(r'relatorios', RelatorioViewSet, basename='relatorio')
 # Auditoria / Logs
 router.register(r'auditoria', AuditoriaViewSet, basename='auditoria')
 
+# Eventos em tempo real (SSE)
+router.register(r'eventos', EventosViewSet, basename='eventos')
+
 # URLs
 urlpatterns = [
     # Autenticação
@@ -0,0 +1,68 @@
+"""
+Utilitários da cache partilhada (Redis ou ficheiros, ver CACHES em core/settings.py).
+
+As chaves agrupadas por namespace incluem a geração actual do namespace,
+guardada na própria cache partilhada. Ao mudar a geração, todas as chaves
+do grupo deixam de ser lidas em todos os workers/processos de uma só vez,
+sem ser necessário conhecer cada chave individual.
+"""
+import time
+from django.core.cache import cache
+from django.db import transaction
+
+# Namespaces usados pela aplicação
+NS_CANDIDATOS_STATUS = 'candidatos_status'
+
+
+def _chave_geracao(namespace):
+    return f'geracao:{namespace}'
+
+
+def _nova_geracao():
+    # Baseada no relógio: se a chave da geração for despejada, nunca se
+    # reutiliza uma geração antiga (com dados obsoletos ainda na cache)
+    return int(time.time() * 1000)
+
+
+def geracao(namespace):
+    """Retorna a geração actual do namespace (criando-a se necessário)"""
+    chave_geracao = _chave_geracao(namespace)
+    valor = cache.get(chave_geracao)
+    if valor is None:
+        cache.add(chave_geracao, _nova_geracao(), None)
+        valor = cache.get(chave_geracao)
+    return valor
+
+
+def chave(namespace, *partes):
+    """Constrói a chave versionada: '<namespace>:g<geracao>:<partes>'"""
+    sufixo = ':'.join(str(parte) for parte in partes)
+    return f'{namespace}:g{geracao(namespace)}:{sufixo}'
+
+
+def chaves_status_candidato(*termos):
+    """Chaves de consultar_status dos termos de pesquisa (nº de inscrição, BI) de um candidato"""
+    return [chave(NS_CANDIDATOS_STATUS, termo) for termo in termos if termo]
+
+
+def invalidar_namespace(namespace):
+    """Invalida todas as chaves do namespace em todos os processos"""
+    chave_geracao = _chave_geracao(namespace)
+    actual = cache.get(chave_geracao) or 0
+    cache.set(chave_geracao, max(actual + 1, _nova_geracao()), None)
+
+
+def invalidar_apos_commit(*chaves, namespaces=()):
+    """
+    Remove as chaves (e invalida os namespaces) imediatamente e de novo após o
+    commit da transacção actual: entre o save e o commit, outro worker ainda lê
+    os dados antigos da base de dados e pode voltar a colocá-los na cache.
+    """
+    def limpar():
+        if chaves:
+            cache.delete_many(chaves)
+        for namespace in namespaces:
+            invalidar_namespace(namespace)
+
+    limpar()
+    transaction.on_commit(limpar)
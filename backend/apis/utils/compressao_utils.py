@@ -0,0 +1,139 @@
+"""
+Política de compressão dos arquivos de backup.
+
+- Ficheiros já comprimidos (JPEG, PNG, PDF, ZIP, documentos Office...) são
+  guardados sem recompressão: comprimi-los de novo gasta CPU sem reduzir o tamanho.
+- O dump da base de dados é comprimido em blocos independentes por várias
+  threads (zlib e lzma libertam o GIL). Os blocos são concatenados pela ordem
+  original: vários membros gzip (ou streams xz) seguidos continuam a ser um
+  ficheiro .gz/.xz válido, descomprimido em streaming no restauro.
+- O perfil escolhido pelo administrador define o compromisso velocidade/tamanho.
+"""
+import os
+import gzip
+import lzma
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+
+# perfil -> (codec do dump, nível)
+PERFIS = {
+    'rapido': ('gzip', 1),
+    'equilibrado': ('gzip', 6),
+    'maximo': ('xz', 6),
+}
+PERFIL_PADRAO = 'equilibrado'
+
+EXTENSOES = {'gzip': '.gz', 'xz': '.xz'}
+
+# Threads por omissão: o backup corre ao lado do servidor aplicacional e não deve ocupar todos os CPUs
+THREADS_PADRAO = 2
+
+# Blocos maiores comprimem melhor; o xz beneficia de um dicionário maior
+TAMANHO_BLOCO = {'gzip': 4 * 1024 * 1024, 'xz': 16 * 1024 * 1024}
+
+# Formatos que já são comprimidos internamente
+EXTENSOES_COMPRIMIDAS = {
+    '.jpg', '.jpeg', '.png', '.gif', '.webp', '.heic',
+    '.pdf',
+    '.zip', '.gz', '.tgz', '.bz2', '.xz', '.7z', '.rar',
+    '.docx', '.xlsx', '.pptx', '.odt', '.ods', '.odp',
+    '.mp3', '.mp4', '.m4a', '.mov', '.avi', '.mkv', '.webm',
+}
+
+
+def perfil(nome=None):
+    """(nome, codec, nível) do perfil; lança ValueError para perfis desconhecidos"""
+    nome = nome or getattr(settings, 'BACKUP_COMPRESSAO', PERFIL_PADRAO)
+    if nome not in PERFIS:
+        raise ValueError(f"Perfil de compressão inválido: {nome} (opções: {', '.join(PERFIS)})")
+    codec, nivel = PERFIS[nome]
+    return nome, codec, nivel
+
+
+def threads():
+    """Threads de compressão: BACKUP_COMPRESSAO_THREADS ou, com 0, até THREADS_PADRAO"""
+    configuradas = int(getattr(settings, 'BACKUP_COMPRESSAO_THREADS', 0) or 0)
+    return configuradas or min(THREADS_PADRAO, os.cpu_count() or 1)
+
+
+def tipo_zip(nome_ficheiro, nivel):
+    """(compress_type, compresslevel) de um ficheiro de media no ZIP"""
+    if os.path.splitext(nome_ficheiro)[1].lower() in EXTENSOES_COMPRIMIDAS:
+        return zipfile.ZIP_STORED, None
+    return zipfile.ZIP_DEFLATED, nivel
+
+
+def comprimir_bloco(codec, nivel, dados):
+    if codec == 'gzip':
+        # mtime=0: o mesmo conteúdo produz sempre os mesmos bytes
+        return gzip.compress(dados, compresslevel=nivel, mtime=0)
+    return lzma.compress(dados, preset=nivel)
+
+
+def descomprimir(origem, codec):
+    """Leitor em streaming sobre um ficheiro comprimido por CompressorParalelo (ou None = sem compressão)"""
+    if codec is None:
+        return origem
+    if codec == 'gzip':
+        return gzip.GzipFile(fileobj=origem, mode='rb')
+    return lzma.LZMAFile(origem, mode='rb')
+
+
+class CompressorParalelo:
+    """
+    Pseudo-ficheiro de escrita: acumula os dados em blocos, comprime cada bloco
+    numa thread e escreve os resultados em `destino` pela ordem original.
+    O número de blocos em memória é limitado (threads + 1).
+    """
+
+    def __init__(self, destino, codec, nivel, n_threads=None):
+        self.destino = destino
+        self.codec = codec
+        self.nivel = nivel
+        self.tamanho_bloco = TAMANHO_BLOCO[codec]
+        self.n_threads = n_threads or threads()
+        self.bytes_escritos = 0
+        self._buffer = bytearray()
+        self._pendentes = []
+        self._blocos = 0
+        self._pool = ThreadPoolExecutor(max_workers=self.n_threads)
+
+    def write(self, dados):
+        self._buffer += dados
+        while len(self._buffer) >= self.tamanho_bloco:
+            bloco = bytes(self._buffer[:self.tamanho_bloco])
+            del self._buffer[:self.tamanho_bloco]
+            self._submeter(bloco)
+        return len(dados)
+
+    def _submeter(self, bloco):
+        self._blocos += 1
+        self._pendentes.append(self._pool.submit(comprimir_bloco, self.codec, self.nivel, bloco))
+        while len(self._pendentes) > self.n_threads:
+            self._escrever_seguinte()
+
+    def _escrever_seguinte(self):
+        comprimido = self._pendentes.pop(0).result()
+        self.destino.write(comprimido)
+        self.bytes_escritos += len(comprimido)
+
+    def close(self):
+        try:
+            # Sem dados: um stream vazio continua a ser um .gz/.xz válido
+            if self._buffer or not self._blocos:
+                self._submeter(bytes(self._buffer))
+                self._buffer = bytearray()
+            while self._pendentes:
+                self._escrever_seguinte()
+        finally:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, tipo, valor, traceback):
+        if tipo is None:
+            self.close()
+        else:
+            self._pool.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,122 @@
+"""
+Paginação por cursor (keyset) para tabelas grandes que só crescem (auditoria).
+
+Em vez de OFFSET, cada página continua a partir da chave da última linha da
+anterior: WHERE (data, id) < (data_cursor, id_cursor) ORDER BY data DESC, id DESC
+LIMIT n. Com um índice em (data, id), a página 500 custa o mesmo que a primeira.
+O cursor é opaco para o cliente (base64 da chave) e a contagem total, opcional,
+pode ser aproximada (estimativa do planeador do PostgreSQL) para não percorrer a tabela.
+"""
+import json
+import base64
+import binascii
+from django.db import connection
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+PAGE_SIZE_PADRAO = 20
+PAGE_SIZE_MAXIMO = 100
+
+
+class CursorInvalido(ValueError):
+    pass
+
+
+def codificar_cursor(direccao, data, pk):
+    """direccao: 'n' (página seguinte, linhas mais antigas) ou 'p' (página anterior)"""
+    dados = json.dumps([direccao, data.isoformat(), pk], separators=(',', ':'))
+    return base64.urlsafe_b64encode(dados.encode()).decode().rstrip('=')
+
+
+def descodificar_cursor(cursor):
+    """(direccao, data, pk) de um cursor; lança CursorInvalido"""
+    try:
+        dados = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        direccao, data, pk = json.loads(dados)
+        data = parse_datetime(data)
+    except (binascii.Error, ValueError, TypeError):
+        raise CursorInvalido('Cursor inválido')
+    if direccao not in ('n', 'p') or data is None or not isinstance(pk, int):
+        raise CursorInvalido('Cursor inválido')
+    return direccao, data, pk
+
+
+def page_size(valor):
+    try:
+        return max(1, min(int(valor), PAGE_SIZE_MAXIMO))
+    except (TypeError, ValueError):
+        return PAGE_SIZE_PADRAO
+
+
+def contagem_aproximada(queryset):
+    """
+    Número de linhas estimado pelo planeador do PostgreSQL (EXPLAIN), sem
+    executar a consulta; noutras bases de dados, a contagem exacta.
+    """
+    if connection.vendor != 'postgresql':
+        return queryset.count()
+    sql, params = queryset.order_by().values('pk').query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+        plano = cursor.fetchone()[0]
+    if isinstance(plano, str):
+        plano = json.loads(plano)
+    return int(plano[0]['Plan']['Plan Rows'])
+
+
+def paginar(queryset, campo_data, cursor=None, tamanho=PAGE_SIZE_PADRAO, total=None):
+    """
+    Página de `queryset` ordenada por (campo_data DESC, pk DESC).
+
+    `cursor`: valor de `next_cursor`/`previous_cursor` de uma resposta anterior.
+    `total`: None (sem contagem), 'aproximado' ou 'exacto'.
+    Retorna (linhas, metadados); lança CursorInvalido.
+    """
+    pk = queryset.model._meta.pk.name
+
+    direccao, data, id_cursor = descodificar_cursor(cursor) if cursor else ('n', None, None)
+    if data is None:
+        pagina = queryset.order_by(f'-{campo_data}', f'-{pk}')
+    elif direccao == 'n':
+        # Condição redundante em campo_data: permite ao planeador usar o índice como intervalo
+        pagina = queryset.filter(**{f'{campo_data}__lte': data}).filter(
+            Q(**{f'{campo_data}__lt': data}) | Q(**{campo_data: data, f'{pk}__lt': id_cursor})
+        ).order_by(f'-{campo_data}', f'-{pk}')
+    else:
+        pagina = queryset.filter(**{f'{campo_data}__gte': data}).filter(
+            Q(**{f'{campo_data}__gt': data}) | Q(**{campo_data: data, f'{pk}__gt': id_cursor})
+        ).order_by(campo_data, pk)
+
+    # Uma linha a mais indica se existe outra página nesta direcção
+    linhas = list(pagina[:tamanho + 1])
+    mais = len(linhas) > tamanho
+    linhas = linhas[:tamanho]
+    if direccao == 'p':
+        linhas.reverse()
+
+    if direccao == 'n':
+        tem_seguinte, tem_anterior = mais, data is not None
+    else:
+        tem_seguinte, tem_anterior = True, mais
+
+    metadados = {
+        'page_size': tamanho,
+        'next_cursor': None,
+        'previous_cursor': None,
+        'has_next': bool(linhas) and tem_seguinte,
+        'has_previous': bool(linhas) and tem_anterior,
+        'count': None,
+        'count_aproximado': total == 'aproximado',
+    }
+    if linhas:
+        primeira, ultima = linhas[0], linhas[-1]
+        if metadados['has_next']:
+            metadados['next_cursor'] = codificar_cursor('n', getattr(ultima, campo_data), getattr(ultima, pk))
+        if metadados['has_previous']:
+            metadados['previous_cursor'] = codificar_cursor('p', getattr(primeira, campo_data), getattr(primeira, pk))
+
+    if total == 'aproximado':
+        metadados['count'] = contagem_aproximada(queryset)
+    elif total == 'exacto':
+        metadados['count'] = queryset.count()
+    return linhas, metadados
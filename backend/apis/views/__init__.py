@@ -21,6 +21,7 @@ from .relatorio_views import RelatorioViewSet
 from .auditoria_views import AuditoriaViewSet
 from .configuracao_views import ConfiguracaoViewSet, AgendamentoBackupViewSet
 from .backup_views import BackupViewSet
+from .eventos_views import EventosViewSet
 
 __all__ = [
     # Auth
@@ -44,4 +45,5 @@ __all__ = [
     'RelatorioViewSet',
     'AuditoriaViewSet',
     'ConfiguracaoViewSet', 'AgendamentoBackupViewSet', 'BackupViewSet',
+    'EventosViewSet',
 ]
@@ -16,7 +16,9 @@ from apis.serializers.academico_serializers import (
     PeriodoSerializer, TurmaSerializer, TurmaListSerializer, AnoLectivoSerializer,
     VagaCursoSerializer
 )
-from apis.mixins import AuditMixin
+from apis.mixins import AuditMixin, DeltaSyncMixin
+from apis.services.ocupacao_service import OcupacaoService
+from apis.services.vagas_service import VagasService
 
 from rest_framework.pagination import PageNumberPagination
 
@@ -146,9 +148,11 @@ class AnoLectivoViewSet(AuditMixin, viewsets.ModelViewSet):
             
         return Response(data)
 
-class SalaViewSet(AuditMixin, viewsets.ModelViewSet):
+class SalaViewSet(DeltaSyncMixin, AuditMixin, viewsets.ModelViewSet):
     """ViewSet para Sala"""
     queryset = Sala.objects.all()
+    # A ocupação muda com as turmas da sala e com os seus alunos
+    delta_campos = ['atualizado_em', 'turma__atualizado_em', 'turma__aluno__atualizado_em']
     serializer_class = SalaSerializer
     permission_classes = [IsAuthenticated, HasAdditionalPermission]
     permission_map = {
@@ -163,6 +167,13 @@ class SalaViewSet(AuditMixin, viewsets.ModelViewSet):
     ordering_fields = ['numero_sala', 'capacidade_alunos', 'bloco']
     ordering = ['numero_sala']
 
+    def get_serializer(self, *args, **kwargs):
+        """Pré-calcula a ocupação da página inteira numa só consulta agrupada"""
+        if kwargs.get('many') and args:
+            ano_id = OcupacaoService.resolver_ano_id(self.request)
+            args = (OcupacaoService.carregar_ocupacao_salas(args[0], ano_id),) + args[1:]
+        return super().get_serializer(*args, **kwargs)
+
 class ClasseViewSet(AuditMixin, viewsets.ModelViewSet):
     """ViewSet para Classe"""
     queryset = Classe.objects.all()
@@ -210,9 +221,14 @@ class AreaFormacaoViewSet(AuditMixin, viewsets.ModelViewSet):
     search_fields = ['nome_area']
     ordering = ['nome_area']
 
-class CursoViewSet(AuditMixin, viewsets.ModelViewSet):
+class CursoViewSet(DeltaSyncMixin, AuditMixin, viewsets.ModelViewSet):
     """ViewSet para Curso"""
     queryset = Curso.objects.select_related('id_area_formacao', 'id_responsavel').all()
+    # Vagas e turmas do curso dependem de VagaCurso, Turma e Matricula
+    delta_campos = [
+        'atualizado_em', 'vagas_por_ano__atualizado_em',
+        'turma__atualizado_em', 'turma__matricula__atualizado_em'
+    ]
     serializer_class = CursoSerializer
     permission_classes = [IsAuthenticated, HasAdditionalPermission]
     permission_map = {
@@ -227,7 +243,7 @@ class CursoViewSet(AuditMixin, viewsets.ModelViewSet):
     
     def get_permissions(self):
         """Permitir listagem pública para o formulário de candidaturas"""
-        if self.action == 'list':
+        if self.is_listagem:
             return [AllowAny()]
         return [IsAuthenticated(), HasAdditionalPermission()]
     filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
@@ -236,14 +252,27 @@ class CursoViewSet(AuditMixin, viewsets.ModelViewSet):
     ordering = ['nome_curso']
     
     def get_serializer_class(self):
-        if self.action == 'list':
+        if self.is_listagem:
             return CursoListSerializer
         return CursoSerializer
+
+    def get_serializer(self, *args, **kwargs):
+        """Índice de vagas dos cursos da página, construído uma vez por request (formulário público de candidatura)"""
+        if self.is_listagem and kwargs.get('many') and args:
+            cursos = list(args[0])
+            kwargs['context'] = {
+                **self.get_serializer_context(),
+                **VagasService.contexto_serializer([curso.pk for curso in cursos]),
+            }
+            args = (cursos,) + args[1:]
+        return super().get_serializer(*args, **kwargs)
     
     @action(detail=True, methods=['get'])
     def turmas(self, request, pk=None):
         curso = self.get_object()
-        turmas = Turma.objects.filter(id_curso=curso).select_related('id_sala', 'id_classe', 'id_periodo')
+        turmas = OcupacaoService.anotar_turmas(
+            Turma.objects.filter(id_curso=curso).select_related('id_sala', 'id_classe', 'id_periodo', 'ano_lectivo')
+        )
         serializer = TurmaListSerializer(turmas, many=True)
         return Response(serializer.data)
     
@@ -264,9 +293,10 @@ class PeriodoViewSet(AuditMixin, viewsets.ModelViewSet):
     permission_classes = [IsAuthenticated, HasAdditionalPermission]
     permission_map = {} # 'list': 'view_turmas' removido
 
-class TurmaViewSet(AuditMixin, viewsets.ModelViewSet):
+class TurmaViewSet(DeltaSyncMixin, AuditMixin, viewsets.ModelViewSet):
     """ViewSet para Turma"""
-    queryset = Turma.objects.select_related('id_sala', 'id_curso', 'id_classe', 'id_periodo', 'id_responsavel').all()
+    queryset = Turma.objects.select_related('id_sala', 'id_curso', 'id_classe', 'id_periodo', 'id_responsavel', 'ano_lectivo').all()
+    delta_campos = ['atualizado_em', 'aluno__atualizado_em']
     serializer_class = TurmaSerializer
     permission_classes = [IsAuthenticated, HasAdditionalPermission, IsActiveYearOrReadOnly]
     permission_map = {
@@ -284,8 +314,11 @@ class TurmaViewSet(AuditMixin, viewsets.ModelViewSet):
     ordering_fields = ['codigo_turma', 'ano']
     ordering = ['codigo_turma']
     
+    def get_queryset(self):
+        return OcupacaoService.anotar_turmas(super().get_queryset())
+
     def get_serializer_class(self):
-        if self.action == 'list':
+        if self.is_listagem:
             return TurmaListSerializer
         return TurmaSerializer
     
@@ -325,7 +358,7 @@ class TurmaViewSet(AuditMixin, viewsets.ModelViewSet):
 
 class VagaCursoViewSet(AuditMixin, viewsets.ModelViewSet):
     """ViewSet para Gestão de Vagas por Curso"""
-    queryset = VagaCurso.objects.all()
+    queryset = VagaCurso.objects.select_related('id_curso', 'ano_lectivo').all()
     serializer_class = VagaCursoSerializer
     permission_classes = [IsAuthenticated, HasAdditionalPermission]
     filter_backends = [DjangoFilterBackend, SearchFilter]
@@ -340,3 +373,16 @@ class VagaCursoViewSet(AuditMixin, viewsets.ModelViewSet):
         'partial_update': 'manage_configuracoes',
         'destroy': 'manage_configuracoes',
     }
+
+    def get_serializer(self, *args, **kwargs):
+        """Índice de vagas restrito aos cursos e anos lectivos da página"""
+        if self.action == 'list' and kwargs.get('many') and args:
+            vagas = list(args[0])
+            kwargs['context'] = {
+                **self.get_serializer_context(),
+                **VagasService.contexto_serializer(
+                    {vaga.id_curso_id for vaga in vagas}, {vaga.ano_lectivo_id for vaga in vagas}
+                ),
+            }
+            args = (vagas,) + args[1:]
+        return super().get_serializer(*args, **kwargs)
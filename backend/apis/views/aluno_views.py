@@ -3,6 +3,7 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from django_filters.rest_framework import DjangoFilterBackend
+from django.utils import timezone
 from rest_framework.filters import SearchFilter, OrderingFilter
 from apis.permissions.custom_permissions import HasAdditionalPermission, IsActiveYearOrReadOnly
 
@@ -12,6 +13,8 @@ from apis.serializers import (
     AlunoEncarregadoSerializer
 )
 from apis.mixins import AuditMixin
+from apis.services.aluno_service import AlunoService
+from apis.services.principal_service import PrincipalService
 
 
 class AlunoViewSet(AuditMixin, viewsets.ModelViewSet):
@@ -21,7 +24,8 @@ class AlunoViewSet(AuditMixin, viewsets.ModelViewSet):
         'id_turma__id_curso',
         'id_turma__id_classe',
         'id_turma__id_periodo',
-        'id_turma__id_sala'
+        'id_turma__id_sala',
+        'id_turma__ano_lectivo'
     ).prefetch_related(
         'alunoencarregado_set',
         'alunoencarregado_set__id_encarregado'
@@ -69,7 +73,8 @@ class AlunoViewSet(AuditMixin, viewsets.ModelViewSet):
             )
 
         # update() directo na BD sem chamar o save() do modelo (contorna os bloqueios)
-        updated = Aluno.objects.filter(pk=pk).update(status_aluno=new_status)
+        updated = Aluno.objects.filter(pk=pk).update(status_aluno=new_status, atualizado_em=timezone.now())
+        PrincipalService.invalidar('aluno', pk)
 
         if updated == 0:
             return Response(
@@ -91,15 +96,30 @@ class AlunoViewSet(AuditMixin, viewsets.ModelViewSet):
     def get_serializer_class(self):
         if self.action == 'retrieve':
             return AlunoDetailSerializer
-        elif self.action == 'list':
+        elif self.action in ['list', 'ativos']:
             return AlunoListSerializer
         return AlunoSerializer
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action in ['list', 'ativos']:
+            # Substitui os prefetch genéricos pelos da listagem (com to_attr)
+            queryset = AlunoService.preparar_listagem(queryset.prefetch_related(None))
+        return queryset
+
+    def get_serializer(self, *args, **kwargs):
+        """Resolve em lote fotos e tipos de matrícula da página antes de serializar"""
+        if kwargs.get('many') and args:
+            alunos = list(args[0])
+            kwargs['context'] = {**self.get_serializer_context(), **AlunoService.contexto_lote(alunos)}
+            args = (alunos,) + args[1:]
+        return super().get_serializer(*args, **kwargs)
     
     @action(detail=False, methods=['get'])
     def ativos(self, request):
         """Retorna apenas alunos ativos"""
-        alunos = self.queryset.filter(status_aluno='Activo')
-        serializer = AlunoListSerializer(alunos, many=True, context={'request': request})
+        alunos = self.get_queryset().filter(status_aluno='Activo')
+        serializer = self.get_serializer(alunos, many=True)
         return Response(serializer.data)
 
     @action(detail=False, methods=['get'])
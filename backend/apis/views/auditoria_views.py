@@ -1,10 +1,14 @@
+import datetime
 from rest_framework import viewsets
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_date
 
 from apis.models import Historico, HistoricoLogin
+from apis.utils import paginacao_utils
 
 
 from apis.permissions.custom_permissions import HasAdditionalPermission
@@ -19,26 +23,54 @@ class AuditoriaViewSet(viewsets.ViewSet):
         'resumo': 'view_logs'
     }
 
+    def _filtrar_datas(self, qs, campo, request):
+        """
+        data_inicio/data_fim (dias, hora local) como intervalo no campo
+        (sem __date: continua a usar o índice). Lança ValueError para datas inválidas.
+        """
+        for parametro, lookup, dias in (('data_inicio', 'gte', 0), ('data_fim', 'lt', 1)):
+            valor = request.query_params.get(parametro)
+            if not valor:
+                continue
+            dia = parse_date(valor)
+            if dia is None:
+                raise ValueError(f'{parametro} inválida (AAAA-MM-DD)')
+            limite = timezone.make_aware(
+                datetime.datetime.combine(dia + datetime.timedelta(days=dias), datetime.time.min)
+            )
+            qs = qs.filter(**{f'{campo}__{lookup}': limite})
+        return qs
+
+    def _paginar(self, qs, campo, request):
+        """
+        Paginação por cursor (keyset) em (campo, pk), mais recentes primeiro.
+        Parâmetros: cursor, page_size (máx. 100), total=aproximado|exacto (opcional).
+        """
+        total = request.query_params.get('total')
+        return paginacao_utils.paginar(
+            qs, campo,
+            cursor=request.query_params.get('cursor'),
+            tamanho=paginacao_utils.page_size(request.query_params.get('page_size')),
+            total=total if total in ('aproximado', 'exacto') else None,
+        )
+
     @action(detail=False, methods=['get'])
     def actividades(self, request):
         """
         Lista as acções registadas no sistema (Historico).
-        Filtra por data_inicio, data_fim, usuario_id e tipo_accao.
+        Filtra por data_inicio, data_fim e busca; paginação por cursor (ver `_paginar`).
         """
         qs = Historico.objects.select_related(
             'id_usuario', 'id_funcionario', 'id_aluno'
-        ).order_by('-data_hora')
+        )
 
         # Filtros opcionais
-        data_inicio = request.query_params.get('data_inicio')
-        data_fim = request.query_params.get('data_fim')
-        tipo = request.query_params.get('tipo')
         busca = request.query_params.get('busca')
 
-        if data_inicio:
-            qs = qs.filter(data_hora__date__gte=data_inicio)
-        if data_fim:
-            qs = qs.filter(data_hora__date__lte=data_fim)
+        try:
+            qs = self._filtrar_datas(qs, 'data_hora', request)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=400)
         if busca:
             qs = qs.filter(
                 Q(tipo_accao__icontains=busca) |
@@ -47,16 +79,13 @@ class AuditoriaViewSet(viewsets.ViewSet):
                 Q(id_aluno__nome_completo__icontains=busca)
             )
 
-        # Paginação simples
-        page = int(request.query_params.get('page', 1))
-        page_size = int(request.query_params.get('page_size', 20))
-        total = qs.count()
-        
-        start = (page - 1) * page_size
-        end = start + page_size
+        try:
+            pagina, metadados = self._paginar(qs, 'data_hora', request)
+        except paginacao_utils.CursorInvalido as e:
+            return Response({'error': str(e)}, status=400)
 
         items = []
-        for h in qs[start:end]:
+        for h in pagina:
             # Resolve nome do executor da acção
             actor_name = 'Sistema'
             if h.id_funcionario_id:
@@ -75,32 +104,24 @@ class AuditoriaViewSet(viewsets.ViewSet):
                 'dados_novos': h.dados_novos,
             })
 
-        return Response({
-            'count': total,
-            'page': page,
-            'page_size': page_size,
-            'total_pages': (total + page_size - 1) // page_size if total > 0 else 1,
-            'results': items
-        })
+        return Response({**metadados, 'results': items})
 
     @action(detail=False, methods=['get'])
     def logins(self, request):
         """
         Lista o histórico de sessões de login.
-        Filtra por data_inicio, data_fim e busca por nome.
+        Filtra por data_inicio, data_fim e busca por nome; paginação por cursor (ver `_paginar`).
         """
         qs = HistoricoLogin.objects.select_related(
             'id_usuario', 'id_funcionario', 'id_aluno', 'id_encarregado'
-        ).order_by('-hora_entrada')
+        )
 
-        data_inicio = request.query_params.get('data_inicio')
-        data_fim = request.query_params.get('data_fim')
         busca = request.query_params.get('busca')
-        
-        if data_inicio:
-            qs = qs.filter(hora_entrada__date__gte=data_inicio)
-        if data_fim:
-            qs = qs.filter(hora_entrada__date__lte=data_fim)
+
+        try:
+            qs = self._filtrar_datas(qs, 'hora_entrada', request)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=400)
 
         if busca:
             qs = qs.filter(
@@ -111,16 +132,13 @@ class AuditoriaViewSet(viewsets.ViewSet):
                 Q(ip_usuario__icontains=busca)
             )
 
-        # Paginação simples
-        page = int(request.query_params.get('page', 1))
-        page_size = int(request.query_params.get('page_size', 20))
-        total = qs.count()
-        
-        start = (page - 1) * page_size
-        end = start + page_size
+        try:
+            pagina, metadados = self._paginar(qs, 'hora_entrada', request)
+        except paginacao_utils.CursorInvalido as e:
+            return Response({'error': str(e)}, status=400)
 
         items = []
-        for h in qs[start:end]:
+        for h in pagina:
             # Resolver nome e tipo do utilizador
             user_name = 'Desconhecido'
             user_type = 'sistema'
@@ -157,13 +175,7 @@ class AuditoriaViewSet(viewsets.ViewSet):
                 'sessao_activa': h.hora_saida is None,
             })
 
-        return Response({
-            'count': total,
-            'page': page,
-            'page_size': page_size,
-            'total_pages': (total + page_size - 1) // page_size if total > 0 else 1,
-            'results': items
-        })
+        return Response({**metadados, 'results': items})
 
     @action(detail=False, methods=['get'])
     def resumo(self, request):
@@ -1,3 +1,4 @@
+from django.core.exceptions import ValidationError as DjangoValidationError
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
@@ -123,23 +124,33 @@ class NotaViewSet(AuditMixin, viewsets.ModelViewSet):
                 disciplina = Disciplina.objects.get(id_disciplina=id_disciplina)
                 professor = Funcionario.objects.get(id_funcionario=id_professor)
                 
-                notas_criadas = []
-                for n in notas_data:
-                    nota = Nota.objects.create(
-                        id_aluno_id=n['id_aluno'],
-                        id_disciplina=disciplina,
-                        id_professor=professor,
-                        id_turma=turma,
-                        tipo_avaliacao=tipo_avaliacao,
-                        valor=n['valor']
+                resultado = AcademicService.lancar_notas_lote(
+                    turma, disciplina, professor, tipo_avaliacao, notas_data
+                )
+
+                if not resultado['valido']:
+                    return Response({
+                        'error': 'A pauta contém linhas inválidas. Nenhuma nota foi gravada.',
+                        'resultados': resultado['resultados']
+                    }, status=status.HTTP_400_BAD_REQUEST)
+
+                total = resultado['criadas'] + resultado['actualizadas']
+                if total:
+                    self._log_audit_batch(
+                        'create', Nota,
+                        f"Pauta {turma.codigo_turma} - {disciplina.nome} ({tipo_avaliacao})",
+                        dados_novos={
+                            'criadas': resultado['criadas'],
+                            'actualizadas': resultado['actualizadas'],
+                        }
                     )
-                    notas_criadas.append(nota)
-                
-                self._log_audit_action('create', notas_criadas[0]) if notas_criadas else None
 
                 return Response({
-                    'message': f'{len(notas_criadas)} notas lançadas.',
-                    'count': len(notas_criadas)
+                    'message': f"{resultado['criadas']} notas lançadas, {resultado['actualizadas']} actualizadas.",
+                    'count': total,
+                    'criadas': resultado['criadas'],
+                    'actualizadas': resultado['actualizadas'],
+                    'resultados': resultado['resultados']
                 }, status=status.HTTP_201_CREATED)
                 
             except Exception as e:
@@ -187,15 +198,24 @@ class FaltaAlunoViewSet(AuditMixin, viewsets.ModelViewSet):
                     status=status.HTTP_403_FORBIDDEN
                 )
 
-            total = AcademicService.registrar_falta_lote(
+            resultado = AcademicService.registrar_falta_lote(
                 aluno_ids, disciplina_id, turma_id, data_falta, observacao
             )
-            # Manual audit log for batch action - we log one sample to show the action happened
-            self._log_audit_action('create', FaltaAluno.objects.filter(id_turma=turma).last()) if total > 0 else None
+            total = resultado['criadas']
+            # Uma única entrada de auditoria cobre todo o lote
+            if total > 0:
+                self._log_audit_batch(
+                    'create', FaltaAluno,
+                    f"{total} faltas em {turma.codigo_turma} ({data_falta})",
+                    dados_novos={'disciplina_id': disciplina_id, 'data_falta': str(data_falta), 'total': total}
+                )
 
             return Response({
                 'message': f'{total} faltas registradas.',
-                'count': total
+                'count': total,
+                'ignoradas': resultado['ignoradas']
             }, status=status.HTTP_201_CREATED)
+        except DjangoValidationError as e:
+            return Response({'error': e.messages[0]}, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
             return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
@@ -6,16 +6,18 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from django.core.cache import cache
+from apis.utils import cache_utils
 from apis.models import Candidato, RupeCandidato, Curso, ExameAdmissao, Sala
 from apis.serializers import CandidatoSerializer, CandidatoCreateSerializer, RupeCandidatoSerializer
 from decimal import Decimal
 from apis.permissions.custom_permissions import HasAdditionalPermission
-from apis.mixins import AuditMixin
+from apis.mixins import AuditMixin, ExportacaoCSVMixin
 from apis.permissions.authentication import SchoolJWTAuthentication
 from rest_framework_simplejwt.authentication import JWTAuthentication
 from apis.services.pdf_service import PDFService
+from apis.services.exame_service import ExameService
 
-class CandidaturaViewSet(AuditMixin, viewsets.ModelViewSet):
+class CandidaturaViewSet(ExportacaoCSVMixin, AuditMixin, viewsets.ModelViewSet):
     """ViewSet para gerenciar candidaturas"""
     queryset = Candidato.objects.all()
     serializer_class = CandidatoSerializer
@@ -31,7 +33,28 @@ class CandidaturaViewSet(AuditMixin, viewsets.ModelViewSet):
         'avaliar': 'manage_inscritos',
         'matricular': 'matricular_aluno',
         'destroy': 'manage_inscritos',
+        'exportar': 'view_inscritos',
+        'comprovativos_lote': 'manage_inscritos',
     }
+
+    nome_exportacao = 'candidatos'
+    colunas_exportacao = [
+        ('Nº Inscrição', 'numero_inscricao'),
+        ('Nome Completo', 'nome_completo'),
+        ('Género', 'genero'),
+        ('Data de Nascimento', 'data_nascimento'),
+        ('Nº BI', 'numero_bi'),
+        ('Telefone', 'telefone'),
+        ('Email', 'email'),
+        ('Escola de Proveniência', 'escola_proveniencia'),
+        ('Média Final', 'media_final'),
+        ('1ª Opção', 'curso_primeira_opcao__nome_curso'),
+        ('2ª Opção', 'curso_segunda_opcao__nome_curso'),
+        ('Turno Preferencial', 'turno_preferencial'),
+        ('Ano Lectivo', 'ano_lectivo__nome'),
+        ('Estado', 'status'),
+        ('Data de Inscrição', 'criado_em'),
+    ]
     
     def list(self, request, *args, **kwargs):
         queryset = self.filter_queryset(self.get_queryset())
@@ -136,6 +159,35 @@ class CandidaturaViewSet(AuditMixin, viewsets.ModelViewSet):
             
         return Response({'erro': 'Erro ao gerar PDF'}, status=500)
 
+    @action(detail=False, methods=['get'])
+    def comprovativos_lote(self, request):
+        """
+        Gera em lote os comprovativos de inscrição de uma sala de exame e/ou ano
+        lectivo, num ZIP enviado à medida que os PDFs são gerados.
+        GET /candidaturas/comprovativos_lote/?sala=<id>&ano_lectivo=<id>
+        """
+        from apis.services.documentos_lote_service import DocumentosLoteService
+
+        sala_id = request.query_params.get('sala')
+        ano_id = request.query_params.get('ano_lectivo')
+        if not sala_id and not ano_id:
+            return Response({'erro': 'Indique a sala de exame ou o ano_lectivo.'}, status=400)
+
+        candidatos = Candidato.objects.order_by('nome_completo')
+        if sala_id:
+            candidatos = candidatos.filter(exame__sala_id=sala_id)
+        if ano_id:
+            candidatos = candidatos.filter(ano_lectivo_id=ano_id)
+
+        ids = list(candidatos.values_list('pk', flat=True))
+        if not ids:
+            return Response({'erro': 'Nenhum candidato encontrado.'}, status=404)
+
+        sufixo = f"sala_{sala_id}" if sala_id else f"ano_{ano_id}"
+        return DocumentosLoteService.resposta(
+            'comprovativo_inscricao', ids, request.build_absolute_uri('/')[:-1], f"comprovativos_{sufixo}.zip"
+        )
+
     @action(detail=True, methods=['post'], permission_classes=[AllowAny], authentication_classes=[])
     def gerar_rupe(self, request, pk=None):
         """Gera RUPE para o candidato (limite de 2 referências)"""
@@ -257,10 +309,11 @@ class CandidaturaViewSet(AuditMixin, viewsets.ModelViewSet):
         """
         Distribui candidatos com status 'INSCRITO' por salas disponíveis.
         Considera apenas candidatos do ano lectivo activo no sistema.
-        Parâmetros: { data_inicio: str, hora_inicio: str, limite_candidatos: int }
+        Parâmetros: { data_inicio: str, hora_inicio: str, limite_candidatos: int,
+                      candidatos_por_sala: int, simular: bool }
         """
         import datetime
-        from apis.models import Sala, ExameAdmissao, AnoLectivo
+        from apis.models import Sala, AnoLectivo
         
         data_inicio_str = request.data.get('data_inicio')
         hora_inicio_str = request.data.get('hora_inicio', '08:00')
@@ -298,53 +351,26 @@ class CandidaturaViewSet(AuditMixin, viewsets.ModelViewSet):
         if not salas.exists():
             return Response({'erro': 'Nenhuma sala cadastrada no sistema.'}, status=400)
             
-        # 3. Lógica de Distribuição
+        # 3. Lógica de Distribuição (calculada em memória pelo ExameService)
         try:
             data_atual = datetime.datetime.strptime(f"{data_inicio_str} {hora_inicio_str}", "%Y-%m-%d %H:%M")
         except ValueError:
             return Response({'erro': 'Formato de data/hora inválido. Use YYYY-MM-DD e HH:MM'}, status=400)
-            
-        distribuidos = 0
-        idx = 0
-        total = len(candidatos)
-        
-        while idx < total:
-            # Respeitar janelas de horário: 08-12 e 13-16
-            current_hour = data_atual.hour
-            
-            # Se cair no intervalo de almoço (12:xx), salta para as 13h
-            if current_hour >= 12 and current_hour < 13:
-                data_atual = data_atual.replace(hour=13, minute=0)
-            
-            # Se passar das 16:xx, salta para as 08h do dia seguinte
-            if current_hour >= 16:
-                data_atual = data_atual.replace(hour=8, minute=0) + datetime.timedelta(days=1)
-
-            # Preencher cada sala no horário atual
-            for sala in salas:
-                if idx >= total:
-                    break
-                    
-                capacidade = int(candidatos_por_sala_custom) if candidatos_por_sala_custom else sala.capacidade_alunos
-                bloco = candidatos[idx : idx + capacidade]
-                
-                for cand in bloco:
-                    ExameAdmissao.objects.update_or_create(
-                        candidato=cand,
-                        defaults={
-                            'data_exame': data_atual,
-                            'sala': sala,
-                            'realizado': False
-                        }
-                    )
-                    cand.status = 'INSCRITO'
-                    cand.save()
-                    distribuidos += 1
-                
-                idx += len(bloco)
-            
-            # Próximo turno (vamos assumir turnos de 2 horas para preencher o tempo)
-            data_atual += datetime.timedelta(hours=2)
+
+        try:
+            plano = ExameService.planear_distribuicao(candidatos, salas, data_atual, candidatos_por_sala_custom)
+        except ValueError:
+            return Response({'erro': 'Capacidade por sala inválida.'}, status=400)
+
+        # Pré-visualização: devolve o plano sem gravar
+        if str(request.data.get('simular', '')).lower() in ['true', '1']:
+            return Response({
+                'mensagem': f'Pré-visualização: {len(plano)} candidatos seriam agendados.',
+                'total': len(plano),
+                'sessoes': ExameService.resumir_plano(plano)
+            })
+
+        distribuidos = ExameService.aplicar_distribuicao(plano)
         
         return Response({
             'mensagem': f'Distribuição concluída com sucesso! {distribuidos} candidatos foram agendados respeitando as salas e janelas de horário.',
@@ -391,7 +417,9 @@ class CandidaturaViewSet(AuditMixin, viewsets.ModelViewSet):
             return Response({'erro': 'Informe o parâmetro q (BI ou Nº Inscrição)'}, status=400)
             
         # Tentar recuperar do cache (10 minutos)
-        cache_key = f'candidato_status_{term}'
+        # Chave versionada: as alterações a um candidato removem as suas chaves (nº de inscrição e BI);
+        # a distribuição de exames em lote invalida o namespace em todos os workers
+        cache_key = cache_utils.chave(cache_utils.NS_CANDIDATOS_STATUS, term)
         cached_data = cache.get(cache_key)
         if cached_data:
             return Response(cached_data)
@@ -0,0 +1,71 @@
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+from rest_framework import viewsets, renderers
+from rest_framework.decorators import action
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+
+from apis.permissions.authentication import SSEBilheteAuthentication
+from apis.permissions.custom_permissions import HasAdditionalPermission
+from apis.services.eventos_service import EventosService, broker
+
+
+class EventStreamRenderer(renderers.BaseRenderer):
+    """Permite a negociação de conteúdo com 'Accept: text/event-stream' (EventSource)"""
+    media_type = 'text/event-stream'
+    format = 'sse'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return data
+
+
+class EventosViewSet(viewsets.ViewSet):
+    """
+    Feed de alterações em tempo real (Server-Sent Events).
+    POST /api/v1/eventos/bilhete/            -> {bilhete, expira_em} (header Authorization)
+    GET  /api/v1/eventos/ocupacao/?bilhete=<bilhete>
+
+    Eventos:
+      ocupacao_sala -> {id_sala, numero_sala, total_alunos, ocupacao_por_periodo}
+      vagas_curso   -> {id_curso, ano_lectivo, vagas_totais, vagas_preenchidas, vagas_disponiveis}
+
+    Limitação: um único nó. O broker é local ao processo, pelo que o feed só
+    é servido com um único worker (WEB_CONCURRENCY <= 1) e, fora do DEBUG,
+    via ASGI (core/asgi.py); caso contrário responde 503. Com vários workers ou
+    servidores seria preciso um broker partilhado (ex: Redis pub/sub).
+    """
+    permission_classes = [IsAuthenticated, HasAdditionalPermission]
+    permission_map = {
+        'bilhete': 'view_matriculas',
+        'ocupacao': 'view_matriculas',
+    }
+
+    @action(detail=False, methods=['post'])
+    def bilhete(self, request):
+        """Bilhete de uso único para o EventSource (o access token não vai no URL)"""
+        payload = getattr(request, 'auth_payload', None) or {}
+        bilhete = EventosService.emitir_bilhete(payload.get('user_type'), payload.get('user_id'))
+        return Response({'bilhete': bilhete, 'expira_em': EventosService.BILHETE_VALIDADE}, status=201)
+
+    @action(
+        detail=False, methods=['get'], renderer_classes=[EventStreamRenderer, renderers.JSONRenderer],
+        authentication_classes=[SSEBilheteAuthentication]
+    )
+    def ocupacao(self, request):
+        assincrono = isinstance(request._request, ASGIRequest)
+        motivo = EventosService.motivo_indisponivel(assincrono)
+        if motivo:
+            return Response({'erro': motivo}, status=503)
+
+        fila = broker.subscrever()
+        if assincrono:
+            conteudo = EventosService.stream_assincrono(fila)
+        else:
+            conteudo = EventosService.stream(fila)
+
+        response = StreamingHttpResponse(conteudo, content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        # Desactivar o buffering em proxies (nginx)
+        response['X-Accel-Buffering'] = 'no'
+        return response
@@ -9,7 +9,7 @@ from apis.serializers import (
     FaturaSerializer, FaturaListSerializer,
     PagamentoSerializer, PagamentoListSerializer
 )
-from apis.mixins import AuditMixin
+from apis.mixins import AuditMixin, ExportacaoCSVMixin
 
 
 class FaturaViewSet(AuditMixin, viewsets.ModelViewSet):
@@ -38,7 +38,7 @@ class FaturaViewSet(AuditMixin, viewsets.ModelViewSet):
         return FaturaSerializer
 
 
-class PagamentoViewSet(AuditMixin, viewsets.ModelViewSet):
+class PagamentoViewSet(ExportacaoCSVMixin, AuditMixin, viewsets.ModelViewSet):
     """ViewSet para Pagamento"""
     queryset = Pagamento.objects.select_related(
         'id_fatura', 'id_recebedor'
@@ -53,8 +53,21 @@ class PagamentoViewSet(AuditMixin, viewsets.ModelViewSet):
         'update': 'manage_financeiro',
         'partial_update': 'manage_financeiro',
         'destroy': 'delete_financeiro',
+        'exportar': 'view_financeiro',
     }
 
+    nome_exportacao = 'pagamentos'
+    colunas_exportacao = [
+        ('Nº Pagamento', 'id_pagamento'),
+        ('Data', 'criado_em'),
+        ('Nº Fatura', 'id_fatura'),
+        ('Descrição', 'id_fatura__descricao'),
+        ('Aluno', 'id_fatura__id_aluno__nome_completo'),
+        ('Método de Pagamento', 'metodo_pagamento'),
+        ('Valor Pago', 'valor_pago'),
+        ('Recebedor', 'id_recebedor__nome_completo'),
+    ]
+
     filter_backends = [DjangoFilterBackend, OrderingFilter]
     #filterset_fields = ['id_fatura', 'metodo_pagamento']
     ordering_fields = ['criado_em', 'valor_pago']
@@ -5,6 +5,7 @@ from rest_framework.permissions import IsAuthenticated, AllowAny
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.filters import SearchFilter, OrderingFilter
 from django.db import transaction
+from django.utils import timezone
 from django.core.exceptions import ValidationError
 import json
 
@@ -12,10 +13,13 @@ from apis.models import Matricula
 from apis.serializers.matricula_serializers import MatriculaSerializer
 
 from apis.permissions.custom_permissions import HasAdditionalPermission, IsActiveYearOrReadOnly
-from apis.mixins import AuditMixin
+from apis.mixins import AuditMixin, DeltaSyncMixin, ExportacaoCSVMixin
+from apis.services.eventos_service import EventosService
+from apis.services.principal_service import PrincipalService
 
-class MatriculaViewSet(AuditMixin, viewsets.ModelViewSet):
+class MatriculaViewSet(ExportacaoCSVMixin, DeltaSyncMixin, AuditMixin, viewsets.ModelViewSet):
     """ViewSet para Matricula"""
+    delta_campos = ['atualizado_em', 'id_aluno__atualizado_em', 'id_turma__atualizado_em']
     queryset = Matricula.objects.select_related(
         'id_aluno', 
         'id_turma', 
@@ -41,8 +45,26 @@ class MatriculaViewSet(AuditMixin, viewsets.ModelViewSet):
         'update_status': 'edit_matricula',
         'matricular_novo_aluno': 'create_matricula',
         'permutar': 'change_matricula',
+        'exportar': 'view_matriculas',
+        'documentos_lote': 'view_matriculas',
     }
 
+    nome_exportacao = 'matriculas'
+    colunas_exportacao = [
+        ('Nº Matrícula', 'id_matricula'),
+        ('Nº Aluno', 'id_aluno__numero_matricula'),
+        ('Nome do Aluno', 'id_aluno__nome_completo'),
+        ('Nº BI', 'id_aluno__numero_bi'),
+        ('Turma', 'id_turma__codigo_turma'),
+        ('Curso', 'id_turma__id_curso__nome_curso'),
+        ('Classe', 'id_turma__id_classe__nivel'),
+        ('Período', 'id_turma__id_periodo__periodo'),
+        ('Ano Lectivo', 'ano_lectivo__nome'),
+        ('Tipo', 'tipo'),
+        ('Estado', 'status'),
+        ('Data de Matrícula', 'data_matricula'),
+    ]
+
     @action(detail=True, methods=['patch'], permission_classes=[IsAuthenticated, HasAdditionalPermission])
     def update_status(self, request, pk=None):
         """
@@ -59,11 +81,12 @@ class MatriculaViewSet(AuditMixin, viewsets.ModelViewSet):
             return Response({'erro': f'Status inválido. Escolha entre: {", ".join(VALID_STATUSES)}'}, status=400)
 
         # Usar .update() para evitar o gatilho do .save() do modelo que bloqueia edições em anos fechados
-        updated = Matricula.objects.filter(pk=pk).update(status=new_status)
+        updated = Matricula.objects.filter(pk=pk).update(status=new_status, atualizado_em=timezone.now())
 
         if updated:
             # Sincronizar status do aluno se for final
             matricula = Matricula.objects.get(pk=pk)
+            EventosService.matricula_alterada(matricula.id_turma_id)
             if new_status in ['Concluida', 'Desistente', 'Transferido']:
                 from apis.models import Aluno
                 # Mapeamento para status do aluno
@@ -74,7 +97,8 @@ class MatriculaViewSet(AuditMixin, viewsets.ModelViewSet):
                 }
                 status_aluno = aluno_status_map.get(new_status)
                 if status_aluno:
-                    Aluno.objects.filter(pk=matricula.id_aluno_id).update(status_aluno=status_aluno)
+                    Aluno.objects.filter(pk=matricula.id_aluno_id).update(status_aluno=status_aluno, atualizado_em=timezone.now())
+                    PrincipalService.invalidar('aluno', matricula.id_aluno_id)
 
             return Response({'mensagem': 'Estado da matrícula actualizado com sucesso!'})
         
@@ -557,12 +581,58 @@ class MatriculaViewSet(AuditMixin, viewsets.ModelViewSet):
         except Exception as e:
             return Response({'erro': f'Erro ao realizar permuta: {str(e)}'}, status=500)
 
+    @action(detail=False, methods=['get'])
+    def documentos_lote(self, request):
+        """
+        Gera em lote as fichas (tipo=ficha_matricula) ou declarações de matrícula
+        (tipo=declaracao_matricula) de uma turma ou de um ano lectivo, num ZIP
+        enviado à medida que os PDFs são gerados.
+        GET /matriculas/documentos_lote/?tipo=ficha_matricula&turma=<id>&ano_lectivo=<id>
+        """
+        from apis.models import Aluno
+        from apis.services.documentos_lote_service import DocumentosLoteService
+        from apis.services.ocupacao_service import OcupacaoService
+
+        tipo = request.query_params.get('tipo', 'ficha_matricula')
+        turma_id = request.query_params.get('turma')
+        ano_id = request.query_params.get('ano_lectivo')
+
+        if tipo not in ('ficha_matricula', 'declaracao_matricula'):
+            return Response({'erro': 'tipo deve ser ficha_matricula ou declaracao_matricula'}, status=400)
+        if not turma_id and not ano_id:
+            return Response({'erro': 'Indique a turma ou o ano_lectivo.'}, status=400)
+
+        if tipo == 'ficha_matricula':
+            objectos = Matricula.objects.order_by('id_aluno__nome_completo')
+            if turma_id:
+                objectos = objectos.filter(id_turma_id=turma_id)
+            if ano_id:
+                objectos = objectos.filter(ano_lectivo_id=ano_id)
+        else:
+            # Declarações apenas para alunos activos
+            objectos = Aluno.objects.filter(
+                status_aluno__in=OcupacaoService.STATUS_ALUNO_ACTIVO
+            ).order_by('nome_completo')
+            if turma_id:
+                objectos = objectos.filter(id_turma_id=turma_id)
+            if ano_id:
+                objectos = objectos.filter(id_turma__ano_lectivo_id=ano_id)
+
+        ids = list(objectos.values_list('pk', flat=True))
+        if not ids:
+            return Response({'erro': 'Nenhum documento para gerar.'}, status=404)
+
+        sufixo = f"turma_{turma_id}" if turma_id else f"ano_{ano_id}"
+        return DocumentosLoteService.resposta(
+            tipo, ids, request.build_absolute_uri('/')[:-1], f"{tipo}_{sufixo}.zip"
+        )
+
     @action(detail=True, methods=['get'])
     def download_ficha(self, request, pk=None):
         """
         Gera e retorna a Ficha de Matrícula em PDF.
         """
-        from django.http import HttpResponse
+        from django.http import FileResponse
         from apis.services.pdf_service import PDFService
         from django.utils import timezone
         
@@ -581,13 +651,19 @@ class MatriculaViewSet(AuditMixin, viewsets.ModelViewSet):
             'hoje': timezone.now(),
             'site_url': request.build_absolute_uri('/')[:-1]
         }
-        
-        pdf = PDFService.render_to_pdf('pdf/ficha_matricula.html', context)
+
+        # Versão dos dados da ficha: a ficha só é gerada de novo quando algo muda
+        versao = [
+            matricula.atualizado_em, aluno.atualizado_em,
+            turma.atualizado_em if turma else None,
+            matricula.ano_lectivo.atualizado_em if matricula.ano_lectivo_id else None,
+            list(encarregados.order_by('pk').values_list('pk', 'grau_parentesco', 'id_encarregado__atualizado_em')),
+        ]
+        parametros = {'matricula': matricula.pk, 'site_url': context['site_url']}
+        pdf = PDFService.render_to_pdf_cached('pdf/ficha_matricula.html', context, parametros, versao)
         
         if pdf:
-            response = HttpResponse(pdf, content_type='application/pdf')
             filename = f"Ficha_Matricula_{aluno.numero_matricula}.pdf"
-            response['Content-Disposition'] = f'attachment; filename="{filename}"'
-            return response
+            return FileResponse(pdf, as_attachment=True, filename=filename, content_type='application/pdf')
         
         return Response({'erro': 'Erro ao gerar PDF'}, status=500)
@@ -5,6 +5,11 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.0/howto/deployment/asgi/
+
+O feed de eventos em tempo real (/api/v1/eventos/ocupacao/, Server-Sent Events)
+deve ser servido por ASGI (ex: uvicorn core.asgi:application): as ligações
+longas usam um gerador assíncrono e não ocupam um worker WSGI cada. O broker
+dos eventos é local ao processo: servir com um único worker (WEB_CONCURRENCY=1).
 """
 
 import os
@@ -184,16 +184,81 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 
 # Cache Configuration
-# Usando LocMemCache para desenvolvimento/homologação. 
-# Para produção com 10k+ usuários, RECOMENDA-SE substituir por Redis.
-CACHES = {
-    'default': {
+# A cache tem de ser partilhada entre os workers (gunicorn): com LocMemCache cada
+# processo tinha a sua cópia e a invalidação (ex: ano lectivo activo) não chegava
+# aos restantes workers.
+#   CACHE_BACKEND=redis  -> Redis (REDIS_URL), recomendado com vários servidores
+#   CACHE_BACKEND=file   -> ficheiros em CACHE_DIR, partilhada pelos workers do mesmo servidor
+#   CACHE_BACKEND=locmem -> memória local do processo (apenas desenvolvimento)
+# CACHE_VERSION permite invalidar todas as chaves de uma vez (ex: após um deploy).
+REDIS_URL = os.getenv('REDIS_URL', '')
+CACHE_BACKEND = os.getenv('CACHE_BACKEND', 'redis' if REDIS_URL else 'file')
+CACHE_VERSION = int(os.getenv('CACHE_VERSION', '1'))
+
+if CACHE_BACKEND == 'redis':
+    _cache_default = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': REDIS_URL or 'redis://127.0.0.1:6379/1',
+    }
+elif CACHE_BACKEND == 'locmem':
+    _cache_default = {
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
         'LOCATION': 'unique-snowflake',
     }
+else:
+    _cache_default = {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.getenv('CACHE_DIR', os.path.join(BASE_DIR, 'cache')),
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    }
+
+CACHES = {
+    'default': {
+        **_cache_default,
+        'KEY_PREFIX': os.getenv('CACHE_KEY_PREFIX', 'sgm'),
+        'VERSION': CACHE_VERSION,
+    }
 }
 
 
+# Relatórios em PDF gerados em segundo plano (python manage.py processar_relatorios)
+# Número máximo de relatórios renderizados em simultâneo pelo pool de processos
+RELATORIOS_WORKERS = int(os.getenv('RELATORIOS_WORKERS', '2'))
+
+# Cache em disco dos PDFs gerados (relatórios, fichas), limitada em tamanho (LRU)
+PDF_CACHE_DIR = os.getenv('PDF_CACHE_DIR', os.path.join(BASE_DIR, 'pdf_cache'))
+PDF_CACHE_MAX_MB = int(os.getenv('PDF_CACHE_MAX_MB', '200'))
+
+# Documentos gerados em lote (ZIP de fichas/declarações/comprovativos):
+# processos de renderização partilhados por cada worker web
+DOCUMENTOS_LOTE_WORKERS = int(os.getenv('DOCUMENTOS_LOTE_WORKERS', '2'))
+
+# Eventos em tempo real (SSE, /api/v1/eventos/ocupacao/). O broker é local ao
+# processo: o feed só é servido com um único worker (WEB_CONCURRENCY, o nº de
+# workers lido pelo gunicorn/uvicorn) e, fora do DEBUG, apenas por ASGI.
+EVENTOS_SSE = os.getenv('EVENTOS_SSE', 'True') == 'True'
+WEB_CONCURRENCY = int(os.getenv('WEB_CONCURRENCY', '1'))
+
+# Backups (base de dados + media) executados em segundo plano com prioridade reduzida
+BACKUP_DIR = os.getenv('BACKUP_DIR', os.path.join(BASE_DIR, 'backups'))
+BACKUP_NICE = int(os.getenv('BACKUP_NICE', '10'))
+# Media incremental: backups incrementais seguidos antes de voltar a guardar toda a media
+BACKUP_MEDIA_COMPLETO_A_CADA = int(os.getenv('BACKUP_MEDIA_COMPLETO_A_CADA', '7'))
+# Processos do pg_restore no restauro (pg_restore -j); 1 envia o dump directamente em streaming
+BACKUP_RESTAURO_JOBS = int(os.getenv('BACKUP_RESTAURO_JOBS', str(min(4, os.cpu_count() or 1))))
+# Perfil de compressão padrão do dump (rapido, equilibrado, maximo) e threads usadas (0 = até 2, sem exceder o nº de CPUs)
+BACKUP_COMPRESSAO = os.getenv('BACKUP_COMPRESSAO', 'equilibrado')
+BACKUP_COMPRESSAO_THREADS = int(os.getenv('BACKUP_COMPRESSAO_THREADS', '0'))
+
+# Agendador de backups (python manage.py agendar_backups)
+# Janela fora de horas de ponta em que os backups agendados podem correr (hora local; vazio = sem restrição)
+BACKUP_JANELA = os.getenv('BACKUP_JANELA', '01:00-06:00')
+BACKUP_AGENDADO_TENTATIVAS = int(os.getenv('BACKUP_AGENDADO_TENTATIVAS', '3'))
+# Orçamento de recursos: duração máxima (minutos), carga média por CPU e threads de compressão
+BACKUP_AGENDADO_DURACAO_MAXIMA = int(os.getenv('BACKUP_AGENDADO_DURACAO_MAXIMA', '240'))
+BACKUP_AGENDADO_CARGA_MAXIMA = float(os.getenv('BACKUP_AGENDADO_CARGA_MAXIMA', '0.75'))
+BACKUP_AGENDADO_THREADS = int(os.getenv('BACKUP_AGENDADO_THREADS', '2'))
+
 # REST Framework Configuration
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
@@ -0,0 +1,148 @@
+"""
+Benchmark da compressão dos arquivos de backup (compressao_utils).
+
+Gera uma árvore de media sintética (imagens/PDFs já comprimidos + ficheiros de
+texto) e um dump sintético, e compara a política antiga (ZIP_DEFLATED numa só
+thread sobre tudo) com cada perfil de compressão e número de threads,
+reportando o débito (MB/s) e a razão de compressão.
+
+Uso:
+    python scripts/benchmark_compressao.py
+    python scripts/benchmark_compressao.py --dump-mb 512 --media-mb 256 --threads 1 2 4 8
+"""
+import os
+import sys
+import time
+import random
+import shutil
+import zipfile
+import argparse
+import tempfile
+import django
+
+# Adicionar o diretorio raiz do backend ao sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Configurar Django
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
+django.setup()
+
+from apis.utils import compressao_utils
+
+MB = 1024 * 1024
+BLOCO_LEITURA = MB
+
+
+def gerar_dump(caminho, tamanho):
+    """Texto ao estilo de um dump SQL (linhas COPY com valores repetitivos)"""
+    rng = random.Random(1)
+    nomes = ['Ana', 'João', 'Maria', 'Pedro', 'Isabel', 'Carlos', 'Teresa', 'António']
+    with open(caminho, 'wb') as f:
+        escritos = 0
+        while escritos < tamanho:
+            linhas = ''.join(
+                f"{rng.randint(1, 10**6)}\t{rng.choice(nomes)} {rng.choice(nomes)}\t"
+                f"2026-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}\t{rng.randint(0, 20)}\tActivo\n"
+                for _ in range(1000)
+            ).encode()
+            f.write(linhas)
+            escritos += len(linhas)
+
+
+def gerar_media(pasta, tamanho):
+    """70% do volume em ficheiros aleatórios (.jpg/.pdf, incompressíveis), 30% em texto"""
+    rng = random.Random(2)
+    escritos = 0
+    indice = 0
+    while escritos < tamanho:
+        subpasta = os.path.join(pasta, f"alunos/{indice % 20:02d}")
+        os.makedirs(subpasta, exist_ok=True)
+        if rng.random() < 0.7:
+            extensao = rng.choice(['.jpg', '.pdf'])
+            dados = os.urandom(rng.randint(50, 800) * 1024)
+        else:
+            extensao = rng.choice(['.txt', '.csv', '.html'])
+            dados = (f"Registo {indice};Aluno {indice};Turma {indice % 30};Observações\n" * 2000).encode()
+        with open(os.path.join(subpasta, f"ficheiro_{indice}{extensao}"), 'wb') as f:
+            f.write(dados)
+        escritos += len(dados)
+        indice += 1
+
+
+def ficheiros(pasta):
+    return [
+        os.path.join(raiz, nome) for raiz, _dirs, nomes in os.walk(pasta) for nome in sorted(nomes)
+    ]
+
+
+def politica_antiga(destino, dump, media):
+    """Tudo com ZIP_DEFLATED (nível 6), numa thread"""
+    with zipfile.ZipFile(destino, 'w', zipfile.ZIP_DEFLATED, allowZip64=True) as arquivo:
+        arquivo.write(dump, arcname='database.dump')
+        for caminho in ficheiros(media):
+            arquivo.write(caminho, arcname=os.path.relpath(caminho, media))
+
+
+def politica_nova(destino, dump, media, nome_perfil, n_threads):
+    """Dump comprimido em blocos paralelos; media já comprimida guardada sem recompressão"""
+    _nome, codec, nivel = compressao_utils.perfil(nome_perfil)
+    with zipfile.ZipFile(destino, 'w', zipfile.ZIP_DEFLATED, allowZip64=True) as arquivo:
+        info = zipfile.ZipInfo('database.dump' + compressao_utils.EXTENSOES[codec])
+        info.compress_type = zipfile.ZIP_STORED
+        with open(dump, 'rb') as origem, arquivo.open(info, 'w', force_zip64=True) as saida, \
+                compressao_utils.CompressorParalelo(saida, codec, nivel, n_threads) as compressor:
+            for bloco in iter(lambda: origem.read(BLOCO_LEITURA), b''):
+                compressor.write(bloco)
+        for caminho in ficheiros(media):
+            relativo = os.path.relpath(caminho, media)
+            compress_type, compresslevel = compressao_utils.tipo_zip(relativo, nivel)
+            arquivo.write(caminho, arcname=relativo, compress_type=compress_type, compresslevel=compresslevel)
+
+
+def medir(funcao, destino, tamanho_original):
+    inicio = time.perf_counter()
+    funcao(destino)
+    duracao = time.perf_counter() - inicio
+    tamanho = os.path.getsize(destino)
+    os.remove(destino)
+    return duracao, tamanho_original / MB / duracao, tamanho_original / tamanho
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--dump-mb', type=int, default=128, help='Tamanho do dump sintético (MB)')
+    parser.add_argument('--media-mb', type=int, default=128, help='Tamanho da media sintética (MB)')
+    parser.add_argument('--threads', type=int, nargs='+', default=[1, os.cpu_count() or 1])
+    parser.add_argument('--perfis', nargs='+', default=list(compressao_utils.PERFIS))
+    args = parser.parse_args()
+
+    pasta = tempfile.mkdtemp(prefix='benchmark_compressao_')
+    try:
+        dump = os.path.join(pasta, 'database.dump')
+        media = os.path.join(pasta, 'media')
+        gerar_dump(dump, args.dump_mb * MB)
+        gerar_media(media, args.media_mb * MB)
+        tamanho_original = os.path.getsize(dump) + sum(os.path.getsize(c) for c in ficheiros(media))
+        destino = os.path.join(pasta, 'backup.zip')
+
+        print(f"Dump: {os.path.getsize(dump) / MB:.1f} MB, media: {len(ficheiros(media))} ficheiros "
+              f"({(tamanho_original - os.path.getsize(dump)) / MB:.1f} MB)")
+        print()
+        print(f"{'Política':<24} | {'Threads':>7} | {'Tempo':>8} | {'MB/s':>7} | {'Razão':>6}")
+        print("-" * 66)
+
+        duracao, debito, razao = medir(lambda d: politica_antiga(d, dump, media), destino, tamanho_original)
+        print(f"{'ZIP_DEFLATED (antiga)':<24} | {1:>7} | {duracao:>7.2f}s | {debito:>7.1f} | {razao:>6.2f}")
+
+        for nome_perfil in args.perfis:
+            for n_threads in args.threads:
+                duracao, debito, razao = medir(
+                    lambda d: politica_nova(d, dump, media, nome_perfil, n_threads), destino, tamanho_original
+                )
+                print(f"{nome_perfil:<24} | {n_threads:>7} | {duracao:>7.2f}s | {debito:>7.1f} | {razao:>6.2f}")
+    finally:
+        shutil.rmtree(pasta, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""
+Benchmark da distribuição de candidatos por salas de exame (ExameService).
+
+Uso:
+    python scripts/benchmark_distribuir_exames.py            # só o plano em memória (10k candidatos)
+    python scripts/benchmark_distribuir_exames.py 20000 --db # plano + gravação em lote (com rollback)
+"""
+import os
+import sys
+import time
+import datetime
+import django
+
+# Adicionar o diretorio raiz do backend ao sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Configurar Django
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
+django.setup()
+
+from django.db import transaction
+from apis.models import Candidato, Sala, AnoLectivo
+from apis.services.exame_service import ExameService
+
+
+class _Rollback(Exception):
+    pass
+
+
+def benchmark_plano(total, salas):
+    candidatos = [Candidato(id_candidato=i + 1) for i in range(total)]
+    inicio = time.perf_counter()
+    plano = ExameService.planear_distribuicao(candidatos, salas, datetime.datetime(2026, 9, 1, 8, 0))
+    duracao = time.perf_counter() - inicio
+    sessoes = ExameService.resumir_plano(plano)
+    print(f"Plano em memória: {len(plano)} candidatos em {duracao:.3f}s ({len(sessoes)} sessões sala/horário)")
+    print(f"  Primeira sessão: {sessoes[0]['data_exame']} | Última sessão: {sessoes[-1]['data_exame']}")
+
+
+def benchmark_db(total):
+    ano = AnoLectivo.get_active_year()
+    if not ano:
+        print("Nenhum ano lectivo activo: o benchmark com base de dados foi ignorado.")
+        return
+
+    try:
+        with transaction.atomic():
+            salas = list(Sala.objects.all().order_by('numero_sala'))
+            base = Candidato.objects.count()
+            candidatos = Candidato.objects.bulk_create([
+                Candidato(
+                    numero_inscricao=f"BENCH{base + i:08d}", nome_completo=f"Candidato Benchmark {i}",
+                    genero='M', data_nascimento=datetime.date(2010, 1, 1), numero_bi=f"BENCH{base + i:09d}",
+                    residencia='Luanda', telefone='900000000', escola_proveniencia='Escola',
+                    municipio_escola='Luanda', ano_conclusao=2025, media_final=14,
+                    nome_encarregado='Encarregado', parentesco_encarregado='Pai',
+                    telefone_encarregado='900000000', ano_lectivo=ano
+                )
+                for i in range(total)
+            ], batch_size=1000)
+            candidatos = list(Candidato.objects.filter(numero_inscricao__startswith='BENCH').order_by('id_candidato'))
+
+            inicio = time.perf_counter()
+            plano = ExameService.planear_distribuicao(candidatos, salas, datetime.datetime(2026, 9, 1, 8, 0))
+            gravados = ExameService.aplicar_distribuicao(plano)
+            duracao = time.perf_counter() - inicio
+            print(f"Plano + gravação em lote: {gravados} exames em {duracao:.3f}s")
+            raise _Rollback()
+    except _Rollback:
+        print("Dados de benchmark revertidos.")
+
+
+if __name__ == "__main__":
+    args = [a for a in sys.argv[1:] if not a.startswith('--')]
+    total = int(args[0]) if args else 10000
+
+    salas = list(Sala.objects.all().order_by('numero_sala')) if '--db' in sys.argv else []
+    if not salas:
+        # Salas sintéticas (20 salas de 40 lugares) para o benchmark em memória
+        salas = [Sala(id_sala=i + 1, numero_sala=i + 1, capacidade_alunos=40) for i in range(20)]
+
+    benchmark_plano(total, salas)
+    if '--db' in sys.argv:
+        benchmark_db(total)
@@ -0,0 +1,93 @@
+"""
+Micro-benchmark da verificação de permissões (HasAdditionalPermission).
+
+Percorre todas as entradas de `permission_map` dos ViewSets registados no router
+e mede o custo médio por verificação para vários perfis:
+  - com principal pré-compilado (caminho normal, via SchoolJWTAuthentication)
+  - sem principal (compilação no próprio request, ex: User nativo do Django)
+
+Uso:
+    python scripts/benchmark_permissoes.py          # 2000 repetições
+    python scripts/benchmark_permissoes.py 10000
+"""
+import os
+import sys
+import time
+import django
+from types import SimpleNamespace
+
+# Adicionar o diretorio raiz do backend ao sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Configurar Django
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
+django.setup()
+
+from apis.urls import router
+from apis.models import Cargo, Funcionario
+from apis.permissions.custom_permissions import HasAdditionalPermission, compilar_permissoes
+
+
+def entradas_permission_map():
+    """Lista de (view, action) para todas as entradas de permission_map"""
+    entradas = []
+    for _prefix, viewset, _basename in router.registry:
+        for action in getattr(viewset, 'permission_map', {}):
+            view = viewset()
+            view.action = action
+            entradas.append((view, action))
+    return entradas
+
+
+def perfis():
+    """(nome, permissoes, cargo, is_superuser) representativos"""
+    return [
+        ('Superusuário', [], 'Administrador', True),
+        ('Secretaria (cargo)', [], 'Secretaria', False),
+        ('Professor (cargo)', [], 'Professor', False),
+        ('Lista explícita', ['view_alunos', 'view_turmas', 'create_matricula', 'view_relatorios'], 'Secretaria', False),
+    ]
+
+
+def medir(entradas, criar_request, repeticoes):
+    permissao = HasAdditionalPermission()
+    permitidas = 0
+    inicio = time.perf_counter()
+    for _ in range(repeticoes):
+        for view, _action in entradas:
+            if permissao.has_permission(criar_request(), view):
+                permitidas += 1
+    duracao = time.perf_counter() - inicio
+    total = repeticoes * len(entradas)
+    return duracao / total * 1e9, permitidas / repeticoes
+
+
+def benchmark(repeticoes):
+    entradas = entradas_permission_map()
+    viewsets = len({type(view) for view, _ in entradas})
+    print(f"{len(entradas)} entradas de permission_map em {viewsets} ViewSets, {repeticoes} repetições\n")
+
+    for nome, permissoes, cargo, is_superuser in perfis():
+        acesso_total, efectivas = compilar_permissoes(permissoes, cargo, is_superuser)
+        principal = {'acesso_total': acesso_total, 'permissoes': efectivas}
+
+        # Utilizador em memória (sem base de dados) para o caminho sem principal
+        if is_superuser:
+            cargo = 'Diretor'
+        user = Funcionario(permissoes_adicionais=permissoes, id_cargo=Cargo(nome_cargo=cargo))
+        user.is_authenticated = True
+
+        com_cache, permitidas = medir(
+            entradas, lambda: SimpleNamespace(user=user, principal=principal), repeticoes
+        )
+        sem_cache, _ = medir(
+            entradas, lambda: SimpleNamespace(user=user, principal=None, auth_payload={}), repeticoes
+        )
+        print(f"{nome:<22} permitidas {int(permitidas):>3}/{len(entradas)} | "
+              f"principal compilado: {com_cache:7.0f} ns/verificação | "
+              f"compilação por request: {sem_cache:7.0f} ns/verificação")
+
+
+if __name__ == "__main__":
+    args = [a for a in sys.argv[1:] if not a.startswith('--')]
+    benchmark(int(args[0]) if args else 2000)
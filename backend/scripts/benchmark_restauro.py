@@ -0,0 +1,127 @@
+"""
+Benchmark do restauro de backups (RestauroService) contra um PostgreSQL local.
+
+Restaura o dump de um arquivo de backup numa base de dados de teste (nunca a
+configurada em settings) com diferentes números de processos do pg_restore,
+e reconstrói a media numa pasta temporária, reportando a duração de cada fase
+e o débito em MB/s.
+
+Uso (ex: PostgreSQL descartável em docker):
+    docker run -d -p 5433:5432 -e POSTGRES_PASSWORD=bench postgres:16
+    createdb -h localhost -p 5433 -U postgres sgm_bench
+    python scripts/benchmark_restauro.py backups/backup_20260101_020000.zip sgm_bench \\
+        --host localhost --port 5433 --user postgres --password bench --jobs 1 2 4
+"""
+import os
+import sys
+import time
+import shutil
+import zipfile
+import argparse
+import tempfile
+import django
+
+# Adicionar o diretorio raiz do backend ao sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Configurar Django
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
+django.setup()
+
+from django.conf import settings
+from apis.services.backup_service import BackupService
+from apis.services.restauro_service import RestauroService, _EstadoRestauro
+
+
+class EstadoBenchmark(_EstadoRestauro):
+    """Estado em memória (sem ficheiro JSON)"""
+
+    def gravar(self, forcar=False):
+        pass
+
+
+def configurar_base_dados(args):
+    """Aponta a ligação usada pelo RestauroService para a base de dados de teste"""
+    original = settings.DATABASES['default']
+    teste = dict(original, NAME=args.base_dados)
+    for chave, valor in (('HOST', args.host), ('PORT', args.port), ('USER', args.user), ('PASSWORD', args.password)):
+        if valor is not None:
+            teste[chave] = valor
+
+    if (teste['NAME'], teste.get('HOST'), str(teste.get('PORT'))) == \
+            (original['NAME'], original.get('HOST'), str(original.get('PORT'))):
+        sys.exit("A base de dados de teste não pode ser a base de dados configurada no sistema.")
+    settings.DATABASES['default'] = teste
+
+
+def restaurar_base_dados(caminho, processos, tamanho_dump, formato):
+    dados = {
+        'processos': processos if formato == 'custom' else 1,
+        'status': RestauroService.STATUS_PROCESSANDO,
+        'fase': '',
+        'base_dados': {'bytes': 0, 'total': tamanho_dump, 'itens': 0, 'total_itens': None},
+        'media': {'bytes': 0, 'total': 0, 'itens': 0, 'total_itens': None},
+        'fases': {},
+    }
+    inicio = time.perf_counter()
+    RestauroService._restaurar_base_dados(caminho, EstadoBenchmark(dados))
+    return time.perf_counter() - inicio, dados['fases']
+
+
+def restaurar_media(caminho):
+    destino = tempfile.mkdtemp(prefix='benchmark_media_')
+    try:
+        inicio = time.perf_counter()
+        ficheiros = BackupService.restaurar_media(caminho, destino)
+        duracao = time.perf_counter() - inicio
+        tamanho = sum(
+            os.path.getsize(os.path.join(raiz, nome)) for raiz, _dirs, nomes in os.walk(destino) for nome in nomes
+        )
+        return ficheiros, tamanho, duracao
+    finally:
+        shutil.rmtree(destino, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('arquivo', help='Arquivo de backup (.zip)')
+    parser.add_argument('base_dados', help='Base de dados de teste (será apagada e recriada)')
+    parser.add_argument('--host')
+    parser.add_argument('--port')
+    parser.add_argument('--user')
+    parser.add_argument('--password')
+    parser.add_argument('--jobs', type=int, nargs='+', default=[1, 2, 4], help='Processos do pg_restore a testar')
+    args = parser.parse_args()
+
+    configurar_base_dados(args)
+    caminho = os.path.abspath(args.arquivo)
+    with zipfile.ZipFile(caminho) as arquivo:
+        membro, formato, codec = RestauroService.localizar_dump(arquivo)
+        if not membro:
+            sys.exit("Dump da base de dados não encontrado no arquivo.")
+        info = arquivo.getinfo(membro)
+
+    mb_dump = info.file_size / (1024 * 1024)
+    print(f"Arquivo: {os.path.basename(caminho)}")
+    print(f"Dump: {membro} ({formato}, {codec or 'sem compressão própria'}), {mb_dump:.1f} MB "
+          f"({info.compress_size / (1024 * 1024):.1f} MB no arquivo)")
+    print()
+    print(f"{'Processos':>9} | {'Total':>8} | {'MB/s':>7} | Fases")
+    print("-" * 72)
+    for processos in args.jobs:
+        duracao, fases = restaurar_base_dados(caminho, processos, info.file_size, formato)
+        detalhe = ', '.join(f"{nome} {segundos:.2f}s" for nome, segundos in fases.items())
+        print(f"{processos:>9} | {duracao:>7.2f}s | {mb_dump / duracao:>7.1f} | {detalhe}")
+        if formato != 'custom':
+            print("(dump SQL: restauro sempre sequencial via psql)")
+            break
+
+    ficheiros, tamanho, duracao = restaurar_media(caminho)
+    mb_media = tamanho / (1024 * 1024)
+    print()
+    print(f"Media: {ficheiros} ficheiros, {mb_media:.1f} MB em {duracao:.2f}s "
+          f"({mb_media / duracao if duracao else 0:.1f} MB/s)")
+
+
+if __name__ == '__main__':
+    main()
@@ -69,6 +69,7 @@ const Configuracoes = () => {
     });
     const [selectedUser, setSelectedUser] = useState(null);
     const [backupStatus, setBackupStatus] = useState('idle');
+    const [backupCompressao, setBackupCompressao] = useState('equilibrado');
     const [saving, setSaving] = useState(false); // Added for restore operation
 
     // Real Data States
@@ -103,7 +104,7 @@ const Configuracoes = () => {
     const [logsData, setLogsData] = useState([]);
     const [logsLoading, setLogsLoading] = useState(false);
     const [logsPage, setLogsPage] = useState(1);
-    const [logsTotalPages, setLogsTotalPages] = useState(1);
+    const [logsCursors, setLogsCursors] = useState({ next: null, previous: null });
     const [logsTotal, setLogsTotal] = useState(0);
     const [logsFilter, setLogsFilter] = useState({ busca: '', data_inicio: '', data_fim: '', tipo: 'all' });
 
@@ -187,20 +188,23 @@ const Configuracoes = () => {
         }
     };
 
-    const fetchLogs = async (page = 1, tipo = logsTab, filtros = logsFilter) => {
+    const fetchLogs = async (page = 1, tipo = logsTab, filtros = logsFilter, cursor = null) => {
         setLogsLoading(true);
         try {
             const endpoint = tipo === 'logins' ? 'auditoria/logins/' : 'auditoria/actividades/';
-            const params = new URLSearchParams({ page, page_size: 20 });
+            // Paginação por cursor: o total (aproximado) só é pedido na primeira página
+            const params = new URLSearchParams({ page_size: 20 });
+            if (cursor) params.append('cursor', cursor);
+            else params.append('total', 'aproximado');
             if (filtros.busca) params.append('busca', filtros.busca);
             if (filtros.data_inicio) params.append('data_inicio', filtros.data_inicio);
             if (filtros.data_fim) params.append('data_fim', filtros.data_fim);
             if (filtros.tipo && filtros.tipo !== 'all') params.append('tipo', filtros.tipo);
             const res = await api.get(`${endpoint}?${params}`);
             setLogsData(res.data.results || []);
-            setLogsPage(res.data.page || 1);
-            setLogsTotalPages(res.data.total_pages || 1);
-            setLogsTotal(res.data.count || 0);
+            setLogsPage(page);
+            setLogsCursors({ next: res.data.next_cursor, previous: res.data.previous_cursor });
+            if (!cursor) setLogsTotal(res.data.count || 0);
         } catch (e) {
             console.error('Erro ao carregar logs:', e);
         } finally {
@@ -305,13 +309,23 @@ const Configuracoes = () => {
     const handleBackup = async () => {
         setBackupStatus('processing');
         try {
-            await api.post('backups/create_backup/', {}, { timeout: 300000 }); // Extender para 5 minutos
+            // O backup corre em segundo plano: acompanhar o estado até terminar
+            const { data: job } = await api.post('backups/create_backup/', { compressao: backupCompressao });
+            let estado = job;
+            while (estado.status === 'Pendente' || estado.status === 'Em Processamento') {
+                await new Promise(resolve => setTimeout(resolve, 3000));
+                const response = await api.get(`backups/backup_status/?job=${job.id_job}`);
+                estado = response.data;
+            }
+            if (estado.status !== 'Concluido') {
+                throw new Error(estado.erro || 'Erro ao gerar backup');
+            }
             setBackupStatus('completed');
             fetchBackups();
             setTimeout(() => setBackupStatus('idle'), 5000);
         } catch (error) {
             console.error("Erro ao gerar backup:", error);
-            alert("Erro ao gerar backup. Verifique se o pg_dump está instalado no servidor.");
+            alert(error.response?.data?.error || "Erro ao gerar backup. Verifique se o pg_dump está instalado no servidor.");
             setBackupStatus('idle');
         }
     };
@@ -335,6 +349,19 @@ const Configuracoes = () => {
         }
     };
 
+    // O restauro corre em segundo plano: acompanhar o estado até terminar
+    const aguardarRestauro = async (restauro) => {
+        let estado = restauro;
+        while (estado.status === 'Pendente' || estado.status === 'Em Processamento') {
+            await new Promise(resolve => setTimeout(resolve, 3000));
+            const response = await api.get(`backups/restore_status/?job=${restauro.token}`);
+            estado = response.data;
+        }
+        if (estado.status !== 'Concluido') {
+            throw new Error(estado.erro || 'Erro ao restaurar backup');
+        }
+    };
+
     const handleRestoreBackup = async (filename) => {
         console.log("Iniciando restauração do backup:", filename);
         if (!window.confirm("AVISO CRÍTICO: Esta ação irá substituir TODOS os dados atuais do sistema (Base de Dados e Media) pelos dados deste backup. Deseja continuar?")) return;
@@ -342,12 +369,13 @@ const Configuracoes = () => {
         try {
             setSaving(true);
             const response = await api.post('backups/restore_backup/', { filename });
+            await aguardarRestauro(response.data);
             alert("✅ Backup restaurado com sucesso!\n\nPara garantir que todos os dados sejam actualizados correctamente, a página será recarregada. Por favor, termine a sessão e entre novamente após o recarregamento.");
             // Recarregar a página para garantir que os novos dados sejam carregados
             setTimeout(() => window.location.reload(), 2000);
         } catch (error) {
             console.error("Erro ao restaurar backup:", error);
-            alert(error.response?.data?.error || "Erro ao restaurar backup");
+            alert(error.response?.data?.error || error.message || "Erro ao restaurar backup");
         } finally {
             setSaving(false);
         }
@@ -373,12 +401,13 @@ const Configuracoes = () => {
                 headers: { 'Content-Type': 'multipart/form-data' },
                 timeout: 600000 // 10 minutos para uploads grandes
             });
+            await aguardarRestauro(response.data);
 
             alert("✅ Sistema restaurado com sucesso a partir do ficheiro!\n\nAVISO: É obrigatório terminar a sessão e entrar novamente (Logout/Login) para aplicar as novas permissões e dados de acesso restaurados.");
             setTimeout(() => window.location.reload(), 2000);
         } catch (error) {
             console.error("Erro no upload de restauração:", error);
-            alert(error.response?.data?.error || "Falha ao carregar ou restaurar o ficheiro.");
+            alert(error.response?.data?.error || error.message || "Falha ao carregar ou restaurar o ficheiro.");
         } finally {
             setSaving(false);
             setBackupStatus('idle');
@@ -1080,6 +1109,18 @@ const Configuracoes = () => {
                                     </>
                                 )}
                             </button>
+                            <select
+                                className="input-v2"
+                                style={{ width: 'auto' }}
+                                value={backupCompressao}
+                                onChange={e => setBackupCompressao(e.target.value)}
+                                disabled={backupStatus === 'processing'}
+                                title="Compressão do backup"
+                            >
+                                <option value="rapido">Compressão rápida</option>
+                                <option value="equilibrado">Compressão equilibrada</option>
+                                <option value="maximo">Compressão máxima (mais lento)</option>
+                            </select>
                             <label className="btn-premium btn-secondary-premium" style={{ cursor: 'pointer', display: 'flex', alignItems: 'center', gap: '8px' }}>
                                 <Upload size={18} />
                                 <span>Restaurar do ficheiro</span>
@@ -1203,11 +1244,11 @@ const Configuracoes = () => {
                                             <div style={{ display: 'flex', alignItems: 'center', gap: '12px' }}>
                                                 <div style={{ 
                                                     width: '40px', height: '40px', borderRadius: '10px', 
-                                                    background: ag.notificado ? '#dcfce7' : '#fef3c7', 
-                                                    color: ag.notificado ? '#16a34a' : '#d97706',
+                                                    background: ag.executado ? '#dcfce7' : (ag.erro ? '#fee2e2' : '#fef3c7'), 
+                                                    color: ag.executado ? '#16a34a' : (ag.erro ? '#dc2626' : '#d97706'),
                                                     display: 'flex', alignItems: 'center', justifyContent: 'center'
                                                 }}>
-                                                    {ag.notificado ? <CheckCircle size={20} /> : <Clock size={20} />}
+                                                    {ag.executado ? <CheckCircle size={20} /> : (ag.erro ? <AlertTriangle size={20} /> : <Clock size={20} />)}
                                                 </div>
                                                 <div>
                                                     <p style={{ fontWeight: 700, fontSize: '14px', margin: 0, color: '#1e293b' }}>
@@ -1217,9 +1258,14 @@ const Configuracoes = () => {
                                                 </div>
                                             </div>
                                             <div style={{ display: 'flex', gap: '10px', alignItems: 'center' }}>
-                                                {ag.notificado && (
+                                                {ag.executado && (
                                                     <span style={{ fontSize: '11px', fontWeight: 700, background: '#dcfce7', color: '#16a34a', padding: '4px 8px', borderRadius: '20px' }}>
-                                                        Notificado
+                                                        Executado
+                                                    </span>
+                                                )}
+                                                {!ag.executado && ag.erro && (
+                                                    <span title={ag.erro} style={{ fontSize: '11px', fontWeight: 700, background: '#fee2e2', color: '#dc2626', padding: '4px 8px', borderRadius: '20px' }}>
+                                                        Falhou ({ag.tentativas} {ag.tentativas === 1 ? 'tentativa' : 'tentativas'})
                                                     </span>
                                                 )}
                                                 <button 
@@ -2642,17 +2688,17 @@ const Configuracoes = () => {
                         </div>
 
                         {/* Paginação */}
-                        {logsTotalPages > 1 && (
+                        {(logsCursors.next || logsCursors.previous) && (
                             <div style={{ display: 'flex', justifyContent: 'space-between', alignItems: 'center', marginTop: '16px', padding: '0 4px' }}>
-                                <span style={{ fontSize: '13px', color: '#64748b' }}>Total: {logsTotal} registos</span>
+                                <span style={{ fontSize: '13px', color: '#64748b' }}>Total: ~{logsTotal} registos</span>
                                 <div style={{ display: 'flex', gap: '8px', alignItems: 'center' }}>
-                                    <button disabled={logsPage <= 1} onClick={() => { setLogsPage(p => p-1); fetchLogs(logsPage-1, logsTab); }}
-                                        style={{ padding: '6px 12px', border: '1px solid #e2e8f0', borderRadius: '8px', background: logsPage <= 1 ? '#f8fafc' : 'white', cursor: logsPage <= 1 ? 'not-allowed' : 'pointer', color: '#64748b' }}>
+                                    <button disabled={!logsCursors.previous} onClick={() => fetchLogs(Math.max(1, logsPage-1), logsTab, logsFilter, logsCursors.previous)}
+                                        style={{ padding: '6px 12px', border: '1px solid #e2e8f0', borderRadius: '8px', background: !logsCursors.previous ? '#f8fafc' : 'white', cursor: !logsCursors.previous ? 'not-allowed' : 'pointer', color: '#64748b' }}>
                                         <ChevronLeft size={16}/>
                                     </button>
-                                    <span style={{ fontSize: '13px', fontWeight: 600, color: '#1e293b' }}>Pág. {logsPage} de {logsTotalPages}</span>
-                                    <button disabled={logsPage >= logsTotalPages} onClick={() => { setLogsPage(p => p+1); fetchLogs(logsPage+1, logsTab); }}
-                                        style={{ padding: '6px 12px', border: '1px solid #e2e8f0', borderRadius: '8px', background: logsPage >= logsTotalPages ? '#f8fafc' : 'white', cursor: logsPage >= logsTotalPages ? 'not-allowed' : 'pointer', color: '#64748b' }}>
+                                    <span style={{ fontSize: '13px', fontWeight: 600, color: '#1e293b' }}>Pág. {logsPage}</span>
+                                    <button disabled={!logsCursors.next} onClick={() => fetchLogs(logsPage+1, logsTab, logsFilter, logsCursors.next)}
+                                        style={{ padding: '6px 12px', border: '1px solid #e2e8f0', borderRadius: '8px', background: !logsCursors.next ? '#f8fafc' : 'white', cursor: !logsCursors.next ? 'not-allowed' : 'pointer', color: '#64748b' }}>
                                         <ChevronRightIcon size={16}/>
                                     </button>
                                 </div>